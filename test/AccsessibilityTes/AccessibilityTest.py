@@ -1,107 +1,108 @@
-import unittest
-import time
-from selenium import webdriver
-from selenium.webdriver import Keys
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.wait import WebDriverWait
-
-#====== URL AND WEBSITE ======
-SITE_URL="https://react.dev/"
-YOUTUBE_TAB="youtube.com"
-#====== TAGS AND ATTRIBUTES ======
-BODY_TAG="body"
-HERF_TAB="href"
-OUTLINE_PROPERTY="outline"
-MAX_TABS=60
-
-class AccessibilityTest(unittest.TestCase):
-    """
-     Test suite to verify keyboard accessibility and visible focus on the React.dev homepage.
-
-     This test checks that TAB navigation can reach all interactive elements,
-     that each focused element has a visible outline, and that a YouTube video
-     link is reachable and functional via keyboard only.
-     """
-
-    def setUp(self):
-        """
-        This function open the Chrome Browser and then open the React.dev Homepage.
-        """
-        self.driver = webdriver.Chrome()
-        self.driver.get(SITE_URL)
-        self.wait = WebDriverWait(self.driver, 10)
-
-    def tearDown(self):
-        """
-        This function is responsible to close the browser after each test.
-        """
-        self.driver.quit()
-
-    def test_tab_accessibility(self):
-        """
-        Main accessibility test:
-        1. Navigates the homepage using TAB up to MAX_TABS times.
-        2. For each element focused, checks that a visible outline is present.
-        3. When a YouTube link is focused, presses ENTER to follow the link.
-        4. Asserts that the YouTube link opens correctly in a new tab or window.
-        5. Navigates backward through focus order with Shift+TAB, ensuring no errors.
-        """
-        driver = self.driver
-        driver.get(SITE_URL)
-        time.sleep(1)
-
-        body = driver.find_element(By.TAG_NAME, BODY_TAG)
-
-        video_found=False
-        video_index=-1
-        max_tabs = MAX_TABS
-        focused_elements = []
-
-        #Moving inside the main page until we reach max_tabs
-        for i in range(max_tabs):
-            body.send_keys(Keys.TAB)
-            time.sleep(0.1)
-            focused = driver.switch_to.active_element
-            href = focused.get_attribute(HERF_TAB) or ""
-            text = focused.text.strip()
-
-
-            #Check for visible focused
-            outline = focused.value_of_css_property(OUTLINE_PROPERTY)
-            self.assertTrue(
-                ("solid" in outline or "rgb" in outline or "1px" in outline) and not outline == "none",
-                "Focused element has no visible focus outline!"
-            )
-
-            focused_elements.append(focused)
-
-            #if the current focused is a YouTube link -> We press Enter and check if the link is ok
-            if YOUTUBE_TAB in href:
-                focused.send_keys(Keys.ENTER)
-                video_found = True
-                video_index = i
-                break
-
-        #Check if we did reach a YouTube link
-        self.assertTrue(video_found, "Did not reach the YouTube link with TAB navigation.")
-
-
-        time.sleep(2)
-
-        #check if the new tab opened after pressing ENTER;
-        if len(driver.window_handles) > 1:
-            driver.switch_to.window(driver.window_handles[-1])
-            self.assertTrue("youtube.com" in driver.current_url, "New tab is not a YouTube video!")
-            driver.close()
-            driver.switch_to.window(driver.window_handles[0])
-        else:
-            # If no new tab, check if the current URL is the YouTube link
-            self.assertTrue("youtube.com" in driver.current_url, "Did not navigate to YouTube video!")
-
-
-        # Backward navigation: Go back through the focus order using Shift+TAB until the start
-        for j in range(video_index, 0, -1):
-            body.send_keys(Keys.SHIFT + Keys.TAB)
-            time.sleep(0.1)
-            focused = driver.switch_to.active_element
-            text = focused.text.strip()
+import time
+import unittest
+from selenium.webdriver import ActionChains, Keys
+from selenium.webdriver.support.wait import WebDriverWait
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.Fingerprints import HTML, get_fingerprint_store, page_fingerprint
+from Infrastructure.Instrumentation import instrument_helpers
+from Infrastructure.FocusOrder import TabWalker, crawl_focus_order, sample_indices
+from Infrastructure.PageWait import PageWait
+from Infrastructure.PerfMetrics import HOME, get_perf_recorder
+from Infrastructure.SiteConfig import site_url
+
+#====== URL AND WEBSITE ======
+SITE_URL=site_url("https://react.dev/")
+YOUTUBE_TAB="youtube.com"
+#====== FOCUS ORDER ======
+TAB_SAMPLE_SIZE=12
+#====== FINGERPRINT ======
+# The focus outlines come from the stylesheets, so a CSS-only change must run the walk again.
+TAB_WALK_INPUTS={"body": HTML, "link[rel=stylesheet]": HTML, "style": HTML}
+
+@instrument_helpers
+class AccessibilityTest(unittest.TestCase):
+    """
+     Test suite to verify keyboard accessibility and visible focus on the React.dev homepage.
+
+     This test checks that TAB navigation can reach all interactive elements,
+     that each focused element has a visible outline, and that a YouTube video
+     link is reachable and functional via keyboard only.
+     """
+
+    def setUp(self):
+        """
+        This function leases a warm Chrome Browser from the shared driver pool and then open the React.dev Homepage.
+        """
+        self.lease = get_driver_pool().acquire(self.id())
+        self.addCleanup(get_driver_pool().release, self.lease)
+        self.driver = self.lease.driver
+        self.driver.get(SITE_URL)
+        # Asserted at the start of the test, so a slow homepage fails the test instead of its setUp.
+        self.home_budget_error = get_perf_recorder().check(self.driver, HOME, self.id())
+        self.wait = WebDriverWait(self.driver, 10)
+        self.page_wait = PageWait(self.driver, 10)
+
+    def test_tab_accessibility(self):
+        """
+        Main accessibility test:
+        1. Computes the whole TAB order of the homepage in one script (with the focus outline of every element).
+        2. For each element in the TAB order, checks that a visible outline is present.
+        3. Presses real TAB keys on a sample of the stops (always including the YouTube link) and checks that
+           the focus lands where the computed order says.
+        4. When the YouTube link is focused, presses ENTER and asserts that it opens correctly in a new tab or window.
+        5. Navigates backward through a sample of the focus order with Shift+TAB, checking the focus again.
+        The walk is skipped when the page markup and styles did not change since the last passing run
+        (FORCE_FULL_RUN=1 walks anyway).
+        """
+        self.assertIsNone(self.home_budget_error, self.home_budget_error)
+        driver = self.driver
+        driver.get(SITE_URL)
+        self.page_wait.page_load(SITE_URL)
+
+        start = time.perf_counter()
+        fingerprints = get_fingerprint_store()
+        fingerprint = page_fingerprint(driver, TAB_WALK_INPUTS)
+        if fingerprints.unchanged(self.id(), "tab walk", fingerprint):
+            self.skipTest("Homepage markup and styles unchanged since the last passing tab walk")
+
+        focus_order = crawl_focus_order(driver)
+
+        #Check for visible focus on every element of the TAB order
+        no_outline = [stop.path for stop in focus_order if not stop.has_visible_focus]
+        self.assertFalse(no_outline, f"Focused elements have no visible focus outline: {no_outline}")
+
+        #find the first YouTube link in the TAB order
+        video_index = next((stop.index for stop in focus_order if YOUTUBE_TAB in stop.href), -1)
+        self.assertNotEqual(video_index, -1, "Did not reach the YouTube link with TAB navigation.")
+
+        #press real TAB keys on a sample of the stops, up to the YouTube link
+        walker = TabWalker(driver)
+        forward = sample_indices(video_index + 1, TAB_SAMPLE_SIZE, required=[video_index])
+        mismatches = walker.verify(focus_order, forward)
+        self.assertFalse(mismatches, f"TAB order differs from the computed order: {mismatches}")
+
+        #the YouTube link is focused -> We press Enter and check if the link is ok
+        ActionChains(driver).send_keys(Keys.ENTER).perform()
+
+        #wait for the video to open, either in a new tab or in the current one.
+        self.page_wait.until(
+            lambda d: len(d.window_handles) > 1 or YOUTUBE_TAB in d.current_url, "YouTube video"
+        )
+
+        #check if the new tab opened after pressing ENTER;
+        if len(driver.window_handles) > 1:
+            driver.switch_to.window(driver.window_handles[-1])
+            self.assertTrue("youtube.com" in driver.current_url, "New tab is not a YouTube video!")
+            driver.close()
+            driver.switch_to.window(driver.window_handles[0])
+        else:
+            # If no new tab, check if the current URL is the YouTube link
+            self.assertTrue("youtube.com" in driver.current_url, "Did not navigate to YouTube video!")
+            fingerprints.record(self.id(), "tab walk", fingerprint, time.perf_counter() - start)
+            return
+
+        # Backward navigation: Go back through a sample of the focus order using Shift+TAB until the start
+        backward = list(reversed(forward[:-1]))
+        mismatches = walker.verify(focus_order, backward)
+        self.assertFalse(mismatches, f"SHIFT+TAB order differs from the computed order: {mismatches}")
+        fingerprints.record(self.id(), "tab walk", fingerprint, time.perf_counter() - start)
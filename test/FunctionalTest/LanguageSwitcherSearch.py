@@ -1,241 +1,226 @@
-import unittest
-from deep_translator import GoogleTranslator
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-import time
-from selenium.webdriver.support.wait import WebDriverWait
-from sentence_transformers import SentenceTransformer, util
-
-#====== URL AND WEBSITE ======
-SITE_URL="https://react.dev/"
-SITE_NAME="react.dev"
-GIT_HUB_LINK="github.com"
-SCRIPT_ARGUMENT="window.open(arguments[0]);"
-FRENCH_URL="https://fr.react.dev/"
-
-#====== SELECTORS ======
-FULL_TRANSLATION_SELECTOR="ul.ms-6.my-3.list-disc"
-TRANSLATION_BUTTON='[aria-label="Translations"]'
-
-#====== TAGS AND ATTRIBUTES ======
-TAG_LI="li"
-TAG_A="a"
-HERF_TAG="href"
-LANG_ATTRIBUTE="lang"
-HTML="html"
-LANGUAGE_CODES = {
-            "en": "en",
-            "fr": "fr",  # French
-            "ja": "ja",  # Japanese
-            "ko": "ko",  # Korean
-            "zh": "zh",  # Chinese
-            "es": "es",  # Spanish
-            "tr": "tr",  # Turkish
-        }
-
-#====== ERRORS ======
-ERROR_404="404"
-ERROR_NOT_FOUND="Not Found"
-
-#====== DEFAULT ======
-DEFAULT_SECTION_SELECTOR="main"
-DEFAULT_MAX_CHAR=1500
-SIMILARITY_THRESHOLD=0.4
-PARAPHRASE_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
-BODY_SELECTOR="body"
-
-"""
-    This class is to test the language switch functionality.
-    It contains two main test :
-    1. Test the nevigation buttons to the Translation page, and than if the links of each tranlated website is 
-        correct.
-    2. Test that chekc if the translation is correct. Meaning if the translation to French is similar 
-        to the translation to English. 
-"""
-class  LanguageSwitcherTests(unittest.TestCase):
-
-    def setUp(self):
-        """
-        This function open the Chrome Browser and then open the React.dev Homepage.
-        """
-        self.driver = webdriver.Chrome()
-        self.driver.get(SITE_URL)
-        self.wait = WebDriverWait(self.driver, 10)
-
-
-    def tearDown(self):
-        """
-        This function is responsible to close the browser after each test.
-        """
-        self.driver.quit()
-    def get_full_link(self):
-        """
-        Extract the URL of the translation pages that inside the "Full translation" part.
-        Returns: A list that contains the url of the translation pages.
-
-        """
-        ul_all_lists = self.driver.find_elements(By.CSS_SELECTOR, FULL_TRANSLATION_SELECTOR)
-
-        full_translations_ul = ul_all_lists[1]
-        language_links = full_translations_ul.find_elements(By.TAG_NAME, TAG_LI)
-        site_links = []
-        for li in language_links:
-            a_tag = li.find_elements(By.TAG_NAME, TAG_A)
-
-            if a_tag:
-                language_name = a_tag[0].text
-                language_href = a_tag[0].get_attribute(HERF_TAG)
-                # Only keep actual translation links (not github) case for each language there is 2 different links.
-                if language_href and SITE_NAME in language_href and not GIT_HUB_LINK in language_href:
-                    site_links.append((language_name, language_href))
-        return site_links
-
-    def check_the_open_translation_page(self, language_name, language_href, language_codes):
-        """
-        This helper function open a translation page link in a new tab. Then check the HTML lang
-        and also if there is no 404 errors.
-        Returns: str or None: Returns an error message if found, otherwise None.
-
-        """
-        #check if we are not in the Homepage.If we are then we stop this function and return None.
-        if language_href.rstrip('/') == SITE_NAME:
-            return None
-
-        driver=self.driver
-
-        #open the url in a new tab
-        driver.execute_script(SCRIPT_ARGUMENT, language_href)
-        driver.switch_to.window(driver.window_handles[-1])
-        time.sleep(2)
-
-        #find the HTML lang attribute
-        html_tag = driver.find_element(By.TAG_NAME, HTML)
-        lang_attr = html_tag.get_attribute(LANG_ATTRIBUTE)
-
-        #check if the HTML attribute is the same as the url meaning we got the right language.
-        found = False
-        for code in language_codes.values():
-            if lang_attr and lang_attr.startswith(code):
-                found = True
-                break
-        error=None
-        if not found:
-            error = f"{language_name} ({lang_attr})"
-
-        # Check if the url did open.
-        if ERROR_404 in driver.title or ERROR_NOT_FOUND in driver.page_source:
-            error = f"{language_name} (404 page!)"
-
-        #close the tab and switch back
-        if len(driver.window_handles) > 1:
-            driver.close()
-            driver.switch_to.window(driver.window_handles[0])
-        time.sleep(0.2)
-
-        return error
-
-    def test_language_switcher(self):
-        """
-        This test is verified the correct functionality of the language switcher in on the React.dev homepage.
-        We check the following conditions:
-        - If the button exist.
-        - Navigate to the language page -> to the "full translation" part in the page.
-        - Navigate to all url inside this part.
-        - Check there correctness (if they are open) and then check if the
-          HTML `lang` attribute of each page matches the expected language code
-
-        """
-        driver=self.driver
-
-        language_button=driver.find_element(By.CSS_SELECTOR,TRANSLATION_BUTTON)
-        language_button.click()
-        time.sleep(1)
-
-        site_links=self.get_full_link()
-
-        errors = []
-
-        #Going throw each Url inside the full translation page and check it.
-        for language_name,language_href in site_links:
-            print(f"Testing {language_name} | {language_href}")
-            error = self.check_the_open_translation_page(language_name, language_href, LANGUAGE_CODES)
-            if error:
-                errors.append(error)
-
-        if errors:
-            self.fail(f"Problems found for: {', '.join(errors)}")
-        else:
-            print("All language links opened correct language pages!")
-
-
-
-
-
-    def get_clean_text(self,section=DEFAULT_SECTION_SELECTOR,max_chars=DEFAULT_MAX_CHAR):
-        """
-        Extracts and returns concatenated text content (up to max_chars) from a specific section of the page.
-        If the section is not found, extracts from <body>.
-        - Strips whitespace and ignores empty paragraphs.
-        - Converts the result to lowercase.
-
-        Args:
-            section: Section to extract text from.
-            max_chars: Maximum number of characters to extract.
-
-        Returns: str: Cleaned and concatenated text from the page.
-
-        """
-        try:
-            body_text= self.driver.find_element(By.CSS_SELECTOR, section)
-        except:
-            # Fallback to whole page if main section not found
-            body_text = self.driver.find_element(By.TAG_NAME, BODY_SELECTOR)
-
-        paragraphs = body_text.find_elements(By.TAG_NAME, "p")
-        all_text = "".join([p.text.strip() for p in paragraphs if len(p.text.strip()) > 0])
-        return all_text[:max_chars].lower()
-
-    def check_for_similarity(self,text1,text2):
-        """
-         Computes the semantic similarity between two pieces of text using a multilingual sentence transformer.
-         The model used is 'paraphrase-multilingual-MiniLM-L12-v2', a lightweight transformer that produces
-         vector embeddings for sentences in many languages.
-        Args:
-            text1: First text to compare.
-            text2: second text to compare.
-
-        Returns: the semantic similarity between text1 and text2.
-
-        """
-        model = SentenceTransformer(PARAPHRASE_MODEL)
-        emb1 = model.encode(text1, convert_to_tensor=True)
-        emb2 = model.encode(text2, convert_to_tensor=True)
-        similarity = float(util.cos_sim(emb1, emb2))
-        return similarity
-
-    def test_translation_correctness(self):
-        """
-        This is the full test. We extract the 2 texts we want to compare and then check if they have similar semantic
-        meaning.
-        This ensures that the full translation is reasonably accurate and matches the English content semantically.
-
-        """
-        driver=self.driver
-
-        #Extracting the English Text
-        english_text = self.get_clean_text()
-
-        #open the French tab
-        driver.get(FRENCH_URL)
-        time.sleep(2)
-        french_text = self.get_clean_text()
-        #check if similarity is less than 0.4
-        if self.check_for_similarity(english_text, french_text)<SIMILARITY_THRESHOLD:
-            self.fail("Full page translation does not match (low similarity).")
-        else:
-            print("Page translation similarity test PASSED!")
-
-
-
-
-
+import os
+import time
+import unittest
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.wait import WebDriverWait
+from Infrastructure import EmbeddingModel
+from Infrastructure.DomExtraction import extract_nodes
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.Fingerprints import (HTML, get_fingerprint_store, http_fingerprint, page_fingerprint,
+                                         text_fingerprint)
+from Infrastructure.Instrumentation import instrument_helpers
+from Infrastructure.MemoryMonitor import get_memory_monitor
+from Infrastructure.NetworkProfiles import TEXT, apply_suite_profile
+from Infrastructure.PageWait import PageWait
+from Infrastructure.ParagraphAlignment import align_paragraphs, iter_paragraphs
+from Infrastructure.PerfMetrics import HOME, get_perf_recorder
+from Infrastructure.SiteConfig import site_url
+from Infrastructure.TranslationBackend import compare_locales, fetch_paragraphs, get_translator
+from Infrastructure.TranslationLinkChecker import TranslationLinkChecker, link_report
+from Infrastructure.ParallelRunner import SHARD_ENV, shard_subtests, subtest_items
+
+#====== URL AND WEBSITE ======
+SITE_URL=site_url("https://react.dev/")
+SITE_NAME="react.dev"
+GIT_HUB_LINK="github.com"
+FRENCH_URL=site_url("https://fr.react.dev/")
+
+#====== SELECTORS ======
+FULL_TRANSLATION_SELECTOR="ul.ms-6.my-3.list-disc"
+TRANSLATION_BUTTON='[aria-label="Translations"]'
+
+#====== TAGS AND ATTRIBUTES ======
+TAG_LI="li"
+TAG_A="a"
+HERF_TAG="href"
+LANGUAGE_CODES = {
+            "en": "en",
+            "fr": "fr",  # French
+            "ja": "ja",  # Japanese
+            "ko": "ko",  # Korean
+            "zh": "zh",  # Chinese
+            "es": "es",  # Spanish
+            "tr": "tr",  # Turkish
+        }
+LOCALE_SUBDOMAINS = {"zh": "zh-hans"}
+
+#====== DEFAULT ======
+DEFAULT_SECTION_SELECTOR="main"
+SIMILARITY_THRESHOLD=0.4
+LANGUAGE_SHARDS=4
+MAX_TRANSLATION_TABS=4
+
+"""
+    This class is to test the language switch functionality.
+    It contains two main test :
+    1. Test the nevigation buttons to the Translation page, and than if the links of each tranlated website is 
+        correct.
+    2. Test that chekc if the translation is correct. Meaning if the translation to French is similar 
+        to the translation to English. 
+    3. Test that every translated site of LANGUAGE_CODES, translated back to English, matches the English page.
+"""
+@instrument_helpers
+class  LanguageSwitcherTests(unittest.TestCase):
+
+    def setUp(self):
+        """
+        This function leases a warm Chrome Browser from the shared driver pool, applies the text network profile
+        (no images, media, fonts or third-party requests) and then open the React.dev Homepage.
+        """
+        self.lease = get_driver_pool().acquire(self.id())
+        self.addCleanup(get_driver_pool().release, self.lease)
+        self.driver = self.lease.driver
+        apply_suite_profile(self.driver, TEXT)
+        self.driver.get(SITE_URL)
+        # Asserted at the start of every test, so a slow homepage fails the test instead of its setUp.
+        self.home_budget_error = get_perf_recorder().check(self.driver, HOME, self.id())
+        self.wait = WebDriverWait(self.driver, 10)
+        self.page_wait = PageWait(self.driver, 10)
+
+    def get_full_link(self):
+        """
+        Extract the URL of the translation pages that inside the "Full translation" part.
+        The first link of every list item of the second list is read in a single script call.
+        Returns: A list that contains the url of the translation pages.
+
+        """
+        language_links = extract_nodes(self.driver, TAG_LI, scope=FULL_TRANSLATION_SELECTOR, scope_index=1,
+                                       inner=TAG_A, attributes=[HERF_TAG])
+        site_links = []
+        for a_tag in language_links:
+            language_name = a_tag.text
+            language_href = a_tag.get_attribute(HERF_TAG)
+            # Only keep actual translation links (not github) case for each language there is 2 different links.
+            if language_href and SITE_NAME in language_href and not GIT_HUB_LINK in language_href:
+                site_links.append((language_name, language_href))
+        return site_links
+
+    @shard_subtests(LANGUAGE_SHARDS)
+    def test_language_switcher(self):
+        """
+        This test is verified the correct functionality of the language switcher in on the React.dev homepage.
+        We check the following conditions:
+        - If the button exist.
+        - Navigate to the language page -> to the "full translation" part in the page.
+        - Fetch all url inside this part concurrently (HTTP first, browser tabs only when JS rendering is needed).
+        - Check there correctness (if they are open) and then check if the
+          HTML `lang` attribute of each page matches the expected language code
+        The links are not checked again when the translations list did not change since the last passing run.
+
+        """
+        self.assertIsNone(self.home_budget_error, self.home_budget_error)
+        driver=self.driver
+
+        language_button=driver.find_element(By.CSS_SELECTOR,TRANSLATION_BUTTON)
+        language_button.click()
+        #wait until the "Full translation" list (the second list) is rendered
+        self.page_wait.until(
+            lambda d: len(d.find_elements(By.CSS_SELECTOR, FULL_TRANSLATION_SELECTOR)) > 1, "translations list"
+        )
+        start = time.perf_counter()
+        fingerprints = get_fingerprint_store()
+        fingerprint = page_fingerprint(driver, {FULL_TRANSLATION_SELECTOR: HTML})
+        check = f"translation links {os.environ.get(SHARD_ENV, 'all')}"
+        if fingerprints.unchanged(self.id(), check, fingerprint):
+            self.skipTest("Translations list unchanged since the last passing run")
+
+        #skip the Homepage itself. When running under the ParallelRunner every worker checks only its own
+        #share of the links.
+        site_links = [(language_name, language_href)
+                      for language_name, language_href in subtest_items(self.get_full_link())
+                      if language_href.rstrip('/') != SITE_NAME]
+
+        #Check all the links at once: first over HTTP, then in browser tabs only for pages that need JS.
+        checker = TranslationLinkChecker(LANGUAGE_CODES, max_tabs=MAX_TRANSLATION_TABS,
+                                         perf_recorder=get_perf_recorder(), memory_monitor=get_memory_monitor())
+        results = checker.check(site_links, self.driver, self.page_wait)
+        print(link_report(results))
+        errors = [result.error for result in results if result.error]
+
+        if errors:
+            self.fail(f"Problems found for: {', '.join(errors)}")
+        else:
+            print("All language links opened correct language pages!")
+            fingerprints.record(self.id(), check, fingerprint, time.perf_counter() - start)
+
+
+
+
+
+    def get_paragraphs(self,section=DEFAULT_SECTION_SELECTOR):
+        """
+        Extracts every non empty paragraph of a section of the page (or of the whole page if the section is not
+        found), without truncating. Each paragraph keeps its DOM path so problems can be located.
+
+        Args:
+            section: Tag name of the section to extract the paragraphs from.
+
+        Returns: list of Paragraph objects in document order.
+
+        """
+        return list(iter_paragraphs(self.driver.page_source, section))
+
+    def test_translation_correctness(self):
+        """
+        This is the full test. We extract the paragraphs of the 2 pages we want to compare, align every English
+        paragraph with its French translation and then check if they have similar semantic meaning.
+        This ensures that the full translation is reasonably accurate and matches the English content semantically,
+        and reports the paragraphs that are missing or left untranslated.
+        Skipped when the validators (ETag / Last-Modified) of both pages did not change since the last passing run.
+
+        """
+        self.assertIsNone(self.home_budget_error, self.home_budget_error)
+        driver=self.driver
+        start = time.perf_counter()
+        fingerprints = get_fingerprint_store()
+        fingerprint = http_fingerprint([SITE_URL, FRENCH_URL])
+        if fingerprints.unchanged(self.id(), "alignment", fingerprint):
+            self.skipTest("English and French pages unchanged since the last passing run")
+
+        #Extracting the English paragraphs
+        english_paragraphs = self.get_paragraphs()
+
+        #open the French tab
+        driver.get(FRENCH_URL)
+        self.page_wait.page_load(FRENCH_URL)
+        french_paragraphs = self.get_paragraphs()
+
+        report = align_paragraphs(english_paragraphs, french_paragraphs)
+        print(report.summary())
+        #check if the average paragraph similarity is less than 0.4
+        if report.mean_score<SIMILARITY_THRESHOLD:
+            self.fail("Full page translation does not match (low similarity).")
+        else:
+            print("Page translation similarity test PASSED!")
+            fingerprints.record(self.id(), "alignment", fingerprint, time.perf_counter() - start)
+
+    def test_translations_match_english(self):
+        """
+        Cross-locale check for every language of LANGUAGE_CODES: the home pages are fetched concurrently,
+        every translated page is machine translated back to English (TRANSLATION_BACKEND, cached on disk so
+        unchanged paragraphs are never translated twice) and aligned with the English paragraphs.
+        All the locales are compared in parallel, except the ones whose paragraphs (and the English ones) did
+        not change since they last passed.
+        """
+        self.assertIsNone(self.home_budget_error, self.home_budget_error)
+        urls = {code: site_url(f"https://{LOCALE_SUBDOMAINS.get(code, code)}.react.dev/")
+                for code in LANGUAGE_CODES if code != "en"}
+        urls["en"] = SITE_URL
+        pages = fetch_paragraphs(urls)
+        english = pages.pop("en")
+
+        fingerprints = get_fingerprint_store()
+        english_texts = [paragraph.text for paragraph in english]
+        inputs = {code: text_fingerprint(english_texts, [paragraph.text for paragraph in paragraphs])
+                  for code, paragraphs in pages.items()}
+        changed = {code: pages[code] for code in pages if not fingerprints.unchanged(self.id(), code, inputs[code])}
+
+        start = time.perf_counter()
+        reports = compare_locales(english, changed, get_translator(), EmbeddingModel.embed)
+        seconds = (time.perf_counter() - start) / max(len(changed), 1)
+        for code, report in reports.items():
+            with self.subTest(language=code):
+                print(f"{code}: {report.summary()}")
+                self.assertGreaterEqual(report.mean_score, SIMILARITY_THRESHOLD,
+                                        f"{code} translation does not match the English page")
+                fingerprints.record(self.id(), code, inputs[code], seconds)
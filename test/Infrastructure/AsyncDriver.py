@@ -0,0 +1,673 @@
+import asyncio
+import functools
+import itertools
+import json
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+import websocket
+from selenium.common.exceptions import JavascriptException, TimeoutException, WebDriverException
+from Infrastructure.HttpClient import AsyncHttpClient
+from Infrastructure.Instrumentation import TRACER
+from Infrastructure.Reports import register_report
+from Infrastructure.SiteConfig import LOCAL_ADDRESS, is_local_host
+
+#====== SWITCHES ======
+ASYNC_DRIVER_ENV = "ASYNC_DRIVER"
+DEBUGGER_ADDRESS_CAPABILITIES = ("goog:chromeOptions", "ms:edgeOptions")
+WINDOW_HANDLE_PREFIX = "CDwindow-"
+
+#====== TIMEOUTS ======
+DEFAULT_TIMEOUT = 30
+CONNECT_TIMEOUT = 5
+NETWORK_IDLE_MS = 500
+RETRY_DELAY = 0.05
+BLANK_PAGE = "about:blank"
+
+#====== WEBSOCKET ======
+NORMAL_CLOSURE = 1000
+
+#====== KEYS ======
+KEY_CODES = {"Tab": 9, "Enter": 13, "Escape": 27, "ArrowUp": 38, "ArrowDown": 40}
+SHIFT_MODIFIER = 8
+
+#====== SCRIPTS ======
+# Results holding DOM nodes cannot be sent by value; they are kept in the page for Selenium to pick up.
+PACK_FUNCTION = """
+function pack(value) {
+    var seen = new Set();
+    function hasNode(item, depth) {
+        if (!item || typeof item !== 'object' || depth > 32 || seen.has(item)) return false;
+        if (item instanceof Node) return true;
+        seen.add(item);
+        var keys = Object.keys(item);
+        for (var i = 0; i < keys.length; i++) {
+            if (hasNode(item[keys[i]], depth + 1)) return true;
+        }
+        return false;
+    }
+    if (hasNode(value, 0)) {
+        window.__asyncDriverResult = value;
+        return {stashed: true};
+    }
+    return {value: value};
+}
+"""
+STASHED_RESULT_SCRIPT = "var value = window.__asyncDriverResult; delete window.__asyncDriverResult; return value;"
+# The page was replaced between the command and its evaluation (e.g. right after a click that navigates).
+RETRY_ERRORS = ("Execution context was destroyed", "Cannot find default execution context")
+
+CDP_STATS = {"commands": 0, "events": 0, "max_in_flight": 0, "selenium_fallbacks": 0}
+
+"""
+Asynchronous Chrome DevTools Protocol client, and a shim that moves Selenium's script and CDP commands onto it.
+
+Every Selenium command is a blocking HTTP request to chromedriver, which then talks to the browser. Chrome also
+accepts DevTools clients over a WebSocket: CdpConnection sends commands without waiting for the previous answers
+(pipelining, answers are matched by id) and delivers events (page loads, console, network) to subscribers instead
+of being polled. AsyncBrowser drives any number of tabs from one event loop.
+
+attach_async_driver() connects to the browser of a Selenium session (the debuggerAddress capability) and routes
+execute_script, execute_async_script and execute_cdp_cmd of that driver over the WebSocket, so the existing helpers
+keep working unchanged. Results holding elements and scripts taking elements still go through Selenium, which owns
+the element references. The DriverPool attaches the sessions it launches only with ASYNC_DRIVER=1.
+"""
+
+
+class CdpError(WebDriverException):
+    """
+    Error answer of a DevTools command. A WebDriverException, like the errors of driver.execute_cdp_cmd().
+    """
+
+
+class WebSocket:
+    """
+    asyncio front of a websocket-client connection (the WebSocket client Selenium itself depends on). Messages are
+    read by a daemon thread and handed to the event loop, so receive() never blocks it.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.closed = False
+        self._loop = asyncio.get_running_loop()
+        self._messages = asyncio.Queue()
+        threading.Thread(target=self._read, name="devtools-websocket", daemon=True).start()
+
+    @classmethod
+    async def connect(cls, url, timeout=CONNECT_TIMEOUT):
+        parts = urlsplit(url)
+        # *.localhost names are not always resolvable by the system resolver.
+        if is_local_host(parts.hostname):
+            url = urlunsplit(parts._replace(netloc=f"{LOCAL_ADDRESS}:{parts.port or 80}"))
+        # Chrome refuses DevTools clients that send an Origin it was not started with.
+        connect = functools.partial(websocket.create_connection, url, timeout=timeout, host=parts.netloc,
+                                    suppress_origin=True, enable_multithread=True)
+        try:
+            connection = await asyncio.get_running_loop().run_in_executor(None, connect)
+        except websocket.WebSocketException as error:
+            raise ConnectionError(f"WebSocket handshake with {url} failed: {error}")
+        connection.settimeout(None)
+        return cls(connection)
+
+    async def send(self, text):
+        """
+        Sends a text message. Frames are written whole and in call order, so concurrent senders never interleave.
+        """
+        if self.closed:
+            raise ConnectionError("WebSocket is closed")
+        try:
+            self.connection.send(text)
+        except websocket.WebSocketException as error:
+            raise ConnectionError(str(error))
+
+    async def receive(self):
+        """
+        Returns: the next text message, or None once the connection is closed.
+        """
+        text = await self._messages.get()
+        if text is None:
+            self.closed = True
+        return text
+
+    async def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.connection.send_close(NORMAL_CLOSURE)
+        except (OSError, websocket.WebSocketException):
+            pass
+        # Wakes up the reading thread, which then ends the message stream.
+        self.connection.abort()
+
+    def _read(self):
+        try:
+            while True:
+                text = self.connection.recv()
+                if not text:
+                    break
+                self._deliver(text)
+        except (OSError, websocket.WebSocketException):
+            pass
+        finally:
+            self.connection.shutdown()
+            self._deliver(None)
+
+    def _deliver(self, text):
+        try:
+            self._loop.call_soon_threadsafe(self._messages.put_nowait, text)
+        except RuntimeError:
+            # The event loop is already closed: nobody is listening anymore.
+            pass
+
+
+class CdpConnection:
+    """
+    One DevTools WebSocket. Any number of commands can be in flight at once; events are dispatched to the
+    callbacks subscribed with on() or expect(), per method and session.
+    """
+
+    def __init__(self, socket):
+        self.socket = socket
+        self.stats = {"commands": 0, "events": 0, "max_in_flight": 0}
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._listeners = {}
+        self._reader = asyncio.get_running_loop().create_task(self._read_messages())
+
+    @classmethod
+    async def connect(cls, url):
+        return cls(await WebSocket.connect(url))
+
+    @property
+    def closed(self):
+        return self.socket.closed
+
+    async def send(self, method, params=None, session_id=None, timeout=DEFAULT_TIMEOUT):
+        """
+        Sends a command and waits for its answer; other commands can be sent meanwhile.
+
+        Args:
+            method: DevTools method, e.g. "Runtime.evaluate".
+            params: Dict of parameters.
+            session_id: Session of the target (None for the browser itself).
+            timeout: Seconds before TimeoutException is raised.
+
+        Returns: the result dict of the command.
+        """
+        command_id = next(self._ids)
+        message = {"id": command_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[command_id] = future
+        self.stats["commands"] += 1
+        self.stats["max_in_flight"] = max(self.stats["max_in_flight"], len(self._pending))
+        CDP_STATS["commands"] += 1
+        CDP_STATS["max_in_flight"] = max(CDP_STATS["max_in_flight"], len(self._pending))
+        try:
+            await self.socket.send(json.dumps(message))
+            return await asyncio.wait_for(future, timeout)
+        except ConnectionError as error:
+            raise CdpError(f"{method}: {error}")
+        except asyncio.TimeoutError:
+            raise TimeoutException(f"{method} got no answer in {timeout}s")
+        finally:
+            self._pending.pop(command_id, None)
+
+    def on(self, method, callback, session_id=None):
+        """
+        Calls callback(params) for every `method` event of the session.
+
+        Returns: a function that unsubscribes.
+        """
+        listeners = self._listeners.setdefault((method, session_id), [])
+        listeners.append(callback)
+
+        def unsubscribe():
+            if callback in listeners:
+                listeners.remove(callback)
+        return unsubscribe
+
+    def expect(self, method, predicate=None, session_id=None):
+        """
+        Subscribes to the next `method` event (matching `predicate`) right away, so an event triggered by a
+        command sent afterwards cannot be missed.
+
+        Returns: a future with the params of the event.
+        """
+        future = asyncio.get_running_loop().create_future()
+
+        def listener(params):
+            if not future.done() and (predicate is None or predicate(params)):
+                future.set_result(params)
+        unsubscribe = self.on(method, listener, session_id)
+        future.add_done_callback(lambda _: unsubscribe())
+        return future
+
+    async def close(self):
+        await self.socket.close()
+        await self._reader
+
+    async def _read_messages(self):
+        try:
+            while True:
+                text = await self.socket.receive()
+                if text is None:
+                    break
+                message = json.loads(text)
+                if "id" in message:
+                    future = self._pending.get(message["id"])
+                    if future is None or future.done():
+                        continue
+                    if "error" in message:
+                        future.set_exception(CdpError(message["error"].get("message", str(message["error"]))))
+                    else:
+                        future.set_result(message.get("result", {}))
+                    continue
+                self.stats["events"] += 1
+                CDP_STATS["events"] += 1
+                for callback in list(self._listeners.get((message.get("method"), message.get("sessionId")), ())):
+                    callback(message.get("params", {}))
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(CdpError("DevTools connection closed"))
+
+
+class AsyncTab:
+    """
+    One page target attached to a CdpConnection (a flat session). Commands are sent with the session id;
+    the console and network are only followed after watch_console() / watch_network().
+    """
+
+    def __init__(self, connection, target_id, session_id):
+        self.connection = connection
+        self.target_id = target_id
+        self.session_id = session_id
+        self.console = []
+        self.in_flight = set()
+        self._enabled = set()
+        self._last_network_activity = time.monotonic()
+        self._network_changed = asyncio.Event()
+
+    async def send(self, method, params=None, timeout=DEFAULT_TIMEOUT):
+        return await self.connection.send(method, params, self.session_id, timeout)
+
+    def on(self, method, callback):
+        return self.connection.on(method, callback, self.session_id)
+
+    def expect(self, method, predicate=None):
+        return self.connection.expect(method, predicate, self.session_id)
+
+    async def enable(self, *domains):
+        """
+        Enables the event domains that are not enabled yet, all in one pipelined round.
+        """
+        missing = [domain for domain in domains if domain not in self._enabled]
+        self._enabled.update(missing)
+        await asyncio.gather(*(self.send(f"{domain}.enable") for domain in missing))
+
+    async def watch_console(self):
+        """
+        Collects the console messages of the page in `console` as (level, text).
+        """
+        def logged(params):
+            text = " ".join(str(arg.get("value", arg.get("description", ""))) for arg in params.get("args", ()))
+            self.console.append((params.get("type"), text))
+        self.on("Runtime.consoleAPICalled", logged)
+        await self.enable("Runtime")
+
+    async def watch_network(self):
+        """
+        Follows the requests of the page, so network_idle() is answered by events instead of polling.
+        """
+        def started(params):
+            self.in_flight.add(params["requestId"])
+            self._network_activity()
+
+        def ended(params):
+            self.in_flight.discard(params["requestId"])
+            self._network_activity()
+        self.on("Network.requestWillBeSent", started)
+        self.on("Network.loadingFinished", ended)
+        self.on("Network.loadingFailed", ended)
+        await self.enable("Network")
+
+    async def navigate(self, url, timeout=DEFAULT_TIMEOUT):
+        """
+        Opens `url` and waits for the load event of the new document.
+        """
+        await self.enable("Page")
+        loaded = self.expect("Page.loadEventFired")
+        try:
+            result = await self.send("Page.navigate", {"url": url}, timeout)
+            if result.get("errorText"):
+                raise WebDriverException(f"Navigation to {url} failed: {result['errorText']}")
+            if not result.get("loaderId"):
+                return
+            await asyncio.wait_for(loaded, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutException(f"{url} did not load in {timeout}s")
+        finally:
+            loaded.cancel()
+
+    async def network_idle(self, idle_ms=NETWORK_IDLE_MS, timeout=DEFAULT_TIMEOUT):
+        """
+        Waits until no request was in flight for `idle_ms` milliseconds (needs watch_network()).
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            quiet = now - self._last_network_activity
+            if not self.in_flight and quiet * 1000 >= idle_ms:
+                return
+            if now >= deadline:
+                raise TimeoutException(f"Network of {self.target_id} did not go idle in {timeout}s")
+            self._network_changed.clear()
+            wait = deadline - now if self.in_flight else min(idle_ms / 1000 - quiet, deadline - now)
+            try:
+                await asyncio.wait_for(self._network_changed.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def evaluate(self, expression, await_promise=False, timeout=DEFAULT_TIMEOUT):
+        """
+        Returns: the value of a JS expression (awaited when it is a promise and `await_promise`).
+        """
+        result = await self.send("Runtime.evaluate", {"expression": expression, "returnByValue": True,
+                                                      "awaitPromise": await_promise}, timeout)
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            raise JavascriptException(details.get("exception", {}).get("description") or details.get("text"))
+        return result["result"].get("value")
+
+    async def execute_script(self, script, *args):
+        """
+        Same contract as WebDriver.execute_script for scripts whose result holds no DOM node.
+        """
+        return _unpack(await self.run_script(script, args))
+
+    async def execute_async_script(self, script, *args, timeout=DEFAULT_TIMEOUT):
+        """
+        Same contract as WebDriver.execute_async_script: the script calls its last argument with the result.
+        """
+        return _unpack(await self.run_script(script, args, True, timeout))
+
+    async def run_script(self, script, args, asynchronous=False, timeout=DEFAULT_TIMEOUT):
+        """
+        Runs a WebDriver style script (`arguments`, `return`, callback as last argument when asynchronous).
+
+        Returns: {"value": result}, or {"stashed": True} when the result holds DOM nodes; it is then left in
+        the page for STASHED_RESULT_SCRIPT.
+        """
+        expression = _wrap_script(script, args, asynchronous)
+        try:
+            return await self.evaluate(expression, asynchronous, timeout)
+        except CdpError as error:
+            if not any(text in str(error) for text in RETRY_ERRORS):
+                raise
+        await asyncio.sleep(RETRY_DELAY)
+        return await self.evaluate(expression, asynchronous, timeout)
+
+    async def press_key(self, key, count=1, shift=False):
+        """
+        Presses `key` (a name of KEY_CODES) `count` times; all the key events are pipelined.
+        """
+        code = KEY_CODES[key]
+        event = {"key": key, "code": key, "windowsVirtualKeyCode": code, "nativeVirtualKeyCode": code,
+                 "modifiers": SHIFT_MODIFIER if shift else 0}
+        events = [dict(event, type=kind) for _ in range(count) for kind in ("rawKeyDown", "keyUp")]
+        await asyncio.gather(*(self.send("Input.dispatchKeyEvent", params) for params in events))
+
+    def _network_activity(self):
+        self._last_network_activity = time.monotonic()
+        self._network_changed.set()
+
+
+def _wrap_script(script, args, asynchronous):
+    call = "(function () {\n" + script + "\n}).apply(null, args)"
+    if asynchronous:
+        body = ("return new Promise(function (resolve, reject) {"
+                " args.push(function (value) { resolve(pack(value)); });"
+                " try { " + call + "; } catch (error) { reject(error); } });")
+    else:
+        body = "return pack(" + call + ");"
+    return "(function (args) {" + PACK_FUNCTION + body + "})(" + json.dumps(list(args)) + ")"
+
+
+def _unpack(packed):
+    if packed.get("stashed"):
+        raise WebDriverException("The script returned DOM nodes; only a WebDriver session can hold them")
+    return packed.get("value")
+
+
+class AsyncBrowser:
+    """
+    The browser end of a DevTools connection: attaches to tabs and opens new ones.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.tabs = {}
+        connection.on("Target.detachedFromTarget", lambda params: self._detached(params.get("sessionId")))
+
+    @classmethod
+    async def connect(cls, debugger_address):
+        """
+        Args:
+            debugger_address: "host:port" of the remote debugging endpoint (see debugger_address()).
+        """
+        async with AsyncHttpClient(timeout=CONNECT_TIMEOUT) as client:
+            response = await client.get(f"http://{debugger_address}/json/version")
+        return cls(await CdpConnection.connect(json.loads(response.text)["webSocketDebuggerUrl"]))
+
+    async def attach(self, target_id):
+        """
+        Returns: the AsyncTab of a target, attaching to it the first time.
+        """
+        tab = self.tabs.get(target_id)
+        if tab is None:
+            result = await self.connection.send("Target.attachToTarget", {"targetId": target_id, "flatten": True})
+            tab = self.tabs.setdefault(target_id, AsyncTab(self.connection, target_id, result["sessionId"]))
+        return tab
+
+    async def new_tab(self, url=BLANK_PAGE, watch_network=False):
+        """
+        Opens a tab (in the background) and, when `url` is given, waits for it to load.
+        """
+        target = await self.connection.send("Target.createTarget", {"url": BLANK_PAGE, "background": True})
+        tab = await self.attach(target["targetId"])
+        if watch_network:
+            await tab.watch_network()
+        if url != BLANK_PAGE:
+            await tab.navigate(url)
+        return tab
+
+    async def close_tab(self, tab):
+        self.tabs.pop(tab.target_id, None)
+        await self.connection.send("Target.closeTarget", {"targetId": tab.target_id})
+
+    async def close(self):
+        await self.connection.close()
+
+    def _detached(self, session_id):
+        for target_id, tab in list(self.tabs.items()):
+            if tab.session_id == session_id:
+                del self.tabs[target_id]
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def run_async(coroutine):
+    """
+    Runs `coroutine` on the shared background event loop and waits for its result, from any thread.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="async-driver", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coroutine, _loop).result()
+
+
+def debugger_address(driver):
+    """
+    Returns: "host:port" of the DevTools endpoint of a Chromium session, or None (e.g. Firefox).
+    """
+    capabilities = getattr(driver, "capabilities", None) or {}
+    for name in DEBUGGER_ADDRESS_CAPABILITIES:
+        address = (capabilities.get(name) or {}).get("debuggerAddress")
+        if address:
+            return address
+    return None
+
+
+class CdpBridge:
+    """
+    Synchronous front of an AsyncBrowser for one Selenium session: the calls run on the current window of the
+    driver (window handles are target ids), or on any tab through run(). The current handle is cached and
+    only asked again after a window switch or close.
+    """
+
+    def __init__(self, browser, driver):
+        self.browser = browser
+        self.driver = driver
+        self._handle = None
+        self._selenium_execute_script = driver.execute_script
+        self._selenium_execute_async_script = driver.execute_async_script
+
+    @classmethod
+    def connect(cls, address, driver):
+        return cls(run_async(AsyncBrowser.connect(address)), driver)
+
+    def run(self, coroutine):
+        return run_async(coroutine)
+
+    def forget_window(self):
+        self._handle = None
+
+    def execute_script(self, script, *args):
+        return self._script(script, args, False)
+
+    def execute_async_script(self, script, *args):
+        return self._script(script, args, True)
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        return self._on_current_tab(f"cdp:{cmd}", "send", cmd, cmd_args)
+
+    def press_key(self, key, count=1, shift=False):
+        self._on_current_tab("cdp:Input.dispatchKeyEvent", "press_key", key, count, shift)
+
+    def current_tab(self):
+        """
+        Returns: the AsyncTab of the current window of the driver.
+        """
+        return self.run(self.browser.attach(self._target_id()))
+
+    def close(self):
+        if not self.browser.connection.closed:
+            self.run(self.browser.close())
+
+    def _script(self, script, args, asynchronous):
+        if not _json_arguments(args):
+            CDP_STATS["selenium_fallbacks"] += 1
+            selenium = self._selenium_execute_async_script if asynchronous else self._selenium_execute_script
+            return selenium(script, *args)
+        packed = self._on_current_tab("cdp:Runtime.evaluate", "run_script", script, args, asynchronous)
+        if packed.get("stashed"):
+            CDP_STATS["selenium_fallbacks"] += 1
+            return self._selenium_execute_script(STASHED_RESULT_SCRIPT)
+        return packed.get("value")
+
+    def _target_id(self):
+        if self._handle is None:
+            self._handle = self.driver.current_window_handle
+        return self._handle.removeprefix(WINDOW_HANDLE_PREFIX)
+
+    def _on_current_tab(self, name, method, *args):
+        target_id = self._target_id()
+
+        async def call():
+            tab = await self.browser.attach(target_id)
+            return await getattr(tab, method)(*args)
+
+        start_ns = time.perf_counter_ns()
+        try:
+            return self.run(call())
+        finally:
+            if TRACER.enabled:
+                TRACER.command(name, start_ns, time.perf_counter_ns())
+
+
+def _json_arguments(args):
+    # Element arguments (not JSON serializable) only mean something to the WebDriver session that created them.
+    try:
+        json.dumps(list(args))
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def attach_async_driver(driver):
+    """
+    Routes execute_script, execute_async_script and execute_cdp_cmd of `driver` over a DevTools WebSocket.
+    Safe to call more than once; drivers without a DevTools endpoint are returned unchanged.
+
+    Returns: the driver, with `cdp_bridge` (CdpBridge) set when it was attached.
+    """
+    if getattr(driver, "cdp_bridge", None) is not None:
+        return driver
+    address = debugger_address(driver)
+    if address is None:
+        return driver
+    try:
+        bridge = CdpBridge.connect(address, driver)
+    except (OSError, ValueError, KeyError, asyncio.TimeoutError, WebDriverException):
+        return driver
+
+    driver.cdp_bridge = bridge
+    driver.execute_script = bridge.execute_script
+    driver.execute_async_script = bridge.execute_async_script
+    driver.execute_cdp_cmd = bridge.execute_cdp_cmd
+    switch_to = driver.switch_to
+    switch_to.window = _forgetting_window(bridge, switch_to.window)
+    switch_to.new_window = _forgetting_window(bridge, switch_to.new_window)
+    driver.close = _forgetting_window(bridge, driver.close)
+    quit_driver = driver.quit
+
+    @functools.wraps(quit_driver)
+    def quit_with_bridge():
+        try:
+            bridge.close()
+        finally:
+            quit_driver()
+    driver.quit = quit_with_bridge
+    return driver
+
+
+def _forgetting_window(bridge, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        bridge.forget_window()
+        return method(*args, **kwargs)
+    return wrapper
+
+
+def cdp_report():
+    return (f"Async driver: {CDP_STATS['commands']} DevTools commands (up to {CDP_STATS['max_in_flight']} in "
+            f"flight), {CDP_STATS['events']} events, {CDP_STATS['selenium_fallbacks']} handed to Selenium")
+
+
+def _print_cdp_report():
+    if CDP_STATS["commands"]:
+        print(cdp_report())
+
+
+def _forget_cdp_stats():
+    CDP_STATS.update(dict.fromkeys(CDP_STATS, 0))
+
+
+register_report(_print_cdp_report, _forget_cdp_stats)
@@ -0,0 +1,324 @@
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+import unittest
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.Fingerprints import get_fingerprint_store
+from Infrastructure.Instrumentation import TRACER
+from Infrastructure.MemoryMonitor import RELEASE
+from Infrastructure.SiteConfig import BASE_URL_ENV
+from Infrastructure.SnapshotServer import DEFAULT_STORE_DIR, REPLAY, SnapshotServer
+
+#====== HARNESS DEFAULTS ======
+DEFAULT_ITERATIONS = 5
+DEFAULT_WARMUP = 1
+DEFAULT_HISTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache",
+                               "benchmarks.sqlite")
+DEFAULT_BENCHMARKS = (
+    "LayotTest.LayoutHomePageTest.LayoutHomePageTest.test_layout_in_different_size",
+    "FunctionalTest.LanguageSwitcherSearch.LanguageSwitcherTests.test_language_switcher",
+    "AccsessibilityTes.AccessibilityTest.AccessibilityTest.test_tab_accessibility",
+)
+SUITE_TOTAL = "TOTAL"
+
+#====== REGRESSION DETECTION ======
+METRICS = ("seconds", "commands", "memory_mb")
+BASELINE_RUNS = 5
+BOOTSTRAP_ITERATIONS = 2000
+CONFIDENCE = 0.95
+MIN_EFFECT = 0.05
+BOOTSTRAP_SEED = 0
+REGRESSION = "REGRESSION"
+IMPROVEMENT = "faster"
+NO_CHANGE = "same"
+NO_BASELINE = "new"
+
+#====== OUTCOMES ======
+OK = "ok"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+"""
+Benchmarks the automation itself.
+
+Every benchmarked test method runs N times (after warm-up runs that launch the browser) against the local
+fixture site, the replayed snapshot of react.dev (see SnapshotServer). Each run records its wall time, the number
+of WebDriver commands it sent and the memory of the browser when its session was released. Incremental checks never
+skip (the fingerprint store is forced), and a run that skipped anyway is stored as "skipped" and left out of the
+statistics. The samples go into a SQLite history and are compared with the pooled samples of the previous runs: a
+bootstrap confidence interval of the relative change of the median decides whether a test (or the whole set,
+"TOTAL") got significantly slower, heavier or chattier.
+
+Usage (from the `test` folder):
+    python -m Infrastructure.Benchmark -n 10
+    python -m Infrastructure.Benchmark -n 5 LayotTest.LayoutHomePageTest.LayoutHomePageTest.test_header
+"""
+
+
+class Comparison:
+    """
+    Current vs baseline samples of one metric of one test. `change` is the relative change of the median,
+    [low, high] its bootstrap confidence interval.
+    """
+
+    def __init__(self, test_id, metric, baseline, current, change, low, high, verdict):
+        self.test_id = test_id
+        self.metric = metric
+        self.baseline = baseline
+        self.current = current
+        self.change = change
+        self.low = low
+        self.high = high
+        self.verdict = verdict
+
+    def __str__(self):
+        if self.verdict == NO_BASELINE:
+            return f"{self.test_id} {self.metric}: {self.current:g} (no baseline yet)"
+        return (f"{self.test_id} {self.metric}: {self.baseline:g} -> {self.current:g} "
+                f"({self.change:+.1%}, {CONFIDENCE:.0%} CI {self.low:+.1%}..{self.high:+.1%}) {self.verdict}")
+
+
+def relative_change(baseline, current):
+    if baseline == 0:
+        return 0.0 if current == 0 else float("inf")
+    return (current - baseline) / baseline
+
+
+def bootstrap_interval(baseline, current, iterations=BOOTSTRAP_ITERATIONS, confidence=CONFIDENCE,
+                       seed=BOOTSTRAP_SEED):
+    """
+    Bootstrap confidence interval of the relative change of the median from `baseline` to `current`.
+
+    Returns: (low, high)
+    """
+    rng = random.Random(seed)
+    changes = sorted(
+        relative_change(statistics.median(rng.choices(baseline, k=len(baseline))),
+                        statistics.median(rng.choices(current, k=len(current))))
+        for _ in range(iterations))
+    tail = (1 - confidence) / 2
+    return changes[int(tail * (iterations - 1))], changes[int((1 - tail) * (iterations - 1))]
+
+
+def compare(test_id, metric, baseline, current, min_effect=MIN_EFFECT):
+    """
+    A change is significant when its confidence interval excludes zero and the median moved by more than
+    `min_effect`.
+
+    Returns: Comparison
+    """
+    current_median = statistics.median(current)
+    if not baseline:
+        return Comparison(test_id, metric, None, current_median, None, None, None, NO_BASELINE)
+    baseline_median = statistics.median(baseline)
+    change = relative_change(baseline_median, current_median)
+    low, high = bootstrap_interval(baseline, current)
+    if low > 0 and change > min_effect:
+        verdict = REGRESSION
+    elif high < 0 and change < -min_effect:
+        verdict = IMPROVEMENT
+    else:
+        verdict = NO_CHANGE
+    return Comparison(test_id, metric, baseline_median, current_median, change, low, high, verdict)
+
+
+class BenchmarkHistory:
+    """
+    SQLite history of benchmark runs and their samples.
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY, started REAL, revision TEXT, label TEXT, iterations INTEGER);
+            CREATE TABLE IF NOT EXISTS samples (
+                run_id INTEGER REFERENCES runs(id), test_id TEXT, iteration INTEGER,
+                seconds REAL, commands INTEGER, memory_mb REAL, outcome TEXT);
+            CREATE INDEX IF NOT EXISTS samples_by_test ON samples (test_id, run_id);
+        """)
+
+    def start_run(self, revision=None, label=None, iterations=0):
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (started, revision, label, iterations) VALUES (?, ?, ?, ?)",
+                (time.time(), revision, label, iterations))
+        return cursor.lastrowid
+
+    def add_sample(self, run_id, test_id, iteration, seconds, commands, memory_mb, outcome):
+        with self.connection:
+            self.connection.execute("INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                    (run_id, test_id, iteration, seconds, commands, memory_mb, outcome))
+
+    def samples(self, run_ids, test_id, metric):
+        """
+        Values of `metric` for the successful samples of `test_id` in the given runs (skipped and failed runs and None
+        values left out).
+        """
+        if metric not in METRICS or not run_ids:
+            return []
+        marks = ",".join("?" * len(run_ids))
+        query = (f"SELECT {metric} FROM samples WHERE run_id IN ({marks}) AND test_id = ? AND outcome = '{OK}' "
+                 f"AND {metric} IS NOT NULL")
+        return [row[0] for row in self.connection.execute(query, list(run_ids) + [test_id])]
+
+    def totals(self, run_ids, metric, test_count):
+        """
+        Sum of `metric` over all the tests of each iteration of the given runs, for the iterations where all
+        `test_count` tests passed and reported the metric.
+        """
+        if metric not in METRICS or not run_ids:
+            return []
+        marks = ",".join("?" * len(run_ids))
+        query = (f"SELECT SUM({metric}) FROM samples WHERE run_id IN ({marks}) AND outcome = '{OK}' "
+                 f"GROUP BY run_id, iteration HAVING COUNT(*) = ? AND COUNT({metric}) = COUNT(*)")
+        return [row[0] for row in self.connection.execute(query, list(run_ids) + [test_count])]
+
+    def previous_runs(self, run_id, test_ids, count=BASELINE_RUNS):
+        """
+        The last `count` runs before `run_id` that measured exactly the same tests.
+        """
+        wanted = sorted(test_ids)
+        found = []
+        for (previous,) in self.connection.execute("SELECT id FROM runs WHERE id < ? ORDER BY id DESC", (run_id,)):
+            tests = [row[0] for row in self.connection.execute(
+                "SELECT DISTINCT test_id FROM samples WHERE run_id = ? ORDER BY test_id", (previous,))]
+            if tests == wanted:
+                found.append(previous)
+                if len(found) == count:
+                    break
+        return found
+
+    def close(self):
+        self.connection.close()
+
+
+def released_memory_mb(samples):
+    """
+    Memory of the browser when the last session of a run was released: the RSS of the browser processes (Linux
+    /proc), or the used JS heap of the page when the process tree cannot be read.
+
+    Args:
+        samples: MemorySample list of the pool's MemoryMonitor taken during the run.
+    """
+    released = [sample for sample in samples if sample.step == RELEASE]
+    if not released:
+        return None
+    last = released[-1]
+    return last.browser_mb if last.browser_mb is not None else last.js_heap_mb
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_once(test_id):
+    """
+    Runs one test method once.
+
+    Returns: (outcome, seconds, commands, memory_mb), outcome one of OK, SKIPPED and FAILED.
+    """
+    # An unchanged fingerprint would make every iteration after the first passing one a near-zero skip.
+    get_fingerprint_store().force = True
+    monitor = get_driver_pool().memory_monitor
+    samples_before = len(monitor.samples)
+    result = unittest.TestResult()
+    commands_before = TRACER.command_count
+    start = time.perf_counter()
+    unittest.TestLoader().loadTestsFromName(test_id).run(result)
+    seconds = time.perf_counter() - start
+    commands = TRACER.command_count - commands_before
+    memory_mb = released_memory_mb(monitor.samples[samples_before:])
+    if not result.wasSuccessful() or not result.testsRun:
+        outcome = FAILED
+    elif result.skipped:
+        outcome = SKIPPED
+    else:
+        outcome = OK
+    return outcome, seconds, commands, memory_mb
+
+
+def run_benchmark(test_ids, iterations=DEFAULT_ITERATIONS, history=None, warmup=DEFAULT_WARMUP, label=None,
+                  stream=sys.stderr):
+    """
+    Runs every test `iterations` times (interleaved, so drift affects all tests alike), stores the samples
+    and compares them with the previous runs of the same tests.
+
+    Returns: (run_id, list of Comparison)
+    """
+    history = history or BenchmarkHistory()
+    TRACER.enabled = True
+    for _ in range(warmup):
+        for test_id in test_ids:
+            run_once(test_id)
+
+    run_id = history.start_run(git_revision(), label, iterations)
+    for iteration in range(iterations):
+        for test_id in test_ids:
+            outcome, seconds, commands, memory_mb = run_once(test_id)
+            history.add_sample(run_id, test_id, iteration, seconds, commands, memory_mb, outcome)
+            stream.write(f"[{iteration + 1}/{iterations}] {test_id}: {outcome} {seconds:.2f}s, "
+                         f"{commands} commands, {memory_mb} MB\n")
+
+    baseline_runs = history.previous_runs(run_id, test_ids)
+    comparisons = []
+    for metric in METRICS:
+        for test_id in test_ids:
+            current = history.samples([run_id], test_id, metric)
+            if current:
+                comparisons.append(compare(test_id, metric, history.samples(baseline_runs, test_id, metric),
+                                           current))
+        current = history.totals([run_id], metric, len(test_ids))
+        if current:
+            comparisons.append(compare(SUITE_TOTAL, metric, history.totals(baseline_runs, metric, len(test_ids)),
+                                       current))
+    return run_id, comparisons
+
+
+def benchmark_report(comparisons):
+    regressions = [comparison for comparison in comparisons if comparison.verdict == REGRESSION]
+    lines = [str(comparison) for comparison in comparisons]
+    lines.append(f"{len(regressions)} significant regression(s)")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark test methods and detect regressions.")
+    parser.add_argument("tests", nargs="*", default=list(DEFAULT_BENCHMARKS), help="test method ids")
+    parser.add_argument("-n", "--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP)
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="SQLite file")
+    parser.add_argument("--snapshot", default=DEFAULT_STORE_DIR, help="snapshot store replayed as the fixture site")
+    parser.add_argument("--live", action="store_true", help="benchmark against the live site")
+    parser.add_argument("--label", default=None)
+    args = parser.parse_args(argv)
+
+    server = None
+    if not args.live:
+        server = SnapshotServer(args.snapshot, REPLAY).start()
+        os.environ[BASE_URL_ENV] = server.base_url
+    history = BenchmarkHistory(args.history)
+    try:
+        _, comparisons = run_benchmark(args.tests, args.iterations, history, args.warmup, args.label)
+    finally:
+        history.close()
+        if server is not None:
+            server.stop()
+    print(benchmark_report(comparisons))
+    return 1 if any(comparison.verdict == REGRESSION for comparison in comparisons) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
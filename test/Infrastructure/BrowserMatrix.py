@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from Infrastructure.Browsers import CHROME, FIREFOX, BrowserConfig, parse_viewport
+from Infrastructure.ParallelRunner import DEFAULT_WORKERS, SUCCESS, MergedResult, collect_jobs, init_worker, \
+    job_outcome, run_job
+
+#====== MATRIX DEFAULTS ======
+DEFAULT_BROWSERS = (CHROME, FIREFOX)
+DEFAULT_DURATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache",
+                                 "matrix_durations.json")
+DEFAULT_ESTIMATE_SECONDS = 30.0
+LAUNCH_SECONDS = 3.0
+DURATION_SMOOTHING = 0.5
+CELL_WIDTH = 18
+
+"""
+Runs the suites on a matrix of browsers and viewports (test x browser x viewport jobs) on a fixed number of
+worker processes.
+
+Every job gets an estimate from the durations of the previous runs (.cache/matrix_durations.json): its own, else
+the mean of the same test on the other browsers, else the median of all the known jobs. The jobs are bin-packed
+onto the workers longest first (LPT): each job goes to the worker that would finish it earliest, counting a
+browser launch for a worker that has not run that browser yet, which keeps the makespan close to the total work
+divided by the workers instead of one full run per browser. A worker runs its jobs grouped by browser, so it
+keeps one warm session at a time (see get_driver_pool). The measured durations update the estimates.
+
+The report lists the failures like ParallelRunner, then the outcome and time of every test on every browser and
+viewport, and the predicted and actual makespan.
+
+Usage (from the `test` folder):
+    python -m Infrastructure.BrowserMatrix -w 4 FunctionalTest.SearchTest LayotTest.LayoutHomePageTest
+    python -m Infrastructure.BrowserMatrix -w 6 --browsers chrome firefox --viewports 1280x800 390x844 LayotTest
+"""
+
+
+class MatrixJob:
+    """
+    A ShardJob on one BrowserConfig. `estimate` is the expected duration in seconds.
+    """
+
+    def __init__(self, shard, config, estimate=DEFAULT_ESTIMATE_SECONDS):
+        self.shard = shard
+        self.config = config
+        self.estimate = estimate
+
+    @property
+    def name(self):
+        return f"{self.shard.name} [{self.config.name}]"
+
+
+class DurationHistory:
+    """
+    Smoothed durations of the matrix jobs of previous runs, by job name, in a JSON file.
+    """
+
+    def __init__(self, path=DEFAULT_DURATIONS):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as history_file:
+                self.durations = json.load(history_file)
+        except (OSError, ValueError):
+            self.durations = {}
+
+    def estimate(self, job):
+        if job.name in self.durations:
+            return self.durations[job.name]
+        prefix = f"{job.shard.name} ["
+        same_test = [seconds for name, seconds in self.durations.items() if name.startswith(prefix)]
+        if same_test:
+            return statistics.mean(same_test)
+        if self.durations:
+            return statistics.median(self.durations.values())
+        return DEFAULT_ESTIMATE_SECONDS
+
+    def record(self, job, seconds):
+        previous = self.durations.get(job.name)
+        self.durations[job.name] = seconds if previous is None else (
+            DURATION_SMOOTHING * seconds + (1 - DURATION_SMOOTHING) * previous)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as history_file:
+            json.dump(self.durations, history_file, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+
+class WorkerPlan:
+    """
+    The jobs one worker runs, in order, and its predicted busy time (launches included).
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.jobs = []
+        self.load = 0.0
+
+    @property
+    def configs(self):
+        return list(dict.fromkeys(job.config for job in self.jobs))
+
+
+def schedule(jobs, workers, launch_seconds=LAUNCH_SECONDS):
+    """
+    Longest processing time first: every job, longest first, goes to the worker where it would end earliest,
+    a browser launch included when the worker has not run that browser config yet. Each worker then runs its
+    jobs grouped by config.
+
+    Returns: list of WorkerPlan, one per worker.
+    """
+    plans = [WorkerPlan(index) for index in range(max(1, workers))]
+    for job in sorted(jobs, key=lambda job: (-job.estimate, job.name)):
+        def finish(plan):
+            launch = 0.0 if any(other.config == job.config for other in plan.jobs) else launch_seconds
+            return plan.load + launch + job.estimate
+        plan = min(plans, key=lambda plan: (finish(plan), plan.index))
+        plan.load = finish(plan)
+        plan.jobs.append(job)
+    for plan in plans:
+        order = {config: index for index, config in enumerate(plan.configs)}
+        plan.jobs.sort(key=lambda job: order[job.config])
+    return plans
+
+
+def makespan(plans):
+    return max((plan.load for plan in plans), default=0.0)
+
+
+def _run_plan(jobs):
+    runs = []
+    for job in jobs:
+        os.environ.update(job.config.environment())
+        runs.append(run_job(job.shard))
+    return runs
+
+
+class MatrixResult(MergedResult):
+    """
+    MergedResult of a matrix run, plus the outcome of every job for the test x config table.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.cells = {}
+        self.configs = []
+
+    def add_matrix_job(self, job, worker_pid, seconds, records):
+        self.add_job(job, worker_pid, seconds, records)
+        if job.config not in self.configs:
+            self.configs.append(job.config)
+        self.cells[(job.shard.name, job.config)] = (job_outcome(records), seconds)
+
+    def matrix_report(self, predicted_seconds, wall_seconds):
+        tests = sorted({test for test, _ in self.cells})
+        name_width = max([len(test) for test in tests] + [4])
+        lines = [" " * name_width + "".join(f"  {config.name:>{CELL_WIDTH}}" for config in self.configs)]
+        for test in tests:
+            cells = []
+            for config in self.configs:
+                outcome, seconds = self.cells.get((test, config), ("-", None))
+                cell = outcome if seconds is None else f"{outcome} {seconds:.1f}s"
+                cells.append(f"  {cell:>{CELL_WIDTH}}")
+            lines.append(f"{test:<{name_width}}" + "".join(cells))
+        for config in self.configs:
+            runs = [(outcome, seconds) for (_, cell_config), (outcome, seconds) in self.cells.items()
+                    if cell_config == config]
+            failed = sum(1 for outcome, _ in runs if outcome != SUCCESS)
+            lines.append(f"  {config.name}: {len(runs)} jobs, {sum(seconds for _, seconds in runs):.1f}s of work, "
+                         f"{failed} not ok")
+        work = sum(seconds for _, seconds in self.cells.values())
+        speedup = work / wall_seconds if wall_seconds else 0.0
+        lines.append(f"Matrix: {len(self.cells)} jobs, {work:.1f}s of work in {wall_seconds:.1f}s wall "
+                     f"(predicted makespan {predicted_seconds:.1f}s, {speedup:.1f}x)")
+        return "\n".join(lines)
+
+
+def matrix_jobs(names, configs, history):
+    """
+    Returns: a MatrixJob with its estimate for every test (or shard) in `names` on every config.
+    """
+    jobs = [MatrixJob(shard, config) for shard in collect_jobs(names) for config in configs]
+    for job in jobs:
+        job.estimate = history.estimate(job)
+    return jobs
+
+
+def run_matrix(names, configs, workers=DEFAULT_WORKERS, history=None, stream=sys.stderr):
+    """
+    Runs the named tests on every BrowserConfig, scheduled on `workers` processes (see schedule()).
+
+    Returns: MatrixResult
+    """
+    history = history or DurationHistory()
+    jobs = matrix_jobs(names, configs, history)
+    plans = [plan for plan in schedule(jobs, workers) if plan.jobs]
+    predicted = makespan(plans)
+    stream.write(f"Running {len(jobs)} jobs ({len(configs)} browser configs) on {len(plans)} workers, "
+                 f"predicted makespan {predicted:.1f}s for {sum(job.estimate for job in jobs):.1f}s of work\n")
+
+    result = MatrixResult()
+    result.configs = list(configs)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, len(plans)), initializer=init_worker) as executor:
+        futures = {executor.submit(_run_plan, plan.jobs): plan for plan in plans}
+        for future in as_completed(futures):
+            plan = futures[future]
+            for job, (worker_pid, seconds, records) in zip(plan.jobs, future.result()):
+                result.add_matrix_job(job, worker_pid, seconds, records)
+                history.record(job, seconds)
+                stream.write(f"{job.name} ... {job_outcome(records)} ({seconds:.2f}s)\n")
+    wall_seconds = time.perf_counter() - start
+    history.save()
+    result.print_report(stream, None, wall_seconds)
+    stream.write(result.matrix_report(predicted, wall_seconds) + "\n")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the test suites on a matrix of browsers and viewports.")
+    parser.add_argument("names", nargs="+", help="test modules, classes or methods")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--browsers", nargs="+", default=list(DEFAULT_BROWSERS))
+    parser.add_argument("--viewports", nargs="+", default=[None], help="WIDTHxHEIGHT (default: browser default)")
+    parser.add_argument("--headed", action="store_true", help="show the browser windows")
+    parser.add_argument("--durations", default=DEFAULT_DURATIONS, help="JSON file of the job durations")
+    args = parser.parse_args(argv)
+    configs = [BrowserConfig(browser, parse_viewport(viewport), not args.headed)
+               for browser in args.browsers for viewport in args.viewports]
+    result = run_matrix(args.names, configs, args.workers, DurationHistory(args.durations))
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+import functools
+import os
+import sys
+from selenium import webdriver
+
+#====== SWITCHES ======
+BROWSER_ENV = "BROWSER"
+VIEWPORT_ENV = "VIEWPORT"
+HEADLESS_ENV = "HEADLESS"
+
+#====== BROWSERS ======
+CHROME = "chrome"
+FIREFOX = "firefox"
+DEFAULT_BROWSER = CHROME
+# Browsers that speak the Chrome DevTools Protocol (execute_cdp_cmd, the DevTools WebSocket of AsyncDriver).
+CDP_BROWSERS = (CHROME,)
+DEFAULT_VIEWPORT_NAME = "default"
+
+"""
+The browsers the suites can run on, chosen per process with environment variables:
+    BROWSER=chrome|firefox     (default chrome)
+    VIEWPORT=1280x800          window size of the launched sessions (default: the browser's own)
+    HEADLESS=1|0               (default: headless on Linux without a display)
+
+The DriverPool launches its sessions with driver_factory(). Features built on the DevTools Protocol check
+supports_cdp(driver) and fall back to plain WebDriver (or are skipped with @requires_cdp) on other browsers.
+"""
+
+
+class BrowserConfig:
+    """
+    A browser, window size and headless mode. Equal configs launch interchangeable sessions.
+
+    Args:
+        browser: CHROME or FIREFOX.
+        viewport: (width, height) of the window, or None for the browser's default.
+        headless: Run without a window.
+    """
+
+    def __init__(self, browser=DEFAULT_BROWSER, viewport=None, headless=False):
+        if browser not in BROWSER_OPTIONS:
+            raise ValueError(f"Unknown browser {browser!r}, expected one of {sorted(BROWSER_OPTIONS)}")
+        self.browser = browser
+        self.viewport = tuple(viewport) if viewport else None
+        self.headless = headless
+
+    @property
+    def name(self):
+        viewport = "x".join(map(str, self.viewport)) if self.viewport else DEFAULT_VIEWPORT_NAME
+        return f"{self.browser} {viewport}"
+
+    @property
+    def cdp(self):
+        return self.browser in CDP_BROWSERS
+
+    def environment(self):
+        """
+        Returns: the environment variables that select this config in another process.
+        """
+        return {BROWSER_ENV: self.browser, VIEWPORT_ENV: "x".join(map(str, self.viewport)) if self.viewport else "",
+                HEADLESS_ENV: "1" if self.headless else "0"}
+
+    def factory(self):
+        """
+        Returns: a callable launching a WebDriver session of this config.
+        """
+        return functools.partial(_launch, self)
+
+    def __eq__(self, other):
+        return isinstance(other, BrowserConfig) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f"BrowserConfig({self.name}{', headless' if self.headless else ''})"
+
+    def _key(self):
+        return self.browser, self.viewport, self.headless
+
+
+def parse_viewport(text):
+    """
+    "1280x800" -> (1280, 800); "" or "default" -> None.
+    """
+    if not text or text == DEFAULT_VIEWPORT_NAME:
+        return None
+    try:
+        width, height = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"Viewport {text!r} is not WIDTHxHEIGHT")
+    return width, height
+
+
+def default_headless():
+    return sys.platform.startswith("linux") and not os.environ.get("DISPLAY")
+
+
+def browser_config():
+    """
+    Returns: the BrowserConfig selected by BROWSER, VIEWPORT and HEADLESS.
+    """
+    headless = os.environ.get(HEADLESS_ENV)
+    return BrowserConfig(os.environ.get(BROWSER_ENV) or DEFAULT_BROWSER, parse_viewport(os.environ.get(VIEWPORT_ENV)),
+                         default_headless() if headless in (None, "") else headless != "0")
+
+
+def driver_factory():
+    """
+    Returns: a callable launching sessions of the configured browser (see browser_config()).
+    """
+    return browser_config().factory()
+
+
+def _chrome_options(config):
+    options = webdriver.ChromeOptions()
+    if config.headless:
+        options.add_argument("--headless=new")
+    if config.viewport:
+        options.add_argument("--window-size={},{}".format(*config.viewport))
+    return options
+
+
+def _firefox_options(config):
+    options = webdriver.FirefoxOptions()
+    if config.headless:
+        options.add_argument("-headless")
+    if config.viewport:
+        options.add_argument(f"--width={config.viewport[0]}")
+        options.add_argument(f"--height={config.viewport[1]}")
+    return options
+
+
+BROWSER_OPTIONS = {CHROME: _chrome_options, FIREFOX: _firefox_options}
+BROWSER_DRIVERS = {CHROME: "Chrome", FIREFOX: "Firefox"}
+
+
+def _launch(config):
+    driver_class = getattr(webdriver, BROWSER_DRIVERS[config.browser])
+    return driver_class(options=BROWSER_OPTIONS[config.browser](config))
+
+
+def supports_cdp(driver):
+    return callable(getattr(driver, "execute_cdp_cmd", None))
+
+
+def requires_cdp(test_item):
+    """
+    Skips a test method (or every test of a class) when the configured browser has no DevTools Protocol.
+    Decided when the test runs, so the same process can run the test for several browsers.
+    """
+    def skip_without_cdp(test):
+        config = browser_config()
+        if not config.cdp:
+            test.skipTest(f"needs the Chrome DevTools Protocol, not available on {config.browser}")
+
+    if isinstance(test_item, type):
+        set_up = test_item.setUp
+
+        @functools.wraps(set_up)
+        def guarded_set_up(self):
+            skip_without_cdp(self)
+            set_up(self)
+        test_item.setUp = guarded_set_up
+        return test_item
+
+    @functools.wraps(test_item)
+    def guarded_test(self, *args, **kwargs):
+        skip_without_cdp(self)
+        return test_item(self, *args, **kwargs)
+    return guarded_test
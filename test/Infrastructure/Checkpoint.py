@@ -0,0 +1,282 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from selenium.common.exceptions import WebDriverException
+from Infrastructure.Reports import register_report
+
+#====== CHECKPOINT STORE ======
+CHECKPOINT_DIR_ENV = "CHECKPOINT_DIR"
+CHECKPOINTS_ENV = "CHECKPOINTS"
+DEFAULT_CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache",
+                                      "checkpoints")
+MAX_AGE_SECONDS = 24 * 60 * 60
+UNKNOWN_BUILD = "unknown"
+
+#====== CDP ======
+GET_COOKIES_COMMAND = "Network.getAllCookies"
+SET_COOKIES_COMMAND = "Network.setCookies"
+ADD_SCRIPT_COMMAND = "Page.addScriptToEvaluateOnNewDocument"
+REMOVE_SCRIPT_COMMAND = "Page.removeScriptToEvaluateOnNewDocument"
+COOKIE_FIELDS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires")
+
+#====== SCRIPTS ======
+CAPTURE_SCRIPT = """
+function dump(storage) {
+    var values = {};
+    try {
+        for (var i = 0; i < storage.length; i++) values[storage.key(i)] = storage.getItem(storage.key(i));
+    } catch (e) {}
+    return values;
+}
+return {url: location.href, origin: location.origin, local: dump(window.localStorage),
+        session: dump(window.sessionStorage)};
+"""
+# Runs before any page script of the first document of the checkpoint origin, so the app starts with the state.
+RESTORE_SCRIPT = """
+(function (state) {
+    if (location.origin !== state.origin) return;
+    try {
+        localStorage.clear();
+        sessionStorage.clear();
+        Object.keys(state.local).forEach(function (key) { localStorage.setItem(key, state.local[key]); });
+        Object.keys(state.session).forEach(function (key) { sessionStorage.setItem(key, state.session[key]); });
+    } catch (e) {}
+})(%s);
+"""
+BUILD_SCRIPT = """
+var next = window.__NEXT_DATA__;
+return [next && next.buildId || null,
+        Array.prototype.map.call(document.querySelectorAll('script[src], link[rel=stylesheet]'), function (el) {
+            return el.getAttribute('src') || el.getAttribute('href');
+        })];
+"""
+# Hashed asset names of the build, e.g. /_next/static/chunks/main-3f5a1c.js
+ASSET_HASH = re.compile(r"[-.][0-9a-f]{6,}\.(?:js|css)$")
+
+"""
+Checkpoints of browser state, so tests that share a setup prefix do not replay it through the UI.
+
+A checkpoint holds the cookies, the localStorage and sessionStorage of the current origin (DocSearch keeps the
+recent and favorite searches there) and the URL. restore_checkpoint() puts that state into any session (e.g. a fresh
+lease of the DriverPool) with one page load: the cookies are set with CDP, the storage is written by a script that
+runs before the page scripts, and the URL is opened.
+Checkpoints are cached on disk per build of the site (the Next.js buildId, or the hashed asset names), so a new
+deployment never reuses state recorded against an old one.
+
+Usage:
+    get_checkpoint_store().checkpoint(driver, "searched custom hook", setup=search_and_open_first_result)
+"""
+
+
+class Checkpoint:
+    """
+    Browser state after a setup prefix.
+    """
+
+    def __init__(self, name, build, url, origin, cookies, local_storage, session_storage, created=None):
+        self.name = name
+        self.build = build
+        self.url = url
+        self.origin = origin
+        self.cookies = cookies
+        self.local_storage = local_storage
+        self.session_storage = session_storage
+        self.created = time.time() if created is None else created
+
+    def to_json(self):
+        return {"name": self.name, "build": self.build, "url": self.url, "origin": self.origin,
+                "cookies": self.cookies, "local_storage": self.local_storage,
+                "session_storage": self.session_storage, "created": self.created}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["name"], data["build"], data["url"], data["origin"], data["cookies"], data["local_storage"],
+                   data["session_storage"], data["created"])
+
+
+def build_hash(driver):
+    """
+    Identifies the deployed build of the page open in `driver`: the Next.js buildId when there is one,
+    otherwise a hash of the hashed script/stylesheet names.
+    """
+    build_id, assets = driver.execute_script(BUILD_SCRIPT)
+    if build_id:
+        return build_id
+    hashed = sorted(asset for asset in assets if ASSET_HASH.search(asset.split("?")[0]))
+    if not hashed:
+        return UNKNOWN_BUILD
+    return hashlib.sha256("\n".join(hashed).encode()).hexdigest()[:16]
+
+
+def capture_checkpoint(driver, name, build=None):
+    """
+    Captures the cookies, the storage of the current origin and the URL of the page open in `driver`.
+
+    Returns: Checkpoint
+    """
+    state = driver.execute_script(CAPTURE_SCRIPT)
+    try:
+        cookies = driver.execute_cdp_cmd(GET_COOKIES_COMMAND, {})["cookies"]
+    except (AttributeError, WebDriverException):
+        cookies = driver.get_cookies()
+    cookies = [_cookie_param(cookie) for cookie in cookies]
+    return Checkpoint(name, build or build_hash(driver), state["url"], state["origin"], cookies, state["local"],
+                      state["session"])
+
+
+def restore_checkpoint(driver, checkpoint):
+    """
+    Puts the state of `checkpoint` into `driver` and opens its URL (one page load).
+    """
+    try:
+        if checkpoint.cookies:
+            driver.execute_cdp_cmd(SET_COOKIES_COMMAND, {"cookies": checkpoint.cookies})
+        state = {"origin": checkpoint.origin, "local": checkpoint.local_storage,
+                 "session": checkpoint.session_storage}
+        script = driver.execute_cdp_cmd(ADD_SCRIPT_COMMAND, {"source": RESTORE_SCRIPT % json.dumps(state)})
+    except (AttributeError, WebDriverException):
+        _restore_without_cdp(driver, checkpoint)
+        return
+    try:
+        driver.get(checkpoint.url)
+    finally:
+        # The script would otherwise stay installed in the (pooled) session for every later page.
+        driver.execute_cdp_cmd(REMOVE_SCRIPT_COMMAND, {"identifier": script["identifier"]})
+
+
+def _restore_without_cdp(driver, checkpoint):
+    # Cookies and storage can only be written on a page of their origin, so this needs a second load.
+    driver.get(checkpoint.url)
+    for cookie in checkpoint.cookies:
+        cookie = {key: value for key, value in cookie.items() if key != "expires"}
+        try:
+            driver.add_cookie(cookie)
+        except WebDriverException:
+            pass
+    driver.execute_script(RESTORE_SCRIPT % json.dumps({"origin": checkpoint.origin,
+                                                       "local": checkpoint.local_storage,
+                                                       "session": checkpoint.session_storage}))
+    driver.refresh()
+
+
+def _cookie_param(cookie):
+    # Network.getAllCookies returns more fields than Network.setCookies accepts; session cookies have no expiry.
+    param = {field: cookie[field] for field in COOKIE_FIELDS if field in cookie}
+    if cookie.get("session") or param.get("expires", 0) <= 0:
+        param.pop("expires", None)
+    if "expiry" in cookie:
+        param["expires"] = cookie["expiry"]
+    return param
+
+
+class CheckpointStore:
+    """
+    Checkpoints on disk under <root>/<build>/<sha of the name>.json, plus an in-memory copy.
+
+    Args:
+        root: Directory of the store.
+        max_age: Seconds after which a checkpoint is recorded again (cookies and sessions expire).
+        enabled: False records nothing and never restores (CHECKPOINTS=0).
+    """
+
+    def __init__(self, root=DEFAULT_CHECKPOINT_DIR, max_age=MAX_AGE_SECONDS, enabled=True):
+        self.root = root
+        self.max_age = max_age
+        self.enabled = enabled
+        self.stats = {"restored": 0, "recorded": 0}
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def get(self, build, name):
+        """
+        Returns: the Checkpoint, or None when there is none (or it is too old).
+        """
+        with self._lock:
+            checkpoint = self._memory.get((build, name))
+        if checkpoint is None:
+            try:
+                with open(self._path(build, name), encoding="utf-8") as checkpoint_file:
+                    checkpoint = Checkpoint.from_json(json.load(checkpoint_file))
+            except FileNotFoundError:
+                return None
+        if time.time() - checkpoint.created > self.max_age:
+            return None
+        with self._lock:
+            self._memory[(build, name)] = checkpoint
+        return checkpoint
+
+    def put(self, checkpoint):
+        with self._lock:
+            self._memory[(checkpoint.build, checkpoint.name)] = checkpoint
+        path = self._path(checkpoint.build, checkpoint.name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as checkpoint_file:
+            json.dump(checkpoint.to_json(), checkpoint_file)
+        os.replace(temp_path, path)
+
+    def checkpoint(self, driver, name, setup):
+        """
+        Restores checkpoint `name` of the build open in `driver`, or runs `setup()` and records it.
+
+        Args:
+            driver: WebDriver with a page of the site open (its build selects the checkpoint).
+            name: Name of the setup prefix, including its parameters (e.g. "searched custom hook").
+            setup: Callable that brings the browser into the state through the UI.
+
+        Returns: True when the state was restored, False when setup ran.
+        """
+        if not self.enabled:
+            setup()
+            return False
+        build = build_hash(driver)
+        checkpoint = self.get(build, name)
+        if checkpoint is not None:
+            restore_checkpoint(driver, checkpoint)
+            self._count("restored")
+            return True
+        setup()
+        self.put(capture_checkpoint(driver, name, build))
+        self._count("recorded")
+        return False
+
+    def report(self):
+        return f"Checkpoints: {self.stats['restored']} restored, {self.stats['recorded']} recorded"
+
+    def _count(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def _path(self, build, name):
+        return os.path.join(self.root, build, hashlib.sha256(name.encode()).hexdigest()[:16] + ".json")
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_checkpoint_store():
+    """
+    Returns the process-wide CheckpointStore. The directory is read from CHECKPOINT_DIR and CHECKPOINTS=0
+    disables restoring (every setup runs through the UI).
+    """
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = CheckpointStore(os.environ.get(CHECKPOINT_DIR_ENV, DEFAULT_CHECKPOINT_DIR),
+                                            enabled=os.environ.get(CHECKPOINTS_ENV) != "0")
+            register_report(_print_report, _forget_store)
+        return _shared_store
+
+
+def _forget_store():
+    global _shared_store
+    _shared_store = None
+
+
+def _print_report():
+    if _shared_store is not None and any(_shared_store.stats.values()):
+        print(_shared_store.report())
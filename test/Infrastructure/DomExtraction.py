@@ -0,0 +1,116 @@
+from Infrastructure.Reports import register_report
+
+#====== SCRIPTS ======
+CSS_PATH_FUNCTION = """
+function cssPath(el) {
+    var steps = [];
+    for (; el && el.nodeType === 1; el = el.parentElement) {
+        var step = el.localName, index = 1;
+        for (var sibling = el.previousElementSibling; sibling; sibling = sibling.previousElementSibling) {
+            if (sibling.localName === el.localName) index++;
+        }
+        steps.unshift(index > 1 ? step + ':nth-of-type(' + index + ')' : step);
+    }
+    return steps.join(' > ');
+}
+"""
+EXTRACT_SCRIPT = CSS_PATH_FUNCTION + """
+var selector = arguments[0], scopeSelector = arguments[1], scopeIndex = arguments[2],
+    fallbackSelector = arguments[3], innerSelector = arguments[4], attributes = arguments[5],
+    withElements = arguments[6];
+
+var scope = document;
+if (scopeSelector) {
+    scope = document.querySelectorAll(scopeSelector)[scopeIndex];
+    if (!scope && fallbackSelector) scope = document.querySelector(fallbackSelector);
+    if (!scope) return [];
+}
+
+function isVisible(el) {
+    var rect = el.getBoundingClientRect(), style = getComputedStyle(el);
+    return rect.width > 0 && rect.height > 0 && style.visibility !== 'hidden' && style.display !== 'none';
+}
+
+var nodes = [];
+scope.querySelectorAll(selector).forEach(function (match) {
+    var el = innerSelector ? match.querySelector(innerSelector) : match;
+    if (!el) return;
+    var values = {};
+    attributes.forEach(function (name) {
+        var value = el[name];
+        values[name] = typeof value === 'string' ? value : el.getAttribute(name);
+    });
+    var node = {text: (el.innerText || '').trim(), path: cssPath(el), visible: isVisible(el), attributes: values};
+    if (withElements) node.element = el;
+    nodes.push(node);
+});
+return nodes;
+"""
+
+ROUND_TRIP_STATS = {"script_calls": 0, "nodes": 0, "round_trips_saved": 0}
+
+
+class DomNode:
+    """
+    Text, CSS path, visibility and requested attributes of one element, read in bulk.
+    `element` is the WebElement itself, only when it was asked for (e.g. to click it afterwards).
+    """
+
+    def __init__(self, text, path, visible, attributes, element=None):
+        self.text = text
+        self.path = path
+        self.visible = visible
+        self.attributes = attributes
+        self.element = element
+
+    def get_attribute(self, name):
+        return self.attributes.get(name)
+
+
+def extract_nodes(driver, selector, scope=None, scope_index=0, fallback_scope=None, inner=None,
+                  attributes=(), with_elements=False):
+    """
+    Reads the text, CSS path, visibility and attributes of all the elements matching `selector`
+    in ONE execute_script call, instead of find_elements plus one .text / get_attribute call per element.
+
+    Args:
+        driver: WebDriver.
+        selector: CSS selector of the elements to read.
+        scope: CSS selector of the element to search in (default: the whole document).
+        scope_index: Which match of `scope` to use (like find_elements(...)[scope_index]).
+        fallback_scope: CSS selector used when `scope` is not found (e.g. "body").
+        inner: Read the first descendant matching this selector instead of the match itself
+               (matches without such a descendant are skipped).
+        attributes: Attribute names to read. DOM properties win over attributes, like get_attribute().
+        with_elements: Also return the WebElement of every node.
+
+    Returns: list of DomNode in document order.
+    """
+    raw_nodes = driver.execute_script(EXTRACT_SCRIPT, selector, scope, scope_index, fallback_scope, inner,
+                                      list(attributes), with_elements)
+    nodes = [DomNode(raw["text"], raw["path"], raw["visible"], raw["attributes"], raw.get("element"))
+             for raw in raw_nodes]
+
+    # find_elements (+ find_element for the scope and inner element) and one call per text/attribute read.
+    lookups = 1 + (1 if scope else 0) + (len(nodes) if inner else 0)
+    ROUND_TRIP_STATS["script_calls"] += 1
+    ROUND_TRIP_STATS["nodes"] += len(nodes)
+    ROUND_TRIP_STATS["round_trips_saved"] += lookups + len(nodes) * (1 + len(attributes)) - 1
+    return nodes
+
+
+def round_trip_report():
+    return (f"DOM extraction: {ROUND_TRIP_STATS['nodes']} nodes in {ROUND_TRIP_STATS['script_calls']} script calls, "
+            f"{ROUND_TRIP_STATS['round_trips_saved']} WebDriver round trips saved")
+
+
+def _print_round_trip_report():
+    if ROUND_TRIP_STATS["script_calls"]:
+        print(round_trip_report())
+
+
+def _forget_round_trips():
+    ROUND_TRIP_STATS.update(dict.fromkeys(ROUND_TRIP_STATS, 0))
+
+
+register_report(_print_round_trip_report, _forget_round_trips)
@@ -0,0 +1,257 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from selenium.common.exceptions import WebDriverException
+from Infrastructure.AsyncDriver import ASYNC_DRIVER_ENV, attach_async_driver
+from Infrastructure.Browsers import browser_config
+from Infrastructure.Instrumentation import instrument_driver
+from Infrastructure.MemoryMonitor import ACQUIRE, RELEASE, RESET, get_memory_monitor
+from Infrastructure.PerfMetrics import install_observers
+from Infrastructure.Reports import register_report
+
+#====== POOL DEFAULTS ======
+POOL_SIZE_ENV = "DRIVER_POOL_SIZE"
+DEFAULT_POOL_SIZE = 1
+# A test waiting longer than this for a session means one was leased and never released.
+ACQUIRE_TIMEOUT_ENV = "DRIVER_ACQUIRE_TIMEOUT"
+DEFAULT_ACQUIRE_TIMEOUT = 300
+BLANK_PAGE = "about:blank"
+
+#====== SCRIPTS ======
+CLEAR_STORAGE_SCRIPT = """
+try { window.localStorage.clear(); } catch (e) {}
+try { window.sessionStorage.clear(); } catch (e) {}
+"""
+CLEAR_COOKIES_COMMAND = "Network.clearBrowserCookies"
+
+
+class DriverLease:
+    """
+    A single browser session handed out by the DriverPool.
+    The test uses lease.driver exactly like a driver created with webdriver.Chrome() (or Firefox, see Browsers).
+    """
+
+    def __init__(self, driver, label, setup_seconds, reused):
+        self.driver = driver
+        self.label = label
+        self.setup_seconds = setup_seconds
+        self.reused = reused
+
+
+class DriverPool:
+    """
+    Keeps up to `size` warm browser sessions and leases them to tests.
+
+    When a lease is released the session is reset (extra windows closed, cookies and storage
+    cleared, window size restored) and goes back to the pool, so the next test does not pay
+    for a browser cold start. A session that fails to reset, or that the memory monitor wants
+    recycled, is quit instead, and a new one is launched with `driver_factory` on a later acquire.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, driver_factory=None, memory_monitor=None, browser=None,
+                 acquire_timeout=None):
+        if acquire_timeout is None:
+            acquire_timeout = float(os.environ.get(ACQUIRE_TIMEOUT_ENV, DEFAULT_ACQUIRE_TIMEOUT))
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.browser = browser or browser_config()
+        self.driver_factory = driver_factory or self.browser.factory()
+        self.memory_monitor = memory_monitor or get_memory_monitor()
+        self.leases = []
+        self.recycled = []
+        self._idle = []
+        self._open_count = 0
+        self._window_sizes = {}
+        self._reset_seconds = {}
+        self._condition = threading.Condition()
+
+    def acquire(self, label=None):
+        """
+        Leases a browser session, launching a new one only if the pool is not full yet.
+        Blocks until a session is free when all of them are leased, at most `acquire_timeout` seconds.
+
+        Args:
+            label: Name of the test that uses the session (shown in the report).
+
+        Returns: DriverLease with the driver and the time it took to get it.
+
+        Raises: TimeoutError when no session was released in time (a lease that is never released).
+        """
+        start = time.perf_counter()
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._idle or self._open_count < self.size, self.acquire_timeout):
+                raise TimeoutError(f"{label}: no browser session released in {self.acquire_timeout:g}s, all "
+                                   f"{self.size} are leased (a lease that is never released?)")
+            if self._idle:
+                driver = self._idle.pop()
+            else:
+                driver = None
+                self._open_count += 1
+
+        reused = driver is not None
+        if not reused:
+            try:
+                driver = self._launch()
+            except Exception:
+                with self._condition:
+                    self._open_count -= 1
+                    self._condition.notify()
+                raise
+
+        setup_seconds = time.perf_counter() - start + self._reset_seconds.pop(id(driver), 0.0)
+        lease = DriverLease(driver, label, setup_seconds, reused)
+        self.leases.append(lease)
+        self.memory_monitor.sample(driver, ACQUIRE, label)
+        return lease
+
+    def release(self, lease):
+        """
+        Resets the session of the lease and returns it to the pool.
+        A session that fails to reset, or that the memory monitor wants recycled, is closed and replaced on the
+        next acquire.
+        """
+        driver = lease.driver
+        self.memory_monitor.sample(driver, RELEASE)
+        start = time.perf_counter()
+        try:
+            self.reset(driver)
+        except WebDriverException:
+            self._discard(driver)
+            return
+        self.memory_monitor.sample(driver, RESET, collect_garbage=True)
+        reason = self.memory_monitor.recycle_reason(driver)
+        if reason is not None:
+            self.memory_monitor.recycle(driver, reason)
+            self.recycled.append((lease.label, reason))
+            self._discard(driver)
+            return
+        self._reset_seconds[id(driver)] = time.perf_counter() - start
+        with self._condition:
+            self._idle.append(driver)
+            self._condition.notify()
+
+    @contextmanager
+    def lease(self, label=None):
+        """
+        Context manager version of acquire/release.
+        """
+        lease = self.acquire(label)
+        try:
+            yield lease
+        finally:
+            self.release(lease)
+
+    def reset(self, driver):
+        """
+        Brings a used session back to a clean state:
+        - Closes every window except the first one.
+        - Removes the network profile of the session (see NetworkProfiles).
+        - Clears localStorage, sessionStorage and cookies.
+        - Restores the window size the session was launched with.
+        - Navigates to a blank page.
+        """
+        handles = driver.window_handles
+        main_handle = handles[0]
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(main_handle)
+        network_profile = getattr(driver, "network_profile", None)
+        if network_profile is not None:
+            network_profile.remove()
+
+        driver.execute_script(CLEAR_STORAGE_SCRIPT)
+        try:
+            driver.execute_cdp_cmd(CLEAR_COOKIES_COMMAND, {})
+        except (AttributeError, WebDriverException):
+            driver.delete_all_cookies()
+
+        width, height = self._window_sizes[id(driver)]
+        size = driver.get_window_size()
+        if (size["width"], size["height"]) != (width, height):
+            driver.set_window_size(width, height)
+        driver.get(BLANK_PAGE)
+
+    def shutdown(self):
+        """
+        Quits every idle session. The shared pools are shut down with the end-of-run reports (see Reports).
+        """
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for driver in idle:
+            self._discard(driver)
+
+    def report(self):
+        """
+        Returns a short text summary of lease setup times, split into cold launches and warm reuses.
+        """
+        cold = [lease.setup_seconds for lease in self.leases if not lease.reused]
+        warm = [lease.setup_seconds for lease in self.leases if lease.reused]
+        lines = [f"Driver pool: {len(self.leases)} leases, pool size {self.size}, {self.browser.name}"]
+        for name, times in (("cold launch", cold), ("warm reuse", warm)):
+            if times:
+                lines.append(f"  {name}: {len(times)} x avg {sum(times) / len(times):.3f}s "
+                             f"(max {max(times):.3f}s)")
+        for label, reason in self.recycled:
+            lines.append(f"  recycled after {label}: {reason}")
+        for lease in self.leases:
+            kind = "warm" if lease.reused else "cold"
+            lines.append(f"  {lease.label}: {lease.setup_seconds:.3f}s ({kind})")
+        return "\n".join(lines)
+
+    def _launch(self):
+        driver = instrument_driver(self.driver_factory())
+        install_observers(driver)
+        if os.environ.get(ASYNC_DRIVER_ENV) == "1":
+            attach_async_driver(driver)
+        size = driver.get_window_size()
+        self._window_sizes[id(driver)] = (size["width"], size["height"])
+        return driver
+
+    def _discard(self, driver):
+        self.memory_monitor.forget(driver)
+        self._window_sizes.pop(id(driver), None)
+        self._reset_seconds.pop(id(driver), None)
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+        with self._condition:
+            self._open_count -= 1
+            self._condition.notify()
+
+
+_shared_pools = {}
+_shared_pool_lock = threading.Lock()
+
+
+def get_driver_pool():
+    """
+    Returns the process-wide DriverPool of the configured browser, creating it on first use.
+    The pool size is read from the DRIVER_POOL_SIZE environment variable, the browser from BROWSER, VIEWPORT and
+    HEADLESS (see Browsers). When the browser changes (a BrowserMatrix worker running the jobs of another browser),
+    the idle sessions of the other pools are quit, so a worker keeps one browser at a time.
+    """
+    config = browser_config()
+    with _shared_pool_lock:
+        pool = _shared_pools.get(config)
+        if pool is None:
+            if not _shared_pools:
+                register_report(_close_shared_pools, _shared_pools.clear)
+            pool = _shared_pools[config] = DriverPool(int(os.environ.get(POOL_SIZE_ENV, DEFAULT_POOL_SIZE)),
+                                                      browser=config)
+        for other in _shared_pools.values():
+            if other is not pool:
+                other.shutdown()
+        return pool
+
+
+def _close_shared_pools():
+    with _shared_pool_lock:
+        pools = list(_shared_pools.values())
+        _shared_pools.clear()
+    for pool in pools:
+        if pool.leases:
+            print(pool.report())
+        pool.shutdown()
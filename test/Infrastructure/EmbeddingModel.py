@@ -0,0 +1,135 @@
+import hashlib
+import os
+import tempfile
+import threading
+import unicodedata
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+#====== MODEL ======
+PARAPHRASE_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+ENCODE_BATCH_SIZE = 64
+
+#====== DISK CACHE ======
+CACHE_DIR_ENV = "EMBEDDING_CACHE_DIR"
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "embeddings")
+
+EMBEDDING_STATS = {"model_loads": 0, "encode_calls": 0, "encoded_texts": 0, "memory_hits": 0, "disk_hits": 0}
+
+"""
+    Process-wide SentenceTransformer shared by all the tests.
+    The model is loaded once per process, on first use (or before forking the ParallelRunner workers with
+    preload(), so the workers inherit it). Embeddings are normalized, kept in memory and cached on disk
+    under a hash of the normalized text, so the same paragraph is never encoded twice, even across runs.
+"""
+
+_model = None
+_model_lock = threading.Lock()
+_memory_cache = {}
+
+
+def get_model():
+    """
+    Returns the shared SentenceTransformer, loading it the first time it is needed.
+    """
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = SentenceTransformer(PARAPHRASE_MODEL)
+            EMBEDDING_STATS["model_loads"] += 1
+        return _model
+
+
+def preload():
+    """
+    Loads the model now. Used by the ParallelRunner before it forks its workers.
+    """
+    get_model()
+
+
+def normalize_text(text):
+    """
+    Unicode NFC and collapsed whitespace, so that cosmetic differences share one cache entry.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_key(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def embed(texts):
+    """
+    Returns the normalized embeddings of `texts` as a (len(texts), dim) array.
+    Cached texts are read from memory or disk, all the others are encoded in a single batched call.
+    """
+    keys = [text_key(text) for text in texts]
+    found = {}
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key in found or key in missing:
+            continue
+        vector = _memory_cache.get(key)
+        if vector is not None:
+            EMBEDDING_STATS["memory_hits"] += 1
+        else:
+            vector = _read_cached(key)
+        if vector is None:
+            missing[key] = normalize_text(text)
+        else:
+            found[key] = vector
+
+    if missing:
+        vectors = get_model().encode(list(missing.values()), batch_size=ENCODE_BATCH_SIZE,
+                                     convert_to_numpy=True, normalize_embeddings=True)
+        EMBEDDING_STATS["encode_calls"] += 1
+        EMBEDDING_STATS["encoded_texts"] += len(missing)
+        for key, vector in zip(missing, vectors):
+            found[key] = vector
+            _write_cached(key, vector)
+
+    _memory_cache.update(found)
+    return np.stack([found[key] for key in keys])
+
+
+def similarities(pairs):
+    """
+    Cosine similarity of every (text1, text2) pair, with one batched encode for all the texts.
+
+    Args:
+        pairs: List of (text1, text2) tuples.
+
+    Returns: numpy array with one similarity per pair.
+    """
+    if not pairs:
+        return np.zeros(0)
+    vectors = embed([text1 for text1, _ in pairs] + [text2 for _, text2 in pairs])
+    return np.einsum("ij,ij->i", vectors[:len(pairs)], vectors[len(pairs):])
+
+
+def similarity(text1, text2):
+    return float(similarities([(text1, text2)])[0])
+
+
+def _cache_path(key):
+    cache_dir = os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+    return os.path.join(cache_dir, PARAPHRASE_MODEL, key[:2], key + ".npy")
+
+
+def _read_cached(key):
+    try:
+        vector = np.load(_cache_path(key))
+    except (OSError, ValueError):
+        return None
+    EMBEDDING_STATS["disk_hits"] += 1
+    return vector
+
+
+def _write_cached(key, vector):
+    # Write to a temporary file and rename it, so parallel workers never read half written files.
+    path = _cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(handle, "wb") as temp_file:
+        np.save(temp_file, vector)
+    os.replace(temp_path, path)
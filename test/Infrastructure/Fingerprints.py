@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from Infrastructure.Browsers import browser_config
+from Infrastructure.HttpClient import AsyncHttpClient
+from Infrastructure.Reports import register_report
+
+#====== FINGERPRINT STORE ======
+FINGERPRINT_DIR_ENV = "FINGERPRINT_DIR"
+FORCE_FULL_RUN_ENV = "FORCE_FULL_RUN"
+DEFAULT_FINGERPRINT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache",
+                                       "fingerprints")
+
+#====== MODES ======
+HTML = "html"
+TEXT = "text"
+VALIDATOR_HEADERS = ("etag", "last-modified")
+
+#====== SCRIPTS ======
+# Hashes in the page when WebCrypto is available (secure contexts), so only 64 characters come back.
+FINGERPRINT_SCRIPT = """
+var specs = arguments[0], done = arguments[arguments.length - 1];
+var source = specs.map(function (spec) {
+    var nodes = document.querySelectorAll(spec[0]);
+    return spec[0] + '\\n' + Array.prototype.map.call(nodes, function (el) {
+        return spec[1] === 'text' ? (el.innerText || '').replace(/\\s+/g, ' ').trim() : el.outerHTML;
+    }).join('\\n');
+}).join('\\n\\u0000\\n');
+if (!(window.crypto && crypto.subtle && window.TextEncoder)) { done({source: source}); return; }
+crypto.subtle.digest('SHA-256', new TextEncoder().encode(source)).then(function (digest) {
+    done({sha256: Array.prototype.map.call(new Uint8Array(digest), function (byte) {
+        return ('0' + byte.toString(16)).slice(-2);
+    }).join('')});
+}, function () { done({source: source}); });
+"""
+
+"""
+Incremental runs: expensive checks are skipped when their inputs did not change since they last passed.
+
+A fingerprint is a hash of what a check depends on, read as cheaply as possible: the DOM subtrees it looks at
+(one script call, hashed inside the page), the HTTP validators (ETag / Last-Modified) of the pages it loads,
+or texts that were already extracted. After a check passes it records its fingerprint and duration; on the next
+run the check asks unchanged() first and skips the expensive part when the fingerprint is the same.
+Fingerprints are kept per browser config (see Browsers): a check that passed on Chrome still runs on Firefox.
+FORCE_FULL_RUN=1 runs everything (and records fresh fingerprints). The skipped work is reported at exit.
+
+Usage:
+    fingerprint = page_fingerprint(driver, {"main": TEXT})
+    if not get_fingerprint_store().unchanged(test_id, "similarity", fingerprint):
+        ... expensive check ...
+        get_fingerprint_store().record(test_id, "similarity", fingerprint, seconds)
+"""
+
+
+class SkippedCheck:
+    """
+    A check that was skipped, with the duration of the run that recorded its fingerprint.
+    """
+
+    def __init__(self, test_id, check, saved_seconds):
+        self.test_id = test_id
+        self.check = check
+        self.saved_seconds = saved_seconds
+
+
+def page_fingerprint(driver, selectors):
+    """
+    Fingerprint of DOM subtrees of the page open in `driver`, in one script call.
+
+    Args:
+        selectors: Dict of CSS selector -> HTML (outerHTML of every match) or TEXT (normalized innerText).
+
+    Returns: "sha256:<hex>"
+    """
+    result = driver.execute_async_script(FINGERPRINT_SCRIPT, [[selector, mode] for selector, mode in
+                                                              selectors.items()])
+    if "sha256" in result:
+        return "sha256:" + result["sha256"]
+    return "sha256:" + hashlib.sha256(result["source"].encode("utf-8")).hexdigest()
+
+
+def text_fingerprint(*parts):
+    """
+    Fingerprint of texts (or lists of texts) that were already extracted.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        for text in ([part] if isinstance(part, str) else part):
+            digest.update(text.encode("utf-8"))
+            digest.update(b"\0")
+        digest.update(b"\1")
+    return "sha256:" + digest.hexdigest()
+
+
+def http_fingerprint(urls):
+    """
+    Fingerprint of pages from their HTTP validators, fetched concurrently: ETag or Last-Modified of a HEAD
+    request, or the hash of the body when the server sends neither.
+    """
+    async def validators():
+        async with AsyncHttpClient() as client:
+            return await asyncio.gather(*(validator(client, url) for url in urls))
+
+    async def validator(client, url):
+        response = await client.head(url)
+        found = [f"{name}={response.headers[name]}" for name in VALIDATOR_HEADERS if name in response.headers]
+        if response.status < 400 and found:
+            return f"{url} {response.status} " + " ".join(found)
+        response = await client.get(url)
+        return f"{url} {response.status} " + hashlib.sha256(response.body).hexdigest()
+
+    return text_fingerprint(asyncio.run(validators()))
+
+
+class FingerprintStore:
+    """
+    Last passing fingerprint of every (browser config, test, check), one small JSON file each so parallel workers
+    never race.
+
+    Args:
+        root: Directory of the store.
+        force: Never skip (FORCE_FULL_RUN=1); fingerprints are still recorded.
+        browser: BrowserConfig the checks run on, by default the configured one at the time of each call (a
+            BrowserMatrix worker switches configs between jobs).
+    """
+
+    def __init__(self, root=DEFAULT_FINGERPRINT_DIR, force=False, browser=None):
+        self.root = root
+        self.force = force
+        self.browser = browser
+        self.skipped = []
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    def unchanged(self, test_id, check, fingerprint):
+        """
+        Returns: True when `check` of `test_id` passed last time with the same fingerprint (the check can be
+        skipped). The skip is added to the report.
+        """
+        if self.force:
+            return False
+        entry = self._read(test_id, check)
+        if entry is None or entry["fingerprint"] != fingerprint:
+            return False
+        with self._lock:
+            self.skipped.append(SkippedCheck(test_id, check, entry["seconds"]))
+        return True
+
+    def record(self, test_id, check, fingerprint, seconds=0.0):
+        """
+        Records the fingerprint of a check that passed. Only call it after the check's assertions.
+        """
+        path = self._path(test_id, check)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as entry_file:
+            json.dump({"browser": self._browser_name(), "test_id": test_id, "check": check,
+                       "fingerprint": fingerprint, "seconds": seconds, "recorded": time.time()}, entry_file)
+        os.replace(temp_path, path)
+        with self._lock:
+            self.recorded += 1
+
+    def forget(self, test_id, check):
+        try:
+            os.remove(self._path(test_id, check))
+        except FileNotFoundError:
+            pass
+
+    def report(self):
+        """
+        Returns: text summary of the skipped checks and the time they took when they last ran.
+        """
+        saved = sum(skip.saved_seconds for skip in self.skipped)
+        lines = [f"Fingerprints: {len(self.skipped)} checks skipped with unchanged inputs (~{saved:.1f}s saved), "
+                 f"{self.recorded} recorded" + (" [full run forced]" if self.force else "")]
+        for skip in sorted(self.skipped, key=lambda skip: -skip.saved_seconds):
+            lines.append(f"  {skip.saved_seconds:7.2f}s  {skip.test_id} [{skip.check}]")
+        return "\n".join(lines)
+
+    def _read(self, test_id, check):
+        try:
+            with open(self._path(test_id, check), encoding="utf-8") as entry_file:
+                return json.load(entry_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _browser_name(self):
+        return (self.browser or browser_config()).name
+
+    def _path(self, test_id, check):
+        key = hashlib.sha256(f"{self._browser_name()}\0{test_id}\0{check}".encode("utf-8")).hexdigest()
+        return os.path.join(self.root, key[:2], key + ".json")
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_fingerprint_store():
+    """
+    Returns the process-wide FingerprintStore. The directory is read from FINGERPRINT_DIR and
+    FORCE_FULL_RUN=1 disables skipping.
+    """
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = FingerprintStore(os.environ.get(FINGERPRINT_DIR_ENV, DEFAULT_FINGERPRINT_DIR),
+                                             force=os.environ.get(FORCE_FULL_RUN_ENV) == "1")
+            register_report(_print_report, _forget_store)
+        return _shared_store
+
+
+def _forget_store():
+    global _shared_store
+    _shared_store = None
+
+
+def _print_report():
+    if _shared_store is not None and (_shared_store.skipped or _shared_store.recorded):
+        print(_shared_store.report())
@@ -0,0 +1,134 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+#====== SERVER DEFAULTS ======
+LOCAL_HOST = "127.0.0.1"
+HTML_CONTENT_TYPE = "text/html; charset=utf-8"
+NOT_FOUND_BODY = "<html><head><title>404: Not Found</title></head><body>Not Found</body></html>"
+
+
+class FixtureResponse:
+    """
+    A canned response served by the FixtureServer. `delay` (seconds) simulates a slow server.
+    """
+
+    def __init__(self, body="", status=200, content_type=HTML_CONTENT_TYPE, headers=None, delay=0):
+        self.body = body.encode("utf-8") if isinstance(body, str) else body
+        self.status = status
+        self.content_type = content_type
+        self.headers = headers or {}
+        self.delay = delay
+
+
+class FixtureRequest:
+    """
+    What a route callable receives: method, path, parsed query, headers and raw body.
+    """
+
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+
+class FixtureServer:
+    """
+    Local multi-threaded HTTP stand-in for react.dev, used to test the automation itself offline.
+
+    `routes` maps a path to a FixtureResponse, or to a callable that gets a FixtureRequest and
+    returns a FixtureResponse. Unknown paths get a 404 page. Every request is logged in `requests`.
+
+    Usage:
+        with FixtureServer({"/": FixtureResponse("<html lang='en'>...</html>")}) as server:
+            driver.get(server.url("/"))
+    """
+
+    def __init__(self, routes=None, port=0):
+        self.routes = dict(routes or {})
+        self.requests = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((LOCAL_HOST, port), _handler_for(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{LOCAL_HOST}:{self._server.server_address[1]}"
+
+    def url(self, path="/"):
+        return self.base_url + path
+
+    def add(self, path, response):
+        self.routes[path] = response
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def respond(self, request):
+        with self._lock:
+            self.requests.append((request.method, request.path))
+        route = self.routes.get(request.path)
+        if route is None:
+            return FixtureResponse(NOT_FOUND_BODY, status=404)
+        if callable(route):
+            return route(request)
+        return route
+
+
+def _handler_for(fixture):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with fixture._lock:
+                fixture.connections += 1
+
+        def do_GET(self):
+            self._serve(send_body=True)
+
+        def do_POST(self):
+            self._serve(send_body=True)
+
+        def do_HEAD(self):
+            self._serve(send_body=False)
+
+        def _serve(self, send_body):
+            parts = urlsplit(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            request = FixtureRequest(self.command, parts.path, parse_qs(parts.query), self.headers, body)
+            response = fixture.respond(request)
+            if response.delay:
+                time.sleep(response.delay)
+
+            self.send_response(response.status)
+            self.send_header("Content-Type", response.content_type)
+            self.send_header("Content-Length", str(len(response.body)))
+            for name, value in response.headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            if send_body:
+                self.wfile.write(response.body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
@@ -0,0 +1,421 @@
+import json
+import os
+import time
+from string import Template
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.wait import WebDriverWait
+from Infrastructure.Checkpoint import capture_checkpoint, restore_checkpoint
+from Infrastructure.DomExtraction import extract_nodes
+from Infrastructure.PageWait import PageWait
+from Infrastructure.PerfMetrics import start_soft_navigation
+from Infrastructure.Reports import register_report
+from Infrastructure.SearchLatency import type_query, typing_cadence_ms
+
+#====== STEPS ======
+ACTIONS = ("open", "window_size", "click", "type", "wait", "dom_quiet")
+PAGE_CHANGING_ACTIONS = ("open", "window_size", "click", "type")
+READ_KINDS = ("count", "texts", "text", "exists", "url", "title")
+EXPECTATIONS = ("equals", "not_equals", "greater", "contains", "not_contains")
+FRAGMENT_STEP = "use"
+DEFAULT_TIMEOUT = 10
+# Branch checkpoints only live during one run, the build of the site does not matter.
+CHECKPOINT_BUILD = "flow"
+
+#====== SCRIPTS ======
+READ_BATCH_SCRIPT = """
+var reads = arguments[0], values = {};
+function texts(selector) {
+    return Array.prototype.map.call(document.querySelectorAll(selector), function (el) {
+        return (el.innerText || el.textContent || '').trim();
+    });
+}
+reads.forEach(function (read) {
+    var name = read[0], kind = read[1], selector = read[2];
+    if (kind === 'count') values[name] = document.querySelectorAll(selector).length;
+    else if (kind === 'texts') values[name] = texts(selector);
+    else if (kind === 'text') values[name] = texts(selector)[0] || null;
+    else if (kind === 'exists') values[name] = document.querySelector(selector) !== null;
+    else if (kind === 'url') values[name] = location.href;
+    else if (kind === 'title') values[name] = document.title;
+});
+return values;
+"""
+
+"""
+Declarative test flows (JSON or YAML) run as a prefix tree on one browser.
+
+A flow file holds named scenarios, each a list of steps, plus optional fragments of shared steps:
+    {"fragments": {"search": [{"click": "${SEARCH_BTN_SELECTOR}"}, ...]},
+     "scenarios": [{"name": "recent", "steps": [{"open": "${SITE_URL}"}, {"use": "search"}, ...]}]}
+Step types:
+    actions:  open, window_size, click (optionally on the `inner` element of the match containing `text`,
+              `navigates` waits for the URL to change, `perf` records the navigation under that PerfMetrics page),
+              type, wait (presence, or `text` in the element), dom_quiet
+    reads:    {"read": name, <kind>: selector} with kind in count / texts / text / exists / url / title
+    expects:  {"expect": name, <check>: value} with check in equals / not_equals / greater / contains / not_contains
+${NAME} placeholders are filled from the variables given to load_flows.
+
+The scenarios are merged into a prefix tree, so steps shared by several scenarios run once. Consecutive reads and
+expects are compiled into a single execute_script call. After a branch that changed the page, the next sibling
+branch starts again from a checkpoint of the branch point (cookies, storage and URL, see Checkpoint.py) plus the
+actions done since that page was loaded, instead of replaying the whole prefix from a cold page.
+"""
+
+FLOW_STATS = {"declared_steps": 0, "executed_steps": 0, "read_batches": 0, "restores": 0}
+
+
+class FlowStep:
+    """
+    One declarative step. `key` identifies equal steps of different scenarios.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.key = json.dumps(spec, sort_keys=True)
+        if "read" in spec:
+            self.kind = "read"
+        elif "expect" in spec:
+            self.kind = "expect"
+        else:
+            actions = [action for action in ACTIONS if action in spec]
+            if len(actions) != 1:
+                raise ValueError(f"Unknown flow step: {spec}")
+            self.kind = actions[0]
+
+    @property
+    def batchable(self):
+        """
+        Reads and expects are compiled into one script call.
+        """
+        return self.kind in ("read", "expect")
+
+    @property
+    def changes_page(self):
+        return self.kind in PAGE_CHANGING_ACTIONS
+
+    def describe(self):
+        return ", ".join(f"{key}={value}" for key, value in self.spec.items())
+
+
+class Scenario:
+
+    def __init__(self, name, steps):
+        self.name = name
+        self.steps = [step if isinstance(step, FlowStep) else FlowStep(step) for step in steps]
+
+
+class FlowResult:
+    """
+    Outcome of one scenario. `error` names the failing step, which may be a prefix shared with other scenarios.
+    """
+
+    def __init__(self, scenario, passed, error=None, seconds=0.0):
+        self.scenario = scenario
+        self.passed = passed
+        self.error = error
+        self.seconds = seconds
+
+
+class FlowNode:
+    """
+    A run of steps of the prefix tree. `ends` lists the scenarios that finish after these steps.
+    """
+
+    def __init__(self, steps=()):
+        self.steps = list(steps)
+        self.children = []
+        self.ends = []
+
+    @property
+    def changes_page(self):
+        return any(step.changes_page for step in self.steps) or any(child.changes_page for child in self.children)
+
+    def scenarios(self):
+        names = list(self.ends)
+        for child in self.children:
+            names.extend(child.scenarios())
+        return names
+
+    def count_steps(self):
+        return len(self.steps) + sum(child.count_steps() for child in self.children)
+
+
+def load_flows(path, variables=None):
+    """
+    Reads the scenarios of a .json, .yaml or .yml flow file.
+
+    Args:
+        path: Flow file.
+        variables: Dict of values for the ${NAME} placeholders.
+
+    Returns: list of Scenario
+    """
+    with open(path, encoding="utf-8") as flow_file:
+        if os.path.splitext(path)[1] in (".yaml", ".yml"):
+            import yaml
+            document = yaml.safe_load(flow_file)
+        else:
+            document = json.load(flow_file)
+    document = _substitute(document, variables or {})
+    fragments = document.get("fragments", {})
+    return [Scenario(scenario["name"], _expand(scenario["steps"], fragments))
+            for scenario in document["scenarios"]]
+
+
+def _substitute(value, variables):
+    if isinstance(value, str):
+        return Template(value).safe_substitute(variables)
+    if isinstance(value, list):
+        return [_substitute(item, variables) for item in value]
+    if isinstance(value, dict):
+        return {key: _substitute(item, variables) for key, item in value.items()}
+    return value
+
+
+def _expand(steps, fragments):
+    expanded = []
+    for step in steps:
+        if FRAGMENT_STEP in step:
+            expanded.extend(_expand(fragments[step[FRAGMENT_STEP]], fragments))
+        else:
+            expanded.append(step)
+    return expanded
+
+
+def build_plan(scenarios):
+    """
+    Merges the scenarios into a prefix tree and compresses every chain without branches or scenario ends
+    into one node.
+
+    Returns: the root FlowNode (without steps).
+    """
+    root = FlowNode()
+    for scenario in scenarios:
+        node = root
+        for step in scenario.steps:
+            child = next((child for child in node.children if child.steps[0].key == step.key), None)
+            if child is None:
+                child = FlowNode([step])
+                node.children.append(child)
+            node = child
+        node.ends.append(scenario.name)
+    for child in root.children:
+        _compress(child)
+    return root
+
+
+def _compress(node):
+    while len(node.children) == 1 and not node.ends:
+        child = node.children[0]
+        node.steps.extend(child.steps)
+        node.children = child.children
+        node.ends = child.ends
+    for child in node.children:
+        _compress(child)
+
+
+class FlowEngine:
+    """
+    Runs declarative scenarios on one (pooled) WebDriver session.
+
+    Args:
+        driver: WebDriver, usually a lease of the DriverPool.
+        timeout: Seconds of every explicit wait.
+        cadence_ms: Typing cadence of type steps (see SearchLatency.type_query).
+        perf_recorder: PerfRecorder for the clicks with a `perf` page; their budget messages go to budget_errors.
+        test: Test id stored with the perf samples.
+    """
+
+    def __init__(self, driver, timeout=DEFAULT_TIMEOUT, cadence_ms=None, perf_recorder=None, test=None):
+        self.driver = driver
+        self.wait = WebDriverWait(driver, timeout)
+        self.page_wait = PageWait(driver, timeout)
+        self.cadence_ms = typing_cadence_ms() if cadence_ms is None else cadence_ms
+        self.perf_recorder = perf_recorder
+        self.test = test
+        self.stats = dict.fromkeys(FLOW_STATS, 0)
+        self.budget_errors = []
+
+    def run(self, scenarios):
+        """
+        Returns: list of FlowResult in the order of `scenarios`.
+        """
+        plan = build_plan(scenarios)
+        self._count("declared_steps", sum(len(scenario.steps) for scenario in scenarios))
+        results = {}
+        self._run_children(plan, {}, [], results, time.perf_counter())
+        return [results[scenario.name] for scenario in scenarios]
+
+    def report(self):
+        return flow_report(self.stats)
+
+    def _count(self, name, amount=1):
+        self.stats[name] += amount
+        FLOW_STATS[name] += amount
+
+    def _run_node(self, node, values, since_load, results, start):
+        """
+        Runs the steps of `node`, then its children. `since_load` are the actions since the last page load,
+        which a restore has to replay after reloading the page.
+        """
+        values = dict(values)
+        since_load = list(since_load)
+        batch = []
+        try:
+            for batch in _batches(node.steps):
+                self._count("executed_steps", len(batch))
+                if batch[0].batchable:
+                    self._check(batch, values)
+                else:
+                    self._execute(batch[0])
+                    since_load = [] if _loads_page(batch[0]) else since_load + batch
+        except Exception as error:
+            step = " / ".join(step.describe() for step in batch)
+            message = f"{step}: {type(error).__name__}: {error}".strip()
+            for name in node.scenarios():
+                results[name] = FlowResult(name, False, message, time.perf_counter() - start)
+            return
+        for name in node.ends:
+            results[name] = FlowResult(name, True, seconds=time.perf_counter() - start)
+        self._run_children(node, values, since_load, results, start)
+
+    def _run_children(self, node, values, since_load, results, start):
+        # Branches that only wait and read run first, they never need a restore.
+        children = sorted(node.children, key=lambda child: child.changes_page)
+        branch = None
+        if sum(child.changes_page for child in children) > 1:
+            branch = capture_checkpoint(self.driver, "flow branch", build=CHECKPOINT_BUILD)
+        dirty = False
+        for child in children:
+            if dirty:
+                self._restore(branch, since_load)
+            self._run_node(child, values, since_load, results, start)
+            dirty = child.changes_page
+
+    def _restore(self, branch, since_load):
+        """
+        Brings the page back to a branch point: restores its checkpoint (cookies, storage and URL)
+        and replays the actions done since that page was loaded.
+        """
+        self._count("restores")
+        restore_checkpoint(self.driver, branch)
+        self.page_wait.ready_state("flow branch")
+        for step in since_load:
+            self._execute(step)
+
+    def _execute(self, step):
+        getattr(self, "_" + step.kind)(step.spec[step.kind])
+
+    def _check(self, steps, values):
+        reads = [[step.spec["read"], kind, step.spec[kind]] for step in steps if step.kind == "read"
+                 for kind in READ_KINDS if kind in step.spec]
+        if reads:
+            self._count("read_batches")
+            values.update(self.driver.execute_script(READ_BATCH_SCRIPT, reads))
+        for step in steps:
+            if step.kind == "expect":
+                _expect(step.spec, values)
+
+    def _open(self, url):
+        if self.driver.current_url.rstrip("/") != url.rstrip("/"):
+            self.driver.get(url)
+
+    def _window_size(self, size):
+        self.driver.set_window_size(*size)
+
+    def _click(self, target):
+        if isinstance(target, str):
+            target = {"selector": target}
+        if "text" in target:
+            self.wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, target["selector"])))
+            nodes = extract_nodes(self.driver, target["selector"], with_elements=True)
+            match = next((node for node in nodes if target["text"].lower() in node.text.lower()), None)
+            if match is None:
+                raise AssertionError(f"No {target['selector']} contains {target['text']!r}")
+            element = match.element.find_element(By.CSS_SELECTOR, target["inner"]) if "inner" in target \
+                else match.element
+        else:
+            element = self.wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, target["selector"])))
+        initial_url = self.driver.current_url
+        measured = self.perf_recorder is not None and "perf" in target
+        since = start_soft_navigation(self.driver) if measured else None
+        element.click()
+        if target.get("navigates"):
+            self.wait.until(lambda driver: driver.current_url != initial_url)
+            self.page_wait.dom_quiet("flow navigation")
+        if measured:
+            budget_error = self.perf_recorder.check(self.driver, target["perf"], self.test, since)
+            if budget_error:
+                self.budget_errors.append(budget_error)
+
+    def _type(self, target):
+        element = self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, target["selector"])))
+        type_query(self.driver, element, target["text"], self.cadence_ms)
+
+    def _wait(self, target):
+        if isinstance(target, str):
+            target = {"selector": target}
+        if "text" in target:
+            self.wait.until(EC.text_to_be_present_in_element((By.CSS_SELECTOR, target["selector"]), target["text"]))
+        else:
+            self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, target["selector"])))
+
+    def _dom_quiet(self, label):
+        self.page_wait.dom_quiet(label)
+
+
+def _loads_page(step):
+    return step.kind == "open" or (step.kind == "click" and isinstance(step.spec["click"], dict)
+                                   and step.spec["click"].get("navigates", False))
+
+
+def _batches(steps):
+    """
+    Groups consecutive reads and expects, every action stays alone.
+    """
+    batches = []
+    for step in steps:
+        if step.batchable and batches and batches[-1][0].batchable:
+            batches[-1].append(step)
+        else:
+            batches.append([step])
+    return batches
+
+
+def _expect(spec, values):
+    name = spec["expect"]
+    value = values.get(name)
+    for check in EXPECTATIONS:
+        if check not in spec:
+            continue
+        expected = spec[check]
+        if check == "equals":
+            ok = value == expected
+        elif check == "not_equals":
+            ok = value != expected
+        elif check == "greater":
+            ok = value is not None and value > expected
+        else:
+            items = value if isinstance(value, list) else [value or ""]
+            found = any(str(expected).lower() in str(item).lower() for item in items)
+            ok = found if check == "contains" else not found
+        if not ok:
+            raise AssertionError(f"Expected {name} {check} {expected!r}, got {value!r}")
+
+
+def flow_report(stats=FLOW_STATS):
+    return (f"Flows: {stats['executed_steps']} of {stats['declared_steps']} declared steps executed, "
+            f"{stats['read_batches']} read batches, {stats['restores']} branch restores")
+
+
+def _print_flow_report():
+    if FLOW_STATS["declared_steps"]:
+        print(flow_report())
+
+
+def _forget_flow_stats():
+    FLOW_STATS.update(dict.fromkeys(FLOW_STATS, 0))
+
+
+register_report(_print_flow_report, _forget_flow_stats)
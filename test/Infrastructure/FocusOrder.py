@@ -0,0 +1,150 @@
+import random
+from selenium.webdriver import ActionChains, Keys
+from Infrastructure.DomExtraction import CSS_PATH_FUNCTION
+
+#====== SAMPLING ======
+DEFAULT_SAMPLE_SIZE = 12
+DEFAULT_SEED = 0
+
+#====== KEYS ======
+TAB_KEY = "Tab"
+
+#====== SCRIPTS ======
+FOCUS_ORDER_SCRIPT = CSS_PATH_FUNCTION + """
+var FOCUSABLE = 'a[href], area[href], button, input, select, textarea, iframe, summary, [tabindex], '
+    + '[contenteditable=""], [contenteditable="true"], audio[controls], video[controls]';
+
+function isFocusable(el) {
+    if (el.tabIndex < 0 || el.disabled || el.closest('[inert]')) return false;
+    if (el.localName === 'input' && el.type === 'hidden') return false;
+    var closedDetails = el.closest('details:not([open])');
+    if (closedDetails && !(el.localName === 'summary' && el.parentElement === closedDetails)) return false;
+    if (!el.getClientRects().length) return false;
+    return getComputedStyle(el).visibility !== 'hidden';
+}
+
+// tabindex > 0 first (ascending, DOM order for ties), then tabindex 0 in DOM order.
+var elements = Array.prototype.filter.call(document.querySelectorAll(FOCUSABLE), isFocusable);
+var positive = elements.filter(function (el) { return el.tabIndex > 0; });
+positive.sort(function (a, b) { return a.tabIndex - b.tabIndex; });
+var ordered = positive.concat(elements.filter(function (el) { return el.tabIndex === 0; }));
+
+var stops = ordered.map(function (el, index) {
+    el.focus({preventScroll: true, focusVisible: true});
+    var style = getComputedStyle(el);
+    return {
+        index: index, path: cssPath(el), tag: el.localName, href: el.href || el.getAttribute('href') || '',
+        text: (el.innerText || '').trim().slice(0, 80), tabIndex: el.tabIndex,
+        outline: style.outline, boxShadow: style.boxShadow, focused: document.activeElement === el
+    };
+});
+
+// Move the sequential focus starting point back to the top of the page.
+var marker = document.createElement('span');
+marker.tabIndex = -1;
+document.body.insertBefore(marker, document.body.firstChild);
+marker.focus({preventScroll: true});
+marker.remove();
+window.scrollTo(0, 0);
+return stops;
+"""
+ACTIVE_PATH_SCRIPT = CSS_PATH_FUNCTION + "return cssPath(document.activeElement);"
+
+
+class FocusStop:
+    """
+    One element of the computed tab order, with its computed outline while it is :focus-visible.
+    """
+
+    def __init__(self, index, path, tag, href, text, tab_index, outline, box_shadow, focused):
+        self.index = index
+        self.path = path
+        self.tag = tag
+        self.href = href
+        self.text = text
+        self.tab_index = tab_index
+        self.outline = outline
+        self.box_shadow = box_shadow
+        self.focused = focused
+
+    @property
+    def has_visible_focus(self):
+        """
+        Same rule the keyboard test always used for the focused element's outline.
+        """
+        outline = self.outline or ""
+        return ("solid" in outline or "rgb" in outline or "1px" in outline) and not outline == "none"
+
+
+def crawl_focus_order(driver):
+    """
+    Computes the whole tab order of the current page in ONE script call: focusable elements,
+    tabindex ordering rules and the computed outline of each element while focused.
+    Afterwards the focus starting point is reset to the top of the page, so real TAB presses start
+    from the first stop.
+
+    Returns: list of FocusStop in tab order.
+    """
+    return [FocusStop(raw["index"], raw["path"], raw["tag"], raw["href"], raw["text"], raw["tabIndex"],
+                      raw["outline"], raw["boxShadow"], raw["focused"])
+            for raw in driver.execute_script(FOCUS_ORDER_SCRIPT)]
+
+
+def sample_indices(count, sample_size=DEFAULT_SAMPLE_SIZE, required=(), seed=DEFAULT_SEED):
+    """
+    Picks the stops whose real TAB press will be verified: the first one, the `required` ones
+    and a seeded random sample of the rest, in ascending order.
+    """
+    chosen = {index for index in required if 0 <= index < count}
+    if count:
+        chosen.add(0)
+    remaining = [index for index in range(count) if index not in chosen]
+    extra = max(0, min(sample_size - len(chosen), len(remaining)))
+    chosen.update(random.Random(seed).sample(remaining, extra))
+    return sorted(chosen)
+
+
+class TabWalker:
+    """
+    Presses real TAB / SHIFT+TAB keys to move between stops of a computed tab order.
+    All the presses needed to reach a stop are sent in one action, so checking a sample costs two
+    WebDriver calls per sampled stop whatever the distance between them. With an async driver attached
+    (see AsyncDriver) the key events are pipelined over DevTools instead.
+    """
+
+    def __init__(self, driver, position=-1):
+        self.driver = driver
+        self.position = position
+
+    def walk_to(self, index):
+        """
+        Moves the real keyboard focus to stop `index` and returns the CSS path of the focused element.
+        """
+        steps = index - self.position
+        bridge = getattr(self.driver, "cdp_bridge", None)
+        if steps and bridge is not None:
+            bridge.press_key(TAB_KEY, abs(steps), shift=steps < 0)
+        elif steps:
+            actions = ActionChains(self.driver)
+            if steps < 0:
+                actions.key_down(Keys.SHIFT)
+            for _ in range(abs(steps)):
+                actions.send_keys(Keys.TAB)
+            if steps < 0:
+                actions.key_up(Keys.SHIFT)
+            actions.perform()
+        self.position = index
+        return self.driver.execute_script(ACTIVE_PATH_SCRIPT)
+
+    def verify(self, order, indices):
+        """
+        Walks to every index in `indices` (in the given order) and compares the real focus with the computed one.
+
+        Returns: list of (index, expected_path, actual_path) for every mismatch.
+        """
+        mismatches = []
+        for index in indices:
+            actual = self.walk_to(index)
+            if actual != order[index].path:
+                mismatches.append((index, order[index].path, actual))
+        return mismatches
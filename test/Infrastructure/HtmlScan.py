@@ -0,0 +1,258 @@
+import re
+from html.parser import HTMLParser
+
+#====== SELECTOR SYNTAX ======
+SELECTOR_TOKEN = re.compile(r"""
+    (?P<tag>^[a-zA-Z][\w-]*|^\*)
+  | \#(?P<id>[\w-]+)
+  | \.(?P<cls>[\w-]+)
+  | \[\s*(?P<attr>[\w-]+)\s*(?:(?P<op>[*^$~|]?=)\s*(?P<value>"[^"]*"|'[^']*'|[^\]\s]+)\s*)?\]
+""", re.VERBOSE)
+DESCENDANT = " "
+CHILD = ">"
+UNSUPPORTED_COMBINATORS = "+~"
+
+#====== HTML PARSING ======
+VOID_TAGS = frozenset(("area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source",
+                       "track", "wbr"))
+# Tags whose start tag closes an open element of the same kind (<li>a<li>b).
+SELF_CLOSING_SIBLINGS = frozenset(("li", "p", "option", "dt", "dd", "tr", "td", "th"))
+# Block start tags that close an open <p> (<p>text<footer> puts the footer next to the paragraph).
+PARAGRAPH_CLOSING_TAGS = frozenset(("address", "article", "aside", "blockquote", "details", "div", "dl", "fieldset",
+                                    "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+                                    "hr", "main", "nav", "ol", "p", "pre", "section", "table", "ul"))
+
+
+class CompoundSelector:
+    """
+    A CSS compound selector (tag, #id, .class and [attr] / [attr=v] / [attr*=v] / [attr^=v] / [attr$=v]
+    / [attr~=v] / [attr|=v] parts, no combinators) that can be matched against a start tag while parsing.
+    """
+
+    def __init__(self, text):
+        self.text = text.strip()
+        self.tag = None
+        self.id = None
+        self.classes = []
+        self.attributes = []
+        position = 0
+        while position < len(self.text):
+            match = SELECTOR_TOKEN.match(self.text, position)
+            if not match or match.end() == position:
+                raise ValueError(f"Unsupported selector: {text!r}")
+            if match.group("tag") and match.group("tag") != "*":
+                self.tag = match.group("tag").lower()
+            elif match.group("id"):
+                self.id = match.group("id")
+            elif match.group("cls"):
+                self.classes.append(match.group("cls"))
+            elif match.group("attr"):
+                value = match.group("value")
+                if value and value[0] in "\"'":
+                    value = value[1:-1]
+                self.attributes.append((match.group("attr").lower(), match.group("op"), value))
+            position = match.end()
+
+    def matches(self, tag, attrs):
+        """
+        Args:
+            tag: Lower case tag name.
+            attrs: Dict of the attributes of the tag.
+        """
+        if self.tag and self.tag != tag:
+            return False
+        if self.id and attrs.get("id") != self.id:
+            return False
+        if self.classes:
+            classes = (attrs.get("class") or "").split()
+            if any(cls not in classes for cls in self.classes):
+                return False
+        for name, op, value in self.attributes:
+            actual = attrs.get(name)
+            if actual is None or not _attribute_matches(actual, op, value):
+                return False
+        return True
+
+
+class Selector:
+    """
+    A CSS selector list ("a, b") of compound selectors joined by descendant (space) or child (>) combinators,
+    matched against an element and its open ancestors while parsing. Sibling combinators and pseudo-classes
+    raise ValueError: they need a rendered DOM.
+    """
+
+    def __init__(self, text):
+        self.text = text.strip()
+        self.alternatives = [_parse_complex(part) for _, part in _split_outside_brackets(self.text, ",")]
+
+    def matches(self, tag, attrs, ancestors=()):
+        """
+        Args:
+            tag: Lower case tag name.
+            attrs: Dict of the attributes of the tag.
+            ancestors: List of (tag, attrs) of the open ancestors, outermost first.
+        """
+        return any(_matches_from(steps, len(steps) - 1, tag, attrs, ancestors, len(ancestors))
+                   for steps in self.alternatives)
+
+
+def _split_outside_brackets(text, separators):
+    """
+    Splits `text` on any of `separators` found outside [...] and quotes.
+
+    Returns: list of (separator before the part or None, part).
+    """
+    parts, current, separator, quote, depth = [], [], None, None, 0
+    for char in text:
+        if quote:
+            quote = None if char == quote else quote
+        elif char in "\"'":
+            quote = char
+        elif char == "[":
+            depth += 1
+        elif char == "]":
+            depth -= 1
+        elif depth == 0 and char in separators:
+            parts.append((separator, "".join(current)))
+            current, separator = [], char
+            continue
+        current.append(char)
+    parts.append((separator, "".join(current)))
+    return parts
+
+
+def _parse_complex(text):
+    """
+    Returns: list of (combinator, CompoundSelector); the combinator links a compound to the previous one.
+    """
+    steps, combinator = [], None
+    for separator, part in _split_outside_brackets(text.strip(), " \t\n" + CHILD + UNSUPPORTED_COMBINATORS):
+        if separator and separator in UNSUPPORTED_COMBINATORS:
+            raise ValueError(f"Unsupported combinator in selector: {text!r}")
+        if separator == CHILD:
+            if combinator == CHILD or not steps:
+                raise ValueError(f"Unsupported selector: {text!r}")
+            combinator = CHILD
+        elif separator and combinator is None and steps:
+            combinator = DESCENDANT
+        if part:
+            steps.append((combinator, CompoundSelector(part)))
+            combinator = None
+    if not steps or combinator is not None:
+        raise ValueError(f"Unsupported selector: {text!r}")
+    return steps
+
+
+def _matches_from(steps, index, tag, attrs, ancestors, depth):
+    # Right to left: steps[index] against the element, then its combinator against ancestors[:depth].
+    combinator, compound = steps[index]
+    if not compound.matches(tag, attrs):
+        return False
+    if index == 0:
+        return True
+    if combinator == CHILD:
+        return depth > 0 and _matches_from(steps, index - 1, *ancestors[depth - 1], ancestors, depth - 1)
+    return any(_matches_from(steps, index - 1, *ancestors[position], ancestors, position)
+               for position in range(depth - 1, -1, -1))
+
+
+def _attribute_matches(actual, op, value):
+    if op is None:
+        return True
+    if op == "=":
+        return actual == value
+    if op == "*=":
+        return value in actual
+    if op == "^=":
+        return actual.startswith(value)
+    if op == "$=":
+        return actual.endswith(value)
+    if op == "~=":
+        return value in actual.split()
+    return actual == value or actual.startswith(value + "-")
+
+
+class ScannedPage:
+    """
+    What the scanner found in the raw HTML: lang, title, links, which selectors matched and how many
+    elements each one matched.
+    """
+
+    def __init__(self, lang, title, links, matched, counts=None):
+        self.lang = lang
+        self.title = title
+        self.links = links
+        self.matched = matched
+        self.counts = counts or {}
+
+
+class HtmlScanner(HTMLParser):
+    """
+    Single pass scanner over server rendered HTML. Collects <html lang>, <title>, every <a href> and
+    how many elements each of the given selectors (see Selector) matched. Can be fed in chunks, so a page
+    can be checked while it downloads.
+    """
+
+    def __init__(self, selectors=()):
+        super().__init__(convert_charrefs=True)
+        self.selectors = [Selector(selector) for selector in selectors]
+        self.counts = {selector.text: 0 for selector in self.selectors}
+        self.lang = None
+        self.title = ""
+        self.links = []
+        self._in_title = False
+        self._open = []
+
+    @property
+    def matched(self):
+        return {text: count > 0 for text, count in self.counts.items()}
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {name: value or "" for name, value in attrs}
+        if tag == "html" and self.lang is None:
+            self.lang = attrs.get("lang")
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "a" and attrs.get("href"):
+            self.links.append(attrs["href"])
+        if self._open and ((tag in SELF_CLOSING_SIBLINGS and self._open[-1][0] == tag)
+                           or (tag in PARAGRAPH_CLOSING_TAGS and self._open[-1][0] == "p")):
+            self._open.pop()
+        for selector in self.selectors:
+            if selector.matches(tag, attrs, self._open):
+                self.counts[selector.text] += 1
+        if tag not in VOID_TAGS:
+            self._open.append((tag, attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self._open.pop()
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        # Unclosed children (<p> without </p>) are closed with their parent; stray end tags are ignored.
+        for position in range(len(self._open) - 1, -1, -1):
+            if self._open[position][0] == tag:
+                del self._open[position:]
+                break
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+
+    def page(self):
+        return ScannedPage(self.lang, self.title.strip(), self.links, self.matched, dict(self.counts))
+
+
+def scan_html(html, selectors=()):
+    """
+    Scans a whole HTML document. See HtmlScanner.
+
+    Returns: ScannedPage
+    """
+    scanner = HtmlScanner(selectors)
+    scanner.feed(html)
+    scanner.close()
+    return scanner.page()
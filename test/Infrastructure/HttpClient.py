@@ -0,0 +1,220 @@
+import asyncio
+import gzip
+import ssl
+import time
+import zlib
+from urllib.parse import urljoin, urlsplit
+from Infrastructure.SiteConfig import LOCAL_ADDRESS, is_local_host
+
+#====== CLIENT DEFAULTS ======
+DEFAULT_TIMEOUT = 10
+DEFAULT_CONNECTIONS_PER_HOST = 8
+MAX_REDIRECTS = 5
+USER_AGENT = "Frontend-Automation-Tests"
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+NO_BODY_STATUSES = (204, 304)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+class HttpResponse:
+    """
+    A fully read HTTP response. `seconds` is the latency of the request including redirects.
+    """
+
+    def __init__(self, url, status, headers, body, seconds=0.0):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.seconds = seconds
+
+    @property
+    def text(self):
+        return self.body.decode("utf-8", errors="replace")
+
+
+class AsyncHttpClient:
+    """
+    Small asyncio HTTP/1.1 client with a keep-alive connection pool per host.
+
+    Many requests can be awaited at once (asyncio.gather); at most `connections_per_host`
+    connections are opened to each host and they are reused between requests.
+    Use it as an async context manager so the pooled connections are closed at the end.
+    """
+
+    def __init__(self, connections_per_host=DEFAULT_CONNECTIONS_PER_HOST, timeout=DEFAULT_TIMEOUT):
+        self.connections_per_host = connections_per_host
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._idle = {}
+        self._limits = {}
+        self._ssl_context = ssl.create_default_context()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def get(self, url, headers=None):
+        return await self.request("GET", url, headers)
+
+    async def head(self, url, headers=None):
+        return await self.request("HEAD", url, headers)
+
+    async def request(self, method, url, headers=None, body=None):
+        """
+        Sends a request and follows redirects.
+
+        Args:
+            method: HTTP method.
+            url: Absolute http(s) URL.
+            headers: Extra request headers.
+            body: Request body as bytes (or None).
+
+        Returns: HttpResponse of the final (non redirect) response.
+        """
+        start = time.perf_counter()
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await asyncio.wait_for(self._send(method, url, headers, body), self.timeout)
+            location = response.headers.get("location")
+            if response.status not in REDIRECT_STATUSES or not location:
+                break
+            url = urljoin(url, location)
+            if response.status == 303 or (response.status in (301, 302) and method == "POST"):
+                method, body = "GET", None
+        response.seconds = time.perf_counter() - start
+        return response
+
+    async def close(self):
+        connections = [connection for pooled in self._idle.values() for connection in pooled]
+        self._idle.clear()
+        for connection in connections:
+            await _discard(connection)
+
+    async def _send(self, method, url, headers, body):
+        parts = urlsplit(url)
+        host = parts.hostname
+        port = parts.port or DEFAULT_PORTS[parts.scheme]
+        key = (parts.scheme, host, port)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+
+        request_headers = {
+            "Host": parts.netloc,
+            "User-Agent": USER_AGENT,
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        }
+        request_headers.update(headers or {})
+        if body is not None:
+            request_headers["Content-Length"] = str(len(body))
+        head = f"{method} {target} HTTP/1.1\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in request_headers.items())
+        payload = (head + "\r\n").encode("latin-1") + (body or b"")
+
+        limit = self._limits.setdefault(key, asyncio.Semaphore(self.connections_per_host))
+        async with limit:
+            pooled = self._idle.get(key)
+            connection = pooled.pop() if pooled else None
+            if connection is not None:
+                try:
+                    return await self._exchange(key, connection, method, url, payload)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    # The server closed the idle connection (_exchange closed our end), retry once on a new one.
+                    pass
+            connection = await self._open(key)
+            return await self._exchange(key, connection, method, url, payload)
+
+    async def _open(self, key):
+        scheme, host, port = key
+        ssl_context = self._ssl_context if scheme == "https" else None
+        self.connections_opened += 1
+        # *.localhost names (snapshot replay) are not always resolvable by the system resolver.
+        address = LOCAL_ADDRESS if is_local_host(host) else host
+        return await asyncio.open_connection(address, port, ssl=ssl_context)
+
+    async def _exchange(self, key, connection, method, url, payload):
+        """
+        Sends the request on `connection` and reads the response. The connection goes back to the pool when the
+        server keeps it alive, otherwise (and on any error, timeout or cancellation) it is closed.
+        """
+        try:
+            return await self._read_response(key, connection, method, url, payload)
+        except BaseException:
+            await _discard(connection)
+            raise
+
+    async def _read_response(self, key, connection, method, url, payload):
+        reader, writer = connection
+        writer.write(payload)
+        await writer.drain()
+
+        status_line = await reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name = name.strip().lower()
+            value = value.strip()
+            headers[name] = f"{headers[name]}, {value}" if name in headers else value
+
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if method == "HEAD" or status in NO_BODY_STATUSES or 100 <= status < 200:
+            body = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            body = await _read_chunked(reader)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            keep_alive = False
+
+        if keep_alive:
+            self._idle.setdefault(key, []).append(connection)
+        else:
+            await _discard(connection)
+        return HttpResponse(url, status, headers, _decode(body, headers.get("content-encoding", "")))
+
+
+async def _discard(connection):
+    """
+    Closes a connection that does not go back to the pool and waits until the transport is closed.
+    """
+    _, writer = connection
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        # The peer already reset the connection (ssl.SSLError is an OSError too).
+        pass
+
+
+async def _read_chunked(reader):
+    chunks = []
+    while True:
+        size_line = await reader.readuntil(b"\r\n")
+        size = int(size_line.split(b";")[0], 16)
+        if size == 0:
+            # Skip optional trailers up to the final empty line.
+            while await reader.readuntil(b"\r\n") != b"\r\n":
+                pass
+            return b"".join(chunks)
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+
+
+def _decode(body, encoding):
+    encoding = encoding.lower()
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
@@ -0,0 +1,361 @@
+import csv
+import functools
+import json
+import os
+import threading
+import time
+from Infrastructure.Reports import register_report
+
+#====== SWITCHES ======
+INSTRUMENTATION_ENV = "INSTRUMENTATION"
+TRACE_DIR_ENV = "TRACE_DIR"
+HOTTEST_HELPERS = 15
+MAX_BUFFERED_SPANS = 20000
+
+#====== SPAN CATEGORIES ======
+TEST = "test"
+FIXTURE = "fixture"
+HELPER = "helper"
+COMMAND = "command"
+FIXTURE_METHODS = ("setUp", "tearDown", "setUpClass", "tearDownClass")
+
+"""
+Per-step latency instrumentation.
+
+Every WebDriver command (the driver's command_executor) and every method of the instrumented suite classes is
+recorded as a span: name, start, wall time, thread and the number of WebDriver commands it sent (including the
+commands of nested steps). Recording a span is a couple of perf_counter_ns calls and a list append, so it stays
+on in normal runs; set INSTRUMENTATION=0 to turn it off. The report is built from running totals, and at most
+MAX_BUFFERED_SPANS spans are kept in memory: with TRACE_DIR set, each process writes them out whenever the buffer
+fills up and at the end of the run, as numbered Chrome trace-event JSON chunks (open them in chrome://tracing or
+Perfetto) and one flat CSV; without it, the full buffer is dropped.
+"""
+
+
+class Span:
+    """
+    One timed step. `commands` counts the WebDriver commands sent while the step was open,
+    `child_ns` the time spent in nested steps (so the self time is duration - child time).
+    `test` is the id of the test the step ran in.
+    """
+
+    __slots__ = ("name", "category", "start_ns", "end_ns", "thread", "depth", "commands", "child_ns", "test")
+
+    def __init__(self, name, category, start_ns, thread, depth, test):
+        self.name = name
+        self.category = category
+        self.start_ns = start_ns
+        self.end_ns = start_ns
+        self.thread = thread
+        self.depth = depth
+        self.commands = 0
+        self.child_ns = 0
+        self.test = test
+
+    @property
+    def duration_ns(self):
+        return self.end_ns - self.start_ns
+
+    @property
+    def self_ns(self):
+        return self.duration_ns - self.child_ns
+
+
+class Tracer:
+    """
+    Collects the spans of one process.
+
+    Args:
+        enabled: Record spans at all.
+        max_spans: Number of spans buffered in `spans` before they are written to trace_dir (or dropped).
+        trace_dir: Directory of the exports, None to keep only the running totals.
+    """
+
+    def __init__(self, enabled=True, max_spans=MAX_BUFFERED_SPANS, trace_dir=None):
+        self.enabled = enabled
+        self.max_spans = max_spans
+        self.trace_dir = trace_dir
+        self.spans = []
+        self.labels = {}
+        self.command_count = 0
+        self.command_ns = 0
+        self.helpers = {}
+        self.test_ns = {}
+        self.exported_chunks = 0
+        self.dropped_spans = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin_ns = time.perf_counter_ns()
+
+    def begin(self, name, category=HELPER, test=None):
+        stack = self._stack()
+        if test is None and stack:
+            test = stack[0].test
+        span = Span(name, category, time.perf_counter_ns(), threading.get_ident(), len(stack), test)
+        stack.append(span)
+        return span
+
+    def end(self, span):
+        span.end_ns = time.perf_counter_ns()
+        stack = self._stack()
+        stack.pop()
+        if stack:
+            parent = stack[-1]
+            parent.child_ns += span.duration_ns
+            parent.commands += span.commands
+        self._record(span)
+
+    def command(self, name, start_ns, end_ns):
+        """
+        Records one WebDriver command sent by the current thread.
+        """
+        stack = self._stack()
+        span = Span(name, COMMAND, start_ns, threading.get_ident(), len(stack), stack[0].test if stack else None)
+        span.end_ns = end_ns
+        span.commands = 1
+        if stack:
+            stack[-1].commands += 1
+        self._record(span)
+
+    def label(self, key, value):
+        """
+        Labels the test running on this thread, e.g. with the network profile it runs under. The labels go into
+        the exports, and the report sums the test times per label.
+        """
+        stack = self._stack()
+        if stack and stack[0].test:
+            self.labels.setdefault(stack[0].test, {})[key] = value
+
+    def step(self, name, category=HELPER):
+        """
+        Context manager timing an arbitrary block: `with tracer.step("open menu"): ...`
+        """
+        return _StepContext(self, name, category)
+
+    def clear(self):
+        with self._lock:
+            self.spans = []
+            self.labels = {}
+            self.command_count = 0
+            self.command_ns = 0
+            self.helpers = {}
+            self.test_ns = {}
+            self.dropped_spans = 0
+
+    def flush(self):
+        """
+        Writes the buffered spans to trace_dir, as the next trace-<pid>-<n>.json chunk and appended to
+        steps-<pid>.csv, then empties the buffer. Without a trace_dir the spans are dropped.
+        """
+        with self._lock:
+            self._flush()
+
+    def chrome_trace(self):
+        """
+        Returns: dict in the Chrome trace-event format (complete "X" events, microseconds).
+        """
+        pid = os.getpid()
+        events = []
+        for span in self.spans:
+            events.append({
+                "name": span.name, "cat": span.category, "ph": "X", "pid": pid, "tid": span.thread,
+                "ts": (span.start_ns - self._origin_ns) / 1000, "dur": span.duration_ns / 1000,
+                "args": {"commands": span.commands, "test": span.test, "labels": self.labels.get(span.test, {})},
+            })
+        events.sort(key=lambda event: event["ts"])
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+
+    def export_csv(self, path, append=False):
+        new_file = not (append and os.path.exists(path))
+        with open(path, "a" if append else "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.writer(csv_file)
+            if new_file:
+                writer.writerow(["test", "name", "category", "depth", "thread", "start_ms", "duration_ms",
+                                 "self_ms", "commands", "labels"])
+            for span in sorted(self.spans, key=lambda span: span.start_ns):
+                writer.writerow([span.test or "", span.name, span.category, span.depth, span.thread,
+                                 f"{(span.start_ns - self._origin_ns) / 1e6:.3f}", f"{span.duration_ns / 1e6:.3f}",
+                                 f"{span.self_ns / 1e6:.3f}", span.commands,
+                                 ";".join(f"{key}={value}" for key, value in self.labels.get(span.test, {}).items())])
+
+    def hottest(self, limit=HOTTEST_HELPERS):
+        """
+        Aggregates the helper spans by name.
+
+        Returns: list of (name, calls, total_ns, self_ns, commands), the largest total time first.
+        """
+        rows = [(name,) + values for name, values in self.helpers.items()]
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows[:limit]
+
+    def label_times(self):
+        """
+        Sums the time of the labelled tests (test and fixture spans) per label.
+
+        Returns: dict of (key, value) -> (tests, seconds).
+        """
+        totals = {}
+        for test, labels in self.labels.items():
+            for label in labels.items():
+                tests, total = totals.get(label, (0, 0.0))
+                totals[label] = (tests + 1, total + self.test_ns.get(test, 0) / 1e9)
+        return totals
+
+    def report(self, limit=HOTTEST_HELPERS):
+        lines = [f"Instrumentation: {self.command_count} WebDriver commands ({self.command_ns / 1e9:.2f}s), "
+                 f"hottest helpers:"]
+        for name, calls, total_ns, self_ns, command_count in self.hottest(limit):
+            lines.append(f"  {name}: {calls} calls, {total_ns / 1e9:.3f}s total ({total_ns / calls / 1e6:.1f}ms avg, "
+                         f"{self_ns / 1e9:.3f}s self), {command_count} commands")
+        label_times = self.label_times()
+        if label_times:
+            lines.append("Test time by label:")
+        for (key, value), (tests, seconds) in sorted(label_times.items()):
+            lines.append(f"  {key} {value}: {tests} tests, {seconds:.2f}s ({seconds / tests:.2f}s avg)")
+        if self.dropped_spans:
+            lines.append(f"{self.dropped_spans} spans dropped from the buffer (set {TRACE_DIR_ENV} to export them)")
+        return "\n".join(lines)
+
+    @property
+    def active(self):
+        return bool(self.command_count or self.helpers or self.test_ns or self.spans)
+
+    def _record(self, span):
+        with self._lock:
+            if span.category == COMMAND:
+                self.command_count += 1
+                self.command_ns += span.duration_ns
+            elif span.category == HELPER:
+                calls, total_ns, self_ns, commands = self.helpers.get(span.name, (0, 0, 0, 0))
+                self.helpers[span.name] = (calls + 1, total_ns + span.duration_ns, self_ns + span.self_ns,
+                                           commands + span.commands)
+            elif span.depth == 0 and span.test is not None:
+                self.test_ns[span.test] = self.test_ns.get(span.test, 0) + span.duration_ns
+            self.spans.append(span)
+            if len(self.spans) >= self.max_spans:
+                self._flush()
+
+    def _flush(self):
+        if self.trace_dir and self.spans:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            pid = os.getpid()
+            self.export_chrome_trace(os.path.join(self.trace_dir, f"trace-{pid}-{self.exported_chunks}.json"))
+            self.export_csv(os.path.join(self.trace_dir, f"steps-{pid}.csv"), append=True)
+            self.exported_chunks += 1
+        elif not self.trace_dir:
+            self.dropped_spans += len(self.spans)
+        self.spans = []
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+
+class _StepContext:
+    __slots__ = ("tracer", "name", "category", "span")
+
+    def __init__(self, tracer, name, category):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.span = None
+
+    def __enter__(self):
+        if self.tracer.enabled:
+            self.span = self.tracer.begin(self.name, self.category)
+        return self.span
+
+    def __exit__(self, *exc_info):
+        if self.span is not None:
+            self.tracer.end(self.span)
+
+
+TRACER = Tracer(os.environ.get(INSTRUMENTATION_ENV, "1") != "0", trace_dir=os.environ.get(TRACE_DIR_ENV))
+
+
+def traced(name, category=HELPER, tracer=TRACER):
+    """
+    Decorator timing every call of a function as a span called `name`.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            test = args[0].id() if category in (TEST, FIXTURE) and args and hasattr(args[0], "id") else None
+            span = tracer.begin(name, category, test)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                tracer.end(span)
+        wrapper.__traced__ = True
+        return wrapper
+    return decorator
+
+
+def instrument_helpers(cls):
+    """
+    Class decorator for the suites: times every test (category "test"), setUp/tearDown ("fixture") and
+    helper method ("helper") defined in the class.
+    """
+    for attribute, value in list(vars(cls).items()):
+        if not callable(value) or attribute.startswith("__") or getattr(value, "__traced__", False):
+            continue
+        if isinstance(value, (staticmethod, classmethod, type)):
+            continue
+        if attribute.startswith("test"):
+            category = TEST
+        elif attribute in FIXTURE_METHODS:
+            category = FIXTURE
+        else:
+            category = HELPER
+        setattr(cls, attribute, traced(f"{cls.__name__}.{attribute}", category)(value))
+    return cls
+
+
+def instrument_driver(driver, tracer=TRACER):
+    """
+    Wraps the command executor of a WebDriver so every command it sends is recorded.
+    Safe to call more than once on the same driver.
+    """
+    executor = driver.command_executor
+    if getattr(executor, "__traced__", False):
+        return driver
+    execute = executor.execute
+
+    def timed_execute(command, params):
+        if not tracer.enabled:
+            return execute(command, params)
+        start_ns = time.perf_counter_ns()
+        try:
+            return execute(command, params)
+        finally:
+            tracer.command(command, start_ns, time.perf_counter_ns())
+
+    executor.execute = timed_execute
+    executor.__traced__ = True
+    return driver
+
+
+def _export_report():
+    if not TRACER.active:
+        return
+    print(TRACER.report())
+    if TRACER.trace_dir:
+        TRACER.flush()
+
+
+def _forget_spans():
+    # A forked worker starts with its own lock (the parent's may have been held). The chunk numbers go on, so a
+    # flush in the middle of a run does not overwrite the chunks it already exported (a worker has its own pid).
+    TRACER._lock = threading.Lock()
+    TRACER.clear()
+
+
+register_report(_export_report, _forget_spans)
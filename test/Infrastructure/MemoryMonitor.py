@@ -0,0 +1,350 @@
+import csv
+import os
+import threading
+import time
+from selenium.common.exceptions import WebDriverException
+from Infrastructure.Reports import register_report
+
+#====== SWITCHES ======
+MEMORY_MONITOR_ENV = "MEMORY_MONITOR"
+MEMORY_DIR_ENV = "MEMORY_DIR"
+RECYCLE_BROWSER_MB_ENV = "MEMORY_RECYCLE_MB"
+
+#====== STEPS ======
+ACQUIRE = "acquire"
+RELEASE = "release"
+RESET = "reset"
+
+#====== RECYCLE LIMITS ======
+DEFAULT_RECYCLE_BROWSER_MB = 2048
+RECYCLE_LIMITS = {"js_heap_mb": 512, "dom_nodes": 200000, "listeners": 50000, "windows": 8}
+
+#====== GROWTH DETECTION ======
+# Growth is looked for in the samples taken right after the pool reset a session (blank page, garbage collected):
+# from one test to the next they should stay flat.
+GROWTH_WINDOW = 10
+GROWTH_SHARE = 0.8
+MIN_GROWTH = {"js_heap_mb": 16, "dom_nodes": 5000, "documents": 10, "listeners": 2000, "windows": 2,
+              "chromedriver_mb": 32, "browser_mb": 256}
+
+METRICS = ("js_heap_mb", "dom_nodes", "documents", "listeners", "windows", "chromedriver_mb", "browser_mb")
+DOM_COUNTERS_SCRIPT = """
+return {heap: performance.memory ? performance.memory.usedJSHeapSize : null,
+        nodes: document.getElementsByTagName('*').length, documents: 1 + window.frames.length};
+"""
+
+"""
+Memory and resource leak tracking of long-lived browser sessions.
+
+A sample is the JS heap of the current page (Runtime.getHeapUsage), the DOM counters of its renderer (documents,
+nodes and event listeners, detached ones included, from Memory.getDOMCounters), the open window handles and the
+resident memory (Linux /proc) of chromedriver and of the browser processes it started. Without DevTools the heap
+and the DOM counts come from the page.
+
+The DriverPool samples every session when it is leased, when it is released and right after its reset (after a
+garbage collection). Helpers add samples between steps with get_memory_monitor().sample(driver, "step"). A session
+is recycled (quit and replaced by a fresh one) when a sample crosses a RECYCLE_LIMITS value or MEMORY_RECYCLE_MB
+of browser memory, or when its post-reset samples keep growing: over the last GROWTH_WINDOW resets a metric grew
+in at least GROWTH_SHARE of the steps and by more than MIN_GROWTH in total. So soak runs of thousands of iterations
+stay on healthy sessions.
+
+With MEMORY_DIR set, each process writes its memory timeline (one row per sample, per test and step) as CSV when it
+exits. MEMORY_MONITOR=0 turns the sampling off.
+"""
+
+
+class MemorySample:
+    """
+    Memory of one session at one step of a test. Metrics that could not be read are None.
+    """
+
+    __slots__ = ("session", "test", "step", "seconds") + METRICS
+
+    def __init__(self, session, test, step, seconds, **metrics):
+        self.session = session
+        self.test = test
+        self.step = step
+        self.seconds = seconds
+        for metric in METRICS:
+            setattr(self, metric, metrics.get(metric))
+
+    def metrics(self):
+        return {metric: getattr(self, metric) for metric in METRICS}
+
+
+class GrowthTrend:
+    """
+    How one metric moved over the post-reset samples of a session.
+    """
+
+    def __init__(self, metric, first, last, share):
+        self.metric = metric
+        self.first = first
+        self.last = last
+        self.share = share
+
+    @property
+    def growth(self):
+        return self.last - self.first
+
+    def __str__(self):
+        return (f"{self.metric} {self.first:g} -> {self.last:g} (grew in {self.share:.0%} of the last "
+                f"{GROWTH_WINDOW} resets)")
+
+
+def growth_trend(metric, values, share=GROWTH_SHARE, min_growth=None):
+    """
+    Returns: the GrowthTrend of `values` (oldest first) when they grew steadily and by more than min_growth,
+             otherwise None.
+    """
+    values = [value for value in values if value is not None]
+    if len(values) < 2:
+        return None
+    steps = list(zip(values, values[1:]))
+    grew = sum(1 for before, after in steps if after > before)
+    trend = GrowthTrend(metric, values[0], values[-1], grew / len(steps))
+    minimum = MIN_GROWTH.get(metric, 0) if min_growth is None else min_growth
+    if trend.share >= share and trend.growth > minimum:
+        return trend
+    return None
+
+
+def process_rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/statm", encoding="utf-8") as statm_file:
+            return int(statm_file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def tree_rss_bytes(root_pid):
+    """
+    Returns: the summed resident memory of every descendant of root_pid (not root_pid itself), in bytes.
+    """
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="utf-8", errors="replace") as stat_file:
+                parent = int(stat_file.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+    total = 0
+    pending = list(children.get(root_pid, []))
+    while pending:
+        pid = pending.pop()
+        pending.extend(children.get(pid, []))
+        total += process_rss_bytes(pid)
+    return total
+
+
+class MemoryMonitor:
+    """
+    Samples sessions, keeps their timelines and decides when one should be recycled. See the module description.
+
+    Args:
+        recycle_browser_mb: Browser memory (MB) above which a session is recycled.
+        limits: Dict of metric -> value above which a session is recycled.
+        window: Number of post-reset samples the growth detection looks at.
+        enabled: Sample at all.
+    """
+
+    def __init__(self, recycle_browser_mb=DEFAULT_RECYCLE_BROWSER_MB, limits=None, window=GROWTH_WINDOW,
+                 enabled=True):
+        self.limits = dict(RECYCLE_LIMITS if limits is None else limits, browser_mb=recycle_browser_mb)
+        self.window = window
+        self.enabled = enabled
+        self.samples = []
+        self.recycled = []
+        self._sessions = {}
+        self._tests = {}
+        self._session_count = 0
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def sample(self, driver, step, test=None, collect_garbage=False):
+        """
+        Samples the memory of a session.
+
+        Args:
+            driver: WebDriver of the session.
+            step: Name of the step, e.g. "translation French".
+            test: Id of the running test, by default the one the session was last sampled for.
+            collect_garbage: Collect the garbage of the page first (HeapProfiler.collectGarbage).
+
+        Returns: MemorySample, or None when the monitor is off.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            session = self._sessions.get(id(driver))
+            if session is None:
+                self._session_count += 1
+                session = self._sessions[id(driver)] = self._session_count
+            if test is not None:
+                self._tests[id(driver)] = test
+            test = self._tests.get(id(driver))
+
+        metrics = _page_metrics(driver, collect_garbage)
+        try:
+            metrics["windows"] = len(driver.window_handles)
+        except (AttributeError, WebDriverException):
+            pass
+        process = getattr(getattr(driver, "service", None), "process", None)
+        if process is not None and os.path.isdir("/proc"):
+            metrics["chromedriver_mb"] = round(process_rss_bytes(process.pid) / 2 ** 20, 1) or None
+            metrics["browser_mb"] = round(tree_rss_bytes(process.pid) / 2 ** 20, 1) or None
+
+        sample = MemorySample(session, test, step, round(time.perf_counter() - self._origin, 3), **metrics)
+        with self._lock:
+            self.samples.append(sample)
+        return sample
+
+    def recycle_reason(self, driver):
+        """
+        Returns: why the session should be recycled (a limit crossed by its last sample, or steady growth after
+                 its resets), or None.
+        """
+        session = self._sessions.get(id(driver))
+        if session is None:
+            return None
+        with self._lock:
+            samples = [sample for sample in self.samples if sample.session == session]
+        if not samples:
+            return None
+        for metric, limit in self.limits.items():
+            value = getattr(samples[-1], metric)
+            if limit is not None and value is not None and value > limit:
+                return f"{metric} {value:g} over {limit:g}"
+        trends = self.growth(driver)
+        return "; ".join(map(str, trends)) if trends else None
+
+    def growth(self, driver):
+        """
+        Returns: list of GrowthTrend, the metrics that grew steadily over the last `window` resets of the session.
+        """
+        session = self._sessions.get(id(driver))
+        with self._lock:
+            resets = [sample for sample in self.samples if sample.session == session and sample.step == RESET]
+        resets = resets[-self.window:]
+        if len(resets) < self.window:
+            return []
+        trends = (growth_trend(metric, [getattr(sample, metric) for sample in resets]) for metric in METRICS)
+        return [trend for trend in trends if trend is not None]
+
+    def recycle(self, driver, reason):
+        """
+        Records that the session is being recycled and forgets it.
+        """
+        with self._lock:
+            self.recycled.append((self._sessions.get(id(driver)), self._tests.get(id(driver)), reason))
+        self.forget(driver)
+
+    def forget(self, driver):
+        with self._lock:
+            self._sessions.pop(id(driver), None)
+            self._tests.pop(id(driver), None)
+
+    def timeline(self, test):
+        """
+        Returns: the samples of one test, in order.
+        """
+        with self._lock:
+            return [sample for sample in self.samples if sample.test == test]
+
+    def export_csv(self, path, append=False):
+        new_file = not (append and os.path.exists(path))
+        with open(path, "a" if append else "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.writer(csv_file)
+            if new_file:
+                writer.writerow(("session", "test", "step", "seconds") + METRICS)
+            with self._lock:
+                samples = list(self.samples)
+            for sample in samples:
+                writer.writerow([sample.session, sample.test or "", sample.step, sample.seconds] +
+                                ["" if value is None else value for value in sample.metrics().values()])
+
+    def report(self):
+        """
+        Returns: text summary: the sessions, the recycled ones and the memory each test left behind.
+        """
+        with self._lock:
+            samples = list(self.samples)
+            recycled = list(self.recycled)
+        sessions = len({sample.session for sample in samples})
+        lines = [f"Memory monitor: {len(samples)} samples of {sessions} sessions, {len(recycled)} recycled"]
+        lines.extend(f"  recycled session {session} after {test}: {reason}" for session, test, reason in recycled)
+        by_test = {}
+        for sample in samples:
+            if sample.test is not None:
+                by_test.setdefault(sample.test, []).append(sample)
+        for test, test_samples in by_test.items():
+            first, last = test_samples[0], test_samples[-1]
+            changes = []
+            for metric in ("js_heap_mb", "dom_nodes", "browser_mb"):
+                before, after = getattr(first, metric), getattr(last, metric)
+                if before is not None and after is not None:
+                    changes.append(f"{metric} {after - before:+g}")
+            if changes:
+                lines.append(f"  {test}: {', '.join(changes)} over {len(test_samples)} samples")
+        return "\n".join(lines)
+
+
+def _page_metrics(driver, collect_garbage):
+    metrics = {}
+    try:
+        if collect_garbage:
+            driver.execute_cdp_cmd("HeapProfiler.collectGarbage", {})
+        heap = driver.execute_cdp_cmd("Runtime.getHeapUsage", {})
+        counters = driver.execute_cdp_cmd("Memory.getDOMCounters", {})
+        metrics["js_heap_mb"] = round(heap["usedSize"] / 2 ** 20, 2)
+        metrics["dom_nodes"] = counters["nodes"]
+        metrics["documents"] = counters["documents"]
+        metrics["listeners"] = counters["jsEventListeners"]
+        return metrics
+    except (AttributeError, KeyError, TypeError, WebDriverException):
+        pass
+    try:
+        counts = driver.execute_script(DOM_COUNTERS_SCRIPT)
+    except (AttributeError, WebDriverException):
+        return metrics
+    if counts:
+        metrics["js_heap_mb"] = round(counts["heap"] / 2 ** 20, 2) if counts.get("heap") else None
+        metrics["dom_nodes"] = counts.get("nodes")
+        metrics["documents"] = counts.get("documents")
+    return metrics
+
+
+_shared_monitor = None
+_shared_monitor_lock = threading.Lock()
+
+
+def get_memory_monitor():
+    """
+    Returns the process-wide MemoryMonitor, used by the shared DriverPool.
+    """
+    global _shared_monitor
+    with _shared_monitor_lock:
+        if _shared_monitor is None:
+            _shared_monitor = MemoryMonitor(int(os.environ.get(RECYCLE_BROWSER_MB_ENV, DEFAULT_RECYCLE_BROWSER_MB)),
+                                            enabled=os.environ.get(MEMORY_MONITOR_ENV, "1") != "0")
+            register_report(_export_report, _forget_monitor)
+        return _shared_monitor
+
+
+def _forget_monitor():
+    global _shared_monitor
+    _shared_monitor = None
+
+
+def _export_report():
+    if _shared_monitor is None or not _shared_monitor.samples:
+        return
+    print(_shared_monitor.report())
+    memory_dir = os.environ.get(MEMORY_DIR_ENV)
+    if memory_dir:
+        os.makedirs(memory_dir, exist_ok=True)
+        # Appended, a flush in the middle of the run forgets the samples it exported.
+        _shared_monitor.export_csv(os.path.join(memory_dir, f"memory-{os.getpid()}.csv"), append=True)
@@ -0,0 +1,563 @@
+import argparse
+import asyncio
+import base64
+import fnmatch
+import hashlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+from urllib.parse import urlsplit
+from selenium.common.exceptions import WebDriverException
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+from Infrastructure.Instrumentation import TRACER
+from Infrastructure.Reports import register_report
+from Infrastructure.SiteConfig import origin_host
+
+#====== SWITCHES ======
+NETWORK_PROFILE_ENV = "NETWORK_PROFILE"
+NETWORK_THROTTLING_ENV = "NETWORK_THROTTLING"
+FONT_CACHE_DIR_ENV = "FONT_CACHE_DIR"
+DEFAULT_FONT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache",
+                                      "fonts")
+PROFILE_LABEL = "network profile"
+
+#====== PROFILE NAMES ======
+FULL = "full"
+SEARCH = "search"
+TEXT = "text"
+LAYOUT = "layout"
+
+#====== REQUEST FILTERS ======
+SITE_DOMAINS = ("react.dev",)
+DOCSEARCH_DOMAINS = ("algolia.net", "algolianet.com")
+ANALYTICS_PATTERNS = ("*://*.google-analytics.com/*", "*://*.googletagmanager.com/*", "*/_vercel/insights/*",
+                      "*/_vercel/speed-insights/*")
+# Without request interception (no DevTools WebSocket), resource types can only be blocked by URL.
+TYPE_URL_PATTERNS = {
+    "Image": ("*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.ico"),
+    "Media": ("*.mp4", "*.webm", "*.ogg", "*.mp3"),
+    "Font": ("*.woff2", "*.woff", "*.ttf", "*.otf"),
+}
+BLOCKED_REASON = "BlockedByClient"
+CACHED_FONT_HEADERS = ("content-type", "access-control-allow-origin")
+
+#====== THROTTLING PRESETS ======
+# (latency ms, download kbit/s, upload kbit/s), the DevTools and Lighthouse presets.
+THROTTLING_PRESETS = {
+    "slow-3g": (2000, 400, 400),
+    "fast-3g": (562.5, 1440, 675),
+    "slow-4g": (150, 1600, 750),
+}
+NO_THROTTLING = {"offline": False, "latency": 0, "downloadThroughput": -1, "uploadThroughput": -1}
+
+#====== BENCHMARK ======
+DEFAULT_ITERATIONS = 5
+ASSET_DELAY = 0.05
+THIRD_PARTY_DELAY = 0.3
+IMAGE_COUNT = 6
+IMAGE_BYTES = 64 * 1024
+FONT_BYTES = 48 * 1024
+LOAD_TIMING_SCRIPT = """
+var navigation = performance.getEntriesByType('navigation')[0];
+var resources = performance.getEntriesByType('resource');
+return {load_ms: navigation.loadEventEnd - navigation.startTime, resources: resources.length,
+        bytes: resources.reduce(function (total, entry) { return total + entry.transferSize; }, 0)};
+"""
+
+"""
+Per-suite network profiles: what a page may download, and how fast.
+
+A profile blocks requests by resource type (images, media, fonts), by URL pattern (analytics) and, optionally,
+every request to a host that is not first party for the suite. Fonts can be served from a disk cache instead of
+the network (.cache/fonts, FONT_CACHE_DIR to move it). Any profile can be combined with a throttling preset
+(Network.emulateNetworkConditions) for latency experiments.
+
+On a pooled session with a DevTools WebSocket (see AsyncDriver), the profile intercepts every request of the tab
+with the Fetch domain: blocked requests fail as "blocked by client", cached fonts are fulfilled from disk and new
+fonts are stored on their way in. Without the WebSocket, only the URL patterns and resource types are blocked
+(Network.setBlockedURLs) and fonts are not cached. The pool removes the profile when the lease is released.
+
+NETWORK_PROFILE=<name> runs every suite under that profile (NETWORK_PROFILE=full turns the blocking off),
+NETWORK_THROTTLING=<preset> throttles every suite. The profile is labelled on the test in the Instrumentation
+spans, so the test timings are reported per profile.
+
+Benchmark of the page-load savings per profile on the local fixture server (from the `test` folder):
+    python -m Infrastructure.NetworkProfiles -n 5
+    python -m Infrastructure.NetworkProfiles --throttling fast-3g full search
+"""
+
+
+class NetworkProfile:
+    """
+    What the pages of a suite may download.
+
+    Args:
+        name: Name shown in the reports.
+        block_third_party: Block every request to a host outside first_party.
+        blocked_types: DevTools resource types to block, e.g. ("Image", "Media").
+        blocked_urls: URL wildcard patterns to block, e.g. ANALYTICS_PATTERNS.
+        font_cache: Serve fonts from the font cache.
+        throttling: Name of a THROTTLING_PRESETS entry, or None.
+        first_party: Domains (and their subdomains) of the suite. Hosts mapped to localhost by SiteConfig count as
+                     the live host they stand for.
+    """
+
+    def __init__(self, name, block_third_party=False, blocked_types=(), blocked_urls=(), font_cache=False,
+                 throttling=None, first_party=SITE_DOMAINS):
+        if throttling is not None and throttling not in THROTTLING_PRESETS:
+            raise ValueError(f"Unknown throttling preset {throttling!r}, expected one of {sorted(THROTTLING_PRESETS)}")
+        self.name = name
+        self.block_third_party = block_third_party
+        self.blocked_types = tuple(blocked_types)
+        self.blocked_urls = tuple(blocked_urls)
+        self.font_cache = font_cache
+        self.throttling = throttling
+        self.first_party = tuple(first_party)
+
+    @property
+    def intercepts(self):
+        return bool(self.block_third_party or self.blocked_types or self.blocked_urls or self.font_cache)
+
+    def throttled(self, preset):
+        """
+        Returns: a copy of the profile with the throttling preset, named "<name>+<preset>".
+        """
+        return NetworkProfile(f"{self.name}+{preset}", self.block_third_party, self.blocked_types,
+                              self.blocked_urls, self.font_cache, preset, self.first_party)
+
+    def with_first_party(self, *domains):
+        """
+        Returns: a copy of the profile that also counts `domains` as first party (e.g. a fixture server).
+        """
+        return NetworkProfile(self.name, self.block_third_party, self.blocked_types, self.blocked_urls,
+                              self.font_cache, self.throttling, self.first_party + domains)
+
+    def is_third_party(self, url):
+        host = urlsplit(url).hostname
+        if not host:
+            return False
+        host = origin_host(host)
+        return not any(host == domain or host.endswith("." + domain) for domain in self.first_party)
+
+    def blocks(self, url, resource_type, main_frame=False):
+        """
+        Args:
+            main_frame: The request is a navigation of the tab itself, which is never blocked as third party.
+
+        Returns: why the request is blocked ("third-party", the resource type or "url"), or None.
+        """
+        if url.startswith("data:"):
+            return None
+        if resource_type in self.blocked_types:
+            return resource_type
+        if any(fnmatch.fnmatchcase(url, pattern) for pattern in self.blocked_urls):
+            return "url"
+        if self.block_third_party and not main_frame and self.is_third_party(url):
+            return "third-party"
+        return None
+
+    def url_patterns(self):
+        """
+        The blocking rules that can be written as URL patterns, for sessions without request interception.
+        """
+        patterns = list(self.blocked_urls)
+        for resource_type in self.blocked_types:
+            patterns.extend(TYPE_URL_PATTERNS.get(resource_type, ()))
+        return patterns
+
+    def conditions(self):
+        """
+        Returns: the parameters of Network.emulateNetworkConditions for the throttling preset.
+        """
+        if self.throttling is None:
+            return dict(NO_THROTTLING)
+        latency, download_kbps, upload_kbps = THROTTLING_PRESETS[self.throttling]
+        return {"offline": False, "latency": latency, "downloadThroughput": download_kbps * 1000 / 8,
+                "uploadThroughput": upload_kbps * 1000 / 8}
+
+
+PROFILES = {
+    FULL: NetworkProfile(FULL),
+    SEARCH: NetworkProfile(SEARCH, block_third_party=True, blocked_types=("Image", "Media"),
+                           blocked_urls=ANALYTICS_PATTERNS, font_cache=True,
+                           first_party=SITE_DOMAINS + DOCSEARCH_DOMAINS),
+    TEXT: NetworkProfile(TEXT, block_third_party=True, blocked_types=("Image", "Media", "Font"),
+                         blocked_urls=ANALYTICS_PATTERNS),
+    LAYOUT: NetworkProfile(LAYOUT, blocked_urls=ANALYTICS_PATTERNS, font_cache=True),
+}
+
+
+def get_profile(name, throttling=None):
+    """
+    Args:
+        name: Name of a PROFILES entry.
+        throttling: Name of a THROTTLING_PRESETS entry, or None.
+
+    Returns: NetworkProfile
+    """
+    if name not in PROFILES:
+        raise ValueError(f"Unknown network profile {name!r}, expected one of {sorted(PROFILES)}")
+    profile = PROFILES[name]
+    return profile.throttled(throttling) if throttling else profile
+
+
+class FontCache:
+    """
+    Fonts by URL on disk: the body (base64, as the Fetch domain wants it) and the headers a font response needs.
+    """
+
+    def __init__(self, root=DEFAULT_FONT_CACHE_DIR):
+        self.root = root
+
+    def get(self, url):
+        """
+        Returns: (headers dict, base64 body), or None when the font is not cached.
+        """
+        try:
+            with open(self._path(url), encoding="utf-8") as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+        return entry["headers"], entry["body"]
+
+    def put(self, url, headers, body):
+        path = self._path(url)
+        os.makedirs(self.root, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as entry_file:
+            json.dump({"url": url, "headers": headers, "body": body}, entry_file)
+        os.replace(temp_path, path)
+
+    def _path(self, url):
+        return os.path.join(self.root, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+
+class ProfileStats:
+    """
+    What a profile did, over every session it was applied to.
+    """
+
+    def __init__(self):
+        self.sessions = 0
+        self.requests = 0
+        self.blocked = {}
+        self.fonts_from_cache = 0
+        self.fonts_stored = 0
+
+    def describe(self):
+        blocked = ", ".join(f"{count} {reason}" for reason, count in sorted(self.blocked.items()))
+        return (f"{self.sessions} sessions, {self.requests} requests intercepted, "
+                f"{sum(self.blocked.values())} blocked ({blocked or 'none'}), {self.fonts_from_cache} fonts from "
+                f"cache, {self.fonts_stored} fonts cached")
+
+
+PROFILE_STATS = {}
+
+
+class RequestInterceptor:
+    """
+    Decides every request of one tab under a profile (Fetch.requestPaused events): fail, fulfill from the font
+    cache or continue. Fonts that are not cached yet are also paused at the response stage, to store them.
+    Runs on the event loop of the tab.
+    """
+
+    def __init__(self, tab, profile, font_cache, stats):
+        self.tab = tab
+        self.profile = profile
+        self.font_cache = font_cache
+        self.stats = stats
+        self._unsubscribe = None
+        self._tasks = set()
+
+    async def start(self):
+        patterns = [{"urlPattern": "*", "requestStage": "Request"}]
+        if self.profile.font_cache:
+            patterns.append({"urlPattern": "*", "resourceType": "Font", "requestStage": "Response"})
+        self._unsubscribe = self.tab.on("Fetch.requestPaused", self._paused)
+        await self.tab.send("Fetch.enable", {"patterns": patterns})
+
+    async def stop(self):
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+        await self.tab.send("Fetch.disable")
+
+    def _paused(self, params):
+        task = asyncio.ensure_future(self.resolve(params))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def resolve(self, params):
+        request_id = params["requestId"]
+        try:
+            if "responseStatusCode" in params or "responseErrorReason" in params:
+                await self._store_font(params)
+                await self.tab.send("Fetch.continueRequest", {"requestId": request_id})
+                return
+            self.stats.requests += 1
+            url = params["request"]["url"]
+            resource_type = params.get("resourceType")
+            main_frame = resource_type == "Document" and params.get("frameId") == self.tab.target_id
+            reason = self.profile.blocks(url, resource_type, main_frame)
+            if reason is not None:
+                self.stats.blocked[reason] = self.stats.blocked.get(reason, 0) + 1
+                await self.tab.send("Fetch.failRequest", {"requestId": request_id, "errorReason": BLOCKED_REASON})
+                return
+            cached = self.font_cache.get(url) if self.profile.font_cache and resource_type == "Font" else None
+            if cached is not None:
+                headers, body = cached
+                self.stats.fonts_from_cache += 1
+                await self.tab.send("Fetch.fulfillRequest", {
+                    "requestId": request_id, "responseCode": 200, "body": body,
+                    "responseHeaders": [{"name": name, "value": value} for name, value in headers.items()]})
+                return
+            await self.tab.send("Fetch.continueRequest", {"requestId": request_id})
+        except WebDriverException:
+            # The request went away with its page (navigation, closed tab).
+            pass
+
+    async def _store_font(self, params):
+        if params.get("responseStatusCode") != 200:
+            return
+        response = await self.tab.send("Fetch.getResponseBody", {"requestId": params["requestId"]})
+        body = response["body"]
+        if not response.get("base64Encoded"):
+            body = base64.b64encode(body.encode("utf-8")).decode("ascii")
+        headers = {header["name"].lower(): header["value"] for header in params.get("responseHeaders", [])
+                   if header["name"].lower() in CACHED_FONT_HEADERS}
+        self.font_cache.put(params["request"]["url"], headers, body)
+        self.stats.fonts_stored += 1
+
+
+class ActiveProfile:
+    """
+    A profile applied to a session (`driver.network_profile`); remove() puts the network back to normal.
+    """
+
+    def __init__(self, driver, profile, interceptor):
+        self.driver = driver
+        self.profile = profile
+        self.interceptor = interceptor
+
+    def remove(self):
+        if getattr(self.driver, "network_profile", None) is self:
+            self.driver.network_profile = None
+        try:
+            if self.interceptor is not None:
+                self.driver.cdp_bridge.run(self.interceptor.stop())
+            elif self.profile.url_patterns():
+                self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": []})
+            if self.profile.throttling is not None:
+                self.driver.execute_cdp_cmd("Network.emulateNetworkConditions", dict(NO_THROTTLING))
+        except WebDriverException:
+            pass
+
+
+def apply_profile(driver, profile, font_cache=None):
+    """
+    Applies a profile to the current tab of a session, replacing the profile it had.
+
+    Args:
+        driver: WebDriver, intercepted over its DevTools WebSocket when it has one (see AsyncDriver).
+        profile: NetworkProfile.
+        font_cache: FontCache, by default the one under FONT_CACHE_DIR.
+
+    Returns: the ActiveProfile, or None when the browser has no DevTools (the network is left as it is).
+    """
+    previous = getattr(driver, "network_profile", None)
+    if previous is not None:
+        previous.remove()
+    bridge = getattr(driver, "cdp_bridge", None)
+    stats = PROFILE_STATS.setdefault(profile.name, ProfileStats())
+    interceptor = None
+    try:
+        if profile.throttling is not None:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.emulateNetworkConditions", profile.conditions())
+        if bridge is not None and profile.intercepts:
+            tab = bridge.current_tab()
+            interceptor = RequestInterceptor(tab, profile, font_cache or get_font_cache(), stats)
+            bridge.run(interceptor.start())
+        elif profile.url_patterns():
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": profile.url_patterns()})
+    except (AttributeError, WebDriverException):
+        return None
+    stats.sessions += 1
+    driver.network_profile = ActiveProfile(driver, profile, interceptor)
+    return driver.network_profile
+
+
+def apply_suite_profile(driver, name):
+    """
+    Applies the profile of a suite, unless NETWORK_PROFILE names another one, with the NETWORK_THROTTLING preset,
+    and labels the running test with it.
+
+    Returns: the ActiveProfile, or None.
+    """
+    profile = get_profile(os.environ.get(NETWORK_PROFILE_ENV) or name, os.environ.get(NETWORK_THROTTLING_ENV) or None)
+    TRACER.label(PROFILE_LABEL, profile.name)
+    if not profile.intercepts and profile.throttling is None:
+        return None
+    return apply_profile(driver, profile)
+
+
+_shared_font_cache = None
+_shared_font_cache_lock = threading.Lock()
+
+
+def get_font_cache():
+    global _shared_font_cache
+    with _shared_font_cache_lock:
+        if _shared_font_cache is None:
+            _shared_font_cache = FontCache(os.environ.get(FONT_CACHE_DIR_ENV) or DEFAULT_FONT_CACHE_DIR)
+        return _shared_font_cache
+
+
+def profile_report():
+    lines = ["Network profiles:"]
+    lines.extend(f"  {name}: {stats.describe()}" for name, stats in sorted(PROFILE_STATS.items()))
+    return "\n".join(lines)
+
+
+def _print_profile_report():
+    if any(stats.sessions for stats in PROFILE_STATS.values()):
+        print(profile_report())
+
+
+register_report(_print_profile_report, PROFILE_STATS.clear)
+
+
+class ProfileFixture:
+    """
+    A page with what slows real pages down, on the local fixture server: a web font, images, a video poster and
+    a third-party analytics script and embed. The third party is a second FixtureServer reached as "localhost",
+    so its host differs from the page's.
+    """
+
+    def __init__(self):
+        self.third_party = FixtureServer({
+            "/analytics.js": FixtureResponse("window.analytics = true;", content_type="text/javascript",
+                                             delay=THIRD_PARTY_DELAY),
+            "/embed": FixtureResponse("<html><body>video</body></html>", delay=THIRD_PARTY_DELAY),
+            "/thumbnail.jpg": FixtureResponse(os.urandom(IMAGE_BYTES), content_type="image/jpeg",
+                                              delay=THIRD_PARTY_DELAY),
+        })
+        self.site = FixtureServer({
+            "/fonts/display.woff2": FixtureResponse(os.urandom(FONT_BYTES), content_type="font/woff2",
+                                                    delay=ASSET_DELAY),
+            "/poster.webm": FixtureResponse(os.urandom(IMAGE_BYTES), content_type="video/webm", delay=ASSET_DELAY),
+        })
+        for index in range(IMAGE_COUNT):
+            self.site.add(f"/images/{index}.png", FixtureResponse(os.urandom(IMAGE_BYTES), content_type="image/png",
+                                                                  delay=ASSET_DELAY))
+
+    @property
+    def first_party(self):
+        return urlsplit(self.site.base_url).hostname
+
+    def url(self):
+        return self.site.url("/")
+
+    def start(self):
+        self.third_party.start()
+        self.site.start()
+        third_party = self.third_party.base_url.replace(urlsplit(self.third_party.base_url).hostname, "localhost")
+        images = "".join(f'<img src="/images/{index}.png">' for index in range(IMAGE_COUNT))
+        self.site.add("/", FixtureResponse(f"""<!DOCTYPE html><html lang="en"><head><title>Profiles</title>
+<style>@font-face {{ font-family: Display; src: url(/fonts/display.woff2) format("woff2"); }}
+body {{ font-family: Display, sans-serif; }}</style>
+<script src="{third_party}/analytics.js"></script></head><body><h1>React</h1>{images}
+<video poster="{third_party}/thumbnail.jpg" src="/poster.webm" preload="auto"></video>
+<iframe src="{third_party}/embed"></iframe></body></html>"""))
+        return self
+
+    def stop(self):
+        self.site.stop()
+        self.third_party.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class ProfileLoads:
+    """
+    The page loads of one profile: load event times (ms), resources loaded and bytes transferred.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.load_ms = []
+        self.resources = []
+        self.bytes = []
+
+    @property
+    def median_ms(self):
+        return statistics.median(self.load_ms)
+
+
+def benchmark_profiles(driver, url, profiles, iterations=DEFAULT_ITERATIONS, font_cache=None):
+    """
+    Loads `url` under every profile `iterations` times (interleaved, after one warm-up load each that also fills
+    the font cache), with the HTTP cache of the browser disabled.
+
+    Returns: list of ProfileLoads, in the order of profiles.
+    """
+    results = [ProfileLoads(profile.name) for profile in profiles]
+    driver.execute_cdp_cmd("Network.setCacheDisabled", {"cacheDisabled": True})
+    try:
+        for iteration in range(iterations + 1):
+            for profile, loads in zip(profiles, results):
+                apply_profile(driver, profile, font_cache)
+                driver.get(url)
+                timing = driver.execute_script(LOAD_TIMING_SCRIPT)
+                if iteration:
+                    loads.load_ms.append(timing["load_ms"])
+                    loads.resources.append(timing["resources"])
+                    loads.bytes.append(timing["bytes"])
+    finally:
+        active = getattr(driver, "network_profile", None)
+        if active is not None:
+            active.remove()
+        driver.execute_cdp_cmd("Network.setCacheDisabled", {"cacheDisabled": False})
+    return results
+
+
+def savings_report(results):
+    """
+    Returns: the median load time of every profile and its saving against the first one.
+    """
+    baseline = results[0].median_ms
+    lines = [f"Page load per network profile (saving against {results[0].name}):"]
+    for loads in results:
+        saving = (baseline - loads.median_ms) / baseline if baseline else 0.0
+        lines.append(f"  {loads.name}: {loads.median_ms:.0f}ms median load, {statistics.median(loads.resources):.0f} "
+                     f"resources, {statistics.median(loads.bytes) / 1024:.0f} KB, {saving:+.0%}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the page-load savings of the network profiles.")
+    parser.add_argument("profiles", nargs="*", default=list(PROFILES), help="profile names, the first is the baseline")
+    parser.add_argument("-n", "--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--throttling", choices=sorted(THROTTLING_PRESETS), default=None)
+    args = parser.parse_args(argv)
+
+    with ProfileFixture() as fixture, tempfile.TemporaryDirectory() as font_dir:
+        profiles = [get_profile(name, args.throttling).with_first_party(fixture.first_party)
+                    for name in args.profiles]
+        with get_driver_pool().lease("network profiles benchmark") as lease:
+            results = benchmark_profiles(lease.driver, fixture.url(), profiles, args.iterations, FontCache(font_dir))
+    print(savings_report(results))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
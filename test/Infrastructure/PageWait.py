@@ -0,0 +1,208 @@
+import time
+from selenium.common.exceptions import TimeoutException
+from Infrastructure.Reports import register_report
+
+#====== POLLING ======
+DEFAULT_TIMEOUT = 10
+FIRST_POLL_INTERVAL = 0.02
+MAX_POLL_INTERVAL = 0.5
+POLL_BACKOFF = 1.5
+
+#====== QUIET PERIODS (ms) ======
+NETWORK_IDLE_MS = 500
+DOM_QUIET_MS = 300
+BLANK_PAGE = "about:blank"
+# Resource Timing keeps 250 entries by default and drops the later ones, which would freeze the last response end.
+RESOURCE_TIMING_BUFFER_SIZE = 10000
+
+#====== SCRIPTS ======
+PAGE_STATE_SCRIPT = "return [location.href, document.readyState];"
+NETWORK_STATE_SCRIPT = """
+performance.setResourceTimingBufferSize(arguments[0]);
+var entries = performance.getEntriesByType('resource');
+var lastEnd = 0;
+for (var i = 0; i < entries.length; i++) {
+    lastEnd = Math.max(lastEnd, entries[i].responseEnd);
+}
+return [entries.length, performance.now() - lastEnd];
+"""
+DOM_QUIET_SCRIPT = """
+var quietMs = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+var root = document.body || document.documentElement;
+var start = performance.now(), timer = null;
+var observer = new MutationObserver(restart);
+function finish(quiet) {
+    observer.disconnect();
+    clearTimeout(timer);
+    done(quiet);
+}
+function restart() {
+    clearTimeout(timer);
+    if (performance.now() - start > timeoutMs) { finish(false); return; }
+    timer = setTimeout(function () { finish(true); }, quietMs);
+}
+observer.observe(root, {childList: true, subtree: true, attributes: true, characterData: true});
+restart();
+"""
+# Focus also moves when it leaves the document (TAB past the last element): focusout without a focusin, after
+# which activeElement is the body (or null).
+FOCUS_LISTEN_SCRIPT = """
+window.__pageWaitFocus = false;
+window.__pageWaitFocusDone = null;
+function moved() {
+    if (window.__pageWaitFocus) { return; }
+    window.__pageWaitFocus = true;
+    if (window.__pageWaitFocusDone) { window.__pageWaitFocusDone(); }
+}
+document.addEventListener('focusin', moved, {once: true, capture: true});
+document.addEventListener('focusout', function () {
+    setTimeout(function () {
+        var active = document.activeElement;
+        if (!active || active === document.body || !document.hasFocus()) { moved(); }
+    }, 0);
+}, {once: true, capture: true});
+"""
+FOCUS_WAIT_SCRIPT = """
+var timeoutMs = arguments[0], done = arguments[arguments.length - 1];
+if (window.__pageWaitFocus) { done(true); return; }
+var timer = setTimeout(function () { done(false); }, timeoutMs);
+window.__pageWaitFocusDone = function () { clearTimeout(timer); done(true); };
+"""
+
+WAIT_TIMINGS = []
+
+
+class WaitTiming:
+    """
+    How long one wait really took, so the report shows the actual latency of each page.
+    """
+
+    def __init__(self, kind, label, seconds, polls, timed_out):
+        self.kind = kind
+        self.label = label
+        self.seconds = seconds
+        self.polls = polls
+        self.timed_out = timed_out
+
+
+class PageWait:
+    """
+    Event driven replacement for fixed time.sleep() calls.
+
+    Every wait resolves as soon as the real signal arrives (document ready, network idle, DOM quiet,
+    focus moved) instead of sleeping a fixed time. Polling waits start with a short interval and back off,
+    so fast pages resolve almost immediately and slow pages do not flood the driver with commands.
+    Every wait is recorded in WAIT_TIMINGS.
+    """
+
+    def __init__(self, driver, timeout=DEFAULT_TIMEOUT):
+        self.driver = driver
+        self.timeout = timeout
+
+    def until(self, condition, label="condition", kind="until", timeout=None):
+        """
+        Polls condition(driver) with an adaptive interval until it returns a truthy value.
+
+        Args:
+            condition: Callable that receives the driver.
+            label: Name of the wait in the timings report.
+            kind: Type of the wait in the timings report.
+            timeout: Seconds before TimeoutException is raised (defaults to the PageWait timeout).
+
+        Returns: The truthy value returned by the condition.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        interval = FIRST_POLL_INTERVAL
+        polls = 0
+        while True:
+            polls += 1
+            value = condition(self.driver)
+            elapsed = time.perf_counter() - start
+            if value:
+                _record(kind, label, elapsed, polls, False)
+                return value
+            if elapsed >= timeout:
+                _record(kind, label, elapsed, polls, True)
+                raise TimeoutException(f"Timed out after {timeout}s waiting for {label}")
+            time.sleep(min(interval, timeout - elapsed))
+            interval = min(interval * POLL_BACKOFF, MAX_POLL_INTERVAL)
+
+    def ready_state(self, label="page"):
+        """
+        Waits until the current window left about:blank and document.readyState is "complete".
+        """
+        def loaded(driver):
+            href, state = driver.execute_script(PAGE_STATE_SCRIPT)
+            return href != BLANK_PAGE and state == "complete"
+        return self.until(loaded, label, "ready_state")
+
+    def network_idle(self, label="page", idle_ms=NETWORK_IDLE_MS):
+        """
+        Waits until no resource request finished during the last `idle_ms` milliseconds
+        (based on the Resource Timing entries of the page, whose buffer is raised to RESOURCE_TIMING_BUFFER_SIZE
+        on the first poll so pages with many resources keep recording them).
+        """
+        def idle(driver):
+            _, since_last_response = driver.execute_script(NETWORK_STATE_SCRIPT, RESOURCE_TIMING_BUFFER_SIZE)
+            return since_last_response >= idle_ms
+        return self.until(idle, label, "network_idle")
+
+    def page_load(self, label="page"):
+        """
+        Waits for a page to be fully loaded: ready state first, then network idle.
+        """
+        self.ready_state(label)
+        self.network_idle(label)
+
+    def dom_quiet(self, label="dom", quiet_ms=DOM_QUIET_MS):
+        """
+        Waits (inside the page) until the DOM had no mutations for `quiet_ms` milliseconds.
+        """
+        start = time.perf_counter()
+        quiet = self.driver.execute_async_script(DOM_QUIET_SCRIPT, quiet_ms, self.timeout * 1000)
+        _record("dom_quiet", label, time.perf_counter() - start, 1, not quiet)
+        if not quiet:
+            raise TimeoutException(f"DOM of {label} kept changing for {self.timeout}s")
+
+    def focus_change(self, action, label="focus"):
+        """
+        Runs `action` (e.g. sending TAB) and waits for the resulting focusin event,
+        instead of sleeping after every key press. Focus leaving the document (activeElement back to the body)
+        counts as a change too.
+        """
+        start = time.perf_counter()
+        self.driver.execute_script(FOCUS_LISTEN_SCRIPT)
+        action()
+        moved = self.driver.execute_async_script(FOCUS_WAIT_SCRIPT, self.timeout * 1000)
+        _record("focus_change", label, time.perf_counter() - start, 1, not moved)
+        if not moved:
+            raise TimeoutException(f"Focus did not move after {label}")
+
+
+def _record(kind, label, seconds, polls, timed_out):
+    WAIT_TIMINGS.append(WaitTiming(kind, label, seconds, polls, timed_out))
+
+
+def wait_report():
+    """
+    Returns a text summary of all the waits: total and slowest wait per kind.
+    """
+    by_kind = {}
+    for timing in WAIT_TIMINGS:
+        by_kind.setdefault(timing.kind, []).append(timing)
+    lines = [f"Waits: {len(WAIT_TIMINGS)} total, {sum(t.seconds for t in WAIT_TIMINGS):.2f}s"]
+    for kind, timings in sorted(by_kind.items()):
+        slowest = max(timings, key=lambda timing: timing.seconds)
+        timeouts = sum(1 for timing in timings if timing.timed_out)
+        lines.append(f"  {kind}: {len(timings)} x avg {sum(t.seconds for t in timings) / len(timings):.3f}s, "
+                     f"slowest {slowest.seconds:.3f}s ({slowest.label}), {timeouts} timeouts")
+    return "\n".join(lines)
+
+
+def _print_wait_report():
+    if WAIT_TIMINGS:
+        print(wait_report())
+
+
+register_report(_print_wait_report, WAIT_TIMINGS.clear)
@@ -0,0 +1,226 @@
+from html.parser import HTMLParser
+import numpy as np
+from Infrastructure import EmbeddingModel
+
+#====== EXTRACTION ======
+DEFAULT_SECTION_TAG = "main"
+PARAGRAPH_TAG = "p"
+SKIPPED_TAGS = ("script", "style", "template", "noscript")
+VOID_TAGS = ("area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr")
+
+#====== ALIGNMENT ======
+DEFAULT_BAND = 20
+ROW_CHUNK = 256
+MISSING_THRESHOLD = 0.4
+OK = "ok"
+MISSING = "missing"
+UNTRANSLATED = "untranslated"
+
+
+class Paragraph:
+    """
+    One non empty <p> of a page: its position, the CSS path to it and its whitespace normalized text.
+    """
+
+    def __init__(self, index, path, text):
+        self.index = index
+        self.path = path
+        self.text = text
+
+    def __repr__(self):
+        return f"Paragraph({self.index}, {self.path!r}, {self.text[:40]!r})"
+
+
+class ParagraphExtractor(HTMLParser):
+    """
+    Streaming <p> extractor: feed() the HTML in chunks and take the finished paragraphs with pop_paragraphs().
+    Only the current paragraph is kept in memory, so very long pages are never held as one string.
+    """
+
+    def __init__(self, section=DEFAULT_SECTION_TAG):
+        super().__init__(convert_charrefs=True)
+        self.section = section
+        self.section_seen = False
+        self._stack = [("", {})]
+        self._skip_depth = 0
+        self._paragraph_depth = None
+        self._paragraph_path = None
+        self._paragraph_in_section = False
+        self._text = []
+        self._done = []
+        self._count = 0
+
+    def handle_starttag(self, tag, attrs):
+        counts = self._stack[-1][1]
+        counts[tag] = counts.get(tag, 0) + 1
+        step = f"{tag}:nth-of-type({counts[tag]})" if counts[tag] > 1 else tag
+        if tag in VOID_TAGS:
+            return
+        self._stack.append((tag, {}, step))
+        if tag == self.section:
+            self.section_seen = True
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag == PARAGRAPH_TAG and self._paragraph_depth is None:
+            self._paragraph_depth = len(self._stack)
+            self._paragraph_path = " > ".join(entry[2] for entry in self._stack[1:])
+            self._paragraph_in_section = any(entry[0] == self.section for entry in self._stack)
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if tag not in (entry[0] for entry in self._stack[1:]):
+            return
+        while len(self._stack) > 1:
+            closed = self._stack.pop()[0]
+            if closed in SKIPPED_TAGS:
+                self._skip_depth -= 1
+            if self._paragraph_depth is not None and len(self._stack) < self._paragraph_depth:
+                self._finish_paragraph()
+            if closed == tag:
+                break
+
+    def handle_data(self, data):
+        if self._paragraph_depth is not None and not self._skip_depth:
+            self._text.append(data)
+
+    def pop_paragraphs(self):
+        """
+        Returns the paragraphs finished since the last call as (paragraph, inside_section) pairs.
+        """
+        done, self._done = self._done, []
+        return done
+
+    def _finish_paragraph(self):
+        text = " ".join("".join(self._text).split())
+        if text:
+            self._done.append((Paragraph(self._count, self._paragraph_path, text), self._paragraph_in_section))
+            self._count += 1
+        self._paragraph_depth = None
+
+
+def iter_paragraphs(chunks, section=DEFAULT_SECTION_TAG):
+    """
+    Streams the paragraphs of the `section` element out of HTML chunks.
+    Falls back to every paragraph of the page when the section does not exist.
+
+    Args:
+        chunks: Iterable of HTML strings (a whole page is a single chunk).
+        section: Tag name of the section to extract from.
+
+    Yields: Paragraph objects in document order.
+    """
+    if isinstance(chunks, str):
+        chunks = [chunks]
+    extractor = ParagraphExtractor(section)
+    outside = []
+    for chunk in chunks:
+        extractor.feed(chunk)
+        for paragraph, in_section in extractor.pop_paragraphs():
+            if in_section:
+                outside = None
+                yield paragraph
+            elif outside is not None:
+                outside.append(paragraph)
+    extractor.close()
+    for paragraph, in_section in extractor.pop_paragraphs():
+        if in_section:
+            yield paragraph
+    if not extractor.section_seen and outside:
+        yield from outside
+
+
+class ParagraphMatch:
+    """
+    Alignment of one source (English) paragraph: the best translated paragraph, its score and a status
+    (ok, missing or untranslated).
+    """
+
+    def __init__(self, source, target, score, status):
+        self.source = source
+        self.target = target
+        self.score = score
+        self.status = status
+
+
+class AlignmentReport:
+    """
+    Per-paragraph scores of an alignment plus the missing and untranslated paragraphs.
+    """
+
+    def __init__(self, matches):
+        self.matches = matches
+
+    @property
+    def mean_score(self):
+        return float(np.mean([match.score for match in self.matches])) if self.matches else 0.0
+
+    @property
+    def missing(self):
+        return [match for match in self.matches if match.status == MISSING]
+
+    @property
+    def untranslated(self):
+        return [match for match in self.matches if match.status == UNTRANSLATED]
+
+    def summary(self, limit=10):
+        lines = [f"{len(self.matches)} paragraphs, mean similarity {self.mean_score:.3f}, "
+                 f"{len(self.missing)} missing, {len(self.untranslated)} untranslated"]
+        for match in (self.missing + self.untranslated)[:limit]:
+            lines.append(f"  {match.status:12} {match.score:.2f}  {match.source.path}: {match.source.text[:60]}")
+        return "\n".join(lines)
+
+
+def align_paragraphs(source, target, embed=EmbeddingModel.embed, band=DEFAULT_BAND,
+                     missing_threshold=MISSING_THRESHOLD, originals=None):
+    """
+    Matches every source paragraph with the most similar target paragraph.
+
+    Translated pages keep the order of the original, so each source paragraph is only compared with the
+    target paragraphs in a band of +-band around its proportional position. The scores are computed with
+    NumPy on chunks of rows, which keeps time and memory linear in the number of paragraphs.
+
+    Args:
+        source: List of Paragraph (the English page).
+        target: List of Paragraph (the translated page).
+        embed: Function returning normalized embeddings for a list of texts.
+        band: Half width of the window of target paragraphs compared with each source paragraph.
+        missing_threshold: Below this similarity a paragraph is reported as missing.
+        originals: Texts of the target paragraphs before they were machine translated (for the untranslated
+                   check, which would otherwise flag every good back translation).
+
+    Returns: AlignmentReport
+    """
+    if not source:
+        return AlignmentReport([])
+    if not target:
+        return AlignmentReport([ParagraphMatch(paragraph, None, 0.0, MISSING) for paragraph in source])
+
+    source_vectors = embed([paragraph.text for paragraph in source])
+    target_vectors = embed([paragraph.text for paragraph in target])
+    rows, columns = len(source), len(target)
+    centers = np.rint(np.arange(rows) * ((columns - 1) / max(rows - 1, 1))).astype(int)
+    offsets = np.arange(-band, band + 1)
+
+    best_columns = np.empty(rows, dtype=int)
+    best_scores = np.empty(rows)
+    for start in range(0, rows, ROW_CHUNK):
+        stop = min(start + ROW_CHUNK, rows)
+        candidates = np.clip(centers[start:stop, None] + offsets[None, :], 0, columns - 1)
+        scores = np.einsum("rd,rkd->rk", source_vectors[start:stop], target_vectors[candidates])
+        best = scores.argmax(axis=1)
+        chunk_rows = np.arange(stop - start)
+        best_columns[start:stop] = candidates[chunk_rows, best]
+        best_scores[start:stop] = scores[chunk_rows, best]
+
+    matches = []
+    for paragraph, column, score in zip(source, best_columns, best_scores):
+        match = target[column]
+        original = originals[column] if originals is not None else match.text
+        if original.lower() == paragraph.text.lower():
+            status = UNTRANSLATED
+        elif score < missing_threshold:
+            status = MISSING
+        else:
+            status = OK
+        matches.append(ParagraphMatch(paragraph, match, float(score), status))
+    return AlignmentReport(matches)
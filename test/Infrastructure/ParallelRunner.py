@@ -0,0 +1,304 @@
+import argparse
+import os
+import random
+import sys
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import util as multiprocessing_util
+from Infrastructure.DriverPool import POOL_SIZE_ENV
+from Infrastructure.Reports import flush_reports
+
+#====== RUNNER DEFAULTS ======
+DEFAULT_WORKERS = os.cpu_count() or 2
+SHARD_ATTRIBUTE = "_subtest_shards"
+SHARD_ENV = "SUBTEST_SHARD"
+SEPARATOR_WIDE = "=" * 70
+SEPARATOR_THIN = "-" * 70
+
+#====== OUTCOMES ======
+SUCCESS = "ok"
+FAILURE = "FAIL"
+ERROR = "ERROR"
+SKIPPED = "skipped"
+EXPECTED_FAILURE = "expected failure"
+UNEXPECTED_SUCCESS = "unexpected success"
+
+"""
+    Runs the test suites in parallel on a pool of worker processes.
+    Every worker keeps its own pinned browser (a DriverPool of size 1), so test methods never share a session
+    that is in use. The browser is quit and the worker's reports are printed when the worker shuts down.
+    Test methods are shuffled with a seed to catch hidden coupling between tests, and methods decorated with
+    @shard_subtests are split further so their subTests run on several workers.
+
+    Usage:
+        python -m Infrastructure.ParallelRunner -w 4 --seed 1234 FunctionalTest.SearchTest
+"""
+
+
+def shard_subtests(parts):
+    """
+    Marks a test method whose subTest loop can be split into `parts` independent shards.
+    The test must iterate over subtest_items(...) for the split to take effect.
+    """
+    def decorator(test_method):
+        setattr(test_method, SHARD_ATTRIBUTE, parts)
+        return test_method
+    return decorator
+
+
+def subtest_items(items):
+    """
+    Returns the part of `items` that belongs to the shard currently running in this worker.
+    When the test is not sharded (plain unittest run) all the items are returned.
+    """
+    items = list(items)
+    shard = os.environ.get(SHARD_ENV)
+    if not shard:
+        return items
+    index, count = (int(part) for part in shard.split("/"))
+    return items[index::count]
+
+
+class ShardJob:
+    """
+    One unit of work for a worker: a test method, or one shard of its subTests.
+    """
+
+    def __init__(self, test_id, shard_index=0, shard_count=1):
+        self.test_id = test_id
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+
+    @property
+    def name(self):
+        if self.shard_count == 1:
+            return self.test_id
+        return f"{self.test_id} [shard {self.shard_index + 1}/{self.shard_count}]"
+
+
+class ShardRecord:
+    """
+    Outcome of one test (or subTest) inside a job. Plain data, so it can be sent back from a worker.
+    """
+
+    def __init__(self, description, outcome, details=""):
+        self.description = description
+        self.outcome = outcome
+        self.details = details
+
+    def __str__(self):
+        return self.description
+
+
+class _RecordingResult(unittest.TestResult):
+    """
+    Collects the outcomes of a job as ShardRecords instead of keeping the (unpicklable) test objects.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def _record(self, test, outcome, err=None, details=""):
+        if err is not None:
+            details = self._exc_info_to_string(err, test)
+        self.records.append(ShardRecord(str(test), outcome, details))
+
+    def addSuccess(self, test):
+        super().addSuccess(test)
+        self._record(test, SUCCESS)
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self._record(test, FAILURE, err)
+
+    def addError(self, test, err):
+        super().addError(test, err)
+        self._record(test, ERROR, err)
+
+    def addSkip(self, test, reason):
+        super().addSkip(test, reason)
+        self._record(test, SKIPPED, details=reason)
+
+    def addExpectedFailure(self, test, err):
+        super().addExpectedFailure(test, err)
+        self._record(test, EXPECTED_FAILURE, err)
+
+    def addUnexpectedSuccess(self, test):
+        super().addUnexpectedSuccess(test)
+        self._record(test, UNEXPECTED_SUCCESS)
+
+    def addSubTest(self, test, subtest, err):
+        super().addSubTest(test, subtest, err)
+        if err is not None:
+            outcome = FAILURE if issubclass(err[0], test.failureException) else ERROR
+            self._record(subtest, outcome, err)
+
+
+class MergedResult(unittest.TestResult):
+    """
+    unittest.TestResult that merges the records of every shard, plus the timing of each shard.
+    failures/errors/skipped hold (ShardRecord, details) pairs just like a normal result holds (test, traceback).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.shard_timings = []
+
+    def add_job(self, job, worker_pid, seconds, records):
+        self.shard_timings.append((job.name, worker_pid, seconds))
+        self.testsRun += 1
+        for record in records:
+            if record.outcome == FAILURE:
+                self.failures.append((record, record.details))
+            elif record.outcome == ERROR:
+                self.errors.append((record, record.details))
+            elif record.outcome == SKIPPED:
+                self.skipped.append((record, record.details))
+            elif record.outcome == EXPECTED_FAILURE:
+                self.expectedFailures.append((record, record.details))
+            elif record.outcome == UNEXPECTED_SUCCESS:
+                self.unexpectedSuccesses.append(record)
+
+    def print_report(self, stream, seed, wall_seconds):
+        """
+        Prints the errors the same way unittest.TextTestRunner does, followed by the per-shard timings.
+        """
+        for flavour, problems in ((ERROR, self.errors), (FAILURE, self.failures)):
+            for record, details in problems:
+                stream.write(f"{SEPARATOR_WIDE}\n{flavour}: {record}\n{SEPARATOR_THIN}\n{details}\n")
+
+        stream.write(f"{SEPARATOR_THIN}\nShard timings:\n")
+        for name, worker_pid, seconds in sorted(self.shard_timings, key=lambda timing: -timing[2]):
+            stream.write(f"  {seconds:8.2f}s  worker {worker_pid}  {name}\n")
+        per_worker = {}
+        for _, worker_pid, seconds in self.shard_timings:
+            per_worker[worker_pid] = per_worker.get(worker_pid, 0.0) + seconds
+        for worker_pid, seconds in sorted(per_worker.items()):
+            stream.write(f"  worker {worker_pid}: {seconds:.2f}s busy\n")
+
+        seed_note = f" (seed {seed})" if seed is not None else ""
+        stream.write(f"{SEPARATOR_THIN}\nRan {self.testsRun} shards in {wall_seconds:.3f}s{seed_note}\n\n")
+        if self.wasSuccessful():
+            stream.write("OK\n")
+        else:
+            stream.write(f"FAILED (failures={len(self.failures)}, errors={len(self.errors)})\n")
+
+
+def collect_jobs(names):
+    """
+    Loads the tests named in `names` (modules, classes or methods) and turns them into ShardJobs.
+    """
+    suite = unittest.TestLoader().loadTestsFromNames(names)
+    jobs = []
+    for test in _iter_tests(suite):
+        test_method = getattr(test, test._testMethodName, None)
+        shard_count = getattr(test_method, SHARD_ATTRIBUTE, 1)
+        for shard_index in range(shard_count):
+            jobs.append(ShardJob(test.id(), shard_index, shard_count))
+    return jobs
+
+
+def shuffle_jobs(jobs, seed):
+    """
+    Returns: the jobs in a random order that only depends on `seed`, so a failing order can be replayed.
+    """
+    jobs = list(jobs)
+    random.Random(seed).shuffle(jobs)
+    return jobs
+
+
+def _iter_tests(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from _iter_tests(test)
+        else:
+            yield test
+
+
+def init_worker():
+    """
+    Initializer of the worker processes: one pinned browser per worker. Workers leave through os._exit, so their
+    atexit handlers never run; a multiprocessing finalizer, run when the executor shuts the worker down, quits the
+    worker's browsers and prints its reports instead (see Reports).
+    """
+    os.environ[POOL_SIZE_ENV] = "1"
+    multiprocessing_util.Finalize(None, flush_reports, exitpriority=0)
+
+
+def run_job(job):
+    """
+    Runs one ShardJob in this process.
+
+    Returns: (worker pid, seconds, list of ShardRecord)
+    """
+    if job.shard_count > 1:
+        os.environ[SHARD_ENV] = f"{job.shard_index}/{job.shard_count}"
+    result = _RecordingResult()
+    start = time.perf_counter()
+    try:
+        unittest.TestLoader().loadTestsFromName(job.test_id).run(result)
+    finally:
+        os.environ.pop(SHARD_ENV, None)
+    return os.getpid(), time.perf_counter() - start, result.records
+
+
+def run_parallel(names, workers=DEFAULT_WORKERS, seed=None, stream=sys.stderr):
+    """
+    Runs the named tests on `workers` processes in a seeded random order.
+
+    Args:
+        names: Test names accepted by unittest (e.g. "LayotTest.LayoutHomePageTest").
+        workers: Number of worker processes, each with its own browser.
+        seed: Seed for the test order. A random seed is chosen (and printed) when None.
+        stream: Where to print the report.
+
+    Returns: MergedResult with the outcome of every shard.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    jobs = shuffle_jobs(collect_jobs(names), seed)
+    stream.write(f"Running {len(jobs)} shards on {workers} workers, randomized with seed {seed}\n")
+
+    merged = MergedResult()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        futures = {executor.submit(run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            worker_pid, seconds, records = future.result()
+            merged.add_job(job, worker_pid, seconds, records)
+            stream.write(f"{job.name} ... {job_outcome(records)} ({seconds:.2f}s)\n")
+    merged.print_report(stream, seed, time.perf_counter() - start)
+    return merged
+
+
+def job_outcome(records):
+    """
+    Returns: the worst outcome of the records of a job.
+    """
+    outcomes = [record.outcome for record in records]
+    for outcome in (ERROR, FAILURE):
+        if outcome in outcomes:
+            return outcome
+    return outcomes[-1] if outcomes else SUCCESS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the test suites in parallel worker processes.")
+    parser.add_argument("names", nargs="+", help="test modules, classes or methods")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--seed", type=int, default=None, help="seed of the randomized test order")
+    parser.add_argument("--preload-embeddings", action="store_true",
+                        help="load the SentenceTransformer once, before forking the workers")
+    args = parser.parse_args(argv)
+    if args.preload_embeddings:
+        from Infrastructure import EmbeddingModel
+        EmbeddingModel.preload()
+    result = run_parallel(args.names, args.workers, args.seed)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,372 @@
+import json
+import os
+import threading
+import time
+from selenium.common.exceptions import WebDriverException
+from Infrastructure.Reports import register_report
+
+#====== PAGES ======
+HOME = "home"
+TRANSLATION = "translation"
+# Translation pages settled over HTTP (no browser), only their fetch time is known.
+TRANSLATION_HTTP = "translation_http"
+SEARCH_RESULT = "search_result"
+
+#====== BUDGETS ======
+# Per page: metric -> (p50 budget, p95 budget). Times in ms, CLS unitless.
+PAGE_BUDGETS = {
+    HOME: {"ttfb": (800, 1800), "fcp": (1800, 3000), "lcp": (2500, 4000), "cls": (0.1, 0.25),
+           "long_task_ms": (300, 800)},
+    TRANSLATION: {"ttfb": (800, 1800), "fcp": (1800, 3000), "lcp": (2500, 4000), "cls": (0.1, 0.25)},
+    TRANSLATION_HTTP: {"fetch_ms": (1000, 2500)},
+    SEARCH_RESULT: {"navigation_ms": (1000, 2500), "cls": (0.1, 0.25), "long_task_ms": (300, 800)},
+}
+BUDGET_WINDOW = 50
+# A page is checked against its budgets only once this run has this many samples of it.
+MIN_BUDGET_SAMPLES = 3
+SESSION_GAP_MS = 1000
+SESSION_MAX_MS = 5000
+
+#====== SWITCHES ======
+PERF_MODE_ENV = "PERF_METRICS"
+METRICS_FILE_ENV = "PERF_METRICS_FILE"
+FAIL = "fail"
+WARN = "warn"
+OFF = "off"
+DEFAULT_METRICS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "perf",
+                                    "metrics.jsonl")
+# The time series file is rotated to <file>.1 once it grows past this size.
+MAX_METRICS_BYTES = 8 * 1024 * 1024
+
+#====== SCRIPTS ======
+ADD_SCRIPT_COMMAND = "Page.addScriptToEvaluateOnNewDocument"
+# Installed before any page script runs, so long tasks (which are not buffered) are seen from the start.
+OBSERVER_SCRIPT = """
+(function () {
+    if (window.__perfMetrics) return;
+    var store = window.__perfMetrics = {lcp: null, shifts: [], longTasks: [], observers: []};
+    function observe(type, callback) {
+        try {
+            var observer = new PerformanceObserver(function (list) { list.getEntries().forEach(callback); });
+            observer.observe({type: type, buffered: true});
+            store.observers.push([observer, callback]);
+        } catch (e) {}
+    }
+    // Delivers the entries still queued for the observers (their callbacks run asynchronously).
+    store.flush = function () {
+        store.observers.forEach(function (pair) { pair[0].takeRecords().forEach(pair[1]); });
+    };
+    observe('largest-contentful-paint', function (entry) { store.lcp = entry.startTime; });
+    observe('layout-shift', function (entry) {
+        store.shifts.push([entry.startTime, entry.value, entry.hadRecentInput]);
+    });
+    observe('longtask', function (entry) { store.longTasks.push([entry.startTime, entry.duration]); });
+})();
+"""
+COLLECT_SCRIPT = """
+var store = window.__perfMetrics;
+function buffered(type) {
+    try {
+        var observer = new PerformanceObserver(function () {});
+        observer.observe({type: type, buffered: true});
+        var entries = observer.takeRecords();
+        observer.disconnect();
+        return entries;
+    } catch (e) { return []; }
+}
+var lcp = null, shifts = [], longTasks = null;
+if (store) {
+    store.flush();
+    lcp = store.lcp; shifts = store.shifts; longTasks = store.longTasks;
+} else {
+    var lcps = buffered('largest-contentful-paint');
+    lcp = lcps.length ? lcps[lcps.length - 1].startTime : null;
+    shifts = buffered('layout-shift').map(function (e) { return [e.startTime, e.value, e.hadRecentInput]; });
+}
+var navigation = performance.getEntriesByType('navigation')[0];
+var paints = {};
+performance.getEntriesByType('paint').forEach(function (entry) { paints[entry.name] = entry.startTime; });
+return {
+    url: location.href, now: performance.now(), lcp: lcp, shifts: shifts, longTasks: longTasks,
+    firstContentfulPaint: paints['first-contentful-paint'] === undefined ? null : paints['first-contentful-paint'],
+    navigation: navigation ? {ttfb: navigation.responseStart, domContentLoaded: navigation.domContentLoadedEventEnd,
+                              load: navigation.loadEventEnd, transferSize: navigation.transferSize} : null
+};
+"""
+NOW_SCRIPT = "return performance.now();"
+
+"""
+Web performance metrics of the pages the suites load.
+
+After a page load, one script call reads Navigation Timing, the paint timings and what the PerformanceObservers saw
+(LCP, layout shifts, long tasks). For client-side navigations (e.g. a search result click) only what happened
+after the click counts. Every sample is appended to a JSON-lines time series (rotated at MAX_METRICS_BYTES) and
+the p50 / p95 of the last BUDGET_WINDOW samples of the page taken in this run are compared with PAGE_BUDGETS, once
+there are at least MIN_BUDGET_SAMPLES of them, so a slow earlier run does not fail later ones. PERF_METRICS=warn
+(default) only prints a budget violation, PERF_METRICS=fail makes the test fail on it and PERF_METRICS=off skips the
+collection.
+"""
+
+
+class PageMetrics:
+    """
+    One sample: the page it belongs to (budget group), URL, test, time and the metric values (None when
+    the browser did not report it).
+    """
+
+    def __init__(self, page, url, test, values, timestamp=None):
+        self.page = page
+        self.url = url
+        self.test = test
+        self.values = values
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def to_json(self):
+        return {"time": self.timestamp, "page": self.page, "url": self.url, "test": self.test, **self.values}
+
+    @classmethod
+    def from_json(cls, data):
+        values = {name: value for name, value in data.items() if name not in ("time", "page", "url", "test")}
+        return cls(data["page"], data["url"], data["test"], values, data["time"])
+
+
+def cumulative_layout_shift(shifts, since=0.0):
+    """
+    CLS as defined by Web Vitals: layout shifts not caused by input are grouped in session windows
+    (less than 1s between shifts, at most 5s long) and the largest window sum is the score.
+
+    Args:
+        shifts: List of [start_time_ms, value, had_recent_input].
+        since: Ignore shifts before this time (ms).
+    """
+    best = current = 0.0
+    window_start = previous = None
+    for start, value, had_recent_input in sorted(shifts):
+        if had_recent_input or start < since:
+            continue
+        if window_start is None or start - previous > SESSION_GAP_MS or start - window_start > SESSION_MAX_MS:
+            window_start, current = start, 0.0
+        current += value
+        previous = start
+        best = max(best, current)
+    return best
+
+
+def percentile(values, fraction):
+    """
+    Linear interpolation percentile, `fraction` in [0, 1].
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def metric_values(raw, since=None):
+    """
+    Turns the result of COLLECT_SCRIPT into metric values.
+    With `since` (performance.now() before a client-side navigation) only what happened after it is measured.
+    """
+    long_tasks = raw.get("longTasks")
+    if long_tasks is not None:
+        long_tasks = [(start, duration) for start, duration in long_tasks if since is None or start >= since]
+    values = {
+        "cls": round(cumulative_layout_shift(raw.get("shifts") or [], since or 0.0), 4),
+        "long_tasks": None if long_tasks is None else len(long_tasks),
+        "long_task_ms": None if long_tasks is None else round(sum(duration for _, duration in long_tasks), 1),
+    }
+    if since is not None:
+        values["navigation_ms"] = round(raw["now"] - since, 1)
+        return values
+    navigation = raw.get("navigation") or {}
+    values.update({
+        "ttfb": navigation.get("ttfb"),
+        "dom_content_loaded": navigation.get("domContentLoaded"),
+        "load": navigation.get("load"),
+        "transfer_size": navigation.get("transferSize"),
+        "fcp": raw.get("firstContentfulPaint"),
+        "lcp": raw.get("lcp"),
+    })
+    return values
+
+
+class MetricsStore:
+    """
+    Append-only JSON-lines time series of PageMetrics (one line per sample, safe to share between processes).
+    Once the file reaches `max_bytes` it is moved to <path>.1 (replacing the previous one) and a new file is started.
+    """
+
+    def __init__(self, path, max_bytes=MAX_METRICS_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def append(self, sample):
+        line = json.dumps(sample.to_json(), sort_keys=True) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            try:
+                if os.path.getsize(self.path) >= self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+            except FileNotFoundError:
+                pass
+            with open(self.path, "a", encoding="utf-8") as metrics_file:
+                metrics_file.write(line)
+
+    def history(self, page=None):
+        """
+        Returns: the samples of the current file (not the rotated one), oldest first.
+        """
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding="utf-8") as metrics_file:
+            samples = [PageMetrics.from_json(json.loads(line)) for line in metrics_file if line.strip()]
+        return [sample for sample in samples if page is None or sample.page == page]
+
+
+class PerfRecorder:
+    """
+    Collects PageMetrics, stores them and checks the per-page p50 / p95 budgets of the samples of this run.
+    """
+
+    def __init__(self, store, budgets=PAGE_BUDGETS, mode=FAIL, window=BUDGET_WINDOW, min_samples=MIN_BUDGET_SAMPLES):
+        self.store = store
+        self.budgets = budgets
+        self.mode = mode
+        self.window = window
+        self.min_samples = min_samples
+        self.samples = []
+
+    def record(self, driver, page, test=None, since=None):
+        """
+        Reads the metrics of the page open in `driver` (one script call) and stores them.
+
+        Returns: PageMetrics, or None when the collection is off.
+        """
+        if self.mode == OFF:
+            return None
+        raw = driver.execute_script(COLLECT_SCRIPT)
+        return self.add(PageMetrics(page, raw["url"], test, metric_values(raw, since)))
+
+    def add(self, sample):
+        """
+        Stores a sample measured without a browser (e.g. the fetch time of a page checked over HTTP).
+
+        Returns: the sample, or None when the collection is off.
+        """
+        if self.mode == OFF:
+            return None
+        self.store.append(sample)
+        self.samples.append(sample)
+        return sample
+
+    def recent(self, page):
+        """
+        Returns: the last `window` samples of the page recorded in this run.
+        """
+        return [sample for sample in self.samples if sample.page == page][-self.window:]
+
+    def violations(self, page):
+        """
+        Returns: list of "metric pXX value > budget" for the recent samples of the page, empty while a metric
+        has fewer than `min_samples` values.
+        """
+        recent = self.recent(page)
+        found = []
+        for metric, (p50_budget, p95_budget) in self.budgets.get(page, {}).items():
+            values = [sample.values.get(metric) for sample in recent]
+            values = [value for value in values if value is not None]
+            if len(values) < self.min_samples:
+                continue
+            for name, fraction, budget in (("p50", 0.5, p50_budget), ("p95", 0.95, p95_budget)):
+                value = percentile(values, fraction)
+                if value is not None and budget is not None and value > budget:
+                    found.append(f"{metric} {name} {value:g} > {budget:g}")
+        return found
+
+    def check(self, driver, page, test=None, since=None, label=None):
+        """
+        Records a sample and checks the budgets of its page.
+
+        Returns: an error message when a budget is exceeded and the mode is "fail", otherwise None.
+        """
+        return self._budget_error(self.record(driver, page, test, since), label)
+
+    def check_sample(self, sample, label=None):
+        """
+        Like check, for a sample measured without a browser (see add).
+        """
+        return self._budget_error(self.add(sample), label)
+
+    def _budget_error(self, sample, label):
+        if sample is None:
+            return None
+        found = self.violations(sample.page)
+        if not found:
+            return None
+        message = f"{label or sample.page} over performance budget: {', '.join(found)}"
+        if self.mode == WARN:
+            print(message)
+            return None
+        return message
+
+    def report(self):
+        lines = [f"Performance metrics: {len(self.samples)} samples -> {self.store.path}"]
+        for page in sorted({sample.page for sample in self.samples}):
+            recent = self.recent(page)
+            parts = []
+            for metric in self.budgets.get(page, {}):
+                values = [sample.values.get(metric) for sample in recent if sample.values.get(metric) is not None]
+                if values:
+                    parts.append(f"{metric} p50={percentile(values, 0.5):g} p95={percentile(values, 0.95):g}")
+            lines.append(f"  {page} ({len(recent)} samples): {', '.join(parts)}")
+        return "\n".join(lines)
+
+
+def install_observers(driver):
+    """
+    Registers OBSERVER_SCRIPT to run before the scripts of every document loaded in this tab (Chrome only;
+    elsewhere the buffered entries are read when the metrics are collected and long tasks are not reported).
+    """
+    try:
+        driver.execute_cdp_cmd(ADD_SCRIPT_COMMAND, {"source": OBSERVER_SCRIPT})
+    except (AttributeError, WebDriverException):
+        pass
+
+
+def start_soft_navigation(driver):
+    """
+    Call before a client-side navigation; pass the result as `since` to PerfRecorder.record / check.
+    """
+    return driver.execute_script(NOW_SCRIPT)
+
+
+_shared_recorder = None
+_shared_recorder_lock = threading.Lock()
+
+
+def get_perf_recorder():
+    """
+    Returns the process-wide PerfRecorder. The mode is read from PERF_METRICS and the time series file
+    from PERF_METRICS_FILE.
+    """
+    global _shared_recorder
+    with _shared_recorder_lock:
+        if _shared_recorder is None:
+            store = MetricsStore(os.environ.get(METRICS_FILE_ENV, DEFAULT_METRICS_FILE))
+            _shared_recorder = PerfRecorder(store, mode=os.environ.get(PERF_MODE_ENV, WARN))
+            register_report(_print_report, _forget_recorder)
+        return _shared_recorder
+
+
+def _forget_recorder():
+    global _shared_recorder
+    _shared_recorder = None
+
+
+def _print_report():
+    if _shared_recorder is not None and _shared_recorder.samples:
+        print(_shared_recorder.report())
@@ -0,0 +1,62 @@
+import atexit
+import os
+import sys
+import threading
+import traceback
+
+"""
+End-of-run reports of the process-wide helpers (the driver pools, the tracer, the perf recorder, the stores, ...).
+
+Each helper registers its report with register_report(): a function that prints (and may export files) only when
+the process did some work, and optionally a function that forgets the helper's state. flush_reports() runs every
+report, the last registered first, like atexit would, and then forgets the state it reported, so the registrations
+stay and a later flush only reports the work done since. A plain unittest run flushes at exit. The ParallelRunner
+and BrowserMatrix workers flush when they finish, because worker processes leave through os._exit and never run
+atexit handlers. A forked worker forgets the state it inherited from its parent, so it only reports (and quits)
+its own work.
+"""
+
+_reports = []
+_reports_lock = threading.Lock()
+
+
+def register_report(report, forget=None):
+    """
+    Registers `report` to run on flush_reports(). Registering the same report again does nothing.
+
+    Args:
+        report: Function printing the report of a helper when it was used.
+        forget: Function dropping the state of the helper, called in a forked child process.
+    """
+    with _reports_lock:
+        if all(registered is not report for registered, _ in _reports):
+            _reports.append((report, forget))
+
+
+def flush_reports():
+    """
+    Runs every registered report, then its forget function. A failing report is printed and does not stop the
+    others.
+    """
+    with _reports_lock:
+        reports = _reports[::-1]
+    for report, forget in reports:
+        for step in (report, forget):
+            if step is None:
+                continue
+            try:
+                step()
+            except Exception:
+                traceback.print_exc(file=sys.stderr)
+
+
+def _forget_inherited():
+    global _reports_lock
+    _reports_lock = threading.Lock()
+    for _, forget in _reports:
+        if forget is not None:
+            forget()
+
+
+atexit.register(flush_reports)
+os.register_at_fork(after_in_child=_forget_inherited)
@@ -0,0 +1,392 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+from selenium.webdriver import ActionChains
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.wait import WebDriverWait
+from Infrastructure.DriverPool import DriverPool
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+
+#====== TYPING ======
+TYPING_CADENCE_ENV = "SEARCH_TYPING_CADENCE_MS"
+DEFAULT_CADENCE_MS = 120
+QUIET_MS = 500
+RESULTS_TIMEOUT = 10
+
+#====== BENCHMARK DEFAULTS ======
+DEFAULT_SESSIONS = 4
+DEFAULT_REPEATS = 3
+SEARCH_WINDOW_SIZE = (400, 800)
+HISTOGRAM_EDGES_MS = (25, 50, 100, 200, 400, 800, 1600)
+HISTOGRAM_WIDTH = 40
+
+#====== DOCSEARCH SELECTORS ======
+SEARCH_BTN_SELECTOR = "button[aria-label*='Search']"
+SEARCH_INPUT_SELECTOR = "input[type='search']"
+SEARCH_RESULT_ITEM_SELECTOR = ".DocSearch-Hit"
+NO_RESULT_TITLE_SELECTOR = ".DocSearch-Title"
+
+#====== DOCSEARCH STAND-IN ======
+QUERIES_PATH = "/1/indexes/*/queries"
+HITS_PER_PAGE = 20
+DOCS_RECORDS = (
+    ("/reference/react/useState", "Reference", "useState",
+     "useState is a React Hook that lets you add a state variable to your component."),
+    ("/reference/react/useEffect", "Reference", "useEffect",
+     "useEffect is a React Hook that lets you synchronize a component with an external system."),
+    ("/reference/react/useContext", "Reference", "useContext",
+     "useContext is a React Hook that lets you read and subscribe to context from your component."),
+    ("/reference/react/useRef", "Reference", "useRef",
+     "useRef is a React Hook that lets you reference a value that's not needed for rendering."),
+    ("/learn/reusing-logic-with-custom-hooks", "Learn React", "Reusing Logic with Custom Hooks",
+     "You can create your own Hooks for your application's needs."),
+    ("/learn/passing-data-deeply-with-context", "Learn React", "Passing Data Deeply with Context",
+     "Context lets the parent component make some information available to any component in the tree below it."),
+    ("/learn/thinking-in-react", "Learn React", "Thinking in React",
+     "React can change how you think about the designs you look at and the apps you build."),
+    ("/learn/state-a-components-memory", "Learn React", "State: A Component's Memory",
+     "Components often need to change what's on the screen as a result of an interaction."),
+    ("/learn/you-might-not-need-an-effect", "Learn React", "You Might Not Need an Effect",
+     "Effects are an escape hatch from the React paradigm."),
+    ("/reference/react-dom/components/input", "Reference", "<input>",
+     "The built-in browser <input> component lets you render different kinds of form inputs."),
+)
+STAND_IN_PAGE = """<!DOCTYPE html><html lang="en"><head><title>React (DocSearch stand-in)</title></head><body>
+<button aria-label="Search" type="button">Search</button>
+<div class="DocSearch-Modal" hidden><input type="search" autocomplete="off"><ul class="DocSearch-Hits"></ul></div>
+<script>
+var modal = document.querySelector('.DocSearch-Modal'), input = modal.querySelector('input'),
+    list = modal.querySelector('ul'), latest = 0, rendered = 0;
+document.querySelector('button').addEventListener('click', function () { modal.hidden = false; input.focus(); });
+function render(seq, query, hits) {
+    // Like DocSearch, a response older than the one on screen is dropped.
+    if (seq < rendered) return;
+    rendered = seq;
+    list.innerHTML = '';
+    if (!query) return;
+    if (!hits.length) {
+        var title = document.createElement('p');
+        title.className = 'DocSearch-Title';
+        title.textContent = 'No results for "' + query + '"';
+        list.appendChild(title);
+        return;
+    }
+    hits.forEach(function (hit) {
+        var item = document.createElement('li');
+        item.className = 'DocSearch-Hit';
+        item.innerHTML = '<a href="' + hit.url + '"><span class="DocSearch-Hit-title"></span></a>';
+        item.querySelector('span').textContent = hit.hierarchy.lvl1;
+        list.appendChild(item);
+    });
+}
+input.addEventListener('input', function () {
+    var seq = ++latest, query = input.value;
+    if (!query) { render(seq, '', []); return; }
+    fetch('%s', {method: 'POST', body: JSON.stringify({requests: [
+        {indexName: 'react', params: 'query=' + encodeURIComponent(query) + '&hitsPerPage=%d'}]})})
+        .then(function (response) { return response.json(); })
+        .then(function (data) { render(seq, query, data.results[0].hits); });
+});
+</script></body></html>""" % (QUERIES_PATH, HITS_PER_PAGE)
+
+#====== SCRIPTS ======
+LATENCY_OBSERVER_SCRIPT = """
+var input = document.querySelector(arguments[0]), resultsSelector = arguments[1];
+var state = window.__searchLatency = {keys: [], lastMutation: performance.now()};
+input.addEventListener('input', function () {
+    state.keys.push({time: performance.now(), value: input.value, first: null, last: null});
+}, true);
+function rendersResults(record) {
+    return Array.prototype.some.call(record.addedNodes, function (node) {
+        return node.nodeType === 1 && (node.matches(resultsSelector) || node.querySelector(resultsSelector));
+    });
+}
+new MutationObserver(function (records) {
+    var now = performance.now(), key = state.keys[state.keys.length - 1];
+    state.lastMutation = now;
+    if (!key || !records.some(rendersResults)) return;
+    if (key.first === null) key.first = now;
+    key.last = now;
+}).observe(document.body, {childList: true, subtree: true});
+"""
+# The quiet window starts at the last keystroke at the earliest, and only once results were rendered after it:
+# a slow backend leaves the page quiet between the keystroke and its response.
+COLLECT_LATENCY_SCRIPT = """
+var done = arguments[arguments.length - 1], quietMs = arguments[0], itemSelector = arguments[1],
+    timeoutMs = arguments[2];
+var state = window.__searchLatency, start = performance.now();
+(function poll() {
+    var now = performance.now(), key = state.keys[state.keys.length - 1];
+    var rendered = !key || key.first !== null;
+    var quietSince = Math.max(state.lastMutation, key ? key.time : 0);
+    if (now - start < timeoutMs && (!rendered || now - quietSince < quietMs)) { setTimeout(poll, 25); return; }
+    done({keys: state.keys, hits: document.querySelectorAll(itemSelector).length, timedOut: !rendered});
+})();
+"""
+
+"""
+Search latency benchmark of the DocSearch flow.
+
+The query is typed character by character with a fixed cadence (one WebDriver action for the whole query) and
+a MutationObserver on the page records, for every keystroke, when the first results were rendered and when the
+results stopped changing. The run ends once results were rendered after the last keystroke and the page stayed
+quiet for QUIET_MS (or after RESULTS_TIMEOUT, then the run counts the hits on screen). A corpus of valid and
+invalid queries runs concurrently on pooled sessions, and the latencies are reported as per-query histograms.
+DocSearchStandIn serves an Algolia-compatible search API (and a minimal DocSearch-like page) with injectable
+latency, so the benchmark also runs offline.
+
+Usage (from the `test` folder):
+    python -m Infrastructure.SearchLatency --stand-in --latency-ms 150 --sessions 4 --repeats 5
+    python -m Infrastructure.SearchLatency https://react.dev --cadence-ms 80
+"""
+
+
+class KeystrokeLatency:
+    """
+    Latency of one keystroke, as the user sees it: from the input event to the first results rendered after it
+    (whichever response they came from) and to the last change of them before the next keystroke.
+    None when nothing was rendered before the next keystroke.
+    """
+
+    def __init__(self, index, value, first_result_ms, stable_ms):
+        self.index = index
+        self.value = value
+        self.first_result_ms = first_result_ms
+        self.stable_ms = stable_ms
+
+
+class QueryRun:
+    """
+    One typed query: its keystroke latencies, the number of hits at the end and whether it should have hits.
+    """
+
+    def __init__(self, query, expect_results, keystrokes, hits, seconds):
+        self.query = query
+        self.expect_results = expect_results
+        self.keystrokes = keystrokes
+        self.hits = hits
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        return (self.hits > 0) == self.expect_results
+
+    @property
+    def final(self):
+        return self.keystrokes[-1] if self.keystrokes else None
+
+
+def typing_cadence_ms():
+    """
+    The cadence configured with SEARCH_TYPING_CADENCE_MS, or None to type the whole query at once.
+    """
+    value = os.environ.get(TYPING_CADENCE_ENV)
+    return float(value) if value else None
+
+
+def type_query(driver, element, query, cadence_ms=None):
+    """
+    Types `query` into `element` one character at a time, `cadence_ms` apart, in a single WebDriver action.
+    Without a cadence the whole query is sent with one send_keys, as before.
+    """
+    if cadence_ms is None:
+        element.send_keys(query)
+        return
+    actions = ActionChains(driver).click(element)
+    for char in query:
+        actions.send_keys(char).pause(cadence_ms / 1000)
+    actions.perform()
+
+
+def measure_query(driver, query, expect_results=True, cadence_ms=DEFAULT_CADENCE_MS, quiet_ms=QUIET_MS):
+    """
+    Opens the search panel of the page open in `driver`, types the query and measures every keystroke.
+
+    Returns: QueryRun
+    """
+    start = time.perf_counter()
+    driver.set_window_size(*SEARCH_WINDOW_SIZE)
+    wait = WebDriverWait(driver, RESULTS_TIMEOUT)
+    wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, SEARCH_BTN_SELECTOR))).click()
+    input_box = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, SEARCH_INPUT_SELECTOR)))
+    results_selector = f"{SEARCH_RESULT_ITEM_SELECTOR}, {NO_RESULT_TITLE_SELECTOR}"
+    driver.execute_script(LATENCY_OBSERVER_SCRIPT, SEARCH_INPUT_SELECTOR, results_selector)
+    type_query(driver, input_box, query, cadence_ms)
+    collected = driver.execute_async_script(COLLECT_LATENCY_SCRIPT, quiet_ms, SEARCH_RESULT_ITEM_SELECTOR,
+                                            RESULTS_TIMEOUT * 1000)
+
+    keystrokes = []
+    for index, key in enumerate(collected["keys"]):
+        first = None if key["first"] is None else key["first"] - key["time"]
+        stable = None if key["last"] is None else key["last"] - key["time"]
+        keystrokes.append(KeystrokeLatency(index, key["value"], first, stable))
+    return QueryRun(query, expect_results, keystrokes, collected["hits"], time.perf_counter() - start)
+
+
+def run_corpus(base_url, corpus, sessions=DEFAULT_SESSIONS, repeats=DEFAULT_REPEATS, cadence_ms=DEFAULT_CADENCE_MS,
+               driver_pool=None):
+    """
+    Runs every (query, expect_results) of the corpus `repeats` times, spread over `sessions` pooled browsers.
+
+    Returns: list of QueryRun
+    """
+    pool = driver_pool or DriverPool(sessions)
+
+    def run(item):
+        query, expect_results = item
+        with pool.lease(f"search latency: {query}") as lease:
+            lease.driver.get(base_url)
+            return measure_query(lease.driver, query, expect_results, cadence_ms)
+
+    try:
+        with ThreadPoolExecutor(max_workers=sessions) as executor:
+            return list(executor.map(run, [item for item in corpus for _ in range(repeats)]))
+    finally:
+        if driver_pool is None:
+            pool.shutdown()
+
+
+def histogram(values, edges=HISTOGRAM_EDGES_MS):
+    """
+    Returns: list of (bucket label, count) for the bucket edges in ms (the last bucket is open).
+    """
+    counts = [0] * (len(edges) + 1)
+    for value in values:
+        bucket = 0
+        while bucket < len(edges) and value >= edges[bucket]:
+            bucket += 1
+        counts[bucket] += 1
+    labels = [f"<{edges[0]}ms"] + [f"{low}-{high}ms" for low, high in zip(edges, edges[1:])] + [f">={edges[-1]}ms"]
+    return list(zip(labels, counts))
+
+
+def latency_report(runs):
+    """
+    Per-query histograms of the time to first results and to stable results of every keystroke.
+    """
+    lines = []
+    for query in dict.fromkeys(run.query for run in runs):
+        query_runs = [run for run in runs if run.query == query]
+        failed = [run for run in query_runs if not run.ok]
+        lines.append(f"Query {query!r}: {len(query_runs)} runs, {len(failed)} with unexpected results")
+        for title, attribute in (("time to first result", "first_result_ms"), ("time to stable results", "stable_ms")):
+            values = [getattr(key, attribute) for run in query_runs for key in run.keystrokes
+                      if getattr(key, attribute) is not None]
+            if not values:
+                lines.append(f"  {title}: no samples")
+                continue
+            p95 = statistics.quantiles(values, n=20)[-1] if len(values) > 1 else values[0]
+            lines.append(f"  {title}: {len(values)} keystrokes, p50 {statistics.median(values):.0f}ms, "
+                         f"p95 {p95:.0f}ms")
+            buckets = histogram(values)
+            largest = max(count for _, count in buckets) or 1
+            for label, count in buckets:
+                bar = "#" * round(count * HISTOGRAM_WIDTH / largest)
+                lines.append(f"    {label:>11} {bar:<{HISTOGRAM_WIDTH}} {count}")
+    return "\n".join(lines)
+
+
+def search_records(records, query, limit=HITS_PER_PAGE):
+    """
+    Matches like DocSearch does for the docs: every word of the query is a prefix of a word of the title or text.
+    """
+    words = query.lower().split()
+    hits = []
+    for url, section, title, content in records:
+        text = f"{title} {content}".lower().replace("<", " ").replace(">", " ").split()
+        if words and all(any(candidate.startswith(word) for candidate in text) for word in words):
+            hits.append({"url": url, "hierarchy": {"lvl0": section, "lvl1": title}, "content": content,
+                         "objectID": url})
+    return hits[:limit]
+
+
+class DocSearchStandIn:
+    """
+    Local stand-in for the DocSearch backend: an Algolia-compatible multi-query endpoint over a small docs index,
+    plus a page with the DocSearch button, input and hit markup the suites use.
+
+    Args:
+        records: (url, section, title, content) tuples to search.
+        latency: Seconds added to every search response, or a callable query -> seconds.
+    """
+
+    def __init__(self, records=DOCS_RECORDS, latency=0.0, port=0):
+        self.records = records
+        self.latency = latency
+        self.queries = []
+        self.server = FixtureServer({"/": FixtureResponse(STAND_IN_PAGE), QUERIES_PATH: self._queries}, port)
+
+    @property
+    def base_url(self):
+        return self.server.base_url
+
+    def start(self):
+        self.server.start()
+        return self
+
+    def stop(self):
+        self.server.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _queries(self, request):
+        payload = json.loads(request.body or b"{}")
+        results = []
+        delay = 0.0
+        for search in payload.get("requests", []):
+            params = parse_qs(search.get("params", ""))
+            query = search.get("query", params.get("query", [""])[0])
+            limit = int(params.get("hitsPerPage", [HITS_PER_PAGE])[0])
+            self.queries.append(query)
+            hits = search_records(self.records, query, limit)
+            results.append({"hits": hits, "nbHits": len(hits), "query": query, "index": search.get("indexName")})
+            delay = max(delay, self.latency(query) if callable(self.latency) else self.latency)
+        return FixtureResponse(json.dumps({"results": results}), content_type="application/json", delay=delay)
+
+
+def default_corpus():
+    """
+    The queries of SearchTest (one valid, one invalid) plus a few more of each kind.
+    """
+    from FunctionalTest.SearchTest import INVALID_QUERY, QUERY
+    valid = [QUERY, "useState", "context", "effect"]
+    invalid = [INVALID_QUERY, "zzqxv"]
+    return [(query, True) for query in valid] + [(query, False) for query in invalid]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure DocSearch latency per keystroke.")
+    parser.add_argument("base_url", nargs="?", default=None, help="site to search (default: the stand-in)")
+    parser.add_argument("--stand-in", action="store_true", help="search the local DocSearch stand-in")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latency injected into the stand-in")
+    parser.add_argument("--sessions", type=int, default=DEFAULT_SESSIONS)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--cadence-ms", type=float, default=DEFAULT_CADENCE_MS)
+    args = parser.parse_args(argv)
+
+    stand_in = None
+    base_url = args.base_url
+    if args.stand_in or base_url is None:
+        stand_in = DocSearchStandIn(latency=args.latency_ms / 1000).start()
+        base_url = stand_in.base_url
+    try:
+        runs = run_corpus(base_url, default_corpus(), args.sessions, args.repeats, args.cadence_ms)
+    finally:
+        if stand_in is not None:
+            stand_in.stop()
+    print(latency_report(runs))
+    return 0 if all(run.ok for run in runs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
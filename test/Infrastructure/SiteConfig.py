@@ -0,0 +1,54 @@
+import os
+from urllib.parse import urlsplit, urlunsplit
+
+#====== BASE URL ======
+BASE_URL_ENV = "SITE_BASE_URL"
+LOCAL_SUFFIX = ".localhost"
+LOCAL_ADDRESS = "127.0.0.1"
+
+"""
+Where the suites find the site under test.
+
+By default every suite talks to the live site. When SITE_BASE_URL is set (e.g. http://localhost:8765, the address
+of a SnapshotServer), every live URL is mapped to the local server, keeping its host as a *.localhost subdomain:
+
+    https://fr.react.dev/learn  ->  http://fr.react.dev.localhost:8765/learn
+
+Chrome resolves *.localhost to the loopback address and treats it as a secure context, and relative links keep
+working because every recorded origin stays a separate origin.
+"""
+
+
+def base_url():
+    return os.environ.get(BASE_URL_ENV, "").rstrip("/")
+
+
+def site_url(url, base=None):
+    """
+    Maps a live URL to the configured base URL (unchanged when no base URL is set).
+
+    Args:
+        url: Absolute URL of the live site, e.g. "https://react.dev/".
+        base: Base URL to use instead of the SITE_BASE_URL environment variable.
+    """
+    base = base_url() if base is None else base
+    if not base:
+        return url
+    parts = urlsplit(url)
+    base_parts = urlsplit(base)
+    netloc = parts.hostname + LOCAL_SUFFIX
+    if base_parts.port:
+        netloc += f":{base_parts.port}"
+    return urlunsplit((base_parts.scheme, netloc, parts.path, parts.query, parts.fragment))
+
+
+def is_local_host(host):
+    return bool(host) and (host == "localhost" or host.endswith(LOCAL_SUFFIX))
+
+
+def origin_host(host):
+    """
+    The live host behind a mapped host: "fr.react.dev.localhost" -> "fr.react.dev".
+    """
+    host = host.lower()
+    return host[:-len(LOCAL_SUFFIX)] if host.endswith(LOCAL_SUFFIX) else host
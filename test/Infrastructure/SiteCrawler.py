@@ -0,0 +1,384 @@
+import abc
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+import zlib
+from collections import deque
+from urllib.parse import urldefrag, urljoin, urlsplit, urlunsplit
+from selenium.common.exceptions import WebDriverException
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.FocusOrder import crawl_focus_order
+from Infrastructure.HtmlScan import scan_html
+from Infrastructure.HttpClient import AsyncHttpClient
+from Infrastructure.PageWait import PageWait
+
+#====== CRAWL DEFAULTS ======
+DEFAULT_WORKERS = 8
+DEFAULT_FRONTIER_LIMIT = 10000
+SAVE_EVERY_PAGES = 200
+SITEMAP_PATH = "/sitemap.xml"
+HTML_CONTENT_TYPE = "text/html"
+SITEMAP_NAMESPACE = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+HTTP_TIER = "http"
+BROWSER_TIER = "browser"
+
+#====== SCRIPTS ======
+OVERFLOW_SCRIPT = "return document.body.scrollWidth - document.body.clientWidth;"
+
+"""
+    Site-wide crawl mode.
+    Pages are discovered from sitemap.xml and from the links of every crawled page (one host, deduplicated,
+    with a bounded in-memory frontier) and the existing checks are fanned out over all of them:
+    - HTTP tier (no browser): header/footer presence and html[lang], on the server rendered HTML.
+    - Browser tier: horizontal overflow and focus outline, on sessions leased from the DriverPool.
+    A page that cannot be fetched, or whose browser session fails or times out, is recorded as a failure of
+    that page and the crawl goes on.
+    The crawl state is saved on disk regularly, so an interrupted crawl can be resumed.
+
+    Usage (from the test folder):
+        python -m Infrastructure.SiteCrawler https://react.dev --workers 16 --rate 20 --state crawl.json
+"""
+
+
+class PageCheck(abc.ABC):
+    """
+    Base class of the per-page checks. `tier` tells the crawler whether the check needs a browser.
+    run() returns an error message, or None when the page passes.
+    """
+    name = "check"
+    tier = HTTP_TIER
+
+    @abc.abstractmethod
+    def run(self, page):
+        """
+        Args:
+            page: HtmlScan result of the page for HTTP tier checks, the WebDriver showing it for browser tier checks.
+        """
+
+
+class SelectorPresenceCheck(PageCheck):
+    """
+    The header and footer checks of the layout suite: every selector must match in the page HTML.
+    """
+    name = "header_footer"
+
+    def __init__(self, selectors):
+        self.selectors = list(selectors)
+
+    def run(self, page):
+        missing = [selector for selector in self.selectors if not page.matched.get(selector)]
+        return f"missing {', '.join(missing)}" if missing else None
+
+
+class LangCheck(PageCheck):
+    """
+    The html[lang] check of the language suite: lang must start with one of the known language codes.
+    """
+    name = "html_lang"
+
+    def __init__(self, language_codes):
+        self.language_codes = tuple(language_codes)
+
+    def run(self, page):
+        if page.lang and any(page.lang.startswith(code) for code in self.language_codes):
+            return None
+        return f"unexpected lang {page.lang!r}"
+
+
+class OverflowCheck(PageCheck):
+    """
+    The horizontal scroll check of the layout suite, in the browser.
+    """
+    name = "horizontal_overflow"
+    tier = BROWSER_TIER
+
+    def __init__(self, max_overflow):
+        self.max_overflow = max_overflow
+
+    def run(self, driver):
+        overflow = driver.execute_script(OVERFLOW_SCRIPT)
+        return None if overflow < self.max_overflow else f"horizontal scroll of {overflow}px"
+
+
+class FocusOutlineCheck(PageCheck):
+    """
+    The visible focus check of the accessibility suite, on the whole tab order of the page.
+    """
+    name = "focus_outline"
+    tier = BROWSER_TIER
+
+    def run(self, driver):
+        missing = [stop.path for stop in crawl_focus_order(driver) if not stop.has_visible_focus]
+        return f"{len(missing)} elements without focus outline, first: {missing[0]}" if missing else None
+
+
+class CrawlState:
+    """
+    Everything needed to resume a crawl: seen URLs, the frontier and the results of the finished pages.
+    """
+
+    def __init__(self):
+        self.seen = set()
+        self.frontier = deque()
+        self.results = {}
+        self.dropped = 0
+
+    def save(self, path, in_flight=()):
+        # Pages that were being crawled go back to the frontier so a resumed crawl does them again.
+        data = {
+            "seen": sorted(self.seen),
+            "frontier": list(in_flight) + list(self.frontier),
+            "results": self.results,
+            "dropped": self.dropped,
+        }
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as state_file:
+            json.dump(data, state_file)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        state = cls()
+        with open(path, encoding="utf-8") as state_file:
+            data = json.load(state_file)
+        state.seen = set(data["seen"])
+        state.frontier = deque(data["frontier"])
+        state.results = data["results"]
+        state.dropped = data.get("dropped", 0)
+        return state
+
+
+class RateLimiter:
+    """
+    Spaces requests so at most `rate` start per second (no limit when rate is None).
+    """
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def normalize_url(url, base=None):
+    """
+    Absolute URL without fragment, with lower case scheme/host and without the default port.
+    Returns None for non http(s) links.
+    """
+    url = urldefrag(urljoin(base, url) if base else url)[0]
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return None
+    netloc = parts.hostname.lower()
+    if parts.port and parts.port != {"http": 80, "https": 443}[parts.scheme]:
+        netloc += f":{parts.port}"
+    return urlunsplit((parts.scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+class SiteCrawler:
+    """
+    Crawls one site and runs the page checks on every page.
+
+    Args:
+        start_url: Home page of the site (its sitemap.xml is read too).
+        checks: List of PageCheck. Browser tier checks need driver_pool.
+        workers: Number of concurrent page workers.
+        max_pages: Stop after this many pages (None for the whole site).
+        frontier_limit: Maximum number of URLs waiting in memory. Links found while it is full are dropped
+                        (they are found again later from other pages).
+        rate: Maximum requests per second (None for no limit).
+        state_path: JSON file used to save and resume the crawl.
+        driver_pool: DriverPool used by the browser tier checks.
+    """
+
+    def __init__(self, start_url, checks, workers=DEFAULT_WORKERS, max_pages=None,
+                 frontier_limit=DEFAULT_FRONTIER_LIMIT, rate=None, state_path=None, driver_pool=None):
+        self.start_url = normalize_url(start_url)
+        self.host = urlsplit(self.start_url).netloc
+        self.http_checks = [check for check in checks if check.tier == HTTP_TIER]
+        self.browser_checks = [check for check in checks if check.tier == BROWSER_TIER]
+        self.selectors = [selector for check in self.http_checks for selector in getattr(check, "selectors", ())]
+        self.workers = workers
+        self.max_pages = max_pages
+        self.frontier_limit = frontier_limit
+        self.rate_limiter = RateLimiter(rate)
+        self.state_path = state_path
+        self.driver_pool = driver_pool
+        self.state = CrawlState()
+        self.pages_this_run = 0
+        self.seconds = 0.0
+        self._in_flight = set()
+        self._browser_slots = None
+
+    def run(self):
+        """
+        Runs the crawl to completion (or max_pages) and returns the CrawlState.
+        """
+        return asyncio.run(self.crawl())
+
+    async def crawl(self):
+        start = time.perf_counter()
+        resumed = self.state_path and os.path.exists(self.state_path)
+        if resumed:
+            self.state = CrawlState.load(self.state_path)
+        if self.driver_pool is not None:
+            self._browser_slots = asyncio.Semaphore(self.driver_pool.size)
+
+        async with AsyncHttpClient(self.workers) as client:
+            if not resumed:
+                self._enqueue(self.start_url)
+                await self._read_sitemap(client, urljoin(self.start_url, SITEMAP_PATH))
+            await asyncio.gather(*(self._worker(client) for _ in range(self.workers)))
+
+        self.seconds = time.perf_counter() - start
+        if self.state_path:
+            self.state.save(self.state_path)
+        return self.state
+
+    def _enqueue(self, url):
+        if url is None or urlsplit(url).netloc != self.host or url in self.state.seen:
+            return
+        if len(self.state.frontier) >= self.frontier_limit:
+            self.state.dropped += 1
+            return
+        self.state.seen.add(url)
+        self.state.frontier.append(url)
+
+    async def _read_sitemap(self, client, sitemap_url, depth=0):
+        try:
+            response = await client.get(sitemap_url)
+            root = ElementTree.fromstring(response.body) if response.status == 200 else None
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, zlib.error,
+                ElementTree.ParseError):
+            # The sitemap only seeds the frontier, the crawl goes on from the start page without it.
+            return
+        if root is None:
+            return
+        for location in root.iter(f"{SITEMAP_NAMESPACE}loc"):
+            if not (location.text or "").strip():
+                continue
+            url = normalize_url(location.text.strip())
+            if root.tag == f"{SITEMAP_NAMESPACE}sitemapindex" and depth < 2:
+                await self._read_sitemap(client, url, depth + 1)
+            else:
+                self._enqueue(url)
+
+    async def _worker(self, client):
+        while self.state.frontier or self._in_flight:
+            if self.max_pages is not None and self.pages_this_run + len(self._in_flight) >= self.max_pages:
+                return
+            if not self.state.frontier:
+                # Other workers may still discover new links.
+                await asyncio.sleep(0.01)
+                continue
+            url = self.state.frontier.popleft()
+            self._in_flight.add(url)
+            try:
+                self.state.results[url] = await self._crawl_page(client, url)
+            finally:
+                self._in_flight.discard(url)
+            self.pages_this_run += 1
+            if self.state_path and self.pages_this_run % SAVE_EVERY_PAGES == 0:
+                self.state.save(self.state_path, self._in_flight)
+
+    async def _crawl_page(self, client, url):
+        await self.rate_limiter.wait()
+        try:
+            response = await client.get(url)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, zlib.error) as error:
+            return {"fetch": f"request failed: {error!r}"}
+        if response.status >= 400:
+            return {"fetch": f"status {response.status}"}
+        if HTML_CONTENT_TYPE not in response.headers.get("content-type", HTML_CONTENT_TYPE):
+            return {}
+
+        page = scan_html(response.text, self.selectors)
+        for link in page.links:
+            self._enqueue(normalize_url(link, response.url))
+
+        outcome = {check.name: check.run(page) for check in self.http_checks}
+        if self.browser_checks and self.driver_pool is not None:
+            async with self._browser_slots:
+                try:
+                    outcome.update(await asyncio.to_thread(self._run_browser_checks, url))
+                except WebDriverException as error:
+                    # Includes TimeoutException, e.g. a page that never finished loading.
+                    outcome[BROWSER_TIER] = f"browser checks failed: {error!r}"
+        return outcome
+
+    def _run_browser_checks(self, url):
+        with self.driver_pool.lease(url) as lease:
+            lease.driver.get(url)
+            PageWait(lease.driver).page_load(url)
+            return {check.name: check.run(lease.driver) for check in self.browser_checks}
+
+    def report(self):
+        """
+        Returns the throughput of this run and the failures of every check.
+        """
+        failures = {}
+        for url, outcome in self.state.results.items():
+            for name, error in outcome.items():
+                if error:
+                    failures.setdefault(name, []).append((url, error))
+        rate = self.pages_this_run / self.seconds if self.seconds else 0.0
+        lines = [f"Crawled {self.pages_this_run} pages in {self.seconds:.2f}s ({rate:.1f} pages/s), "
+                 f"{len(self.state.results)} pages in total, {len(self.state.frontier)} left in the frontier, "
+                 f"{self.state.dropped} links dropped by the frontier limit"]
+        for name, problems in sorted(failures.items()):
+            lines.append(f"  {name}: {len(problems)} pages failed")
+            for url, error in problems[:5]:
+                lines.append(f"    {url}: {error}")
+        return "\n".join(lines)
+
+
+def default_checks(browser=True):
+    """
+    The checks of the existing suites, with the suites' own selectors and thresholds.
+    The suites are imported here and not at the top, so the crawler itself does not load them.
+    """
+    from FunctionalTest.LanguageSwitcherSearch import LANGUAGE_CODES
+    from LayotTest.LayoutHomePageTest import FOOTER_TAG, HEADER_SELECTOR, MAX_HORIZONTAL_OVERFLOW
+    checks = [SelectorPresenceCheck([HEADER_SELECTOR, FOOTER_TAG]), LangCheck(LANGUAGE_CODES.values())]
+    if browser:
+        checks += [OverflowCheck(MAX_HORIZONTAL_OVERFLOW), FocusOutlineCheck()]
+    return checks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crawl a site and run the suite checks on every page.")
+    parser.add_argument("start_url")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--max-pages", type=int, default=None)
+    parser.add_argument("--frontier-limit", type=int, default=DEFAULT_FRONTIER_LIMIT)
+    parser.add_argument("--rate", type=float, default=None, help="maximum requests per second")
+    parser.add_argument("--state", default=None, help="JSON file to save / resume the crawl")
+    parser.add_argument("--no-browser", action="store_true", help="run only the HTTP tier checks")
+    args = parser.parse_args(argv)
+
+    driver_pool = None
+    if not args.no_browser:
+        driver_pool = get_driver_pool()
+    crawler = SiteCrawler(args.start_url, default_checks(not args.no_browser), args.workers, args.max_pages,
+                          args.frontier_limit, args.rate, args.state, driver_pool)
+    crawler.run()
+    print(crawler.report())
+    failed = any(error for outcome in crawler.state.results.values() for error in outcome.values())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
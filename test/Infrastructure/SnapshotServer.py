@@ -0,0 +1,257 @@
+import argparse
+import gzip
+import os
+import re
+import sys
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from Infrastructure.SiteConfig import BASE_URL_ENV, LOCAL_SUFFIX, origin_host
+from Infrastructure.SnapshotStore import SnapshotStore, request_key
+
+#====== SERVER DEFAULTS ======
+LISTEN_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+REQUEST_QUEUE_SIZE = 256
+UPSTREAM_TIMEOUT = 30
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "snapshots")
+RECORD = "record"
+REPLAY = "replay"
+
+#====== RECORDED ORIGINS ======
+# The site and its DocSearch backend; links to any other host are left pointing at the live web.
+DEFAULT_HOST_SUFFIXES = ("react.dev", "algolia.net", "algolianet.com")
+FORWARDED_HEADERS = ("accept", "accept-language", "content-type")
+TEXT_TYPES = ("text/", "javascript", "json", "xml", "svg")
+CORS_HEADERS = {"Access-Control-Allow-Origin": "*", "Access-Control-Allow-Methods": "GET, POST, HEAD, OPTIONS",
+                "Access-Control-Max-Age": "86400"}
+
+"""
+Record / replay of the site under test.
+
+Record mode is a reverse proxy: the browser asks http://<host>.localhost:<port>/..., the server fetches
+https://<host>/... , stores the response in a SnapshotStore and serves it. Replay mode serves only from the
+store, so the suites run against a frozen copy of the site without touching the network:
+
+    (from the `test` folder)
+    python -m Infrastructure.SnapshotServer record --port 8765
+    SITE_BASE_URL=http://localhost:8765 python -m unittest FunctionalTest.SearchTest     # records
+    python -m Infrastructure.SnapshotServer replay --port 8765
+    SITE_BASE_URL=http://localhost:8765 python -m Infrastructure.ParallelRunner -w 8 ...  # replays
+
+Bodies are stored as they were received; absolute links to the recorded hosts are rewritten to the local
+server when they are served.
+"""
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class SnapshotServer:
+    """
+    Multi-threaded record / replay HTTP server over a SnapshotStore.
+
+    Args:
+        store: SnapshotStore (or a directory for one).
+        mode: RECORD or REPLAY.
+        port: Port to listen on (0 picks a free one).
+        host_suffixes: Hosts (and their subdomains) that are recorded and rewritten to the local server.
+        upstreams: Optional dict host -> base URL to fetch that host from instead of https://<host>.
+    """
+
+    def __init__(self, store=DEFAULT_STORE_DIR, mode=REPLAY, port=0, host_suffixes=DEFAULT_HOST_SUFFIXES,
+                 upstreams=None):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown snapshot mode: {mode!r}")
+        self.store = store if isinstance(store, SnapshotStore) else SnapshotStore(store)
+        self.mode = mode
+        self.upstreams = dict(upstreams or {})
+        self.hits = 0
+        self.recorded = 0
+        self.misses = []
+        self._lock = threading.Lock()
+        self._rewritten = {}
+        self._opener = urllib.request.build_opener(_NoRedirect)
+        hosts = "|".join(re.escape(suffix) for suffix in host_suffixes)
+        self._link_pattern = re.compile(
+            r"https?:(\\?/\\?/)((?:[a-z0-9-]+\.)*(?:" + hosts + r"))(?::\d+)?\b", re.IGNORECASE)
+        self._server = _SnapshotHTTPServer((LISTEN_HOST, port), _handler_for(self))
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    @property
+    def base_url(self):
+        return f"http://localhost:{self.port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self.mode == RECORD:
+            self.store.save()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def respond(self, method, host, target, headers, body):
+        """
+        Returns: (status, headers dict, SnapshotResponse or None) for one request.
+        """
+        host = origin_host(host.split(":")[0])
+        parts = urlsplit(target)
+        key = request_key(method, host, parts.path, parts.query, body)
+        if self.mode == RECORD:
+            status, response_headers, response_body = self._fetch(method, host, target, headers, body)
+            snapshot = self.store.put(key, status, response_headers, response_body)
+            with self._lock:
+                self.recorded += 1
+            return snapshot
+        snapshot = self.store.get(key)
+        with self._lock:
+            if snapshot is None:
+                self.misses.append(key)
+            else:
+                self.hits += 1
+        return snapshot
+
+    def rewrite(self, text):
+        """
+        Points absolute links to the recorded hosts at this server: https://react.dev/x -> http://react.dev.localhost:port/x
+        """
+        return self._link_pattern.sub(
+            lambda match: f"http:{match.group(1)}{match.group(2)}{LOCAL_SUFFIX}:{self.port}", text)
+
+    def body_for(self, snapshot):
+        """
+        The body to serve for a snapshot.
+
+        Returns: (bytes, is_gzip). Bodies without links to rewrite are served still compressed.
+        """
+        cached = self._rewritten.get(snapshot.blob)
+        if cached is not None:
+            return cached
+        content_type = snapshot.headers.get("content-type", "")
+        result = (self.store.read_blob(snapshot.blob), True)
+        if any(kind in content_type for kind in TEXT_TYPES):
+            text = self.store.read_body(snapshot.blob).decode("utf-8", errors="surrogateescape")
+            rewritten = self.rewrite(text)
+            if rewritten != text:
+                result = (rewritten.encode("utf-8", errors="surrogateescape"), False)
+        self._rewritten[snapshot.blob] = result
+        return result
+
+    def report(self):
+        lines = [f"Snapshot server ({self.mode}): {self.store.stats()}, {self.hits} hits, "
+                 f"{self.recorded} recorded, {len(self.misses)} misses"]
+        lines += [f"  MISS {key}" for key in self.misses[:20]]
+        return "\n".join(lines)
+
+    def _fetch(self, method, host, target, headers, body):
+        url = self.upstreams.get(host, f"https://{host}").rstrip("/") + target
+        forwarded = {name: value for name, value in headers.items() if name.lower() in FORWARDED_HEADERS}
+        forwarded["Accept-Encoding"] = "identity"
+        request = urllib.request.Request(url, data=body or None, headers=forwarded, method=method)
+        try:
+            with self._opener.open(request, timeout=UPSTREAM_TIMEOUT) as response:
+                return response.status, dict(response.headers), response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, dict(error.headers), error.read()
+
+
+class _SnapshotHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = REQUEST_QUEUE_SIZE
+
+
+def _handler_for(snapshots):
+    class SnapshotHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self._serve(send_body=True)
+
+        def do_POST(self):
+            self._serve(send_body=True)
+
+        def do_HEAD(self):
+            self._serve(send_body=False)
+
+        def do_OPTIONS(self):
+            # CORS preflight of the DocSearch requests; answered locally in both modes.
+            self.send_response(204)
+            for name, value in CORS_HEADERS.items():
+                self.send_header(name, value)
+            requested = self.headers.get("Access-Control-Request-Headers")
+            if requested:
+                self.send_header("Access-Control-Allow-Headers", requested)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def _serve(self, send_body):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            try:
+                snapshot = snapshots.respond(self.command, self.headers.get("Host", ""), self.path, self.headers, body)
+            except OSError as error:
+                self.send_error(502, f"Upstream fetch failed: {error}")
+                return
+            if snapshot is None:
+                self.send_error(404, "Not in snapshot")
+                return
+
+            payload, is_gzip = snapshots.body_for(snapshot)
+            if is_gzip and "gzip" not in self.headers.get("Accept-Encoding", ""):
+                payload, is_gzip = gzip.decompress(payload), False
+            self.send_response(snapshot.status)
+            for name, value in snapshot.headers.items():
+                self.send_header(name, snapshots.rewrite(value) if name == "location" else value)
+            if is_gzip:
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            if send_body:
+                self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return SnapshotHandler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record or replay a snapshot of the site under test.")
+    parser.add_argument("mode", choices=(RECORD, REPLAY))
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--host", action="append", dest="hosts", help="recorded host suffix (repeatable)")
+    args = parser.parse_args(argv)
+
+    server = SnapshotServer(args.store, args.mode, args.port, tuple(args.hosts or DEFAULT_HOST_SUFFIXES))
+    print(f"{args.mode} on {server.base_url} -> run the suites with {BASE_URL_ENV}={server.base_url}")
+    server.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(server.report())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from urllib.parse import parse_qsl, urlencode
+
+#====== STORE LAYOUT ======
+INDEX_FILE = "index.json"
+OBJECTS_DIR = "objects"
+BLOB_SUFFIX = ".gz"
+
+#====== RECORDED HEADERS ======
+KEPT_HEADERS = ("content-type", "content-language", "cache-control", "etag", "last-modified", "location",
+                "access-control-allow-origin", "access-control-allow-headers", "access-control-allow-methods",
+                "access-control-expose-headers")
+
+#====== DOCSEARCH ======
+ALGOLIA_HOST = re.compile(r"^(?P<app>[a-z0-9]+)(?:-dsn|-\d)?\.(?:algolia\.net|algolianet\.com)$", re.IGNORECASE)
+VOLATILE_QUERY_PARAMS = ("x-algolia-agent",)
+
+
+class SnapshotResponse:
+    """
+    A recorded response: status, the headers worth replaying and the sha256 of the (decoded) body.
+    """
+
+    def __init__(self, status, headers, blob):
+        self.status = status
+        self.headers = headers
+        self.blob = blob
+
+    def to_json(self):
+        return {"status": self.status, "headers": self.headers, "blob": self.blob}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["status"], data["headers"], data["blob"])
+
+
+def canonical_host(host):
+    """
+    All the DocSearch (Algolia) hosts of one application (dsn, fallback hosts) share one name,
+    so a replayed search does not depend on which host the client happened to pick.
+    """
+    match = ALGOLIA_HOST.match(host)
+    return f"{match.group('app').lower()}.algolia" if match else host.lower()
+
+
+def request_key(method, host, path, query="", body=b""):
+    """
+    Key of a request in the store. The query parameters are sorted (volatile ones dropped) and JSON bodies
+    are canonicalized, so the DocSearch API requests of SearchTest replay deterministically.
+    """
+    params = sorted((name, value) for name, value in parse_qsl(query, keep_blank_values=True)
+                    if name.lower() not in VOLATILE_QUERY_PARAMS)
+    body_hash = ""
+    if body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode("utf-8")
+        except ValueError:
+            pass
+        body_hash = hashlib.sha256(body).hexdigest()
+    return f"{method.upper()} {canonical_host(host)}{path}?{urlencode(params)} {body_hash}".rstrip()
+
+
+class SnapshotStore:
+    """
+    Content addressed, compressed on-disk store of recorded responses.
+
+    index.json maps request keys to SnapshotResponses; every body is stored once as objects/ab/<sha256>.gz,
+    so assets shared by several locales (same bytes, different URL) are deduplicated.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.index = {}
+        self._blobs = {}
+        self._lock = threading.Lock()
+        index_path = os.path.join(root, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, encoding="utf-8") as index_file:
+                self.index = {key: SnapshotResponse.from_json(value) for key, value in json.load(index_file).items()}
+
+    def get(self, key):
+        return self.index.get(key)
+
+    def put(self, key, status, headers, body):
+        """
+        Stores a response. `headers` are filtered down to KEPT_HEADERS.
+
+        Returns: the stored SnapshotResponse.
+        """
+        blob = hashlib.sha256(body).hexdigest()
+        path = self._blob_path(blob)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as blob_file:
+                blob_file.write(gzip.compress(body))
+            os.replace(temp_path, path)
+        kept = {name.lower(): value for name, value in headers.items() if name.lower() in KEPT_HEADERS}
+        response = SnapshotResponse(status, kept, blob)
+        with self._lock:
+            self.index[key] = response
+        return response
+
+    def read_blob(self, blob):
+        """
+        Returns the compressed bytes of a body (kept in memory after the first read).
+        """
+        compressed = self._blobs.get(blob)
+        if compressed is None:
+            with open(self._blob_path(blob), "rb") as blob_file:
+                compressed = blob_file.read()
+            self._blobs[blob] = compressed
+        return compressed
+
+    def read_body(self, blob):
+        return gzip.decompress(self.read_blob(blob))
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock:
+            data = {key: response.to_json() for key, response in self.index.items()}
+        temp_path = os.path.join(self.root, INDEX_FILE + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as index_file:
+            json.dump(data, index_file, indent=0, sort_keys=True)
+        os.replace(temp_path, os.path.join(self.root, INDEX_FILE))
+
+    def stats(self):
+        blobs = {response.blob for response in self.index.values()}
+        return f"{len(self.index)} responses, {len(blobs)} unique bodies"
+
+    def _blob_path(self, blob):
+        return os.path.join(self.root, OBJECTS_DIR, blob[:2], blob + BLOB_SUFFIX)
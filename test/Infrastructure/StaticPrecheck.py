@@ -0,0 +1,298 @@
+import asyncio
+import codecs
+import threading
+import time
+from selenium.common.exceptions import TimeoutException
+from Infrastructure.HtmlScan import HtmlScanner, Selector
+from Infrastructure.HttpClient import AsyncHttpClient
+from Infrastructure.PageWait import PageWait
+from Infrastructure.Reports import register_report
+
+#====== TIERS ======
+HTTP_TIER = "http"
+BROWSER_TIER = "browser"
+
+#====== DEFAULTS ======
+DEFAULT_CONNECTIONS_PER_HOST = 8
+DEFAULT_BROWSER_TIMEOUT = 10
+PARSE_CHUNK_BYTES = 64 * 1024
+HTML_CONTENT_TYPE = "text/html"
+
+#====== SCRIPTS ======
+COUNT_SCRIPT = "return arguments[0].map(function (selector) { return document.querySelectorAll(selector).length; });"
+
+"""
+Structural assertions ("this selector matches on that page") without a browser when the server rendered HTML
+is enough.
+
+Tier one fetches every page once over the pooled AsyncHttpClient (all the pages at once) and streams the body
+through HtmlScanner, which evaluates all the selectors of the page in the same pass (compound selectors with
+descendant and child combinators) and stops reading as soon as every check of the page is satisfied. A check
+goes to tier two, a real browser, only when tier one cannot settle it: the selector is not found in the raw HTML
+(it may be rendered by JS), the selector needs a rendered DOM (pseudo-classes, sibling combinators), or the
+request failed. The browser is asked for lazily, so a run that tier one settles never starts one.
+Every result records the tier that served it, and the report at exit shows the split.
+
+Usage:
+    result = get_static_precheck().check(SITE_URL, "nav.z-40", browser=lambda: driver)
+    assert result.passed, result.describe()
+"""
+
+
+class StructureCheck:
+    """
+    Assertion that `selector` matches at least `minimum` elements on the page at `url`.
+    """
+
+    def __init__(self, url, selector, minimum=1):
+        self.url = url
+        self.selector = selector
+        self.minimum = minimum
+
+
+class CheckResult:
+    """
+    Outcome of a StructureCheck: the number of matches and which tier (http or browser) counted them.
+    `reason` says why a check was sent to the browser, or why tier one failed it.
+    """
+
+    def __init__(self, check, tier, count, seconds, reason=""):
+        self.check = check
+        self.tier = tier
+        self.count = count
+        self.seconds = seconds
+        self.reason = reason
+
+    @property
+    def passed(self):
+        return self.count >= self.check.minimum
+
+    def describe(self):
+        outcome = "ok" if self.passed else f"{self.count} of {self.check.minimum} expected"
+        reason = f" ({self.reason})" if self.reason else ""
+        return f"[{self.tier}] {self.check.selector} on {self.check.url}: {outcome}{reason}"
+
+
+class _FetchedPage:
+
+    def __init__(self, status, content_type, body, seconds, error=None):
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+        self.seconds = seconds
+        self.error = error
+
+
+class StaticPrecheck:
+    """
+    Two tier structural checker, see the module description.
+
+    Args:
+        connections_per_host: Pooled HTTP connections per host.
+        browser_timeout: Seconds the browser tier waits for JS rendered elements.
+        cache: Keep the fetched pages, so checks of the same page in later tests do not fetch it again.
+    """
+
+    def __init__(self, connections_per_host=DEFAULT_CONNECTIONS_PER_HOST, browser_timeout=DEFAULT_BROWSER_TIMEOUT,
+                 cache=True):
+        self.connections_per_host = connections_per_host
+        self.browser_timeout = browser_timeout
+        self.cache = cache
+        self.results = []
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def check(self, url, selector, minimum=1, browser=None):
+        """
+        Runs one StructureCheck. See run().
+
+        Returns: CheckResult
+        """
+        return self.run([StructureCheck(url, selector, minimum)], browser)[0]
+
+    def run(self, checks, browser=None):
+        """
+        Runs the checks, over HTTP first and in the browser only for the checks tier one cannot settle.
+
+        Args:
+            checks: List of StructureCheck.
+            browser: Callable returning a WebDriver, called only if some check needs the browser. Without it,
+                     those checks fail with the reason tier one gave.
+
+        Returns: List of CheckResult in the same order as checks.
+        """
+        pages = self._fetch({check.url for check in checks})
+        scanned = {}
+        for url, url_checks in _by_url(checks).items():
+            scanned.update(zip(map(id, url_checks), self._scan(pages[url], url_checks)))
+        results = [scanned[id(check)] for check in checks]
+
+        pending = [index for index, result in enumerate(results) if result.tier == BROWSER_TIER]
+        if pending and browser is not None:
+            confirmed = self._check_in_browser(browser(), [results[index] for index in pending])
+        else:
+            confirmed = [CheckResult(results[index].check, HTTP_TIER, results[index].count, results[index].seconds,
+                                     f"{results[index].reason}, no browser to confirm") for index in pending]
+        for index, result in zip(pending, confirmed):
+            results[index] = result
+        with self._lock:
+            self.results.extend(results)
+        return results
+
+    def report(self):
+        """
+        Returns: text summary of the checks served by each tier, and the failures.
+        """
+        by_tier = {}
+        for result in self.results:
+            by_tier.setdefault(result.tier, []).append(result)
+        lines = [f"Structure pre-check: {len(self.results)} checks"]
+        for tier in (HTTP_TIER, BROWSER_TIER):
+            results = by_tier.get(tier, [])
+            if results:
+                slowest = max(result.seconds for result in results)
+                failed = sum(1 for result in results if not result.passed)
+                lines.append(f"  {tier}: {len(results)} checks, {failed} failed, slowest page {slowest:.3f}s")
+        lines.extend("  " + result.describe() for result in self.results if not result.passed)
+        return "\n".join(lines)
+
+    def _fetch(self, urls):
+        with self._lock:
+            pages = {url: self._pages[url] for url in urls if url in self._pages}
+        missing = [url for url in urls if url not in pages]
+        if missing:
+            fetched = asyncio.run(self._fetch_all(missing))
+            pages.update(fetched)
+            if self.cache:
+                with self._lock:
+                    self._pages.update({url: page for url, page in fetched.items() if page.error is None})
+        return pages
+
+    async def _fetch_all(self, urls):
+        async def fetch(client, url):
+            start = time.perf_counter()
+            try:
+                response = await client.get(url)
+            except (OSError, asyncio.TimeoutError, ValueError) as error:
+                return _FetchedPage(None, "", b"", time.perf_counter() - start, f"request failed: {error!r}")
+            return _FetchedPage(response.status, response.headers.get("content-type", HTML_CONTENT_TYPE),
+                                response.body, response.seconds)
+
+        async with AsyncHttpClient(self.connections_per_host) as client:
+            pages = await asyncio.gather(*(fetch(client, url) for url in urls))
+        return dict(zip(urls, pages))
+
+    def _scan(self, page, checks):
+        """
+        Tier one for the checks of one page. Checks it cannot settle come back with the browser tier.
+        """
+        start = time.perf_counter()
+
+        def results_for(tier, counts, reason):
+            seconds = page.seconds + time.perf_counter() - start
+            return [CheckResult(check, tier, counts.get(check.selector, 0), seconds, reason) for check in checks]
+
+        if page.error:
+            return results_for(BROWSER_TIER, {}, page.error)
+        if page.status >= 400:
+            return results_for(HTTP_TIER, {}, f"status {page.status}")
+        if HTML_CONTENT_TYPE not in page.content_type:
+            return results_for(BROWSER_TIER, {}, f"not HTML ({page.content_type})")
+
+        supported, unsupported = [], set()
+        for check in checks:
+            try:
+                Selector(check.selector)
+                supported.append(check)
+            except ValueError:
+                unsupported.add(check.selector)
+        counts = _stream_counts(page.body, supported)
+
+        seconds = page.seconds + time.perf_counter() - start
+        results = []
+        for check in checks:
+            count = counts.get(check.selector, 0)
+            if check.selector in unsupported:
+                results.append(CheckResult(check, BROWSER_TIER, 0, seconds, "selector needs a rendered DOM"))
+            elif count >= check.minimum:
+                results.append(CheckResult(check, HTTP_TIER, count, seconds))
+            else:
+                results.append(CheckResult(check, BROWSER_TIER, count, seconds, "not in the server rendered HTML"))
+        return results
+
+    def _check_in_browser(self, driver, pending):
+        """
+        Tier two for the results tier one could not settle: opens every page once and counts all its selectors
+        in one script call, waiting up to browser_timeout for JS rendered elements.
+        """
+        page_wait = PageWait(driver, self.browser_timeout)
+        confirmed = {}
+        for url, url_checks in _by_url([result.check for result in pending]).items():
+            start = time.perf_counter()
+            if driver.current_url.rstrip("/") != url.rstrip("/"):
+                driver.get(url)
+            selectors = list(dict.fromkeys(check.selector for check in url_checks))
+
+            def rendered(current):
+                values = dict(zip(selectors, current.execute_script(COUNT_SCRIPT, selectors)))
+                return values if all(values[check.selector] >= check.minimum for check in url_checks) else None
+            try:
+                counts = page_wait.until(rendered, url, "structure")
+            except TimeoutException:
+                counts = dict(zip(selectors, driver.execute_script(COUNT_SCRIPT, selectors)))
+            seconds = time.perf_counter() - start
+            confirmed.update((id(check), (counts[check.selector], seconds)) for check in url_checks)
+        return [CheckResult(result.check, BROWSER_TIER, *confirmed[id(result.check)], result.reason)
+                for result in pending]
+
+
+def _by_url(checks):
+    grouped = {}
+    for check in checks:
+        grouped.setdefault(check.url, []).append(check)
+    return grouped
+
+
+def _stream_counts(body, checks):
+    """
+    Feeds the body to one HtmlScanner in chunks and stops as soon as every check has its minimum.
+
+    Returns: dict of selector -> number of matches.
+    """
+    if not checks:
+        return {}
+    scanner = HtmlScanner(dict.fromkeys(check.selector for check in checks))
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for start in range(0, len(body), PARSE_CHUNK_BYTES):
+        scanner.feed(decoder.decode(body[start:start + PARSE_CHUNK_BYTES]))
+        if all(scanner.counts[check.selector] >= check.minimum for check in checks):
+            return dict(scanner.counts)
+    scanner.feed(decoder.decode(b"", final=True))
+    scanner.close()
+    return dict(scanner.counts)
+
+
+_shared_precheck = None
+_shared_precheck_lock = threading.Lock()
+
+
+def get_static_precheck():
+    """
+    Returns the process-wide StaticPrecheck (pages fetched by one test are reused by the next ones).
+    """
+    global _shared_precheck
+    with _shared_precheck_lock:
+        if _shared_precheck is None:
+            _shared_precheck = StaticPrecheck()
+            register_report(_print_report, _forget_precheck)
+        return _shared_precheck
+
+
+def _forget_precheck():
+    global _shared_precheck
+    _shared_precheck = None
+
+
+def _print_report():
+    if _shared_precheck is not None and _shared_precheck.results:
+        print(_shared_precheck.report())
@@ -0,0 +1,310 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from deep_translator import GoogleTranslator
+from Infrastructure.EmbeddingModel import normalize_text, text_key
+from Infrastructure.HttpClient import AsyncHttpClient
+from Infrastructure.ParagraphAlignment import DEFAULT_SECTION_TAG, Paragraph, align_paragraphs, iter_paragraphs
+from Infrastructure.Reports import register_report
+
+#====== BACKENDS ======
+BACKEND_ENV = "TRANSLATION_BACKEND"
+GOOGLE = "google"
+LOCAL = "local"
+GOOGLE_LANGUAGE_CODES = {"zh": "zh-CN"}
+TARGET_LANGUAGE = "en"
+
+#====== BATCHING ======
+DEFAULT_BATCH_SIZE = 25
+DEFAULT_CONCURRENCY = 4
+
+#====== CACHE ======
+CACHE_FILE_ENV = "TRANSLATION_CACHE_FILE"
+DEFAULT_CACHE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache",
+                                  "translations.sqlite")
+
+#====== LEXICAL COMPARISON ======
+LEXICAL_DIMENSIONS = 4096
+WORD = re.compile(r"\w+")
+
+"""
+    Pluggable machine translation for the cross-locale checks.
+
+    A TranslationBackend translates a batch of texts from one language to another: GoogleBackend calls Google
+    Translate through deep_translator, LocalBackend is a deterministic, reversible pseudo translation that needs
+    no network (for tests and offline CI). The Translator in front of a backend keeps every translation in a
+    SQLite cache keyed by backend, languages and the hash of the normalized text, sends only the missing texts,
+    in batches, and bounds the number of backend calls in flight for all the threads that share it.
+    compare_locales() translates every locale back to English in parallel and aligns it with the English page.
+    The backend is chosen with TRANSLATION_BACKEND (google or local).
+"""
+
+
+class TranslationBackend:
+    """
+    Interface of a translation service. `name` is part of the cache key.
+    """
+
+    name = None
+
+    def translate_batch(self, texts, source, target):
+        """
+        Returns: list with the translation of every text, in order.
+        """
+        raise NotImplementedError
+
+
+class GoogleBackend(TranslationBackend):
+    """
+    Google Translate through deep_translator (needs network access).
+    """
+
+    name = GOOGLE
+
+    def translate_batch(self, texts, source, target):
+        translator = GoogleTranslator(source=GOOGLE_LANGUAGE_CODES.get(source, source),
+                                      target=GOOGLE_LANGUAGE_CODES.get(target, target))
+        return [translation or "" for translation in translator.translate_batch(list(texts))]
+
+
+class LocalBackend(TranslationBackend):
+    """
+    Deterministic stand-in: English text becomes "[fr] " plus the text with its letters rotated by an offset
+    derived from the language, and translating back to English reverses it exactly. Text that was not produced
+    by the stand-in (e.g. a paragraph left in English) comes back unchanged.
+
+    Args:
+        latency: Seconds every batch takes, to emulate a remote service.
+    """
+
+    name = LOCAL
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def translate_batch(self, texts, source, target):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._translate(text, source, target) for text in texts]
+
+    def _translate(self, text, source, target):
+        if source != TARGET_LANGUAGE:
+            marker = f"[{source}] "
+            if text.startswith(marker):
+                text = _rotate(text[len(marker):], -_offset(source))
+        if target != TARGET_LANGUAGE:
+            text = f"[{target}] " + _rotate(text, _offset(target))
+        return text
+
+
+def _offset(language):
+    return sum(map(ord, language)) % 25 + 1
+
+
+def _rotate(text, offset):
+    rotated = []
+    for char in text:
+        if "a" <= char <= "z":
+            char = chr((ord(char) - ord("a") + offset) % 26 + ord("a"))
+        elif "A" <= char <= "Z":
+            char = chr((ord(char) - ord("A") + offset) % 26 + ord("A"))
+        rotated.append(char)
+    return "".join(rotated)
+
+
+class TranslationCache:
+    """
+    Persistent translations in SQLite, keyed by (backend, source, target, text hash).
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_FILE):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock, self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS translations (
+                    backend TEXT, source TEXT, target TEXT, text_key TEXT, translation TEXT,
+                    PRIMARY KEY (backend, source, target, text_key))
+            """)
+
+    def get_many(self, backend, source, target, keys):
+        """
+        Returns: dict of text key -> translation for the keys found.
+        """
+        found = {}
+        keys = list(keys)
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self.connection.execute(
+                    f"SELECT text_key, translation FROM translations WHERE backend = ? AND source = ? AND target = ? "
+                    f"AND text_key IN ({marks})", [backend, source, target] + chunk)
+                found.update(rows)
+        return found
+
+    def put_many(self, backend, source, target, translations):
+        with self._lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)",
+                                        [(backend, source, target, key, translation)
+                                         for key, translation in translations.items()])
+
+    def close(self):
+        self.connection.close()
+
+
+class Translator:
+    """
+    Cached, batched translation with a bounded number of concurrent backend calls.
+
+    Args:
+        backend: TranslationBackend.
+        cache: TranslationCache (in memory when not given).
+        batch_size: Maximum number of texts per backend call.
+        concurrency: Maximum number of backend calls in flight, shared by every thread using this translator.
+    """
+
+    def __init__(self, backend, cache=None, batch_size=DEFAULT_BATCH_SIZE, concurrency=DEFAULT_CONCURRENCY):
+        self.backend = backend
+        self.cache = cache or TranslationCache(":memory:")
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.stats = {"requested": 0, "cache_hits": 0, "translated": 0, "batches": 0}
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._lock = threading.Lock()
+
+    def translate(self, texts, source, target=TARGET_LANGUAGE):
+        """
+        Translates `texts` from `source` to `target`. Equal texts (after normalization) are translated once
+        and the texts already in the cache are not sent at all.
+
+        Returns: list of translations in the order of `texts`.
+        """
+        texts = [normalize_text(text) for text in texts]
+        if source == target:
+            return texts
+        keys = [text_key(text) for text in texts]
+        unique = dict(zip(keys, texts))
+        found = self.cache.get_many(self.backend.name, source, target, unique)
+        missing = [key for key in unique if key not in found]
+        batches = [missing[start:start + self.batch_size] for start in range(0, len(missing), self.batch_size)]
+        futures = [self._executor.submit(self.backend.translate_batch, [unique[key] for key in batch], source,
+                                         target) for batch in batches]
+        for batch, future in zip(batches, futures):
+            translated = dict(zip(batch, future.result()))
+            self.cache.put_many(self.backend.name, source, target, translated)
+            found.update(translated)
+        self._count(requested=len(texts), cache_hits=len(unique) - len(missing), translated=len(missing),
+                    batches=len(batches))
+        return [found[key] for key in keys]
+
+    def report(self):
+        return (f"Translations ({self.backend.name}): {self.stats['requested']} requested, "
+                f"{self.stats['cache_hits']} from cache, {self.stats['translated']} translated "
+                f"in {self.stats['batches']} batches")
+
+    def close(self):
+        self._executor.shutdown()
+        self.cache.close()
+
+    def _count(self, **counts):
+        with self._lock:
+            for name, count in counts.items():
+                self.stats[name] += count
+
+
+def lexical_embed(texts, dimensions=LEXICAL_DIMENSIONS):
+    """
+    Normalized bag-of-words vectors (hashed word counts). Back-translated text is in the same language as the
+    original, so this offline comparison is enough to align it; usable as the `embed` of align_paragraphs.
+    """
+    vectors = np.zeros((len(texts), dimensions))
+    for row, text in enumerate(texts):
+        for word in WORD.findall(normalize_text(text).lower()):
+            vectors[row, zlib.crc32(word.encode("utf-8")) % dimensions] += 1
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def compare_locales(english, pages, translator, embed=lexical_embed, workers=None):
+    """
+    Translates the paragraphs of every locale to English (all locales in parallel) and aligns them with the
+    English paragraphs.
+
+    Args:
+        english: List of Paragraph of the English page.
+        pages: Dict of language code -> list of Paragraph of the translated page.
+        translator: Translator shared by all the locales.
+        embed: Embedding function used for the alignment.
+        workers: Number of locales compared at once (default: all).
+
+    Returns: dict of language code -> AlignmentReport.
+    """
+    def compare(language):
+        paragraphs = pages[language]
+        translated = translator.translate([paragraph.text for paragraph in paragraphs], language)
+        back = [Paragraph(paragraph.index, paragraph.path, text) for paragraph, text in zip(paragraphs, translated)]
+        return align_paragraphs(english, back, embed, originals=[paragraph.text for paragraph in paragraphs])
+
+    languages = list(pages)
+    with ThreadPoolExecutor(max_workers=workers or max(len(languages), 1)) as executor:
+        return dict(zip(languages, executor.map(compare, languages)))
+
+
+def fetch_paragraphs(urls, section=DEFAULT_SECTION_TAG):
+    """
+    Fetches all the pages concurrently over HTTP and extracts their paragraphs.
+
+    Args:
+        urls: Dict of name -> URL.
+
+    Returns: dict of name -> list of Paragraph.
+    """
+    async def fetch_all():
+        async with AsyncHttpClient() as client:
+            return await asyncio.gather(*(client.get(url) for url in urls.values()))
+
+    responses = asyncio.run(fetch_all())
+    return {name: list(iter_paragraphs(response.text, section)) for name, response in zip(urls, responses)}
+
+
+_shared_translator = None
+_shared_translator_lock = threading.Lock()
+
+
+def get_translator():
+    """
+    Returns the process-wide Translator. The backend is read from TRANSLATION_BACKEND (google by default,
+    local for the offline stand-in) and the cache file from TRANSLATION_CACHE_FILE.
+    """
+    global _shared_translator
+    with _shared_translator_lock:
+        if _shared_translator is None:
+            backend = LocalBackend() if os.environ.get(BACKEND_ENV, GOOGLE) == LOCAL else GoogleBackend()
+            cache = TranslationCache(os.environ.get(CACHE_FILE_ENV, DEFAULT_CACHE_FILE))
+            _shared_translator = Translator(backend, cache)
+            register_report(_print_report, _forget_translator)
+        return _shared_translator
+
+
+def _forget_translator():
+    global _shared_translator
+    _shared_translator = None
+
+
+def _print_report():
+    if _shared_translator is not None and _shared_translator.stats["requested"]:
+        print(_shared_translator.report())
@@ -0,0 +1,234 @@
+import asyncio
+import time
+import zlib
+from html.parser import HTMLParser
+from Infrastructure.HttpClient import AsyncHttpClient
+from Infrastructure.PageWait import PageWait
+from Infrastructure.PerfMetrics import TRANSLATION, TRANSLATION_HTTP, PageMetrics
+
+#====== CHECKER DEFAULTS ======
+DEFAULT_CONNECTIONS_PER_HOST = 8
+DEFAULT_MAX_TABS = 4
+HTTP_TIER = "http"
+BROWSER_TIER = "browser"
+
+#====== ERRORS ======
+ERROR_404 = "404"
+ERROR_NOT_FOUND = "Not Found"
+
+#====== SCRIPTS ======
+OPEN_TAB_SCRIPT = "window.open(arguments[0]);"
+PAGE_CHECK_SCRIPT = """
+var navigation = performance.getEntriesByType('navigation')[0];
+return [
+    document.documentElement.getAttribute('lang'),
+    document.title,
+    document.documentElement.outerHTML.indexOf(arguments[0]) >= 0,
+    navigation ? navigation.duration / 1000 : null
+];
+"""
+
+
+class LinkResult:
+    """
+    Result of checking one translation link, and which tier (http or browser) checked it.
+    """
+
+    def __init__(self, language_name, href, tier, language_codes, status=None, lang=None, title="",
+                 not_found=False, seconds=0.0, needs_browser=False, budget_error=None):
+        self.language_name = language_name
+        self.href = href
+        self.tier = tier
+        self.language_codes = language_codes
+        self.status = status
+        self.lang = lang
+        self.title = title
+        self.not_found = not_found
+        self.seconds = seconds
+        self.needs_browser = needs_browser
+        self.budget_error = budget_error
+
+    @property
+    def error(self):
+        """
+        Same messages as the original one-tab-at-a-time check: "<name> (404 page!)" or "<name> (<lang>)",
+        then the performance budget message of the page, if it was measured and exceeded.
+        """
+        if self.not_found or ERROR_404 in self.title or (self.status is not None and self.status >= 400):
+            return f"{self.language_name} (404 page!)"
+        if not (self.lang and any(self.lang.startswith(code) for code in self.language_codes)):
+            return f"{self.language_name} ({self.lang})"
+        return self.budget_error
+
+
+class _HeadParser(HTMLParser):
+    """
+    Reads the <html lang> attribute and the <title> text from the raw (server rendered) HTML.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lang = None
+        self.title = ""
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "html":
+            self.lang = dict(attrs).get("lang")
+        elif tag == "title":
+            self._in_title = True
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+
+
+class TranslationLinkChecker:
+    """
+    Two tier checker for the translated sites.
+
+    Tier one fetches every link at once over a pooled asyncio HTTP client, checks the status code and
+    parses <html lang> from the raw response. Only the links that tier one cannot decide (no lang in the
+    server rendered HTML, or the request failed) go to tier two, which opens them in a bounded pool of
+    browser tabs that load concurrently (driven over DevTools events when the driver has an async driver
+    attached, see AsyncDriver). With a PerfRecorder, the web performance metrics of every page
+    opened in a tab are recorded and checked against the translation page budgets, and the fetch time of every
+    page tier one settles is recorded and checked against the TRANSLATION_HTTP budget (no paint or layout metrics
+    exist for those). With a MemoryMonitor, the session is sampled in every tab before it is closed.
+    """
+
+    def __init__(self, language_codes, max_tabs=DEFAULT_MAX_TABS,
+                 connections_per_host=DEFAULT_CONNECTIONS_PER_HOST, perf_recorder=None, memory_monitor=None):
+        self.language_codes = tuple(language_codes.values())
+        self.max_tabs = max_tabs
+        self.connections_per_host = connections_per_host
+        self.perf_recorder = perf_recorder
+        self.memory_monitor = memory_monitor
+
+    def check(self, links, driver=None, page_wait=None):
+        """
+        Checks all the links, using the browser only for the ones that need JS rendering.
+
+        Args:
+            links: List of (language_name, href) tuples.
+            driver: WebDriver for tier two. Without it, undecided links are reported as they are.
+            page_wait: PageWait to use for the browser tabs.
+
+        Returns: List of LinkResult in the same order as links.
+        """
+        results = asyncio.run(self.check_over_http(links))
+        pending = [index for index, result in enumerate(results) if result.needs_browser]
+        if pending and driver is not None:
+            browser_results = self.check_in_browser(driver, [links[index] for index in pending], page_wait)
+            for index, result in zip(pending, browser_results):
+                results[index] = result
+        return results
+
+    async def check_over_http(self, links):
+        """
+        Tier one: fetches all the links concurrently over pooled keep-alive connections.
+        """
+        async with AsyncHttpClient(self.connections_per_host) as client:
+            return await asyncio.gather(*(self._check_one(client, name, href) for name, href in links))
+
+    async def _check_one(self, client, language_name, href):
+        start = time.perf_counter()
+        try:
+            response = await client.get(href)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, zlib.error):
+            return LinkResult(language_name, href, HTTP_TIER, self.language_codes,
+                              seconds=time.perf_counter() - start, needs_browser=True)
+
+        parser = _HeadParser()
+        parser.feed(response.text)
+        not_found = ERROR_NOT_FOUND in response.text
+        needs_browser = response.status < 400 and not not_found and not parser.lang
+        budget_error = None
+        if self.perf_recorder is not None and not needs_browser:
+            sample = PageMetrics(TRANSLATION_HTTP, href, None, {"fetch_ms": round(response.seconds * 1000, 1)})
+            budget_error = self.perf_recorder.check_sample(sample, label=language_name)
+        return LinkResult(language_name, href, HTTP_TIER, self.language_codes, response.status, parser.lang,
+                          parser.title, not_found, response.seconds, needs_browser, budget_error)
+
+    def check_in_browser(self, driver, links, page_wait=None):
+        """
+        Tier two: opens up to max_tabs links at once in new tabs, so they load concurrently,
+        then reads lang, title and the "Not Found" marker of each tab in one script call.
+
+        Returns: List of LinkResult in the same order as links.
+        """
+        bridge = getattr(driver, "cdp_bridge", None)
+        if bridge is not None and self.perf_recorder is None and self.memory_monitor is None:
+            return bridge.run(self.check_in_tabs(bridge.browser, links))
+        page_wait = page_wait or PageWait(driver)
+        main_handle = driver.current_window_handle
+        results = []
+        for batch_start in range(0, len(links), self.max_tabs):
+            opened = []
+            for language_name, href in links[batch_start:batch_start + self.max_tabs]:
+                before = set(driver.window_handles)
+                driver.execute_script(OPEN_TAB_SCRIPT, href)
+                handle = (set(driver.window_handles) - before).pop()
+                opened.append((language_name, href, handle, time.perf_counter()))
+
+            for language_name, href, handle, opened_at in opened:
+                driver.switch_to.window(handle)
+                page_wait.page_load(language_name)
+                lang, title, not_found, load_seconds = driver.execute_script(PAGE_CHECK_SCRIPT, ERROR_NOT_FOUND)
+                seconds = load_seconds if load_seconds else time.perf_counter() - opened_at
+                budget_error = None
+                if self.perf_recorder is not None:
+                    budget_error = self.perf_recorder.check(driver, TRANSLATION, label=language_name)
+                if self.memory_monitor is not None:
+                    self.memory_monitor.sample(driver, f"translation {language_name}")
+                results.append(LinkResult(language_name, href, BROWSER_TIER, self.language_codes, lang=lang,
+                                          title=title or "", not_found=not_found, seconds=seconds,
+                                          budget_error=budget_error))
+                driver.close()
+            driver.switch_to.window(main_handle)
+        return results
+
+    async def check_in_tabs(self, browser, links):
+        """
+        Tier two over a DevTools connection (AsyncBrowser): up to max_tabs background tabs load at once and
+        each one is read as soon as its load event fired and its network went idle, without polling.
+
+        Returns: List of LinkResult in the same order as links.
+        """
+        limit = asyncio.Semaphore(self.max_tabs)
+
+        async def check_one(language_name, href):
+            async with limit:
+                start = time.perf_counter()
+                tab = await browser.new_tab(watch_network=True)
+                try:
+                    await tab.navigate(href)
+                    await tab.network_idle()
+                    lang, title, not_found, load_seconds = await tab.execute_script(PAGE_CHECK_SCRIPT,
+                                                                                    ERROR_NOT_FOUND)
+                finally:
+                    await browser.close_tab(tab)
+            return LinkResult(language_name, href, BROWSER_TIER, self.language_codes, lang=lang, title=title or "",
+                              not_found=not_found, seconds=load_seconds or time.perf_counter() - start)
+
+        return list(await asyncio.gather(*(check_one(name, href) for name, href in links)))
+
+
+def link_report(results):
+    """
+    Returns a text table with the tier, latency and outcome of every link.
+    """
+    lines = []
+    for result in sorted(results, key=lambda result: -result.seconds):
+        outcome = result.error or "ok"
+        lines.append(f"  {result.tier:7} {result.seconds * 1000:8.1f}ms  {result.language_name} "
+                     f"| {result.href} | lang={result.lang} | {outcome}")
+    by_tier = {}
+    for result in results:
+        by_tier[result.tier] = by_tier.get(result.tier, 0) + 1
+    tiers = ", ".join(f"{count} by {tier}" for tier, count in sorted(by_tier.items()))
+    return "\n".join([f"Checked {len(results)} links ({tiers})"] + lines)
@@ -0,0 +1,237 @@
+import time
+from selenium.common.exceptions import TimeoutException
+from Infrastructure.Browsers import supports_cdp
+from Infrastructure.DomExtraction import CSS_PATH_FUNCTION
+from Infrastructure.VisualDiff import capture_png
+
+#====== TABS & WAITS ======
+DEFAULT_TABS = 4
+DEFAULT_QUIET_MS = 150
+DEFAULT_TIMEOUT = 15
+MAX_OFFENDERS = 10
+OVERFLOW_TOLERANCE = 1
+
+#====== CDP ======
+DEVICE_METRICS_COMMAND = "Emulation.setDeviceMetricsOverride"
+NAVIGATE_COMMAND = "Page.navigate"
+INNER_SIZE_SCRIPT = "return [innerWidth, innerHeight];"
+
+#====== SCRIPTS ======
+LAYOUT_SCRIPT = CSS_PATH_FUNCTION + """
+var selectors = arguments[0], quietMs = arguments[1], timeoutMs = arguments[2], maxOffenders = arguments[3],
+    tolerance = arguments[4], done = arguments[arguments.length - 1];
+var start = performance.now();
+
+function box(el) {
+    if (!el) return null;
+    var rect = el.getBoundingClientRect();
+    return {x: rect.left + scrollX, y: rect.top + scrollY, width: rect.width, height: rect.height};
+}
+
+// Outermost elements sticking out to the right of the viewport, skipping subtrees that clip horizontally.
+function offenders(limit) {
+    var found = [];
+    (function visit(el) {
+        for (var child = el.firstElementChild; child && found.length < maxOffenders; child = child.nextElementSibling) {
+            var rect = child.getBoundingClientRect();
+            if (rect.width > 0 && rect.right > limit + tolerance) {
+                found.push({path: cssPath(child), left: rect.left, right: rect.right});
+            } else if (child.firstElementChild && getComputedStyle(child).overflowX === 'visible') {
+                visit(child);
+            }
+        }
+    })(document.body);
+    return found;
+}
+
+function collect(quiet) {
+    var body = document.body, limit = document.documentElement.clientWidth;
+    var boxes = {};
+    for (var name in selectors) boxes[name] = box(document.querySelector(selectors[name]));
+    done({
+        innerWidth: innerWidth, scrollWidth: body.scrollWidth, clientWidth: body.clientWidth, boxes: boxes,
+        offenders: offenders(limit), quiet: quiet, settleMs: performance.now() - start
+    });
+}
+
+function waitQuiet() {
+    var timer = null;
+    var observer = new MutationObserver(restart);
+    function restart() {
+        clearTimeout(timer);
+        if (performance.now() - start > timeoutMs) { observer.disconnect(); collect(false); return; }
+        timer = setTimeout(function () { observer.disconnect(); collect(true); }, quietMs);
+    }
+    observer.observe(document.body, {childList: true, subtree: true, attributes: true, characterData: true});
+    restart();
+}
+
+if (document.readyState === 'complete') waitQuiet();
+else addEventListener('load', waitQuiet, {once: true});
+"""
+
+"""
+Layout checks of one page at many viewport sizes, without resizing the browser window.
+
+Every viewport is emulated with CDP Emulation.setDeviceMetricsOverride, which re-lays out the page in place
+(no window manager round trip, no reload). The viewports are spread over several tabs of one session: all the
+tabs start loading the page at once, then each tab steps through its viewports. For every viewport a single
+script call waits for the DOM to settle and returns the scroll/client width, the bounding boxes of the
+requested elements and the outermost elements overflowing the viewport. Browsers without CDP (Firefox) get the
+same measurements by resizing the window, one viewport after the other.
+
+Usage:
+    snapshots = LayoutEngine(driver, {"header": "nav.z-40", "footer": "footer"}).measure(url, width_sweep())
+"""
+
+
+class Viewport:
+    """
+    One emulated device size.
+    """
+
+    def __init__(self, name, width, height, mobile=False, scale=1):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.mobile = mobile
+        self.scale = scale
+
+    @classmethod
+    def from_breakpoint(cls, breakpoint):
+        """
+        Builds a viewport from a {"name", "width", "height"} breakpoint dict.
+        """
+        return cls(breakpoint["name"], breakpoint["width"], breakpoint["height"])
+
+    def device_metrics(self):
+        return {"width": self.width, "height": self.height, "deviceScaleFactor": self.scale, "mobile": self.mobile}
+
+
+def width_sweep(min_width=320, max_width=1920, count=54, height=900):
+    """
+    Returns: `count` viewports with evenly spaced widths between min_width and max_width.
+    """
+    step = (max_width - min_width) / (count - 1)
+    widths = sorted({round(min_width + index * step) for index in range(count)})
+    return [Viewport(f"{width}px", width, height) for width in widths]
+
+
+class LayoutSnapshot:
+    """
+    Layout of the page at one viewport. `boxes` maps every requested element name to its page coordinates
+    ({"x", "y", "width", "height"}) or None, `offenders` lists {"path", "left", "right"} of the outermost
+    elements sticking out to the right.
+    """
+
+    def __init__(self, viewport, raw, png=None):
+        self.viewport = viewport
+        self.inner_width = raw["innerWidth"]
+        self.scroll_width = raw["scrollWidth"]
+        self.client_width = raw["clientWidth"]
+        self.boxes = raw["boxes"]
+        self.offenders = raw["offenders"]
+        self.quiet = raw["quiet"]
+        self.settle_ms = raw["settleMs"]
+        self.png = png
+
+    @property
+    def overflow(self):
+        return self.scroll_width - self.client_width
+
+    def describe(self):
+        offenders = ", ".join(f"{item['path']} (right {item['right']:.0f}px)" for item in self.offenders)
+        return (f"{self.viewport.name}: scrollWidth {self.scroll_width} vs clientWidth {self.client_width}"
+                + (f", overflowing: {offenders}" if offenders else ""))
+
+
+class LayoutEngine:
+    """
+    Measures a page at many viewports on one WebDriver session.
+
+    Args:
+        driver: WebDriver. Chrome emulates the viewports with CDP; other browsers resize the window instead,
+                one viewport after the other in a single tab.
+        selectors: Dict of name -> CSS selector of the elements whose bounding boxes are collected.
+        tabs: Maximum number of tabs loading and evaluating the page concurrently.
+        quiet_ms: How long the DOM must stay unchanged after a resize before it is measured.
+        timeout: Seconds to wait for the page load plus the quiet period of one viewport.
+        capture: Also capture a CDP screenshot of every viewport (LayoutSnapshot.png).
+    """
+
+    def __init__(self, driver, selectors, tabs=DEFAULT_TABS, quiet_ms=DEFAULT_QUIET_MS, timeout=DEFAULT_TIMEOUT,
+                 capture=False):
+        self.driver = driver
+        self.selectors = selectors
+        self.tabs = tabs
+        self.quiet_ms = quiet_ms
+        self.timeout = timeout
+        self.capture = capture
+
+    def measure(self, url, viewports):
+        """
+        Loads `url` in up to `tabs` new tabs and measures every viewport. The tabs are closed afterwards and
+        the driver is switched back to the window it was on.
+
+        Returns: list of LayoutSnapshot in the order of `viewports`.
+        """
+        viewports = list(viewports)
+        if not supports_cdp(self.driver):
+            return self._measure_by_resizing(url, viewports)
+        groups = [viewports[index::self.tabs] for index in range(min(self.tabs, len(viewports)))]
+        original_handle = self.driver.current_window_handle
+        handles = []
+        try:
+            for group in groups:
+                # Navigating with CDP returns once the navigation started, so the next tab starts loading at once.
+                self.driver.switch_to.new_window("tab")
+                handles.append(self.driver.current_window_handle)
+                self.driver.execute_cdp_cmd(DEVICE_METRICS_COMMAND, group[0].device_metrics())
+                self.driver.execute_cdp_cmd(NAVIGATE_COMMAND, {"url": url})
+
+            snapshots = {}
+            for handle, group in zip(handles, groups):
+                self.driver.switch_to.window(handle)
+                for index, viewport in enumerate(group):
+                    if index:
+                        self.driver.execute_cdp_cmd(DEVICE_METRICS_COMMAND, viewport.device_metrics())
+                    snapshots[id(viewport)] = self._snapshot(viewport)
+            return [snapshots[id(viewport)] for viewport in viewports]
+        finally:
+            for handle in handles:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+            self.driver.switch_to.window(original_handle)
+
+    def _measure_by_resizing(self, url, viewports):
+        original_handle = self.driver.current_window_handle
+        original_size = self.driver.get_window_size()
+        self.driver.switch_to.new_window("tab")
+        try:
+            self.driver.get(url)
+            snapshots = []
+            for viewport in viewports:
+                self._resize_viewport(viewport)
+                snapshots.append(self._snapshot(viewport))
+            return snapshots
+        finally:
+            self.driver.close()
+            self.driver.switch_to.window(original_handle)
+            self.driver.set_window_size(original_size["width"], original_size["height"])
+
+    def _resize_viewport(self, viewport):
+        # The window size includes the browser frame: resize once more by the difference the page reports.
+        self.driver.set_window_size(viewport.width, viewport.height)
+        inner_width, inner_height = self.driver.execute_script(INNER_SIZE_SCRIPT)
+        if (inner_width, inner_height) != (viewport.width, viewport.height):
+            self.driver.set_window_size(2 * viewport.width - inner_width, 2 * viewport.height - inner_height)
+
+    def _snapshot(self, viewport):
+        start = time.perf_counter()
+        raw = self.driver.execute_async_script(LAYOUT_SCRIPT, self.selectors, self.quiet_ms, self.timeout * 1000,
+                                               MAX_OFFENDERS, OVERFLOW_TOLERANCE)
+        if raw["innerWidth"] != viewport.width:
+            raise TimeoutException(f"Viewport {viewport.name} was not applied (innerWidth {raw['innerWidth']})")
+        if not raw["quiet"]:
+            raise TimeoutException(f"DOM kept changing for {time.perf_counter() - start:.1f}s at {viewport.name}")
+        return LayoutSnapshot(viewport, raw, capture_png(self.driver) if self.capture else None)
@@ -0,0 +1,281 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+from selenium.common.exceptions import WebDriverException
+from Infrastructure.Reports import register_report
+
+#====== BASELINE STORE ======
+BASELINE_DIR_ENV = "VISUAL_BASELINE_DIR"
+UPDATE_BASELINES_ENV = "VISUAL_BASELINE_UPDATE"
+DEFAULT_BASELINE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "visual")
+OBJECTS_DIR = "objects"
+REFS_DIR = "refs"
+
+#====== THRESHOLDS ======
+HASH_SIZE = 8
+HASH_SAMPLE = 32
+DEFAULT_HASH_THRESHOLD = 6
+DEFAULT_TILE_SIZE = 64
+DEFAULT_TILE_THRESHOLD = 8.0
+DEFAULT_WORKERS = os.cpu_count() or 2
+
+#====== OUTCOMES ======
+NEW = "new"
+IDENTICAL = "identical"
+SIMILAR = "similar"
+CHANGED = "changed"
+UPDATED = "updated"
+
+#====== CDP ======
+CAPTURE_COMMAND = "Page.captureScreenshot"
+
+"""
+Visual regression checks of screenshots against content addressed baselines.
+
+Screenshots are captured with CDP as PNG bytes and never written to disk on the happy path. Each check is a funnel:
+1. same PNG bytes as the baseline (sha256)          -> identical, nothing is decoded
+2. perceptual hash (DCT pHash) within the threshold -> similar, only the new screenshot is decoded
+3. otherwise a NumPy tile-wise pixel diff against the baseline decides which tiles changed.
+Baseline images are stored once per content hash (objects/ab/<sha256>.png); refs/<key>.json points a
+screenshot key at its baseline and keeps its pHash, so the baseline image is only read for step 3.
+"""
+
+
+class VisualResult:
+    """
+    Outcome of one screenshot check. `changed_tiles` holds (x, y, mean difference) of the tiles that differ.
+    """
+
+    def __init__(self, key, status, sha, distance=None, changed_tiles=(), size_changed=False, path=None):
+        self.key = key
+        self.status = status
+        self.sha = sha
+        self.distance = distance
+        self.changed_tiles = list(changed_tiles)
+        self.size_changed = size_changed
+        self.path = path
+
+    @property
+    def failed(self):
+        return self.status == CHANGED
+
+    @property
+    def message(self):
+        if self.size_changed:
+            return f"{self.key}: screenshot size changed (hash distance {self.distance})"
+        return (f"{self.key}: {len(self.changed_tiles)} tiles changed (hash distance {self.distance}), "
+                f"screenshot at {self.path}")
+
+
+def capture_png(driver):
+    """
+    Returns a screenshot of the viewport as PNG bytes, straight from CDP when available.
+    """
+    try:
+        data = driver.execute_cdp_cmd(CAPTURE_COMMAND, {"format": "png"})["data"]
+        return base64.b64decode(data)
+    except (AttributeError, WebDriverException):
+        return driver.get_screenshot_as_png()
+
+
+def decode_png(png):
+    """
+    Returns: the image as a (height, width, 3) uint8 array.
+    """
+    with Image.open(io.BytesIO(png)) as image:
+        return np.asarray(image.convert("RGB"))
+
+
+def _dct_matrix(size):
+    rows = np.arange(size)[:, None]
+    columns = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * columns + 1) * rows / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(HASH_SAMPLE)
+
+
+def perceptual_hash(image):
+    """
+    DCT perceptual hash: the image is reduced to 32x32 grayscale, and the signs of its 8x8 lowest frequencies
+    (DC excluded) against their median give a 64 bit integer.
+
+    Args:
+        image: PIL image or (height, width, 3) array.
+    """
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    small = np.asarray(image.convert("L").resize((HASH_SAMPLE, HASH_SAMPLE), Image.BILINEAR), dtype=np.float64)
+    low = (_DCT @ small @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].flatten()[1:]
+    bits = low > np.median(low)
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def hash_distance(first, second):
+    return bin(first ^ second).count("1")
+
+
+def tile_diff(baseline, current, tile=DEFAULT_TILE_SIZE, threshold=DEFAULT_TILE_THRESHOLD):
+    """
+    Mean absolute difference of every tile x tile block of two same-sized images, in one vectorized pass.
+
+    Returns: list of (x, y, mean difference) of the tiles above `threshold` (0-255 scale).
+    """
+    height, width = baseline.shape[:2]
+    padded_height = -(-height // tile) * tile
+    padded_width = -(-width // tile) * tile
+    difference = np.zeros((padded_height, padded_width), dtype=np.float32)
+    difference[:height, :width] = np.abs(baseline.astype(np.int16) - current.astype(np.int16)).mean(axis=2)
+    tiles = difference.reshape(padded_height // tile, tile, padded_width // tile, tile).mean(axis=(1, 3))
+    # Edge tiles are partly padding, scale their mean back to the real pixels.
+    rows_real = np.minimum(tile, height - np.arange(tiles.shape[0]) * tile)
+    columns_real = np.minimum(tile, width - np.arange(tiles.shape[1]) * tile)
+    tiles *= (tile * tile) / np.outer(rows_real, columns_real)
+    changed = np.argwhere(tiles > threshold)
+    return [(int(column) * tile, int(row) * tile, float(tiles[row, column])) for row, column in changed]
+
+
+class VisualBaselineStore:
+    """
+    Content addressed screenshot baselines and the hash-then-tile comparison funnel.
+
+    Args:
+        root: Directory of the store.
+        hash_threshold: pHash Hamming distance up to which a screenshot counts as unchanged.
+        tile: Tile size of the pixel diff.
+        tile_threshold: Mean absolute difference (0-255) above which a tile counts as changed.
+        update: Replace the baselines by the new screenshots instead of comparing.
+    """
+
+    def __init__(self, root=DEFAULT_BASELINE_DIR, hash_threshold=DEFAULT_HASH_THRESHOLD, tile=DEFAULT_TILE_SIZE,
+                 tile_threshold=DEFAULT_TILE_THRESHOLD, update=False):
+        self.root = root
+        self.hash_threshold = hash_threshold
+        self.tile = tile
+        self.tile_threshold = tile_threshold
+        self.update = update
+        self.stats = {status: 0 for status in (NEW, IDENTICAL, SIMILAR, CHANGED, UPDATED)}
+        self._lock = threading.Lock()
+
+    def check(self, key, png):
+        """
+        Compares a screenshot with the baseline of `key` (e.g. "home/mobile"). The first screenshot of a key
+        (or every screenshot in update mode) becomes its baseline.
+
+        Returns: VisualResult
+        """
+        sha = hashlib.sha256(png).hexdigest()
+        ref = self._read_ref(key)
+        if ref is not None and ref["sha"] == sha:
+            return self._count(VisualResult(key, IDENTICAL, sha, 0))
+
+        current = decode_png(png)
+        current_hash = perceptual_hash(current)
+        if ref is None or self.update:
+            self._write_object(sha, png)
+            self._write_ref(key, sha, current_hash, current.shape)
+            return self._count(VisualResult(key, NEW if ref is None else UPDATED, sha, path=self._object_path(sha)))
+
+        distance = hash_distance(int(ref["phash"], 16), current_hash)
+        if tuple(ref["shape"]) != current.shape:
+            return self._count(self._changed(key, sha, png, distance, [], size_changed=True))
+        if distance <= self.hash_threshold:
+            return self._count(VisualResult(key, SIMILAR, sha, distance))
+
+        baseline = decode_png(self._read_object(ref["sha"]))
+        changed_tiles = tile_diff(baseline, current, self.tile, self.tile_threshold)
+        if not changed_tiles:
+            return self._count(VisualResult(key, SIMILAR, sha, distance))
+        return self._count(self._changed(key, sha, png, distance, changed_tiles))
+
+    def check_many(self, screenshots, workers=DEFAULT_WORKERS):
+        """
+        Checks many (key, png) pairs on a thread pool (PNG decoding and NumPy release the GIL).
+
+        Returns: list of VisualResult in the same order.
+        """
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda item: self.check(*item), screenshots))
+
+    def report(self):
+        return "Visual checks: " + ", ".join(f"{count} {status}" for status, count in self.stats.items() if count)
+
+    def _changed(self, key, sha, png, distance, changed_tiles, size_changed=False):
+        # The failing screenshot is kept (content addressed too) for inspection.
+        self._write_object(sha, png)
+        return VisualResult(key, CHANGED, sha, distance, changed_tiles, size_changed, self._object_path(sha))
+
+    def _count(self, result):
+        with self._lock:
+            self.stats[result.status] += 1
+        return result
+
+    def _object_path(self, sha):
+        return os.path.join(self.root, OBJECTS_DIR, sha[:2], sha + ".png")
+
+    def _ref_path(self, key):
+        return os.path.join(self.root, REFS_DIR, *key.split("/")) + ".json"
+
+    def _read_ref(self, key):
+        try:
+            with open(self._ref_path(key), encoding="utf-8") as ref_file:
+                return json.load(ref_file)
+        except FileNotFoundError:
+            return None
+
+    def _write_ref(self, key, sha, phash, shape):
+        _write_atomic(self._ref_path(key), json.dumps({"sha": sha, "phash": f"{phash:016x}", "shape": list(shape)}))
+
+    def _read_object(self, sha):
+        with open(self._object_path(sha), "rb") as object_file:
+            return object_file.read()
+
+    def _write_object(self, sha, png):
+        path = self._object_path(sha)
+        if not os.path.exists(path):
+            _write_atomic(path, png)
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    mode = "wb" if isinstance(data, bytes) else "w"
+    with open(temp_path, mode) as temp_file:
+        temp_file.write(data)
+    os.replace(temp_path, path)
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_visual_store():
+    """
+    Returns the process-wide VisualBaselineStore. The directory is read from VISUAL_BASELINE_DIR and
+    VISUAL_BASELINE_UPDATE=1 re-records the baselines.
+    """
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = VisualBaselineStore(os.environ.get(BASELINE_DIR_ENV, DEFAULT_BASELINE_DIR),
+                                                update=os.environ.get(UPDATE_BASELINES_ENV) == "1")
+            register_report(_print_report, _forget_store)
+        return _shared_store
+
+
+def _forget_store():
+    global _shared_store
+    _shared_store = None
+
+
+def _print_report():
+    if _shared_store is not None and any(_shared_store.stats.values()):
+        print(_shared_store.report())
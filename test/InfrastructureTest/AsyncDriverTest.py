@@ -0,0 +1,285 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import struct
+import time
+import unittest
+from unittest import mock
+from selenium.common.exceptions import JavascriptException, TimeoutException
+from selenium.webdriver.remote.webelement import WebElement
+from Infrastructure.AsyncDriver import ASYNC_DRIVER_ENV, AsyncTab, CdpConnection, CdpError
+from Infrastructure.Browsers import requires_cdp
+from Infrastructure.DriverPool import DriverPool
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+
+#====== FAKE DEVTOOLS ======
+LOCAL_HOST = "127.0.0.1"
+SESSION = "session-1"
+PIPELINED_COMMANDS = 10
+LARGE_MESSAGE = 200000
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+TEXT_FRAME = 0x1
+CLOSE_FRAME = 0x8
+
+#====== FIXTURE PAGES ======
+FORM_PAGE = """<!DOCTYPE html><html lang="en"><head><title>Form</title></head><body>
+<a id="first" href="#">First</a><button id="second">Second</button><input id="third"></body></html>"""
+SLOW_PAGE_DELAY = 0.5
+# Run over DevTools and through Selenium, they must give the same results.
+PARITY_SCRIPTS = [
+    ("return [1, 1.5, 'text', '日本語', true, null];", ()),
+    ("return {title: document.title, nested: {list: [1, {deep: [2]}]}};", ()),
+    ("return arguments[0].map(function (value) { return value * 2; });", ([1, 2, 3],)),
+    ("return [arguments[0], arguments[1], arguments[2]];", ({"key": ["value"]}, None, "")),
+    ("return document.querySelectorAll('a, button').length;", ()),
+    ("document.title = document.title;", ()),
+]
+PARITY_ASYNC_SCRIPT = """
+var done = arguments[arguments.length - 1], count = arguments.length;
+setTimeout(function () { done([count, document.title]); }, 10);
+"""
+
+
+def server_frame(opcode, payload):
+    """
+    One final, unmasked frame as a server sends it.
+    """
+    length = len(payload)
+    if length < 126:
+        return struct.pack("!BB", 0x80 | opcode, length) + payload
+    if length < 1 << 16:
+        return struct.pack("!BBH", 0x80 | opcode, 126, length) + payload
+    return struct.pack("!BBQ", 0x80 | opcode, 127, length) + payload
+
+
+async def read_client_frame(reader):
+    """
+    Returns: (opcode, payload) of the next frame a client sent (always masked).
+    """
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    mask = await reader.readexactly(4)
+    payload = await reader.readexactly(length)
+    return first & 0x0F, bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+
+
+class FakeDevTools:
+    """
+    WebSocket endpoint standing in for a browser: every command is passed to `handler(message, devtools)`,
+    which answers (or not) with devtools.send().
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.received = []
+        self._writer = None
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._serve, LOCAL_HOST, 0)
+        self.url = f"ws://{LOCAL_HOST}:{self.server.sockets[0].getsockname()[1]}/devtools/browser/fake"
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def send(self, message):
+        self._writer.write(server_frame(TEXT_FRAME, json.dumps(message).encode()))
+        await self._writer.drain()
+
+    async def _serve(self, reader, writer):
+        self._writer = writer
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+        key = next(line.split(":", 1)[1].strip() for line in head.split("\r\n")
+                   if line.lower().startswith("sec-websocket-key"))
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+        writer.write(f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode("latin-1"))
+        while True:
+            try:
+                opcode, payload = await read_client_frame(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            if opcode == CLOSE_FRAME:
+                writer.write(server_frame(CLOSE_FRAME, payload))
+                break
+            message = json.loads(payload)
+            self.received.append(message)
+            await self.handler(message, self)
+        writer.close()
+
+
+async def echo(message, devtools):
+    await devtools.send({"id": message["id"], "result": {"echo": message["params"]}})
+
+
+class CdpConnectionTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_large_messages(self):
+        async with FakeDevTools(echo) as devtools:
+            connection = await CdpConnection.connect(devtools.url)
+            text = "x" * LARGE_MESSAGE
+            self.assertEqual(await connection.send("Runtime.evaluate", {"text": text}), {"echo": {"text": text}})
+            await connection.close()
+            self.assertTrue(connection.closed)
+
+    async def test_commands_are_pipelined(self):
+        """
+        The fake browser answers only once all the commands arrived, in reverse order.
+        """
+        async def answer_all_at_once(message, devtools):
+            if len(devtools.received) == PIPELINED_COMMANDS:
+                for received in reversed(devtools.received):
+                    await echo(received, devtools)
+
+        async with FakeDevTools(answer_all_at_once) as devtools:
+            connection = await CdpConnection.connect(devtools.url)
+            results = await asyncio.gather(*(connection.send("Runtime.evaluate", {"n": n})
+                                             for n in range(PIPELINED_COMMANDS)))
+            self.assertEqual(results, [{"echo": {"n": n}} for n in range(PIPELINED_COMMANDS)])
+            self.assertEqual(connection.stats["max_in_flight"], PIPELINED_COMMANDS)
+            await connection.close()
+
+    async def test_errors_and_closed_connection(self):
+        async def fail_or_hang(message, devtools):
+            if message["method"] == "Fail.please":
+                await devtools.send({"id": message["id"], "error": {"code": -32000, "message": "No such node"}})
+
+        async with FakeDevTools(fail_or_hang) as devtools:
+            connection = await CdpConnection.connect(devtools.url)
+            with self.assertRaisesRegex(CdpError, "No such node"):
+                await connection.send("Fail.please")
+            with self.assertRaises(TimeoutException):
+                await connection.send("Hang.forever", timeout=0.1)
+
+            pending = asyncio.ensure_future(connection.send("Hang.forever"))
+            await asyncio.sleep(0.05)
+            await connection.close()
+            with self.assertRaisesRegex(CdpError, "closed"):
+                await pending
+
+    async def test_events_are_delivered_per_session(self):
+        async def navigate(message, devtools):
+            if message["method"] == "Page.navigate":
+                await devtools.send({"id": message["id"], "result": {"frameId": "f", "loaderId": "l"}})
+                await asyncio.sleep(0.1)
+                await devtools.send({"method": "Page.loadEventFired", "params": {}, "sessionId": "other"})
+                await devtools.send({"method": "Page.loadEventFired", "params": {"timestamp": 1},
+                                     "sessionId": SESSION})
+            else:
+                await echo(message, devtools)
+
+        async with FakeDevTools(navigate) as devtools:
+            connection = await CdpConnection.connect(devtools.url)
+            tab = AsyncTab(connection, "target", SESSION)
+            start = time.perf_counter()
+            await tab.navigate("http://localhost/")
+            self.assertGreaterEqual(time.perf_counter() - start, 0.1, "navigate() waits for the load event")
+            self.assertEqual([message["method"] for message in devtools.received], ["Page.enable", "Page.navigate"])
+            self.assertTrue(all(message["sessionId"] == SESSION for message in devtools.received))
+            self.assertEqual(connection.stats["events"], 2)
+            await connection.close()
+
+    async def test_network_idle_follows_request_events(self):
+        async def network(message, devtools):
+            await echo(message, devtools)
+            if message["method"] == "Network.enable":
+                event = {"method": "Network.requestWillBeSent", "params": {"requestId": "1"}, "sessionId": SESSION}
+                await devtools.send(event)
+                await asyncio.sleep(0.2)
+                await devtools.send(dict(event, method="Network.loadingFinished"))
+
+        async with FakeDevTools(network) as devtools:
+            connection = await CdpConnection.connect(devtools.url)
+            tab = AsyncTab(connection, "target", SESSION)
+            start = time.perf_counter()
+            await tab.watch_network()
+            await tab.network_idle(idle_ms=100, timeout=5)
+            self.assertGreaterEqual(time.perf_counter() - start, 0.3)
+            self.assertEqual(tab.in_flight, set())
+            await connection.close()
+
+
+@requires_cdp
+class AsyncDriverBrowserTest(unittest.TestCase):
+    """
+    The shim of a session launched with ASYNC_DRIVER=1 runs scripts over DevTools, with the same results as
+    Selenium. The session has its own pool, so the shared pool keeps plain Selenium sessions.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FixtureServer({"/": FixtureResponse(FORM_PAGE),
+                                    "/slow": FixtureResponse(FORM_PAGE, delay=SLOW_PAGE_DELAY)}).start()
+        cls.addClassCleanup(cls.server.stop)
+        cls.pool = DriverPool(1)
+        cls.addClassCleanup(cls.pool.shutdown)
+        with mock.patch.dict(os.environ, {ASYNC_DRIVER_ENV: "1"}):
+            cls.lease = cls.pool.acquire(cls.__name__)
+        cls.driver = cls.lease.driver
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.release(cls.lease)
+
+    def setUp(self):
+        self.driver.get(self.server.url("/"))
+
+    def test_results_match_selenium(self):
+        bridge = self.driver.cdp_bridge
+        for script, args in PARITY_SCRIPTS:
+            self.assertEqual(self.driver.execute_script(script, *args),
+                             bridge._selenium_execute_script(script, *args), script)
+        self.assertEqual(self.driver.execute_async_script(PARITY_ASYNC_SCRIPT, "a"),
+                         bridge._selenium_execute_async_script(PARITY_ASYNC_SCRIPT, "a"))
+        for execute in (self.driver.execute_script, bridge._selenium_execute_script):
+            with self.assertRaises(JavascriptException):
+                execute("return undefinedName.property;")
+
+    def test_scripts_run_over_devtools(self):
+        bridge = self.driver.cdp_bridge
+        self.assertEqual(self.driver.execute_script("return [arguments[0] + 1, document.title];", 41), [42, "Form"])
+        self.assertEqual(self.driver.execute_async_script("arguments[1](arguments[0] * 2);", 21), 42)
+        self.assertIsNone(self.driver.execute_script("document.title = 'Changed';"))
+        self.assertEqual(self.driver.execute_cdp_cmd("Runtime.evaluate", {"expression": "document.title",
+                                                                           "returnByValue": True})["result"]["value"],
+                         "Changed")
+        with self.assertRaises(JavascriptException):
+            self.driver.execute_script("throw new Error('broken');")
+        self.assertIsNotNone(bridge)
+
+    def test_elements_go_through_selenium(self):
+        elements = self.driver.execute_script("return document.querySelectorAll('a, button');")
+        self.assertTrue(all(isinstance(element, WebElement) for element in elements))
+        self.assertEqual([element.text for element in elements], ["First", "Second"])
+        self.assertEqual(self.driver.execute_script("return arguments[0].id;", elements[1]), "second")
+
+    def test_keys_are_pipelined(self):
+        self.driver.cdp_bridge.press_key("Tab", 3)
+        self.assertEqual(self.driver.execute_script("return document.activeElement.id;"), "third")
+        self.driver.cdp_bridge.press_key("Tab", 2, shift=True)
+        self.assertEqual(self.driver.execute_script("return document.activeElement.id;"), "first")
+
+    def test_tabs_load_concurrently(self):
+        browser = self.driver.cdp_bridge.browser
+
+        async def open_tabs():
+            tabs = await asyncio.gather(*(browser.new_tab(self.server.url("/slow")) for _ in range(4)))
+            titles = await asyncio.gather(*(tab.execute_script("return document.title;") for tab in tabs))
+            await asyncio.gather(*(browser.close_tab(tab) for tab in tabs))
+            return titles
+
+        start = time.perf_counter()
+        self.assertEqual(self.driver.cdp_bridge.run(open_tabs()), ["Form"] * 4)
+        self.assertLess(time.perf_counter() - start, 4 * SLOW_PAGE_DELAY, "The tabs did not load concurrently")
+        self.assertEqual(len(self.driver.window_handles), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import io
+import random
+import time
+import unittest
+from Infrastructure.Benchmark import IMPROVEMENT, NO_BASELINE, NO_CHANGE, OK, REGRESSION, SKIPPED, SUITE_TOTAL, \
+    BenchmarkHistory, bootstrap_interval, compare, released_memory_mb, run_benchmark, run_once
+from Infrastructure.Fingerprints import get_fingerprint_store
+from Infrastructure.MemoryMonitor import ACQUIRE, RELEASE, RESET, MemorySample
+
+#====== SYNTHETIC SAMPLES ======
+SAMPLE_COUNT = 15
+BASE_SECONDS = 2.0
+NOISE = 0.05
+BENCHMARKED_TEST = "InfrastructureTest.BenchmarkTest.BenchmarkedCase.test_short_sleep"
+FINGERPRINTED_TEST = "InfrastructureTest.BenchmarkTest.BenchmarkedCase.test_unchanged_fingerprint"
+SKIPPING_TEST = "InfrastructureTest.BenchmarkTest.BenchmarkedCase.test_always_skipped"
+
+
+def noisy(center, count=SAMPLE_COUNT, seed=0):
+    rng = random.Random(seed)
+    return [center * (1 + rng.uniform(-NOISE, NOISE)) for _ in range(count)]
+
+
+class BenchmarkedCase(unittest.TestCase):
+    """
+    A stand-in for a suite test method, benchmarked by BenchmarkTest.test_run_benchmark.
+    """
+
+    def test_short_sleep(self):
+        time.sleep(0.01)
+
+    def test_unchanged_fingerprint(self):
+        if not get_fingerprint_store().force:
+            self.skipTest("Unchanged since the last passing run")
+        time.sleep(0.01)
+
+    def test_always_skipped(self):
+        self.skipTest("Not on this platform")
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def test_regression_is_detected(self):
+        comparison = compare("t", "seconds", noisy(BASE_SECONDS), noisy(BASE_SECONDS * 1.2, seed=1))
+        self.assertEqual(comparison.verdict, REGRESSION)
+        self.assertGreater(comparison.low, 0)
+        self.assertLess(comparison.low, comparison.change)
+        self.assertLess(comparison.change, comparison.high)
+
+    def test_noise_is_not_a_regression(self):
+        comparison = compare("t", "seconds", noisy(BASE_SECONDS), noisy(BASE_SECONDS, seed=1))
+        self.assertEqual(comparison.verdict, NO_CHANGE)
+        self.assertLess(comparison.low, 0)
+        self.assertGreater(comparison.high, 0)
+
+    def test_improvement_and_constant_metrics(self):
+        self.assertEqual(compare("t", "seconds", noisy(BASE_SECONDS), noisy(BASE_SECONDS * 0.7)).verdict, IMPROVEMENT)
+        self.assertEqual(compare("t", "commands", [40] * 5, [40] * 5).verdict, NO_CHANGE)
+        self.assertEqual(compare("t", "commands", [40] * 5, [48] * 5).verdict, REGRESSION)
+        self.assertEqual(bootstrap_interval([40] * 5, [48] * 5), (0.2, 0.2))
+
+    def test_history_baseline_uses_same_test_set(self):
+        history = BenchmarkHistory(":memory:")
+        first = history.start_run()
+        for iteration in range(3):
+            history.add_sample(first, "a", iteration, 1.0, 10, 100.0, "ok")
+            history.add_sample(first, "b", iteration, 2.0, 20, None, "ok" if iteration else "failed")
+        other = history.start_run()
+        history.add_sample(other, "a", 0, 9.0, 90, 100.0, "ok")
+        current = history.start_run()
+
+        self.assertEqual(history.previous_runs(current, ["b", "a"]), [first])
+        self.assertEqual(history.samples([first], "b", "seconds"), [2.0, 2.0])
+        self.assertEqual(history.samples([first], "b", "memory_mb"), [])
+        self.assertEqual(history.totals([first], "seconds", 2), [3.0, 3.0])
+        history.close()
+
+    def test_run_benchmark(self):
+        history = BenchmarkHistory(":memory:")
+        stream = io.StringIO()
+        run_benchmark([BENCHMARKED_TEST], iterations=3, history=history, warmup=0, stream=stream)
+        run_id, comparisons = run_benchmark([BENCHMARKED_TEST], iterations=3, history=history, warmup=0, stream=stream)
+
+        self.assertEqual(len(history.samples([run_id], BENCHMARKED_TEST, "seconds")), 3)
+        self.assertTrue(all(seconds >= 0.01 for seconds in history.samples([run_id], BENCHMARKED_TEST, "seconds")))
+        self.assertEqual(history.samples([run_id], BENCHMARKED_TEST, "commands"), [0, 0, 0])
+        by_name = {(comparison.test_id, comparison.metric): comparison for comparison in comparisons}
+        self.assertNotEqual(by_name[(BENCHMARKED_TEST, "seconds")].verdict, NO_BASELINE)
+        self.assertIn((SUITE_TOTAL, "seconds"), by_name)
+        history.close()
+
+    def test_skips_are_not_samples(self):
+        store = get_fingerprint_store()
+        self.addCleanup(setattr, store, "force", store.force)
+        store.force = False
+        self.assertEqual(run_once(FINGERPRINTED_TEST)[0], OK, "The fingerprint store is forced")
+        self.assertEqual(run_once(SKIPPING_TEST)[0], SKIPPED)
+
+        history = BenchmarkHistory(":memory:")
+        run_id, comparisons = run_benchmark([BENCHMARKED_TEST, SKIPPING_TEST], iterations=2, history=history,
+                                            warmup=0, stream=io.StringIO())
+        self.assertEqual(history.samples([run_id], SKIPPING_TEST, "seconds"), [])
+        self.assertEqual(len(history.samples([run_id], BENCHMARKED_TEST, "seconds")), 2)
+        self.assertEqual(history.totals([run_id], "seconds", 2), [], "No iteration has both tests measured")
+        self.assertNotIn(SKIPPING_TEST, {comparison.test_id for comparison in comparisons})
+        history.close()
+
+    def test_memory_of_the_released_session(self):
+        samples = [MemorySample(1, "t", ACQUIRE, 0.0, browser_mb=300.0),
+                   MemorySample(1, "t", RELEASE, 1.0, browser_mb=420.5),
+                   MemorySample(1, "t", RESET, 1.2, browser_mb=350.0)]
+        self.assertEqual(released_memory_mb(samples), 420.5)
+        self.assertEqual(released_memory_mb([MemorySample(1, "t", RELEASE, 1.0, js_heap_mb=12.0)]), 12.0)
+        self.assertIsNone(released_memory_mb(samples[:1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+from Infrastructure.BrowserMatrix import DEFAULT_ESTIMATE_SECONDS, DurationHistory, MatrixJob, makespan, run_matrix, \
+    schedule
+from Infrastructure.Browsers import BROWSER_ENV, CHROME, FIREFOX, BrowserConfig, browser_config, parse_viewport, \
+    requires_cdp
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.Fingerprints import FINGERPRINT_DIR_ENV, HTML, get_fingerprint_store, page_fingerprint
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+from Infrastructure.Instrumentation import TRACER
+from Infrastructure.ParallelRunner import ShardJob
+from InfrastructureTest.ParallelRunnerTest import POOLED_JOB, QUIT_MARKER_ENV, MarkedDriver, read_quits
+
+#====== CONFIGS ======
+CHROME_DESKTOP = BrowserConfig(CHROME, (1280, 800), headless=True)
+FIREFOX_DESKTOP = BrowserConfig(FIREFOX, (1280, 800), headless=True)
+FIREFOX_PHONE = BrowserConfig(FIREFOX, (390, 844), headless=True)
+
+#====== OFFLINE SUITES ======
+OFFLINE_TESTS = ["InfrastructureTest.FingerprintsTest.FingerprintStoreTest",
+                 "InfrastructureTest.MemoryMonitorTest.GrowthTrendTest"]
+BROWSER_TESTS = ["InfrastructureTest.FingerprintsTest.PageFingerprintBrowserTest"]
+FINGERPRINTED_TEST = "InfrastructureTest.BrowserMatrixTest.FingerprintedCheckBrowserTest"
+FOOTER_PAGE = "<!DOCTYPE html><html><body><main>Text</main><footer>Footer</footer></body></html>"
+
+
+def job(test_id, config, estimate):
+    return MatrixJob(ShardJob(test_id), config, estimate)
+
+
+class BrowserConfigTest(unittest.TestCase):
+
+    def test_environment_round_trip(self):
+        for config in (CHROME_DESKTOP, FIREFOX_PHONE, BrowserConfig(FIREFOX)):
+            with mock.patch.dict(os.environ, config.environment()):
+                self.assertEqual(browser_config(), config)
+        self.assertEqual(FIREFOX_PHONE.name, "firefox 390x844")
+        self.assertFalse(FIREFOX_PHONE.cdp)
+        with self.assertRaises(ValueError):
+            BrowserConfig("netscape")
+
+    def test_parse_viewport(self):
+        self.assertEqual(parse_viewport("1280X800"), (1280, 800))
+        self.assertIsNone(parse_viewport("default"))
+        with self.assertRaises(ValueError):
+            parse_viewport("wide")
+
+    def test_requires_cdp_skips_on_firefox(self):
+        @requires_cdp
+        class DevToolsTest(unittest.TestCase):
+            def test_devtools(self):
+                pass
+
+        for browser, skipped in ((CHROME, 0), (FIREFOX, 1)):
+            with mock.patch.dict(os.environ, {BROWSER_ENV: browser}):
+                result = unittest.TestResult()
+                DevToolsTest("test_devtools").run(result)
+            self.assertEqual((result.testsRun, len(result.skipped)), (1, skipped), browser)
+
+
+class ScheduleTest(unittest.TestCase):
+
+    def test_longest_first_balances_the_workers(self):
+        jobs = [job(f"Suite.test_{index}", CHROME_DESKTOP, seconds)
+                for index, seconds in enumerate([30, 25, 20, 20, 15, 10, 5, 5])]
+        plans = schedule(jobs, 3, launch_seconds=0)
+        self.assertEqual(sorted(plan.load for plan in plans), [40, 45, 45])
+        self.assertEqual(makespan(plans), 45)
+        self.assertEqual(sorted(len(plan.jobs) for plan in plans), [2, 3, 3])
+
+    def test_launch_cost_keeps_browsers_together(self):
+        jobs = [job(f"Suite.test_{index}", config, 10)
+                for index in range(2) for config in (CHROME_DESKTOP, FIREFOX_DESKTOP)]
+        plans = schedule(jobs, 2, launch_seconds=20)
+        self.assertEqual({tuple(plan.configs) for plan in plans}, {(CHROME_DESKTOP,), (FIREFOX_DESKTOP,)})
+        self.assertEqual(makespan(plans), 40)
+
+    def test_jobs_run_grouped_by_config(self):
+        jobs = [job("Suite.test_a", CHROME_DESKTOP, 30), job("Suite.test_b", FIREFOX_DESKTOP, 20),
+                job("Suite.test_c", CHROME_DESKTOP, 10)]
+        plan, = schedule(jobs, 1, launch_seconds=0)
+        self.assertEqual([job.config for job in plan.jobs], [CHROME_DESKTOP, CHROME_DESKTOP, FIREFOX_DESKTOP])
+
+
+class DurationHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.history_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.history_dir.name, "durations.json")
+
+    def tearDown(self):
+        self.history_dir.cleanup()
+
+    def test_estimates_fall_back_and_persist(self):
+        history = DurationHistory(self.path)
+        first, other_browser = job("Suite.test_a", CHROME_DESKTOP, 0), job("Suite.test_a", FIREFOX_DESKTOP, 0)
+        other_test = job("Suite.test_b", FIREFOX_PHONE, 0)
+        self.assertEqual(history.estimate(first), DEFAULT_ESTIMATE_SECONDS)
+        history.record(first, 10.0)
+        history.record(first, 20.0)
+        history.record(job("Suite.test_c", CHROME_DESKTOP, 0), 4.0)
+        history.save()
+
+        history = DurationHistory(self.path)
+        self.assertEqual(history.estimate(first), 15.0)
+        self.assertEqual(history.estimate(other_browser), 15.0, "Same test on another browser")
+        self.assertEqual(history.estimate(other_test), 9.5, "Median of the known jobs")
+
+
+class RunMatrixTest(unittest.TestCase):
+
+    def test_report_covers_every_test_and_config(self):
+        stream = io.StringIO()
+        with tempfile.TemporaryDirectory() as history_dir:
+            history = DurationHistory(os.path.join(history_dir, "durations.json"))
+            result = run_matrix(OFFLINE_TESTS, [CHROME_DESKTOP, FIREFOX_PHONE], 2, history, stream)
+            saved = DurationHistory(history.path).durations
+        report = stream.getvalue()
+
+        self.assertTrue(result.wasSuccessful(), report)
+        self.assertEqual(len(result.cells), result.testsRun)
+        self.assertEqual(len(saved), len(result.cells))
+        self.assertRegex(report, r"chrome 1280x800 +firefox 390x844")
+        self.assertIn("firefox 390x844: ", report)
+        self.assertRegex(report, r"Matrix: \d+ jobs, [\d.]+s of work in [\d.]+s wall \(predicted makespan")
+
+    def test_workers_quit_the_browser_of_every_config(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            marker = os.path.join(work_dir, "quits.txt")
+            with mock.patch.object(BrowserConfig, "factory", lambda config: lambda: MarkedDriver(config.browser)), \
+                    mock.patch.dict(os.environ, {QUIT_MARKER_ENV: marker}), \
+                    mock.patch.object(TRACER, "trace_dir", None):
+                result = run_matrix([POOLED_JOB], [CHROME_DESKTOP, FIREFOX_DESKTOP], 2,
+                                    DurationHistory(os.path.join(work_dir, "durations.json")), io.StringIO())
+            quits = read_quits(marker)
+
+        self.assertTrue(result.wasSuccessful(), result.errors)
+        ran_on = sorted((worker_pid, name.rsplit("[", 1)[1].split()[0]) for name, worker_pid, _ in result.shard_timings)
+        self.assertEqual(sorted(quits), ran_on, "Every worker quits the browser it launched when it stops")
+
+
+class BrowserMatrixBrowserTest(unittest.TestCase):
+
+    def test_fingerprints_on_chrome_and_firefox(self):
+        stream = io.StringIO()
+        with tempfile.TemporaryDirectory() as history_dir:
+            history = DurationHistory(os.path.join(history_dir, "durations.json"))
+            result = run_matrix(BROWSER_TESTS, [CHROME_DESKTOP, FIREFOX_DESKTOP], 2, history, stream)
+        self.assertTrue(result.wasSuccessful(), stream.getvalue())
+        self.assertEqual(sorted(config.browser for config in result.configs), [CHROME, FIREFOX])
+
+    def test_check_passed_on_one_browser_still_runs_on_the_other(self):
+        configs = [CHROME_DESKTOP, FIREFOX_DESKTOP]
+        with tempfile.TemporaryDirectory() as work_dir, \
+                mock.patch.dict(os.environ, {FINGERPRINT_DIR_ENV: os.path.join(work_dir, "fingerprints")}):
+            history = DurationHistory(os.path.join(work_dir, "durations.json"))
+            first = run_matrix([FINGERPRINTED_TEST], configs, 1, history, io.StringIO())
+            second = run_matrix([FINGERPRINTED_TEST], configs, 1, history, io.StringIO())
+
+        self.assertTrue(first.wasSuccessful() and second.wasSuccessful(), first.errors + second.errors)
+        self.assertEqual(first.skipped, [], "Firefox runs the check that passed on Chrome in the same worker")
+        self.assertEqual(len(second.skipped), len(configs), "Unchanged on both browsers")
+
+
+class FingerprintedCheckBrowserTest(unittest.TestCase):
+    """
+    An incremental check on a fixture page, run on several browsers by BrowserMatrixBrowserTest with its own
+    fingerprint store.
+    """
+
+    def setUp(self):
+        if FINGERPRINT_DIR_ENV not in os.environ:
+            self.skipTest("Only run by BrowserMatrixBrowserTest")
+        self.server = FixtureServer({"/": FixtureResponse(FOOTER_PAGE)}).start()
+        self.addCleanup(self.server.stop)
+
+    def test_footer(self):
+        with get_driver_pool().lease(self.id()) as lease:
+            lease.driver.get(self.server.url("/"))
+            fingerprint = page_fingerprint(lease.driver, {"footer": HTML})
+            if get_fingerprint_store().unchanged(self.id(), "footer", fingerprint):
+                self.skipTest("Footer unchanged since the last passing run")
+            self.assertEqual(lease.driver.find_element("tag name", "footer").text, "Footer")
+            get_fingerprint_store().record(self.id(), "footer", fingerprint)
+
+
+if __name__ == "__main__":
+    unittest.main()
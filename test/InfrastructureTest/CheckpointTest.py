@@ -0,0 +1,123 @@
+import os
+import tempfile
+import time
+import unittest
+from Infrastructure.Checkpoint import Checkpoint, CheckpointStore, _cookie_param, build_hash, capture_checkpoint, \
+    restore_checkpoint
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+
+#====== FIXTURE APP ======
+BUILD_ID = "build-1"
+APP_PAGE = """<!DOCTYPE html><html lang="en"><head><title>App</title></head><body><p id="state"></p>
+<script>
+window.__NEXT_DATA__ = {buildId: '%s'};
+document.getElementById('state').textContent = JSON.stringify({
+    recent: localStorage.getItem('recent'), tab: sessionStorage.getItem('tab'),
+    cookie: document.cookie.indexOf('theme=dark') >= 0
+});
+</script></body></html>""" % BUILD_ID
+SETUP_SCRIPT = """
+localStorage.setItem('recent', '["custom hook"]');
+sessionStorage.setItem('tab', 'learn');
+document.cookie = 'theme=dark; path=/; max-age=3600';
+"""
+STATE_SCRIPT = "return JSON.parse(document.getElementById('state').textContent);"
+RESTORED_STATE = {"recent": '["custom hook"]', "tab": "learn", "cookie": True}
+EMPTY_STATE = {"recent": None, "tab": None, "cookie": False}
+
+
+def checkpoint(name="searched", build=BUILD_ID, created=None):
+    return Checkpoint(name, build, "http://localhost/learn", "http://localhost", [{"name": "theme", "value": "dark"}],
+                      {"recent": "[]"}, {}, created)
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store_dir = tempfile.TemporaryDirectory()
+        self.store = CheckpointStore(self.store_dir.name)
+
+    def tearDown(self):
+        self.store_dir.cleanup()
+
+    def test_store_is_keyed_by_build(self):
+        saved = checkpoint()
+        self.store.put(saved)
+        reloaded = CheckpointStore(self.store_dir.name)
+        self.assertEqual(reloaded.get(BUILD_ID, "searched").to_json(), saved.to_json())
+        self.assertIsNone(reloaded.get("build-2", "searched"))
+        self.assertIsNone(reloaded.get(BUILD_ID, "other"))
+
+    def test_old_checkpoints_expire(self):
+        self.store.put(checkpoint(created=time.time() - self.store.max_age - 1))
+        self.assertIsNone(self.store.get(BUILD_ID, "searched"))
+
+    def test_disabled_store_always_runs_setup(self):
+        calls = []
+        store = CheckpointStore(self.store_dir.name, enabled=False)
+        self.assertFalse(store.checkpoint(None, "searched", lambda: calls.append(1)))
+        self.assertEqual(calls, [1])
+        self.assertEqual(os.listdir(self.store_dir.name), [])
+
+    def test_cookie_params(self):
+        cdp_cookie = {"name": "a", "value": "1", "domain": "react.dev", "path": "/", "expires": -1, "size": 2,
+                      "httpOnly": False, "secure": True, "session": True, "priority": "Medium"}
+        self.assertEqual(_cookie_param(cdp_cookie),
+                         {"name": "a", "value": "1", "domain": "react.dev", "path": "/", "secure": True,
+                          "httpOnly": False})
+        self.assertEqual(_cookie_param({"name": "b", "value": "2", "expiry": 1900000000})["expires"], 1900000000)
+
+
+class CheckpointBrowserTest(unittest.TestCase):
+    """
+    Captures the state of a fixture app and restores it into a fresh pooled session.
+    """
+
+    def setUp(self):
+        self.server = FixtureServer({"/": FixtureResponse(APP_PAGE), "/learn": FixtureResponse(APP_PAGE)}).start()
+        self.store_dir = tempfile.TemporaryDirectory()
+        self.store = CheckpointStore(self.store_dir.name)
+
+    def tearDown(self):
+        self.store_dir.cleanup()
+        self.server.stop()
+
+    def test_capture_and_restore_in_fresh_session(self):
+        with get_driver_pool().lease(self.id()) as lease:
+            lease.driver.get(self.server.url("/"))
+            lease.driver.execute_script(SETUP_SCRIPT)
+            lease.driver.get(self.server.url("/learn"))
+            self.assertEqual(build_hash(lease.driver), BUILD_ID)
+            saved = capture_checkpoint(lease.driver, "setup")
+
+        self.assertEqual(saved.url, self.server.url("/learn"))
+        with get_driver_pool().lease(self.id()) as lease:
+            restore_checkpoint(lease.driver, saved)
+            self.assertEqual(lease.driver.current_url, saved.url)
+            self.assertEqual(lease.driver.execute_script(STATE_SCRIPT), RESTORED_STATE)
+
+            lease.driver.execute_script("localStorage.clear(); sessionStorage.clear();")
+            lease.driver.refresh()
+            self.assertEqual(lease.driver.execute_script(STATE_SCRIPT)["recent"], None,
+                             "The restore script is removed after the restore")
+
+    def test_setup_runs_once_per_build(self):
+        def setup():
+            setups.append(1)
+            lease.driver.execute_script(SETUP_SCRIPT)
+            lease.driver.get(self.server.url("/learn"))
+
+        setups = []
+        for _ in range(2):
+            with get_driver_pool().lease(self.id()) as lease:
+                lease.driver.get(self.server.url("/"))
+                self.assertEqual(lease.driver.execute_script(STATE_SCRIPT), EMPTY_STATE)
+                self.store.checkpoint(lease.driver, "setup", setup)
+                self.assertEqual(lease.driver.execute_script(STATE_SCRIPT), RESTORED_STATE)
+        self.assertEqual(setups, [1])
+        self.assertEqual(self.store.stats, {"restored": 1, "recorded": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+from unittest import mock
+from Infrastructure import DomExtraction
+from Infrastructure.DomExtraction import EXTRACT_SCRIPT, extract_nodes, round_trip_report
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+
+#====== FIXTURE PAGE ======
+# Same shape as the react.dev translations page: the second list holds the full translations.
+TRANSLATIONS_PAGE = """<!DOCTYPE html><html lang="en"><head><title>Translations</title></head><body>
+<main>
+<ul class="list-disc"><li><a href="https://es.react.dev/">Español</a></li></ul>
+<ul class="list-disc">
+  <li><a href="https://fr.react.dev/">Français</a> <a href="https://github.com/reactjs/fr.react.dev">repo</a></li>
+  <li>Not translated yet</li>
+  <li><a href="https://ja.react.dev/" style="display: none">日本語</a></li>
+</ul>
+<p>First paragraph</p><p>  Second paragraph  </p>
+</main>
+<footer><button onclick="this.textContent = 'clicked'">Save</button></footer>
+</body></html>"""
+SECOND_LIST = "main > ul:nth-of-type(2)"
+
+
+class RecordingDriver:
+    """
+    Returns canned raw nodes from execute_script and keeps the arguments of every call.
+    """
+
+    def __init__(self, raw_nodes):
+        self.raw_nodes = raw_nodes
+        self.calls = []
+
+    def execute_script(self, script, *args):
+        self.calls.append((script, args))
+        return self.raw_nodes
+
+
+class ExtractNodesTest(unittest.TestCase):
+
+    def setUp(self):
+        patch = mock.patch.dict(DomExtraction.ROUND_TRIP_STATS, dict.fromkeys(DomExtraction.ROUND_TRIP_STATS, 0))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_one_script_call_for_all_the_nodes(self):
+        raw = [{"text": f"Lang {index}", "path": f"ul > li:nth-of-type({index + 1}) > a", "visible": True,
+                "attributes": {"href": f"https://{index}.react.dev/"}} for index in range(5)]
+        driver = RecordingDriver(raw)
+        nodes = extract_nodes(driver, "li", scope="ul", scope_index=1, inner="a", attributes=("href",))
+
+        self.assertEqual(driver.calls, [(EXTRACT_SCRIPT, ("li", "ul", 1, None, "a", ["href"], False))])
+        self.assertEqual([node.get_attribute("href") for node in nodes], [f"https://{index}.react.dev/"
+                                                                           for index in range(5)])
+        self.assertIsNone(nodes[0].element)
+        # find_elements + scope + 5 inner lookups, then one text and one href read per node, instead of 1 call.
+        self.assertEqual(DomExtraction.ROUND_TRIP_STATS, {"script_calls": 1, "nodes": 5, "round_trips_saved": 16})
+        self.assertEqual(round_trip_report(), "DOM extraction: 5 nodes in 1 script calls, "
+                                              "16 WebDriver round trips saved")
+
+
+class ExtractNodesBrowserTest(unittest.TestCase):
+    """
+    Extracts nodes from a fixture page in a pooled browser.
+    """
+
+    def setUp(self):
+        self.server = FixtureServer({"/": FixtureResponse(TRANSLATIONS_PAGE)}).start()
+        self.lease = get_driver_pool().acquire(self.id())
+        self.addCleanup(get_driver_pool().release, self.lease)
+        self.driver = self.lease.driver
+        self.driver.get(self.server.url("/"))
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_scope_inner_and_attributes(self):
+        nodes = extract_nodes(self.driver, "li", scope="ul.list-disc", scope_index=1, inner="a",
+                              attributes=["href"])
+        self.assertEqual([(node.text, node.get_attribute("href"), node.visible) for node in nodes],
+                         [("Français", "https://fr.react.dev/", True), ("日本語", "https://ja.react.dev/", False)])
+        self.assertEqual(nodes[0].path, "html > body > main > ul:nth-of-type(2) > li > a")
+        self.assertEqual(self.driver.find_element("css selector", nodes[1].path).get_attribute("href"),
+                         "https://ja.react.dev/")
+
+    def test_fallback_scope(self):
+        self.assertEqual(extract_nodes(self.driver, "p", scope="article"), [])
+        paragraphs = extract_nodes(self.driver, "p", scope="article", fallback_scope="main")
+        self.assertEqual([node.text for node in paragraphs], ["First paragraph", "Second paragraph"])
+
+    def test_elements_can_be_used_afterwards(self):
+        button, = extract_nodes(self.driver, "footer button", with_elements=True)
+        button.element.click()
+        self.assertEqual(extract_nodes(self.driver, "footer button")[0].text, "clicked")
+        self.assertEqual(len(extract_nodes(self.driver, "li", scope=SECOND_LIST)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+import io
+import threading
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+from selenium.common.exceptions import WebDriverException
+from Infrastructure import DriverPool as driver_pool_module
+from Infrastructure.Browsers import BrowserConfig
+from Infrastructure.DriverPool import BLANK_PAGE, DriverPool, get_driver_pool
+from Infrastructure.MemoryMonitor import MemoryMonitor
+
+#====== FAKE BROWSER ======
+LAUNCH_SIZE = (1200, 800)
+WAIT_SECONDS = 0.2
+
+
+class FakeExecutor:
+    def execute(self, command, params):
+        return {"value": None}
+
+
+class FakeSwitchTo:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def window(self, handle):
+        self.driver.current_window_handle = handle
+
+
+class FakeDriver:
+    """
+    Just enough of a WebDriver for the pool: windows, storage, cookies and window size, and how often it was quit.
+    """
+
+    def __init__(self):
+        self.window_handles = ["main"]
+        self.current_window_handle = "main"
+        self.switch_to = FakeSwitchTo(self)
+        self.command_executor = FakeExecutor()
+        self.capabilities = {}
+        self.size = LAUNCH_SIZE
+        self.url = None
+        self.storage = {"token": "1"}
+        self.cookies = {"session": "1"}
+        self.quit_count = 0
+        self.broken = False
+
+    def execute_script(self, script, *args):
+        if self.broken:
+            raise WebDriverException("session deleted")
+        self.storage.clear()
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        if cmd == "Network.clearBrowserCookies":
+            self.cookies.clear()
+        return {}
+
+    def close(self):
+        self.window_handles.remove(self.current_window_handle)
+
+    def get(self, url):
+        self.url = url
+
+    def get_window_size(self):
+        return {"width": self.size[0], "height": self.size[1]}
+
+    def set_window_size(self, width, height):
+        self.size = (width, height)
+
+    def quit(self):
+        self.quit_count += 1
+
+
+class FakeLauncher:
+    def __init__(self):
+        self.drivers = []
+
+    def __call__(self):
+        self.drivers.append(FakeDriver())
+        return self.drivers[-1]
+
+
+class DriverPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.launcher = FakeLauncher()
+        self.pool = DriverPool(1, self.launcher, MemoryMonitor(enabled=False))
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_released_session_is_reset_and_reused(self):
+        lease = self.pool.acquire("first")
+        driver = lease.driver
+        driver.window_handles.append("translation tab")
+        driver.set_window_size(390, 844)
+        self.pool.release(lease)
+
+        self.assertEqual((driver.window_handles, driver.storage, driver.cookies), (["main"], {}, {}))
+        self.assertEqual((driver.size, driver.url), (LAUNCH_SIZE, BLANK_PAGE))
+        with self.pool.lease("second") as second:
+            self.assertIs(second.driver, driver)
+        self.assertEqual([lease.reused for lease in self.pool.leases], [False, True])
+        self.assertEqual(len(self.launcher.drivers), 1)
+        self.assertRegex(self.pool.report(), r"2 leases, pool size 1(.|\n)*warm reuse: 1 x")
+
+    def test_acquire_waits_for_a_free_session(self):
+        lease = self.pool.acquire("first")
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(self.pool.acquire("second")))
+        waiter.start()
+        waiter.join(WAIT_SECONDS)
+        self.assertEqual(acquired, [], "The pool is full, the second test waits")
+
+        self.pool.release(lease)
+        waiter.join()
+        self.assertIs(acquired[0].driver, lease.driver)
+        self.pool.release(acquired[0])
+
+    def test_leaked_lease_times_out(self):
+        pool = DriverPool(1, self.launcher, MemoryMonitor(enabled=False), acquire_timeout=WAIT_SECONDS)
+        pool.acquire("leaked")
+        with self.assertRaisesRegex(TimeoutError, "second: no browser session released"):
+            pool.acquire("second")
+
+    def test_failing_set_up_returns_the_session(self):
+        pool = DriverPool(1, self.launcher, MemoryMonitor(enabled=False), acquire_timeout=WAIT_SECONDS)
+
+        class FailingSetUpTest(unittest.TestCase):
+            def setUp(self):
+                self.lease = pool.acquire(self.id())
+                self.addCleanup(pool.release, self.lease)
+                self.fail("Home page over performance budget")
+
+            def test_nothing(self):
+                pass
+
+        for _ in range(2):
+            result = unittest.TestResult()
+            FailingSetUpTest("test_nothing").run(result)
+            self.assertEqual(len(result.failures), 1)
+        self.assertEqual(len(self.launcher.drivers), 1, "The session went back to the pool both times")
+
+    def test_session_that_fails_to_reset_is_replaced(self):
+        lease = self.pool.acquire("first")
+        lease.driver.broken = True
+        self.pool.release(lease)
+        self.assertEqual(lease.driver.quit_count, 1)
+
+        with self.pool.lease("second") as second:
+            self.assertIsNot(second.driver, lease.driver)
+            self.assertFalse(second.reused)
+        self.assertEqual(len(self.launcher.drivers), 2)
+
+    def test_shutdown_quits_idle_sessions(self):
+        pool = DriverPool(2, self.launcher, MemoryMonitor(enabled=False))
+        leases = [pool.acquire("a"), pool.acquire("b")]
+        for lease in leases:
+            pool.release(lease)
+        pool.shutdown()
+        self.assertEqual([driver.quit_count for driver in self.launcher.drivers], [1, 1])
+
+
+class SharedPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.launcher = FakeLauncher()
+        patches = [mock.patch.dict(driver_pool_module._shared_pools, clear=True),
+                   mock.patch.object(BrowserConfig, "factory", lambda config: self.launcher)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_close_shared_pools_reports_and_quits(self):
+        pool = get_driver_pool()
+        self.assertIs(get_driver_pool(), pool)
+        pool.release(pool.acquire("LayoutHomePageTest.test_header"))
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            driver_pool_module._close_shared_pools()
+        self.assertIn("LayoutHomePageTest.test_header", output.getvalue())
+        self.assertEqual([driver.quit_count for driver in self.launcher.drivers], [1])
+        self.assertEqual(driver_pool_module._shared_pools, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
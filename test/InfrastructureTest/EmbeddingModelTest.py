@@ -0,0 +1,59 @@
+import os
+import string
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from Infrastructure import EmbeddingModel
+from Infrastructure.EmbeddingModel import CACHE_DIR_ENV, similarities, similarity
+
+
+class LetterModel:
+    """
+    Stands in for the SentenceTransformer: the normalized letter counts of each text, and the texts of every call.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size, convert_to_numpy, normalize_embeddings):
+        self.calls.append(list(texts))
+        vectors = np.array([[text.count(letter) + 0.01 for letter in string.ascii_lowercase] for text in texts])
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class EmbeddingModelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.model = LetterModel()
+        self.stats = dict.fromkeys(EmbeddingModel.EMBEDDING_STATS, 0)
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patches = [mock.patch.object(EmbeddingModel, "_model", self.model),
+                   mock.patch.object(EmbeddingModel, "_memory_cache", {}),
+                   mock.patch.object(EmbeddingModel, "EMBEDDING_STATS", self.stats),
+                   mock.patch.dict(os.environ, {CACHE_DIR_ENV: cache_dir.name})]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_pairs_are_encoded_in_one_batch(self):
+        scores = similarities([("react docs", "react  docs"), ("hooks", "zzz"), ("hooks", "react docs")])
+        self.assertEqual(self.stats["encode_calls"], 1)
+        self.assertEqual(self.model.calls, [["react docs", "hooks", "zzz"]], "Normalized texts are encoded once")
+        self.assertAlmostEqual(scores[0], 1.0, places=6)
+        self.assertLess(scores[1], 0.5)
+        self.assertEqual(similarities([]).shape, (0,))
+
+    def test_cached_embeddings_are_not_encoded_again(self):
+        first = similarity("learn react", "apprendre react")
+        self.assertAlmostEqual(similarity("learn react", "apprendre react"), first)
+        self.assertEqual((self.stats["encode_calls"], self.stats["memory_hits"]), (1, 2))
+
+        EmbeddingModel._memory_cache.clear()
+        self.assertAlmostEqual(similarity("apprendre react", "learn  react"), first)
+        self.assertEqual((self.stats["encode_calls"], self.stats["disk_hits"]), (1, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
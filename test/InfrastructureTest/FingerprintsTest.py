@@ -0,0 +1,108 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from Infrastructure.Browsers import CHROME, FIREFOX, BrowserConfig
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.Fingerprints import HTML, TEXT, FingerprintStore, http_fingerprint, page_fingerprint, \
+    text_fingerprint
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+
+#====== FIXTURE PAGE ======
+PAGE = """<!DOCTYPE html><html lang="en"><head><title>Page</title></head><body>
+<nav><a href="/learn">Learn</a></nav><main><p>First   paragraph</p><p>Second</p></main><footer>Footer</footer>
+</body></html>"""
+TEST_ID = "LayoutTests.test_layout_width_sweep"
+
+
+class FingerprintStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store_dir = tempfile.TemporaryDirectory()
+        self.store = FingerprintStore(self.store_dir.name)
+
+    def tearDown(self):
+        self.store_dir.cleanup()
+
+    def test_unchanged_after_passing_run(self):
+        self.assertFalse(self.store.unchanged(TEST_ID, "sweep", "sha256:a"))
+        self.store.record(TEST_ID, "sweep", "sha256:a", 12.5)
+
+        reloaded = FingerprintStore(self.store_dir.name)
+        self.assertTrue(reloaded.unchanged(TEST_ID, "sweep", "sha256:a"))
+        self.assertFalse(reloaded.unchanged(TEST_ID, "sweep", "sha256:b"))
+        self.assertFalse(reloaded.unchanged(TEST_ID, "other", "sha256:a"))
+        self.assertEqual([(skip.check, skip.saved_seconds) for skip in reloaded.skipped], [("sweep", 12.5)])
+        self.assertIn("1 checks skipped with unchanged inputs (~12.5s saved)", reloaded.report())
+
+    def test_forced_full_run_never_skips(self):
+        self.store.record(TEST_ID, "sweep", "sha256:a")
+        forced = FingerprintStore(self.store_dir.name, force=True)
+        self.assertFalse(forced.unchanged(TEST_ID, "sweep", "sha256:a"))
+        forced.record(TEST_ID, "sweep", "sha256:b")
+        self.assertTrue(self.store.unchanged(TEST_ID, "sweep", "sha256:b"))
+
+    def test_fingerprints_are_kept_per_browser(self):
+        FingerprintStore(self.store_dir.name, browser=BrowserConfig(CHROME)).record(TEST_ID, "sweep", "sha256:a")
+        for browser, unchanged in ((FIREFOX, False), (CHROME, True)):
+            with mock.patch.dict(os.environ, BrowserConfig(browser).environment()):
+                self.assertEqual(self.store.unchanged(TEST_ID, "sweep", "sha256:a"), unchanged, browser)
+
+    def test_forget(self):
+        self.store.record(TEST_ID, "sweep", "sha256:a")
+        self.store.forget(TEST_ID, "sweep")
+        self.store.forget(TEST_ID, "sweep")
+        self.assertFalse(self.store.unchanged(TEST_ID, "sweep", "sha256:a"))
+
+    def test_text_fingerprint_keeps_boundaries(self):
+        self.assertEqual(text_fingerprint(["a", "b"], "c"), text_fingerprint(["a", "b"], "c"))
+        self.assertNotEqual(text_fingerprint(["ab"]), text_fingerprint(["a", "b"]))
+        self.assertNotEqual(text_fingerprint(["a"], ["b"]), text_fingerprint(["a", "b"], []))
+
+
+class HttpFingerprintTest(unittest.TestCase):
+
+    def test_validators_then_body(self):
+        routes = {"/etag": FixtureResponse(PAGE, headers={"ETag": '"v1"'}), "/plain": FixtureResponse(PAGE)}
+        with FixtureServer(routes) as server:
+            urls = [server.url("/etag"), server.url("/plain")]
+            first = http_fingerprint(urls)
+            self.assertEqual(http_fingerprint(urls), first)
+            self.assertEqual(server.requests.count(("GET", "/etag")), 0, "The ETag is enough, the body is not read")
+            self.assertEqual(server.requests.count(("GET", "/plain")), 2)
+
+            routes["/etag"].headers["ETag"] = '"v2"'
+            self.assertNotEqual(http_fingerprint(urls), first)
+            routes["/etag"].headers["ETag"] = '"v1"'
+            routes["/plain"].body = PAGE.replace("Second", "Changed").encode()
+            self.assertNotEqual(http_fingerprint(urls), first)
+
+
+class PageFingerprintBrowserTest(unittest.TestCase):
+    """
+    Fingerprints DOM subtrees of a fixture page in a pooled browser.
+    """
+
+    def setUp(self):
+        self.server = FixtureServer({"/": FixtureResponse(PAGE)}).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_fingerprint_follows_the_selected_subtrees(self):
+        with get_driver_pool().lease(self.id()) as lease:
+            driver = lease.driver
+            driver.get(self.server.url("/"))
+            layout = page_fingerprint(driver, {"nav": HTML, "footer": HTML})
+            text = page_fingerprint(driver, {"main": TEXT})
+            self.assertRegex(layout, r"^sha256:[0-9a-f]{64}$")
+
+            driver.execute_script("document.querySelector('main p').innerHTML = 'First <b>paragraph</b>';")
+            self.assertEqual(page_fingerprint(driver, {"nav": HTML, "footer": HTML}), layout)
+            self.assertEqual(page_fingerprint(driver, {"main": TEXT}), text, "Only the visible text counts")
+            driver.execute_script("document.querySelector('footer').textContent = 'Changed';")
+            self.assertNotEqual(page_fingerprint(driver, {"nav": HTML, "footer": HTML}), layout)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+from FunctionalTest.SearchTest import QUERY, SEARCH_FLOWS_FILE
+from Infrastructure import FlowEngine as flow_engine_module
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+from Infrastructure.FlowEngine import FLOW_STATS, FlowEngine, Scenario, _batches, build_plan, load_flows
+from Infrastructure.PerfMetrics import FAIL, SEARCH_RESULT, MetricsStore, PerfRecorder
+
+#====== FIXTURE SEARCH PAGE ======
+SEARCH_PAGE = """<!DOCTYPE html><html lang="en"><head><title>Search</title></head><body>
+<button id="open">Search</button>
+<div id="panel" hidden><input type="search" id="q"><div id="hits"></div><ul id="recent"></ul></div>
+<script>
+var panel = document.getElementById('panel'), q = document.getElementById('q');
+var hits = document.getElementById('hits'), recent = document.getElementById('recent');
+document.getElementById('open').onclick = function () {
+    panel.hidden = false;
+    recent.innerHTML = '';
+    JSON.parse(localStorage.getItem('recent') || '[]').forEach(function (query) {
+        var item = document.createElement('li');
+        item.className = 'recent';
+        item.innerHTML = '<span></span><button title="Save this search">*</button>';
+        item.firstChild.textContent = query;
+        item.lastChild.onclick = function () { item.remove(); };
+        recent.appendChild(item);
+    });
+};
+q.oninput = function () {
+    hits.innerHTML = q.value ? '<a class="hit" href="/result">' + q.value + '</a>' : '';
+};
+hits.onclick = function () { localStorage.setItem('recent', JSON.stringify([q.value])); };
+</script></body></html>"""
+PREFIX = [{"open": "${BASE}/"}, {"click": "#open"}, {"type": {"selector": "#q", "text": "hooks"}}]
+NAVIGATE = [{"click": {"selector": "a.hit", "navigates": True, "perf": SEARCH_RESULT}}]
+FLOWS = {
+    "fragments": {"prefix": PREFIX, "navigate": [{"use": "prefix"}] + NAVIGATE},
+    "scenarios": [
+        {"name": "results", "steps": [{"use": "prefix"}, {"wait": "a.hit"}, {"read": "hits", "count": "a.hit"},
+                                      {"expect": "hits", "greater": 0}]},
+        {"name": "save", "steps": [{"use": "navigate"}, {"click": "#open"},
+                                   {"click": {"selector": "li.recent", "text": "hooks", "inner": "button"}},
+                                   {"read": "recent", "count": "li.recent"}, {"expect": "recent", "equals": 0}]},
+        {"name": "recent", "steps": [{"use": "navigate"}, {"click": "#open"}, {"wait": "li.recent"},
+                                     {"read": "recent", "texts": "li.recent"},
+                                     {"expect": "recent", "contains": "HOOKS"}]},
+        {"name": "url", "steps": [{"use": "navigate"}, {"read": "page", "url": True}, {"read": "title", "title": True},
+                                  {"expect": "page", "contains": "/result"}, {"expect": "title", "equals": "Search"}]},
+        {"name": "retype", "steps": [{"use": "navigate"}, {"click": "#open"},
+                                     {"type": {"selector": "#q", "text": "effects"}},
+                                     {"read": "hits", "texts": "a.hit"}, {"expect": "hits", "equals": ["effects"]}]},
+        {"name": "broken", "steps": [{"use": "prefix"}, {"read": "hits", "count": "a.hit"},
+                                     {"expect": "hits", "equals": 5}]},
+    ]
+}
+
+
+class FlowEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.flows_dir = tempfile.TemporaryDirectory()
+        self.flows_file = os.path.join(self.flows_dir.name, "flows.json")
+        with open(self.flows_file, "w", encoding="utf-8") as flows:
+            json.dump(FLOWS, flows)
+
+    def tearDown(self):
+        self.flows_dir.cleanup()
+
+    def test_load_expands_fragments_and_variables(self):
+        scenarios = load_flows(self.flows_file, {"BASE": "http://localhost:1"})
+        self.assertEqual([scenario.name for scenario in scenarios][:2], ["results", "save"])
+        self.assertEqual(scenarios[1].steps[0].spec, {"open": "http://localhost:1/"})
+        self.assertEqual([step.kind for step in scenarios[1].steps[:4]], ["open", "click", "type", "click"])
+
+    def test_unknown_step(self):
+        with self.assertRaises(ValueError):
+            Scenario("bad", [{"hover": "#open"}])
+
+    def test_search_flows_share_their_prefix(self):
+        scenarios = load_flows(SEARCH_FLOWS_FILE, {"QUERY": QUERY})
+        plan = build_plan(scenarios)
+        self.assertEqual(len(plan.children), 1)
+        shared = plan.children[0]
+        self.assertEqual([step.kind for step in shared.steps], ["open", "window_size", "click", "type"])
+        self.assertEqual(len(shared.children), 2, "show results / click the first result")
+        self.assertEqual(sorted(shared.scenarios()), sorted(scenario.name for scenario in scenarios))
+        self.assertEqual((plan.count_steps(), sum(len(scenario.steps) for scenario in scenarios)), (20, 36))
+
+    def test_consecutive_reads_are_batched(self):
+        steps = Scenario("reads", FLOWS["scenarios"][3]["steps"][1:]).steps
+        self.assertEqual([len(batch) for batch in _batches(steps)], [4])
+        steps = Scenario("mixed", FLOWS["scenarios"][0]["steps"][1:]).steps
+        self.assertEqual([[step.kind for step in batch] for batch in _batches(steps)],
+                         [["wait"], ["read", "expect"]])
+
+    def test_runs_are_reported_at_exit(self):
+        driver = mock.Mock()
+        driver.execute_script.return_value = {"hits": 2}
+        steps = [{"read": "hits", "count": "a.hit"}, {"expect": "hits", "greater": 0}]
+        with mock.patch.dict(FLOW_STATS, dict.fromkeys(FLOW_STATS, 0)):
+            engine = FlowEngine(driver, cadence_ms=0)
+            results = engine.run([Scenario("first", steps), Scenario("second", steps)])
+            self.assertEqual([result.passed for result in results], [True, True])
+            self.assertEqual(FLOW_STATS, engine.stats)
+            output = StringIO()
+            with redirect_stdout(output):
+                flow_engine_module._print_flow_report()
+            self.assertEqual(output.getvalue().strip(), engine.report())
+            self.assertIn("2 of 4 declared steps executed, 1 read batches", engine.report())
+
+
+class FlowEngineBrowserTest(unittest.TestCase):
+    """
+    Runs branching scenarios against a fixture search page that keeps its history in localStorage.
+    """
+
+    def setUp(self):
+        self.server = FixtureServer({"/": FixtureResponse(SEARCH_PAGE), "/result": FixtureResponse(SEARCH_PAGE)})
+        self.server.start()
+        self.flows_dir = tempfile.TemporaryDirectory()
+        self.flows_file = os.path.join(self.flows_dir.name, "flows.json")
+        with open(self.flows_file, "w", encoding="utf-8") as flows:
+            json.dump(FLOWS, flows)
+        self.lease = get_driver_pool().acquire(self.id())
+        self.addCleanup(get_driver_pool().release, self.lease)
+        self.driver = self.lease.driver
+
+    def tearDown(self):
+        self.flows_dir.cleanup()
+        self.server.stop()
+
+    def test_branching_scenarios(self):
+        scenarios = load_flows(self.flows_file, {"BASE": self.server.base_url})
+        recorder = PerfRecorder(MetricsStore(os.path.join(self.flows_dir.name, "metrics.jsonl")), mode=FAIL)
+        engine = FlowEngine(self.driver, timeout=5, perf_recorder=recorder, test=self.id())
+        results = {result.scenario: result for result in engine.run(scenarios)}
+
+        for name in ("results", "save", "recent", "url", "retype"):
+            self.assertTrue(results[name].passed, results[name].error)
+        self.assertFalse(results["broken"].passed)
+        self.assertIn("Expected hits equals 5, got 1", results["broken"].error)
+        self.assertEqual(engine.stats["executed_steps"], build_plan(scenarios).count_steps())
+        self.assertEqual(engine.stats["restores"], 1, "only between the two branches that change the result page")
+        self.assertEqual(self.server.requests.count(("GET", "/")), 1, "one navigation for every scenario")
+        self.assertEqual([(sample.page, sample.test) for sample in recorder.samples], [(SEARCH_RESULT, self.id())],
+                         "The shared navigation is measured once")
+        self.assertIsNotNone(recorder.samples[0].values["navigation_ms"])
+        self.assertEqual(engine.budget_errors, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
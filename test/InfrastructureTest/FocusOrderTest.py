@@ -0,0 +1,95 @@
+import unittest
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+from Infrastructure.FocusOrder import FocusStop, TabWalker, crawl_focus_order, sample_indices
+
+#====== FIXTURE PAGES ======
+FOCUS_PAGE = """<!DOCTYPE html><html lang="en"><head><title>Focus</title>
+<style>:focus-visible { outline: 2px solid rgb(20, 158, 202); }</style>
+</head><body>
+<nav><a href="/learn">Learn</a><a href="/blog" tabindex="2">Blog</a><a href="/api" tabindex="1">API</a></nav>
+<main>
+  <input type="hidden" name="token"><input id="search" type="search">
+  <button disabled>Disabled</button><button tabindex="-1">Skipped</button>
+  <button>Menu</button>
+  <details><summary>More</summary><a href="/hidden-in-details">Hidden</a></details>
+  <div inert><a href="/inert">Inert</a></div>
+  <a href="/invisible" style="visibility: hidden">Invisible</a><a href="/none" style="display: none">None</a>
+  <div tabindex="0" id="card">Card</div>
+</main>
+<footer><a href="https://github.com/facebook/react">GitHub</a></footer>
+</body></html>"""
+# tabindex 1 and 2 first, then DOM order; hidden, disabled, negative tabindex, inert and closed details are skipped.
+EXPECTED_ORDER = ["html > body > nav > a:nth-of-type(3)", "html > body > nav > a:nth-of-type(2)",
+                  "html > body > nav > a", "html > body > main > input:nth-of-type(2)",
+                  "html > body > main > button:nth-of-type(3)", "html > body > main > details > summary",
+                  "html > body > main > div:nth-of-type(2)", "html > body > footer > a"]
+# Tab from the search field is swallowed and focus stays on it: a keyboard trap.
+TRAP_PAGE = """<!DOCTYPE html><html lang="en"><head><title>Trap</title></head><body>
+<a href="/learn">Learn</a><input id="trap"><a href="/blog">Blog</a><a href="/api">API</a>
+<script>document.getElementById('trap').addEventListener('keydown', function (event) {
+    if (event.key === 'Tab') { event.preventDefault(); }
+});</script>
+</body></html>"""
+
+
+def stop(outline):
+    return FocusStop(0, "a", "a", "/", "Learn", 0, outline, "none", True)
+
+
+class FocusOrderTest(unittest.TestCase):
+
+    def test_sample_is_seeded_and_keeps_the_required_stops(self):
+        sample = sample_indices(100, sample_size=6, required=[42, 250])
+        self.assertEqual(sample, sample_indices(100, sample_size=6, required=[42, 250]))
+        self.assertEqual(len(sample), 6)
+        self.assertTrue({0, 42} <= set(sample))
+        self.assertEqual(sample, sorted(sample))
+        self.assertEqual(sample_indices(3, sample_size=12), [0, 1, 2])
+        self.assertEqual(sample_indices(0), [])
+
+    def test_visible_focus(self):
+        self.assertTrue(stop("rgb(20, 158, 202) solid 2px").has_visible_focus)
+        self.assertFalse(stop("none").has_visible_focus)
+        self.assertFalse(stop("").has_visible_focus)
+
+
+class FocusOrderBrowserTest(unittest.TestCase):
+    """
+    Computes and walks the tab order of fixture pages in a pooled browser.
+    """
+
+    def setUp(self):
+        self.server = FixtureServer({"/": FixtureResponse(FOCUS_PAGE), "/trap": FixtureResponse(TRAP_PAGE)}).start()
+        self.lease = get_driver_pool().acquire(self.id())
+        self.addCleanup(get_driver_pool().release, self.lease)
+        self.driver = self.lease.driver
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_computed_order_follows_the_tabindex_rules(self):
+        self.driver.get(self.server.url("/"))
+        order = crawl_focus_order(self.driver)
+        self.assertEqual([stop.path for stop in order], EXPECTED_ORDER)
+        self.assertEqual([stop.tab_index for stop in order[:3]], [1, 2, 0])
+        self.assertEqual(order[4].text, "Menu")
+        self.assertTrue(all(stop.focused and stop.has_visible_focus for stop in order))
+
+    def test_real_tab_presses_match_the_computed_order(self):
+        self.driver.get(self.server.url("/"))
+        order = crawl_focus_order(self.driver)
+        walker = TabWalker(self.driver)
+        self.assertEqual(walker.verify(order, range(len(order))), [])
+        self.assertEqual(walker.verify(order, [5, 2, 0]), [], "SHIFT+TAB walks back")
+
+    def test_keyboard_trap_is_reported(self):
+        self.driver.get(self.server.url("/trap"))
+        order = crawl_focus_order(self.driver)
+        self.assertEqual(len(order), 4)
+        mismatches = TabWalker(self.driver).verify(order, [0, 1, 3])
+        self.assertEqual(mismatches, [(3, order[3].path, order[1].path)])
+
+
+if __name__ == "__main__":
+    unittest.main()
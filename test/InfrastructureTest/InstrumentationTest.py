@@ -0,0 +1,162 @@
+import csv
+import json
+import os
+import tempfile
+import time
+import unittest
+from Infrastructure.Instrumentation import COMMAND, HELPER, TEST, Tracer, instrument_driver, traced
+
+#====== OVERHEAD BUDGET ======
+OVERHEAD_CALLS = 20000
+MAX_OVERHEAD_SECONDS_PER_CALL = 0.00005
+
+
+class FakeCommandExecutor:
+    def __init__(self):
+        self.sent = []
+
+    def execute(self, command, params):
+        self.sent.append(command)
+        return {"value": None}
+
+
+class FakeDriver:
+    """
+    Just enough of a WebDriver: helper methods send their commands through `command_executor.execute`.
+    """
+
+    def __init__(self):
+        self.command_executor = FakeCommandExecutor()
+
+    def execute(self, command, params=None):
+        return self.command_executor.execute(command, params or {})
+
+
+class InstrumentationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = Tracer()
+        self.driver = instrument_driver(FakeDriver(), self.tracer)
+        tracer = self.tracer
+
+        class Suite:
+            def __init__(self, driver):
+                self.driver = driver
+
+            def id(self):
+                return "Suite.test_search"
+
+            @traced("Suite.open_search", tracer=tracer)
+            def open_search(self):
+                self.driver.execute("findElement")
+                self.driver.execute("clickElement")
+
+            @traced("Suite.enter_search_query", tracer=tracer)
+            def enter_search_query(self):
+                self.open_search()
+                self.driver.execute("sendKeysToElement")
+
+            @traced("Suite.test_search", TEST, tracer=tracer)
+            def test_search(self):
+                self.enter_search_query()
+                self.driver.execute("getCurrentUrl")
+
+        self.suite = Suite(self.driver)
+
+    def spans(self, name):
+        return [span for span in self.tracer.spans if span.name == name]
+
+    def test_commands_are_counted_per_step(self):
+        self.suite.test_search()
+
+        self.assertEqual(len(self.spans("findElement")), 1)
+        self.assertEqual(self.spans("Suite.open_search")[0].commands, 2)
+        self.assertEqual(self.spans("Suite.enter_search_query")[0].commands, 3)
+        test_span = self.spans("Suite.test_search")[0]
+        self.assertEqual(test_span.commands, 4)
+        self.assertEqual({span.test for span in self.tracer.spans}, {"Suite.test_search"})
+        self.assertGreaterEqual(test_span.duration_ns, self.spans("Suite.enter_search_query")[0].duration_ns)
+
+    def test_instrument_driver_twice_records_once(self):
+        instrument_driver(self.driver, self.tracer)
+        self.driver.execute("getTitle")
+        self.assertEqual(len(self.spans("getTitle")), 1)
+
+    def test_exports(self):
+        self.suite.test_search()
+        self.suite.enter_search_query()
+        with tempfile.TemporaryDirectory() as trace_dir:
+            trace_path = os.path.join(trace_dir, "trace.json")
+            csv_path = os.path.join(trace_dir, "steps.csv")
+            self.tracer.export_chrome_trace(trace_path)
+            self.tracer.export_csv(csv_path)
+            with open(trace_path, encoding="utf-8") as trace_file:
+                events = json.load(trace_file)["traceEvents"]
+            with open(csv_path, newline="", encoding="utf-8") as csv_file:
+                rows = list(csv.DictReader(csv_file))
+
+        self.assertEqual(len(events), len(self.tracer.spans))
+        self.assertTrue(all(event["ph"] == "X" and event["dur"] >= 0 for event in events))
+        self.assertEqual({event["cat"] for event in events}, {TEST, HELPER, COMMAND})
+        self.assertEqual(len(rows), len(self.tracer.spans))
+        self.assertEqual(rows[0]["name"], "Suite.test_search")
+
+        hottest = self.tracer.hottest()
+        self.assertEqual([row[0] for row in hottest][:1], ["Suite.enter_search_query"])
+        self.assertEqual(hottest[0][1], 2)
+        self.assertIn("Suite.open_search", self.tracer.report())
+
+    def test_labels_group_the_test_times(self):
+        tracer = self.tracer
+
+        @traced("Suite.test_search", TEST, tracer=tracer)
+        def labelled_test(suite):
+            tracer.label("network profile", "search")
+            suite.enter_search_query()
+        labelled_test(self.suite)
+        self.suite.test_search()
+        tracer.label("network profile", "full")
+
+        self.assertEqual(tracer.labels, {"Suite.test_search": {"network profile": "search"}})
+        (tests, seconds), = tracer.label_times().values()
+        self.assertEqual(tests, 1)
+        self.assertGreater(seconds, 0)
+        self.assertIn("network profile search: 1 tests", tracer.report())
+        self.assertEqual(tracer.chrome_trace()["traceEvents"][0]["args"]["labels"], {"network profile": "search"})
+
+    def test_span_buffer_is_bounded(self):
+        calls = 100
+        with tempfile.TemporaryDirectory() as trace_dir:
+            tracer = Tracer(max_spans=50, trace_dir=trace_dir)
+            driver = instrument_driver(FakeDriver(), tracer)
+            open_search = traced("Suite.open_search", tracer=tracer)(
+                lambda: (driver.execute("findElement"), driver.execute("clickElement")))
+            for _ in range(calls):
+                open_search()
+            self.assertLess(len(tracer.spans), 50)
+            tracer.flush()
+            chunks = sorted(name for name in os.listdir(trace_dir) if name.startswith("trace-"))
+            with open(os.path.join(trace_dir, f"steps-{os.getpid()}.csv"), newline="", encoding="utf-8") as csv_file:
+                rows = list(csv.DictReader(csv_file))
+
+        self.assertEqual((len(chunks), len(rows)), (6, 3 * calls))
+        self.assertEqual(tracer.spans, [])
+        self.assertEqual(tracer.command_count, 2 * calls)
+        self.assertEqual(tracer.hottest()[0][:2], ("Suite.open_search", calls))
+
+        dropping = Tracer(max_spans=50)
+        for _ in range(calls):
+            dropping.command("findElement", 0, 1)
+        self.assertEqual((len(dropping.spans), dropping.dropped_spans), (0, calls))
+        self.assertIn("100 WebDriver commands", dropping.report())
+
+    def test_overhead_is_small(self):
+        start = time.perf_counter()
+        for _ in range(OVERHEAD_CALLS):
+            self.suite.open_search()
+        per_call = (time.perf_counter() - start) / OVERHEAD_CALLS
+        self.assertLess(per_call, MAX_OVERHEAD_SECONDS_PER_CALL)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+import csv
+import os
+import tempfile
+import unittest
+from selenium.common.exceptions import WebDriverException
+from Infrastructure.DriverPool import DriverPool
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+from Infrastructure.MemoryMonitor import RESET, MemoryMonitor, growth_trend
+
+#====== FAKE BROWSER ======
+LEAKED_NODES_PER_TEST = 2000
+BASE_NODES = 400
+TEST_ID = "LanguageSwitcherTests.test_language_switcher"
+
+#====== SOAK ======
+SOAK_ITERATIONS = 30
+SOAK_PAGE = """<!DOCTYPE html><html lang="en"><head><title>Soak</title></head><body>
+<a href="/fr" target="_blank">Français</a></body></html>"""
+
+
+class FakeExecutor:
+    def execute(self, command, params):
+        return {"value": None}
+
+
+class FakeSwitchTo:
+    def window(self, handle):
+        pass
+
+
+class LeakingDriver:
+    """
+    Just enough of a WebDriver for the pool; every reset leaves `leak` more DOM nodes behind.
+    """
+
+    def __init__(self, leak=LEAKED_NODES_PER_TEST, devtools=True):
+        self.leak = leak
+        self.devtools = devtools
+        self.nodes = BASE_NODES
+        self.window_handles = ["main"]
+        self.command_executor = FakeExecutor()
+        self.switch_to = FakeSwitchTo()
+        self.capabilities = {}
+        self.quit_count = 0
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        if not self.devtools:
+            raise WebDriverException("not a Chromium browser")
+        if cmd == "Runtime.getHeapUsage":
+            return {"usedSize": self.nodes * 1024, "totalSize": 2 ** 30}
+        if cmd == "Memory.getDOMCounters":
+            return {"documents": 1, "nodes": self.nodes, "jsEventListeners": 10}
+        return {}
+
+    def execute_script(self, script, *args):
+        return {"heap": None, "nodes": self.nodes, "documents": 1}
+
+    def get(self, url):
+        self.nodes += self.leak
+
+    def get_window_size(self):
+        return {"width": 1200, "height": 800}
+
+    def set_window_size(self, width, height):
+        pass
+
+    def quit(self):
+        self.quit_count += 1
+
+
+class GrowthTrendTest(unittest.TestCase):
+
+    def test_steady_growth_only(self):
+        self.assertIsNotNone(growth_trend("dom_nodes", [1000 * step for step in range(10)]))
+        self.assertIsNone(growth_trend("dom_nodes", [1000 * step for step in range(10)], min_growth=10000))
+        self.assertIsNone(growth_trend("dom_nodes", [0, 9000, 0, 9000, 0, 9000, 0, 9000, 0, 9001]))
+        sawtooth = growth_trend("browser_mb", [300, 340, 380, 370, 420, 460, 500, 540, 580, 620])
+        self.assertEqual((sawtooth.growth, round(sawtooth.share, 2)), (320, 0.89))
+        self.assertIsNone(growth_trend("browser_mb", [300, None, None]))
+
+
+class MemoryMonitorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.monitor = MemoryMonitor(window=5)
+
+    def test_samples_and_timeline(self):
+        driver = LeakingDriver()
+        driver.service = type("Service", (), {"process": type("Process", (), {"pid": os.getpid()})})()
+        self.monitor.sample(driver, "acquire", TEST_ID)
+        driver.window_handles.append("tab")
+        sample = self.monitor.sample(driver, "translation French")
+        self.assertEqual((sample.test, sample.dom_nodes, sample.documents, sample.listeners, sample.windows),
+                         (TEST_ID, BASE_NODES, 1, 10, 2))
+        self.assertGreater(sample.chromedriver_mb, 0)
+        self.assertEqual([sample.step for sample in self.monitor.timeline(TEST_ID)], ["acquire", "translation French"])
+
+        with tempfile.TemporaryDirectory() as memory_dir:
+            path = os.path.join(memory_dir, "memory.csv")
+            self.monitor.export_csv(path)
+            with open(path, newline="", encoding="utf-8") as csv_file:
+                rows = list(csv.DictReader(csv_file))
+        self.assertEqual([(row["step"], row["windows"]) for row in rows],
+                         [("acquire", "1"), ("translation French", "2")])
+
+    def test_page_counts_without_devtools(self):
+        sample = self.monitor.sample(LeakingDriver(devtools=False), "acquire", TEST_ID)
+        self.assertEqual((sample.dom_nodes, sample.js_heap_mb, sample.listeners), (BASE_NODES, None, None))
+
+    def test_growth_and_limits(self):
+        leaking, flat = LeakingDriver(), LeakingDriver(leak=0)
+        for _ in range(5):
+            for driver in (leaking, flat):
+                driver.get("about:blank")
+                self.monitor.sample(driver, RESET, TEST_ID)
+        self.assertRegex(self.monitor.recycle_reason(leaking), r"^dom_nodes 2400 -> 10400 \(grew in 100%")
+        self.assertIsNone(self.monitor.recycle_reason(flat))
+
+        flat.window_handles.extend(f"tab-{index}" for index in range(10))
+        self.monitor.sample(flat, "translation French")
+        self.assertEqual(self.monitor.recycle_reason(flat), "windows 11 over 8")
+
+    def test_disabled(self):
+        monitor = MemoryMonitor(enabled=False)
+        self.assertIsNone(monitor.sample(LeakingDriver(), "acquire"))
+        self.assertIsNone(monitor.recycle_reason(LeakingDriver()))
+
+
+class DriverPoolRecycleTest(unittest.TestCase):
+
+    def test_leaking_session_is_replaced(self):
+        drivers = []
+
+        def launch():
+            drivers.append(LeakingDriver())
+            return drivers[-1]
+        monitor = MemoryMonitor(window=4)
+        pool = DriverPool(1, launch, monitor)
+        for index in range(6):
+            pool.release(pool.acquire(f"test {index}"))
+
+        self.assertEqual(len(drivers), 2, "The session is recycled after four growing resets")
+        self.assertEqual(drivers[0].quit_count, 1)
+        self.assertEqual([label for label, _ in pool.recycled], ["test 3"])
+        self.assertIn("recycled after test 3: dom_nodes", pool.report())
+        self.assertIn("1 recycled", monitor.report())
+        pool.shutdown()
+
+
+class MemoryMonitorBrowserTest(unittest.TestCase):
+    """
+    Soak of the open tab -> switch -> close cycle of the translation checks on one pooled session.
+    """
+
+    def setUp(self):
+        self.server = FixtureServer({"/": FixtureResponse(SOAK_PAGE), "/fr": FixtureResponse(SOAK_PAGE)}).start()
+        self.monitor = MemoryMonitor()
+        self.pool = DriverPool(1, memory_monitor=self.monitor)
+
+    def tearDown(self):
+        self.pool.shutdown()
+        self.server.stop()
+
+    def test_tab_cycle_does_not_grow(self):
+        for iteration in range(SOAK_ITERATIONS):
+            with self.pool.lease(f"soak {iteration}") as lease:
+                driver = lease.driver
+                driver.get(self.server.url("/"))
+                main = driver.current_window_handle
+                driver.execute_script("window.open(arguments[0]);", self.server.url("/fr"))
+                driver.switch_to.window([handle for handle in driver.window_handles if handle != main][0])
+                driver.close()
+                driver.switch_to.window(main)
+                self.monitor.sample(driver, "tab closed")
+        self.assertEqual(self.pool.recycled, [], self.monitor.report())
+        resets = [sample for sample in self.monitor.samples if sample.step == RESET]
+        self.assertEqual(len(resets), SOAK_ITERATIONS)
+        self.assertTrue(all(sample.windows == 1 for sample in resets))
+
+
+if __name__ == "__main__":
+    unittest.main()
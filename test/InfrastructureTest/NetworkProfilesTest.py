@@ -0,0 +1,137 @@
+import tempfile
+import unittest
+from Infrastructure.Browsers import requires_cdp
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.NetworkProfiles import FULL, PROFILES, SEARCH, TEXT, FontCache, ProfileFixture, ProfileStats, \
+    RequestInterceptor, apply_profile, benchmark_profiles, get_profile, savings_report
+
+#====== FIXTURE REQUESTS ======
+TARGET = "target-1"
+FONT_URL = "https://react.dev/fonts/Optimistic_Display.woff2"
+
+
+class RecordingTab:
+    """
+    Stands in for an AsyncTab: records the commands the interceptor answers with.
+    """
+
+    def __init__(self, responses=None):
+        self.target_id = TARGET
+        self.sent = []
+        self.responses = responses or {}
+
+    def on(self, method, callback):
+        return lambda: None
+
+    async def send(self, method, params=None):
+        self.sent.append((method, params or {}))
+        return self.responses.get(method, {})
+
+
+def paused(url, resource_type, frame_id="frame-2", **response):
+    return dict({"requestId": "r1", "request": {"url": url}, "resourceType": resource_type, "frameId": frame_id},
+                **response)
+
+
+class NetworkProfileTest(unittest.TestCase):
+
+    def test_blocking_rules(self):
+        search = get_profile(SEARCH)
+        self.assertIsNone(search.blocks("https://react.dev/learn", "Document", main_frame=True))
+        self.assertIsNone(search.blocks("http://fr.react.dev.localhost:8000/_next/app.js", "Script"))
+        self.assertIsNone(search.blocks("https://1234-dsn.algolia.net/1/indexes/*/queries", "XHR"))
+        self.assertEqual(search.blocks("https://i.ytimg.com/vi/x/hq.jpg", "Script"), "third-party")
+        self.assertEqual(search.blocks("https://react.dev/images/logo.png", "Image"), "Image")
+        self.assertEqual(search.blocks("https://react.dev/_vercel/insights/script.js", "Script"), "url")
+        self.assertIsNone(search.blocks("data:image/png;base64,AAAA", "Image"))
+        self.assertEqual(get_profile(TEXT).blocks("https://docsearch.algolia.net/q", "XHR"), "third-party")
+        self.assertIsNone(get_profile(FULL).blocks("https://i.ytimg.com/vi/x/hq.jpg", "Image"))
+
+    def test_throttling_and_url_patterns(self):
+        throttled = get_profile(TEXT, "fast-3g")
+        self.assertEqual(throttled.name, "text+fast-3g")
+        self.assertEqual(throttled.conditions(), {"offline": False, "latency": 562.5, "downloadThroughput": 180000,
+                                                  "uploadThroughput": 84375})
+        self.assertEqual(get_profile(TEXT).conditions()["downloadThroughput"], -1)
+        self.assertIn("*.woff2", throttled.url_patterns())
+        with self.assertRaises(ValueError):
+            get_profile("images-only")
+        with self.assertRaises(ValueError):
+            get_profile(FULL, "dial-up")
+
+    def test_no_devtools_leaves_the_network_alone(self):
+        self.assertIsNone(apply_profile(object(), PROFILES[SEARCH]))
+
+
+class RequestInterceptorTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.font_cache = FontCache(self.cache_dir.name)
+        self.stats = ProfileStats()
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def interceptor(self, tab, name=SEARCH):
+        return RequestInterceptor(tab, get_profile(name), self.font_cache, self.stats)
+
+    async def test_blocked_and_continued_requests(self):
+        tab = RecordingTab()
+        interceptor = self.interceptor(tab)
+        await interceptor.resolve(paused("https://www.googletagmanager.com/gtag/js", "Script"))
+        await interceptor.resolve(paused("https://react.dev/", "Document", frame_id=TARGET))
+        await interceptor.resolve(paused("https://react.dev/images/hero.webp", "Image"))
+        self.assertEqual(tab.sent, [
+            ("Fetch.failRequest", {"requestId": "r1", "errorReason": "BlockedByClient"}),
+            ("Fetch.continueRequest", {"requestId": "r1"}),
+            ("Fetch.failRequest", {"requestId": "r1", "errorReason": "BlockedByClient"})])
+        self.assertEqual(self.stats.blocked, {"url": 1, "Image": 1})
+        self.assertIn("3 requests intercepted, 2 blocked (1 Image, 1 url)", self.stats.describe())
+
+    async def test_fonts_are_cached_then_served_from_disk(self):
+        tab = RecordingTab({"Fetch.getResponseBody": {"body": "d29mMg==", "base64Encoded": True}})
+        interceptor = self.interceptor(tab)
+        await interceptor.resolve(paused(FONT_URL, "Font"))
+        await interceptor.resolve(paused(FONT_URL, "Font", responseStatusCode=200, responseHeaders=[
+            {"name": "Content-Type", "value": "font/woff2"}, {"name": "Set-Cookie", "value": "a=b"}]))
+        self.assertEqual([method for method, _ in tab.sent],
+                         ["Fetch.continueRequest", "Fetch.getResponseBody", "Fetch.continueRequest"])
+        self.assertEqual(self.font_cache.get(FONT_URL), ({"content-type": "font/woff2"}, "d29mMg=="))
+
+        tab.sent.clear()
+        await interceptor.resolve(paused(FONT_URL, "Font"))
+        self.assertEqual(tab.sent, [("Fetch.fulfillRequest", {
+            "requestId": "r1", "responseCode": 200, "body": "d29mMg==",
+            "responseHeaders": [{"name": "content-type", "value": "font/woff2"}]})])
+        self.assertEqual((self.stats.fonts_stored, self.stats.fonts_from_cache), (1, 1))
+
+
+@requires_cdp
+class NetworkProfilesBrowserTest(unittest.TestCase):
+    """
+    Profiles applied to a pooled session load the fixture page without the blocked requests, and faster.
+    """
+
+    def setUp(self):
+        self.fixture = ProfileFixture().start()
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.fixture.stop()
+        self.cache_dir.cleanup()
+
+    def test_profiles_save_page_load_time(self):
+        profiles = [get_profile(name).with_first_party(self.fixture.first_party) for name in (FULL, SEARCH, TEXT)]
+        with get_driver_pool().lease(self.id()) as lease:
+            results = benchmark_profiles(lease.driver, self.fixture.url(), profiles, 2, FontCache(self.cache_dir.name))
+            self.assertIsNone(getattr(lease.driver, "network_profile", None))
+        full, search, text = results
+        self.assertLess(search.median_ms, full.median_ms, savings_report(results))
+        self.assertLess(text.median_ms, full.median_ms, savings_report(results))
+        self.assertEqual(self.fixture.third_party.requests.count(("GET", "/analytics.js")), 3,
+                         "Only the full profile loads the third party")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import base64
+import unittest
+from unittest import mock
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from Infrastructure import PageWait as page_wait_module
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+from Infrastructure.PageWait import NETWORK_STATE_SCRIPT, RESOURCE_TIMING_BUFFER_SIZE, PageWait, wait_report
+
+#====== FIXTURE PAGES ======
+PIXEL = base64.b64decode("R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7")
+IMAGE_COUNT = 300
+IMAGES_PAGE = ("<!DOCTYPE html><html><body>"
+               + "".join(f'<img src="/pixel?n={index}">' for index in range(IMAGE_COUNT)) + "</body></html>")
+FOCUS_PAGE = """<!DOCTYPE html><html><body><button id="first">First</button><button id="last">Last</button>
+</body></html>"""
+LOAD_IMAGE_SCRIPT = """
+var done = arguments[arguments.length - 1], image = new Image();
+image.onload = image.onerror = function () { done(true); };
+image.src = arguments[0];
+"""
+IDLE_MS = 400
+
+
+class ScriptedDriver:
+    """
+    Answers execute_script with the given values in order (the last one repeats) and keeps the calls.
+    """
+
+    def __init__(self, *values):
+        self.values = list(values)
+        self.calls = []
+
+    def execute_script(self, script, *args):
+        self.calls.append((script, args))
+        return self.values.pop(0) if len(self.values) > 1 else self.values[0]
+
+
+class PageWaitTest(unittest.TestCase):
+
+    def setUp(self):
+        patch = mock.patch.object(page_wait_module, "WAIT_TIMINGS", [])
+        self.timings = patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_until_polls_until_the_condition_holds(self):
+        driver = ScriptedDriver(False, False, "ready")
+        self.assertEqual(PageWait(driver).until(lambda driver: driver.execute_script("poll"), "banner"), "ready")
+        timing, = self.timings
+        self.assertEqual((timing.kind, timing.label, timing.polls, timing.timed_out), ("until", "banner", 3, False))
+
+    def test_until_times_out(self):
+        with self.assertRaises(TimeoutException):
+            PageWait(ScriptedDriver(False), timeout=0.1).until(lambda driver: driver.execute_script("poll"), "menu")
+        self.assertTrue(self.timings[0].timed_out)
+        self.assertIn("until: 1 x avg", wait_report())
+        self.assertIn("(menu), 1 timeouts", wait_report())
+
+    def test_network_idle_raises_the_resource_timing_buffer(self):
+        driver = ScriptedDriver([250, 10.0], [250, IDLE_MS])
+        PageWait(driver).network_idle("home", idle_ms=IDLE_MS)
+        self.assertEqual(driver.calls, [(NETWORK_STATE_SCRIPT, (RESOURCE_TIMING_BUFFER_SIZE,))] * 2)
+
+
+class PageWaitBrowserTest(unittest.TestCase):
+    """
+    Waits on fixture pages in a pooled browser.
+    """
+
+    def setUp(self):
+        routes = {"/images": FixtureResponse(IMAGES_PAGE), "/focus": FixtureResponse(FOCUS_PAGE),
+                  "/pixel": FixtureResponse(PIXEL, content_type="image/gif")}
+        self.server = FixtureServer(routes).start()
+        self.lease = get_driver_pool().acquire(self.id())
+        self.addCleanup(get_driver_pool().release, self.lease)
+        self.driver = self.lease.driver
+        self.page_wait = PageWait(self.driver)
+        patch = mock.patch.object(page_wait_module, "WAIT_TIMINGS", [])
+        self.timings = patch.start()
+        self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_network_idle_after_the_default_resource_buffer_is_full(self):
+        self.driver.get(self.server.url("/images"))
+        self.page_wait.page_load("images")
+        self.driver.execute_async_script(LOAD_IMAGE_SCRIPT, self.server.url(f"/pixel?n={IMAGE_COUNT}"))
+        self.page_wait.network_idle("late image", idle_ms=IDLE_MS)
+        self.assertGreater(self.timings[-1].polls, 1, "The late response is recorded, so the wait is not over yet")
+
+    def test_focus_leaving_the_document_is_a_focus_change(self):
+        self.driver.get(self.server.url("/focus"))
+        last = self.driver.find_element(By.ID, "last")
+        self.driver.execute_script("arguments[0].focus();", last)
+        self.page_wait.focus_change(lambda: ActionChains(self.driver).send_keys(Keys.TAB).perform(), "tab")
+        self.driver.execute_script("arguments[0].focus();", last)
+        self.page_wait.focus_change(lambda: self.driver.execute_script("document.activeElement.blur();"), "blur")
+        self.assertEqual([timing.timed_out for timing in self.timings], [False, False])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import numpy as np
+from Infrastructure.ParagraphAlignment import MISSING, OK, UNTRANSLATED, Paragraph, align_paragraphs, \
+    iter_paragraphs
+
+#====== TOPICS ======
+# Every paragraph talks about one topic; a translation keeps the topic, so its embedding is the topic's unit vector.
+TOPIC_COUNT = 64
+
+
+def embed(texts):
+    vectors = np.zeros((len(texts), TOPIC_COUNT))
+    for row, text in enumerate(texts):
+        vectors[row, int(text.split()[-1])] = 1.0
+    return vectors
+
+
+def page(language, topics):
+    return [Paragraph(index, f"main > p:nth-of-type({index + 1})", f"{language} topic {topic}")
+            for index, topic in enumerate(topics)]
+
+
+def matched_topics(report):
+    return [(int(match.target.text.split()[-1]) if match.target else None, match.status) for match in report.matches]
+
+
+class AlignParagraphsTest(unittest.TestCase):
+
+    def test_translation_in_the_same_order(self):
+        report = align_paragraphs(page("en", range(10)), page("fr", range(10)), embed)
+        self.assertEqual(matched_topics(report), [(topic, OK) for topic in range(10)])
+        self.assertEqual(report.mean_score, 1.0)
+
+    def test_inserted_paragraphs_are_skipped(self):
+        inserted = [0, 40, 1, 2, 41, 42, 3, 4, 5, 43]
+        report = align_paragraphs(page("en", range(6)), page("fr", inserted), embed)
+        self.assertEqual(matched_topics(report), [(topic, OK) for topic in range(6)])
+
+    def test_deleted_paragraphs_are_missing(self):
+        report = align_paragraphs(page("en", range(8)), page("fr", [0, 1, 2, 5, 6, 7]), embed)
+        statuses = [match.status for match in report.matches]
+        self.assertEqual(statuses, [OK, OK, OK, MISSING, MISSING, OK, OK, OK])
+        self.assertEqual([match.source.text for match in report.missing], ["en topic 3", "en topic 4"])
+        self.assertIn("2 missing, 0 untranslated", report.summary())
+
+    def test_reordered_paragraphs_within_the_band(self):
+        reordered = [1, 0, 2, 3, 6, 4, 5, 7]
+        report = align_paragraphs(page("en", range(8)), page("fr", reordered), embed, band=2)
+        self.assertEqual(matched_topics(report), [(topic, OK) for topic in range(8)])
+
+    def test_reordered_paragraphs_outside_the_band(self):
+        report = align_paragraphs(page("en", range(8)), page("fr", [7, 1, 2, 3, 4, 5, 6, 0]), embed, band=1)
+        self.assertEqual([match.status for match in report.matches], [MISSING] + [OK] * 6 + [MISSING])
+
+    def test_empty_side(self):
+        self.assertEqual(align_paragraphs([], page("fr", range(3)), embed).matches, [])
+        self.assertEqual(align_paragraphs([], [], embed).mean_score, 0.0)
+        report = align_paragraphs(page("en", range(3)), [], embed)
+        self.assertEqual(matched_topics(report), [(None, MISSING)] * 3)
+
+    def test_untranslated_paragraph(self):
+        target = page("fr", range(4))
+        target[2] = Paragraph(2, target[2].path, "EN topic 2")
+        report = align_paragraphs(page("en", range(4)), target, embed)
+        self.assertEqual([match.status for match in report.matches], [OK, OK, UNTRANSLATED, OK])
+        originals = [paragraph.text for paragraph in page("fr", range(4))]
+        report = align_paragraphs(page("en", range(4)), page("en", range(4)), embed, originals=originals)
+        self.assertEqual(report.untranslated, [], "Back translations are compared through their originals")
+
+    def test_long_pages_are_aligned_in_chunks(self):
+        topics = [index % TOPIC_COUNT for index in range(600)]
+        report = align_paragraphs(page("en", topics), page("fr", topics), embed, band=3)
+        self.assertEqual([match.target.index for match in report.matches], list(range(600)))
+
+
+class IterParagraphsTest(unittest.TestCase):
+
+    def test_section_paragraphs_in_order(self):
+        html = ("<body><p>Outside</p><main><div><p>First  <b>bold</b></p><script>var p;</script>"
+                "<p></p><p>Second<br>line</p></div></main></body>")
+        paragraphs = list(iter_paragraphs([html[:30], html[30:]]))
+        self.assertEqual([paragraph.text for paragraph in paragraphs], ["First bold", "Secondline"])
+        self.assertEqual(paragraphs[0].path, "body > main > div > p")
+
+    def test_falls_back_to_the_whole_page(self):
+        paragraphs = iter_paragraphs("<body><article><p>One</p><p>Two</p></article></body>")
+        self.assertEqual([paragraph.text for paragraph in paragraphs], ["One", "Two"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+from Infrastructure.Browsers import BrowserConfig
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.Instrumentation import TRACER
+from Infrastructure.ParallelRunner import ERROR, FAILURE, SHARD_ENV, SKIPPED, SUCCESS, MergedResult, ShardJob, \
+    ShardRecord, collect_jobs, job_outcome, run_job, run_parallel, shard_subtests, shuffle_jobs, subtest_items
+from InfrastructureTest.DriverPoolTest import FakeDriver
+
+#====== WORKER JOBS ======
+JOB_COUNT = 4
+QUIT_MARKER_ENV = "PARALLEL_RUNNER_TEST_QUIT_MARKER"
+SHARD_COUNT = 3
+SHARDED_ITEMS = list(range(10))
+SEEN_ITEMS = []
+
+
+class MarkedDriver(FakeDriver):
+    """
+    Appends "<pid> <browser>" of the process that quits it to a marker file, so the parent sees the quits of its
+    workers.
+    """
+
+    def __init__(self, browser="chrome"):
+        super().__init__()
+        self.browser = browser
+
+    def quit(self):
+        super().quit()
+        with open(os.environ[QUIT_MARKER_ENV], "a", encoding="utf-8") as marker:
+            marker.write(f"{os.getpid()} {self.browser}\n")
+
+
+def read_quits(path):
+    """
+    Returns: list of (pid, browser) of the quit MarkedDrivers.
+    """
+    with open(path, encoding="utf-8") as marker:
+        return [(int(pid), browser) for pid, browser in (line.split() for line in marker)]
+
+
+class PooledJob(unittest.TestCase):
+    """
+    Run by ParallelRunnerTest in the workers (its method is not a test, so it is not collected): leases the pooled
+    session and leaves it in the pool, like the suites do.
+    """
+
+    def lease_pooled_session(self):
+        with TRACER.step("lease pooled session"), get_driver_pool().lease(self.id()) as lease:
+            self.assertIsInstance(lease.driver, MarkedDriver)
+
+
+class ShardedJob(unittest.TestCase):
+    """
+    Run by ShardingTest: a subTest loop split into SHARD_COUNT shards that records the items it saw.
+    """
+
+    @shard_subtests(SHARD_COUNT)
+    def check_items(self):
+        for item in subtest_items(SHARDED_ITEMS):
+            with self.subTest(item=item):
+                SEEN_ITEMS.append(item)
+                self.assertNotEqual(item, 7)
+
+
+# Built from the classes, so the workers load the same module whether it was imported as
+# InfrastructureTest.ParallelRunnerTest or, under discover without -t, as ParallelRunnerTest.
+POOLED_JOB = f"{PooledJob.__module__}.{PooledJob.__qualname__}.lease_pooled_session"
+SHARDED_JOB = f"{ShardedJob.__module__}.{ShardedJob.__qualname__}.check_items"
+
+
+def record(outcome, details=""):
+    return ShardRecord(f"test_{outcome}", outcome, details)
+
+
+class ParallelRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.work_dir.cleanup)
+        marker = os.path.join(self.work_dir.name, "quits.txt")
+        patches = [mock.patch.object(BrowserConfig, "factory", lambda config: lambda: MarkedDriver(config.browser)),
+                   mock.patch.dict(os.environ, {QUIT_MARKER_ENV: marker}),
+                   mock.patch.object(TRACER, "trace_dir", self.work_dir.name)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_workers_quit_their_drivers_and_flush_their_reports(self):
+        result = run_parallel([POOLED_JOB] * JOB_COUNT, workers=2, seed=1, stream=io.StringIO())
+
+        self.assertTrue(result.wasSuccessful(), result.errors)
+        worker_pids = {worker_pid for _, worker_pid, _ in result.shard_timings}
+        quitting_pids = [pid for pid, _ in read_quits(os.path.join(self.work_dir.name, "quits.txt"))]
+        self.assertEqual(sorted(quitting_pids), sorted(worker_pids), "Every worker quits its one pooled driver")
+        self.assertNotIn(os.getpid(), quitting_pids)
+        for worker_pid in worker_pids:
+            self.assertTrue(os.path.exists(os.path.join(self.work_dir.name, f"steps-{worker_pid}.csv")),
+                            "The worker's trace export was written")
+
+
+class ShardingTest(unittest.TestCase):
+
+    def setUp(self):
+        SEEN_ITEMS.clear()
+
+    def test_subtest_items_follow_the_shard(self):
+        self.assertEqual(subtest_items(iter(SHARDED_ITEMS)), SHARDED_ITEMS, "Not sharded: every item")
+        with mock.patch.dict(os.environ, {SHARD_ENV: "1/3"}):
+            self.assertEqual(subtest_items(SHARDED_ITEMS), [1, 4, 7])
+
+    def test_sharded_method_is_split_into_jobs(self):
+        jobs = collect_jobs([SHARDED_JOB, POOLED_JOB])
+        self.assertEqual([(job.test_id, job.shard_index, job.shard_count) for job in jobs],
+                         [(SHARDED_JOB, index, SHARD_COUNT) for index in range(SHARD_COUNT)] + [(POOLED_JOB, 0, 1)])
+        self.assertEqual(jobs[1].name, f"{SHARDED_JOB} [shard 2/3]")
+
+        outcomes = [job_outcome(run_job(job)[2]) for job in jobs[:SHARD_COUNT]]
+        self.assertEqual(sorted(SEEN_ITEMS), SHARDED_ITEMS, "The shards cover every item exactly once")
+        self.assertEqual(outcomes, [SUCCESS, FAILURE, SUCCESS], "Item 7 fails in the second shard only")
+        self.assertNotIn(SHARD_ENV, os.environ)
+
+    def test_shuffle_is_seeded(self):
+        jobs = [ShardJob(f"Suite.test_{index}") for index in range(20)]
+        first = shuffle_jobs(jobs, 1234)
+        self.assertEqual([job.name for job in first], [job.name for job in shuffle_jobs(jobs, 1234)])
+        self.assertNotEqual([job.name for job in first], [job.name for job in shuffle_jobs(jobs, 1235)])
+        self.assertEqual(sorted(job.name for job in first), sorted(job.name for job in jobs))
+        self.assertEqual(jobs[0].name, "Suite.test_0", "The input list is left alone")
+
+
+class MergedResultTest(unittest.TestCase):
+
+    def test_shard_records_are_merged(self):
+        merged = MergedResult()
+        merged.add_job(ShardJob("Suite.test_a", 0, 2), 101, 1.5, [record(SUCCESS), record(FAILURE, "boom")])
+        merged.add_job(ShardJob("Suite.test_a", 1, 2), 102, 2.5, [record(SKIPPED, "unchanged")])
+        merged.add_job(ShardJob("Suite.test_b"), 101, 0.5, [record(ERROR, "Traceback")])
+        stream = io.StringIO()
+        merged.print_report(stream, 42, 3.0)
+        report = stream.getvalue()
+
+        self.assertEqual(merged.testsRun, 3)
+        self.assertEqual([(str(test), details) for test, details in merged.failures], [("test_FAIL", "boom")])
+        self.assertEqual([details for _, details in merged.errors + merged.skipped], ["Traceback", "unchanged"])
+        self.assertFalse(merged.wasSuccessful())
+        self.assertIn("worker 101: 2.00s busy", report)
+        self.assertIn("Ran 3 shards in 3.000s (seed 42)", report)
+        self.assertIn("FAILED (failures=1, errors=1)", report)
+        self.assertEqual(job_outcome([record(SKIPPED), record(FAILURE), record(ERROR)]), ERROR)
+        self.assertEqual(job_outcome([]), SUCCESS)
+
+
+if __name__ == "__main__":
+    unittest.main()
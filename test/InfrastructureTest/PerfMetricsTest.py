@@ -0,0 +1,150 @@
+import os
+import tempfile
+import unittest
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+from Infrastructure.PerfMetrics import FAIL, HOME, OFF, MetricsStore, PageMetrics, PerfRecorder, \
+    cumulative_layout_shift, metric_values, percentile
+
+#====== THROTTLED PAGES ======
+SERVER_DELAY = 0.3
+LONG_TASK_MS = 120
+SLOW_PAGE = """<!DOCTYPE html><html lang="en"><head><title>Slow</title></head><body>
+<h1 id="title" style="font-size: 64px">React</h1><p>The library for web and native user interfaces</p>
+<script>
+var end = performance.now() + %d;
+while (performance.now() < end) {}
+setTimeout(function () {
+    var banner = document.createElement('div');
+    banner.style.height = '300px';
+    banner.textContent = 'banner';
+    document.body.insertBefore(banner, document.body.firstChild);
+}, 50);
+</script></body></html>""" % LONG_TASK_MS
+FAST_PAGE = "<!DOCTYPE html><html lang='en'><head><title>Fast</title></head><body><h1>React</h1></body></html>"
+TEST_BUDGETS = {HOME: {"ttfb": (SERVER_DELAY * 1000 / 2, None), "cls": (0.5, 0.5)}}
+
+
+def sample(page, **values):
+    return PageMetrics(page, "http://localhost/", "test", values)
+
+
+class PerfMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics_dir = tempfile.TemporaryDirectory()
+        self.store = MetricsStore(os.path.join(self.metrics_dir.name, "metrics.jsonl"))
+
+    def tearDown(self):
+        self.metrics_dir.cleanup()
+
+    def test_cumulative_layout_shift_session_windows(self):
+        shifts = [[100, 0.05, False], [600, 0.05, False],  # window 1: 0.1
+                  [3000, 0.02, False], [3500, 0.3, True],  # input driven shift ignored
+                  [8000, 0.08, False], [8900, 0.08, False], [9800, 0.08, False]]  # window 3: 0.24
+        self.assertAlmostEqual(cumulative_layout_shift(shifts), 0.24)
+        self.assertAlmostEqual(cumulative_layout_shift(shifts, since=9000), 0.08)
+        self.assertEqual(cumulative_layout_shift([]), 0.0)
+
+    def test_percentile(self):
+        self.assertEqual(percentile([5, 1, 3], 0.5), 3)
+        self.assertAlmostEqual(percentile(range(1, 101), 0.95), 95.05)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_soft_navigation_counts_only_after_the_click(self):
+        raw = {"url": "http://localhost/learn", "now": 5000.0, "lcp": 900.0, "navigation": {"ttfb": 50},
+               "shifts": [[100, 0.2, False], [4500, 0.01, False]], "longTasks": [[200, 300], [4200, 80]]}
+        values = metric_values(raw, since=4000.0)
+        self.assertEqual(values["navigation_ms"], 1000.0)
+        self.assertEqual((values["long_tasks"], values["long_task_ms"]), (1, 80))
+        self.assertEqual(values["cls"], 0.01)
+        self.assertNotIn("lcp", values)
+
+    def test_store_round_trip(self):
+        self.store.append(sample(HOME, lcp=1200.0, cls=0.01))
+        self.store.append(sample("other", lcp=100.0))
+        reloaded = MetricsStore(self.store.path)
+        self.assertEqual([entry.values for entry in reloaded.history(HOME)], [{"lcp": 1200.0, "cls": 0.01}])
+        self.assertEqual(len(reloaded.history()), 2)
+
+    def test_store_rotates_past_max_bytes(self):
+        store = MetricsStore(self.store.path, max_bytes=300)
+        for lcp in range(10):
+            store.append(sample(HOME, lcp=float(lcp)))
+        current, rotated = store.history(), MetricsStore(store.path + ".1").history()
+        kept = [entry.values["lcp"] for entry in rotated + current]
+        self.assertLess(len(current), 10)
+        self.assertEqual(kept, [float(lcp) for lcp in range(10)][-len(kept):], "The newest samples are kept")
+
+    def test_budgets_use_the_recent_window(self):
+        recorder = PerfRecorder(self.store, {HOME: {"lcp": (2000, 3000)}}, FAIL, window=10)
+        recorder.samples += [sample(HOME, lcp=5000.0) for _ in range(20)]
+        recorder.samples += [sample(HOME, lcp=1000.0) for _ in range(10)]
+        self.assertEqual(recorder.violations(HOME), [])
+        recorder.samples.append(sample(HOME, lcp=5000.0))
+        self.assertEqual(recorder.violations(HOME), ["lcp p95 3200 > 3000"])
+        recorder.samples.append(sample(HOME, lcp=None))
+        self.assertEqual(recorder.violations(HOME), ["lcp p95 3400 > 3000"], "Missing values are skipped")
+
+    def test_budgets_ignore_earlier_runs(self):
+        for _ in range(20):
+            self.store.append(sample(HOME, lcp=5000.0))
+        recorder = PerfRecorder(self.store, {HOME: {"lcp": (2000, 3000)}}, FAIL)
+        recorder.samples.append(sample(HOME, lcp=1000.0))
+        self.assertEqual(recorder.violations(HOME), [], "Slow samples of an earlier run are not counted")
+        recorder.samples.append(sample(HOME, lcp=5000.0))
+        self.assertEqual(recorder.violations(HOME), [], "Too few samples in this run")
+        recorder.samples.append(sample(HOME, lcp=5000.0))
+        self.assertEqual(recorder.violations(HOME), ["lcp p50 5000 > 2000", "lcp p95 5000 > 3000"])
+
+
+class PerfMetricsBrowserTest(unittest.TestCase):
+    """
+    Collects the metrics of throttled fixture pages in a real browser.
+    """
+
+    def setUp(self):
+        self.server = FixtureServer({"/slow": FixtureResponse(SLOW_PAGE, delay=SERVER_DELAY),
+                                     "/fast": FixtureResponse(FAST_PAGE)}).start()
+        self.metrics_dir = tempfile.TemporaryDirectory()
+        self.recorder = PerfRecorder(MetricsStore(os.path.join(self.metrics_dir.name, "metrics.jsonl")),
+                                     TEST_BUDGETS, FAIL)
+        self.lease = get_driver_pool().acquire(self.id())
+        self.addCleanup(get_driver_pool().release, self.lease)
+        self.driver = self.lease.driver
+
+    def tearDown(self):
+        self.metrics_dir.cleanup()
+        self.server.stop()
+
+    def test_throttled_page_metrics(self):
+        self.driver.get(self.server.url("/slow"))
+        self.driver.execute_script("return new Promise(function (resolve) { setTimeout(resolve, 300); });")
+        metrics = self.recorder.record(self.driver, HOME, self.id())
+
+        self.assertGreaterEqual(metrics.values["ttfb"], SERVER_DELAY * 1000)
+        self.assertGreaterEqual(metrics.values["fcp"], metrics.values["ttfb"])
+        self.assertIsNotNone(metrics.values["lcp"])
+        self.assertGreater(metrics.values["cls"], 0)
+        self.assertGreaterEqual(metrics.values["long_tasks"], 1)
+        self.assertGreaterEqual(metrics.values["long_task_ms"], LONG_TASK_MS)
+
+    def test_budget_fails_on_slow_page(self):
+        self.driver.get(self.server.url("/fast"))
+        self.assertIsNone(self.recorder.check(self.driver, HOME, self.id()))
+        self.driver.get(self.server.url("/slow"))
+        self.recorder.check(self.driver, HOME, self.id())
+        self.driver.get(self.server.url("/slow"))
+        error = self.recorder.check(self.driver, HOME, self.id(), label="slow page")
+        self.assertIsNotNone(error)
+        self.assertIn("ttfb p50", error)
+
+    def test_off_mode_skips_collection(self):
+        self.recorder.mode = OFF
+        self.driver.get(self.server.url("/fast"))
+        self.assertIsNone(self.recorder.record(self.driver, HOME))
+        self.assertEqual(self.recorder.store.history(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import io
+import multiprocessing
+import unittest
+from contextlib import redirect_stderr
+from unittest import mock
+from Infrastructure import Reports
+from Infrastructure.Reports import flush_reports, register_report
+
+
+def _send_state(state, results):
+    results.put(list(state))
+
+
+class ReportsTest(unittest.TestCase):
+
+    def setUp(self):
+        patch = mock.patch.object(Reports, "_reports", [])
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_reports_run_last_registered_first_then_forget(self):
+        calls = []
+        pool_report = lambda: calls.append("pools")
+        register_report(lambda: calls.append("tracer"), lambda: calls.append("forget tracer"))
+        register_report(pool_report)
+        register_report(pool_report)
+        flush_reports()
+        self.assertEqual(calls, ["pools", "tracer", "forget tracer"])
+
+    def test_registrations_survive_a_flush(self):
+        reported = []
+        state = ["first run"]
+        register_report(lambda: reported.append(list(state)), state.clear)
+        flush_reports()
+        state.append("after the flush")
+        flush_reports()
+        self.assertEqual(reported, [["first run"], ["after the flush"]], "Each flush reports only the work since")
+
+    def test_failing_report_does_not_stop_the_others(self):
+        calls = []
+        register_report(lambda: calls.append("tracer"))
+        register_report(lambda: 1 / 0, lambda: calls.append("forget failing"))
+        errors = io.StringIO()
+        with redirect_stderr(errors):
+            flush_reports()
+        self.assertEqual(calls, ["forget failing", "tracer"])
+        self.assertIn("ZeroDivisionError", errors.getvalue())
+
+    def test_forked_child_forgets_inherited_state(self):
+        state = ["parent sample"]
+        register_report(lambda: None, state.clear)
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        child = context.Process(target=_send_state, args=(state, results))
+        child.start()
+        self.assertEqual(results.get(timeout=10), [])
+        child.join()
+        self.assertEqual(state, ["parent sample"])
+
+
+if __name__ == "__main__":
+    unittest.main()
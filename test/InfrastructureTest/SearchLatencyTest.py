@@ -0,0 +1,95 @@
+import asyncio
+import json
+import unittest
+from FunctionalTest.SearchTest import INVALID_QUERY, QUERY
+from Infrastructure.HttpClient import AsyncHttpClient
+from Infrastructure.SearchLatency import DOCS_RECORDS, QUERIES_PATH, QUIET_MS, DocSearchStandIn, KeystrokeLatency, \
+    QueryRun, histogram, latency_report, run_corpus, search_records
+
+#====== INJECTED LATENCY ======
+LATENCY = 0.15
+CADENCE_MS = 250
+FAST_CADENCE_MS = 20
+SESSIONS = 2
+
+
+def search_body(query):
+    return json.dumps({"requests": [{"indexName": "react", "params": f"query={query}&hitsPerPage=5"}]}).encode()
+
+
+class SearchLatencyTest(unittest.TestCase):
+
+    def test_stand_in_search(self):
+        self.assertEqual([hit["hierarchy"]["lvl1"] for hit in search_records(DOCS_RECORDS, QUERY)],
+                         ["Reusing Logic with Custom Hooks"])
+        self.assertEqual(search_records(DOCS_RECORDS, INVALID_QUERY), [])
+        self.assertEqual(len(search_records(DOCS_RECORDS, "react hook", limit=2)), 2)
+
+    def test_stand_in_latency_is_injected(self):
+        latencies = {"slow": LATENCY}
+        with DocSearchStandIn(latency=lambda query: latencies.get(query, 0.0)) as stand_in:
+            async def search(query):
+                async with AsyncHttpClient() as client:
+                    return await client.request("POST", stand_in.base_url + QUERIES_PATH, body=search_body(query))
+            fast = asyncio.run(search("context"))
+            slow = asyncio.run(search("slow"))
+
+        self.assertEqual(json.loads(fast.body)["results"][0]["nbHits"], 2)
+        self.assertGreaterEqual(slow.seconds, LATENCY)
+        self.assertLess(fast.seconds, LATENCY)
+        self.assertEqual(stand_in.queries, ["context", "slow"])
+
+    def test_histogram(self):
+        buckets = dict(histogram([10, 30, 30, 120, 5000]))
+        self.assertEqual(buckets["<25ms"], 1)
+        self.assertEqual(buckets["25-50ms"], 2)
+        self.assertEqual(buckets["100-200ms"], 1)
+        self.assertEqual(buckets[">=1600ms"], 1)
+        self.assertEqual(sum(buckets.values()), 5)
+
+    def test_report(self):
+        keys = [KeystrokeLatency(0, "c", None, None), KeystrokeLatency(1, "cu", 120.0, 180.0)]
+        runs = [QueryRun(QUERY, True, keys, 1, 1.0), QueryRun(INVALID_QUERY, True, keys, 0, 1.0)]
+        report = latency_report(runs)
+        self.assertIn(f"Query {QUERY!r}: 1 runs, 0 with unexpected results", report)
+        self.assertIn(f"Query {INVALID_QUERY!r}: 1 runs, 1 with unexpected results", report)
+        self.assertIn("time to first result: 1 keystrokes, p50 120ms", report)
+
+
+class SearchLatencyBrowserTest(unittest.TestCase):
+    """
+    Types the SearchTest queries into the stand-in page on pooled browsers. The cadence is slower than the
+    injected latency, so every keystroke gets its own results.
+    """
+
+    def test_corpus_against_stand_in(self):
+        corpus = [(QUERY, True), (INVALID_QUERY, False)]
+        with DocSearchStandIn(latency=LATENCY) as stand_in:
+            runs = run_corpus(stand_in.base_url, corpus, sessions=SESSIONS, repeats=2, cadence_ms=CADENCE_MS)
+
+        self.assertEqual(len(runs), 4)
+        self.assertTrue(all(run.ok for run in runs), latency_report(runs))
+        for run in runs:
+            self.assertEqual(len(run.keystrokes), len(run.query))
+            self.assertEqual(run.keystrokes[-1].value, run.query)
+            for key in run.keystrokes:
+                self.assertGreaterEqual(key.first_result_ms, LATENCY * 1000)
+                self.assertGreaterEqual(key.stable_ms, key.first_result_ms)
+        print(latency_report(runs))
+
+    def test_backend_slower_than_the_quiet_window(self):
+        """
+        With a backend latency above QUIET_MS, the page is quiet between the last keystroke and its results;
+        the collection still waits for them.
+        """
+        latency = QUIET_MS * 2 / 1000
+        with DocSearchStandIn(latency=latency) as stand_in:
+            runs = run_corpus(stand_in.base_url, [(QUERY, True)], sessions=1, repeats=1, cadence_ms=FAST_CADENCE_MS)
+
+        self.assertTrue(runs[0].ok, latency_report(runs))
+        self.assertGreater(runs[0].hits, 0)
+        self.assertGreaterEqual(runs[0].final.first_result_ms, latency * 1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import os
+import tempfile
+import unittest
+from contextlib import contextmanager
+from unittest import mock
+from selenium.common.exceptions import TimeoutException
+from Infrastructure import PageWait as page_wait_module
+from Infrastructure.DriverPool import DriverLease
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+from Infrastructure.PageWait import NETWORK_STATE_SCRIPT, PAGE_STATE_SCRIPT
+from Infrastructure.SiteCrawler import BROWSER_TIER, LangCheck, OverflowCheck, PageCheck, SelectorPresenceCheck, \
+    SiteCrawler, normalize_url
+
+#====== GENERATED SITE ======
+PAGE_COUNT = 2000
+LINKS_PER_PAGE = 4
+SITEMAP_PAGES = 50
+HEADER_SELECTOR = "nav.z-40"
+FOOTER_TAG = "footer"
+PAGE_TEMPLATE = """<!DOCTYPE html><html lang="{lang}"><head><title>Page {number}</title></head><body>
+<nav class="sticky z-40 top-0">header</nav><main><h1>Page {number}</h1>{links}</main>{footer}</body></html>"""
+SITEMAP_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>"""
+NO_FOOTER_PAGES = (17, 1234)
+WRONG_LANG_PAGES = (99,)
+#====== BROKEN PAGES ======
+CORRUPT_PAGE = 2
+HANGING_PAGE = 3
+
+
+def generated_site(base_url):
+    """
+    A static docs-like site: page n links to its children 4n+1..4n+4 (plus a fragment and an external link),
+    and the sitemap lists the first pages.
+    """
+    routes = {}
+    for number in range(PAGE_COUNT):
+        children = range(number * LINKS_PER_PAGE + 1, min((number + 1) * LINKS_PER_PAGE + 1, PAGE_COUNT))
+        links = "".join(f'<a href="/docs/{child}#top">{child}</a>' for child in children)
+        links += '<a href="https://github.com/reactjs">GitHub</a><a href="/">Home</a>'
+        footer = "" if number in NO_FOOTER_PAGES else "<footer>footer</footer>"
+        lang = "de" if number in WRONG_LANG_PAGES else "en"
+        path = "/" if number == 0 else f"/docs/{number}"
+        routes[path] = FixtureResponse(PAGE_TEMPLATE.format(lang=lang, number=number, links=links, footer=footer))
+    entries = "".join(f"<url><loc>{base_url}/docs/{number}</loc></url>" for number in range(1, SITEMAP_PAGES))
+    routes["/sitemap.xml"] = FixtureResponse(SITEMAP_TEMPLATE.format(entries=entries), content_type="application/xml")
+    return routes
+
+
+class HangingPageDriver:
+    """
+    A browser session whose navigation to one page times out; every other page loads at once without overflow.
+    """
+
+    def __init__(self, hanging_url):
+        self.hanging_url = hanging_url
+        self.url = None
+
+    def get(self, url):
+        if url == self.hanging_url:
+            raise TimeoutException("page load timed out")
+        self.url = url
+
+    def execute_script(self, script, *args):
+        if script == PAGE_STATE_SCRIPT:
+            return [self.url, "complete"]
+        if script == NETWORK_STATE_SCRIPT:
+            return [1, 1000.0]
+        return 0
+
+
+class HangingPagePool:
+    def __init__(self, hanging_url, size=2):
+        self.hanging_url = hanging_url
+        self.size = size
+
+    @contextmanager
+    def lease(self, label=None):
+        yield DriverLease(HangingPageDriver(self.hanging_url), label, 0.0, False)
+
+
+class SiteCrawlerTest(unittest.TestCase):
+    """
+    Crawls a generated static site of a few thousand pages with the HTTP tier checks, fully offline.
+    """
+
+    def setUp(self):
+        self.server = FixtureServer().start()
+        self.server.routes.update(generated_site(self.server.base_url))
+        self.checks = [SelectorPresenceCheck([HEADER_SELECTOR, FOOTER_TAG]), LangCheck(["en"])]
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_crawl_whole_site(self):
+        crawler = SiteCrawler(self.server.url("/"), self.checks, workers=16)
+        state = crawler.run()
+        print(crawler.report())
+
+        self.assertEqual(len(state.results), PAGE_COUNT)
+        page_requests = [path for method, path in self.server.requests if path != "/sitemap.xml"]
+        self.assertEqual(len(page_requests), PAGE_COUNT, "A page was fetched more than once")
+        missing_footer = {url for url, outcome in state.results.items() if outcome["header_footer"]}
+        self.assertEqual(missing_footer, {self.server.url(f"/docs/{number}") for number in NO_FOOTER_PAGES})
+        wrong_lang = [url for url, outcome in state.results.items() if outcome["html_lang"]]
+        self.assertEqual(wrong_lang, [self.server.url("/docs/99")])
+
+    def test_resume_from_saved_state(self):
+        with tempfile.TemporaryDirectory() as state_dir:
+            state_path = os.path.join(state_dir, "crawl.json")
+            first = SiteCrawler(self.server.url("/"), self.checks, workers=8, max_pages=500, state_path=state_path)
+            first.run()
+            self.assertEqual(len(first.state.results), 500)
+
+            second = SiteCrawler(self.server.url("/"), self.checks, workers=8, state_path=state_path)
+            second.run()
+            self.assertEqual(len(second.state.results), PAGE_COUNT)
+            self.assertEqual(second.pages_this_run, PAGE_COUNT - 500)
+
+    def test_frontier_limit(self):
+        crawler = SiteCrawler(self.server.url("/"), self.checks, workers=4, frontier_limit=20)
+        crawler.run()
+        self.assertGreater(crawler.state.dropped, 0)
+        self.assertLess(len(crawler.state.results), PAGE_COUNT)
+
+    def test_broken_pages_are_recorded_and_the_crawl_goes_on(self):
+        self.server.routes[f"/docs/{CORRUPT_PAGE}"].headers["Content-Encoding"] = "deflate"
+        hanging_url = self.server.url(f"/docs/{HANGING_PAGE}")
+        crawler = SiteCrawler(self.server.url("/"), self.checks + [OverflowCheck(50)], workers=4, max_pages=20,
+                              driver_pool=HangingPagePool(hanging_url))
+        with mock.patch.object(page_wait_module, "WAIT_TIMINGS", []):
+            results = crawler.run().results
+
+        self.assertEqual(len(results), 20)
+        self.assertIn("while decompressing data", results[self.server.url(f"/docs/{CORRUPT_PAGE}")]["fetch"])
+        self.assertIn("TimeoutException", results[hanging_url][BROWSER_TIER])
+        self.assertEqual(results[hanging_url]["html_lang"], None, "The HTTP tier checks still ran")
+        failed = [url for url, outcome in results.items() if outcome.get("fetch") or outcome.get(BROWSER_TIER)]
+        self.assertEqual(sorted(failed), sorted([self.server.url(f"/docs/{CORRUPT_PAGE}"), hanging_url]))
+        self.assertIn("browser: 1 pages failed", crawler.report())
+
+    def test_blank_sitemap_entries_are_skipped(self):
+        entries = "<url><loc></loc></url><url><loc>  </loc></url><url><loc /></url>"
+        entries += f"<url><loc>{self.server.url('/docs/1')}</loc></url>"
+        self.server.add("/sitemap.xml", FixtureResponse(SITEMAP_TEMPLATE.format(entries=entries),
+                                                        content_type="application/xml"))
+        state = SiteCrawler(self.server.url("/"), self.checks, workers=16).run()
+        self.assertEqual(len(state.results), PAGE_COUNT)
+
+    def test_broken_sitemap_does_not_stop_the_crawl(self):
+        self.server.routes["/sitemap.xml"].headers["Content-Encoding"] = "deflate"
+        state = SiteCrawler(self.server.url("/"), self.checks, workers=16).run()
+        self.assertEqual(len(state.results), PAGE_COUNT, "The pages are still reached from the start page")
+
+    def test_page_check_must_implement_run(self):
+        class UnfinishedCheck(PageCheck):
+            name = "unfinished"
+
+        with self.assertRaises(TypeError):
+            UnfinishedCheck()
+
+    def test_normalize_url(self):
+        self.assertEqual(normalize_url("/docs/1#top", "http://Example.com:80/"), "http://example.com/docs/1")
+        self.assertEqual(normalize_url("https://example.com"), "https://example.com/")
+        self.assertIsNone(normalize_url("mailto:someone@example.com"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import re
+import tempfile
+import unittest
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+from Infrastructure.HttpClient import AsyncHttpClient
+from Infrastructure.SiteConfig import site_url
+from Infrastructure.SnapshotServer import RECORD, REPLAY, SnapshotServer
+from Infrastructure.SnapshotStore import SnapshotStore
+
+#====== RECORDED SITE ======
+SHARED_SCRIPT = "console.log('react');"
+HOME_PAGE = """<html lang="{code}"><head><title>React</title><script src="/_next/app.js"></script></head>
+<body><a href="https://fr.react.dev/learn">Français</a><a href="https://github.com/reactjs">GitHub</a></body></html>"""
+DOCSEARCH_PATH = "/1/indexes/*/queries"
+DOCSEARCH_APP = "1fcf9ac6bt"
+PARALLEL_REQUESTS = 300
+LOCAL_PORT = re.compile(r"\.localhost:\d+")
+
+
+def docsearch_route(request):
+    query = json.loads(request.body)["requests"][0]["params"]
+    return FixtureResponse(json.dumps({"results": [{"hits": [{"title": query}]}]}), content_type="application/json",
+                           headers={"Access-Control-Allow-Origin": "*"})
+
+
+def docsearch_body(query, reverse=False):
+    fields = [("indexName", "beta-react"), ("params", query)]
+    return json.dumps({"requests": [dict(reversed(fields) if reverse else fields)]}).encode("utf-8")
+
+
+class SnapshotServerTest(unittest.TestCase):
+    """
+    Records a local stand-in for react.dev, fr.react.dev and DocSearch, then replays it with the upstreams gone.
+    """
+
+    def setUp(self):
+        self.store_dir = tempfile.TemporaryDirectory()
+        self.upstreams = {}
+        for host, code in (("react.dev", "en"), ("fr.react.dev", "fr")):
+            self.upstreams[host] = FixtureServer({
+                "/": FixtureResponse(HOME_PAGE.format(code=code)),
+                "/_next/app.js": FixtureResponse(SHARED_SCRIPT, content_type="application/javascript"),
+            }).start()
+        self.upstreams[f"{DOCSEARCH_APP}-dsn.algolia.net"] = FixtureServer({DOCSEARCH_PATH: docsearch_route}).start()
+
+    def tearDown(self):
+        for upstream in self.upstreams.values():
+            upstream.stop()
+        self.store_dir.cleanup()
+
+    def record(self, requests):
+        upstreams = {host: server.base_url for host, server in self.upstreams.items()}
+        with SnapshotServer(self.store_dir.name, RECORD, upstreams=upstreams) as server:
+            responses = asyncio.run(self.fetch(server, requests))
+        return responses
+
+    def replay(self, requests, connections_per_host=8):
+        for upstream in self.upstreams.values():
+            upstream.stop()
+        self.upstreams = {}
+        with SnapshotServer(self.store_dir.name, REPLAY) as server:
+            responses = asyncio.run(self.fetch(server, requests, connections_per_host))
+            return responses, server
+
+    async def fetch(self, server, requests, connections_per_host=8):
+        async with AsyncHttpClient(connections_per_host) as client:
+            return await asyncio.gather(*(
+                client.request(method, site_url(url, server.base_url), body=body) for method, url, body in requests))
+
+    def test_replay_without_upstream(self):
+        requests = [("GET", "https://react.dev/", None), ("GET", "https://fr.react.dev/", None),
+                    ("GET", "https://react.dev/_next/app.js", None)]
+        recorded = self.record(requests)
+        replayed, server = self.replay(requests)
+
+        self.assertEqual([response.status for response in replayed], [200, 200, 200])
+        self.assertEqual([LOCAL_PORT.sub(".localhost", response.text) for response in replayed],
+                         [LOCAL_PORT.sub(".localhost", response.text) for response in recorded])
+        self.assertIn(f'href="http://fr.react.dev.localhost:{server.port}/learn"', replayed[0].text)
+        self.assertIn('href="https://github.com/reactjs"', replayed[0].text, "Only recorded hosts are rewritten")
+        self.assertEqual(server.misses, [])
+
+    def test_unknown_request_is_a_miss(self):
+        self.record([("GET", "https://react.dev/", None)])
+        replayed, server = self.replay([("GET", "https://react.dev/missing", None)])
+        self.assertEqual(replayed[0].status, 404)
+        self.assertEqual(len(server.misses), 1)
+
+    def test_assets_shared_across_locales_are_stored_once(self):
+        self.record([("GET", "https://react.dev/_next/app.js", None), ("GET", "https://fr.react.dev/_next/app.js", None)])
+        store = SnapshotStore(self.store_dir.name)
+        self.assertEqual(len(store.index), 2)
+        self.assertEqual(len({response.blob for response in store.index.values()}), 1)
+
+    def test_docsearch_replays_deterministically(self):
+        recorded_url = f"https://{DOCSEARCH_APP}-dsn.algolia.net{DOCSEARCH_PATH}?x-algolia-agent=a&x-algolia-api-key=k"
+        self.record([("POST", recorded_url, docsearch_body("custom hook"))])
+
+        # Other client agent, other fallback host, same query with its JSON keys in another order.
+        replayed_url = f"https://{DOCSEARCH_APP}-1.algolianet.com{DOCSEARCH_PATH}?x-algolia-api-key=k&x-algolia-agent=b"
+        replayed, server = self.replay([("POST", replayed_url, docsearch_body("custom hook", reverse=True))] * 3)
+        self.assertEqual({response.status for response in replayed}, {200})
+        self.assertEqual(json.loads(replayed[0].body)["results"][0]["hits"][0]["title"], "custom hook")
+        self.assertEqual(len({response.body for response in replayed}), 1)
+
+    def test_many_parallel_clients(self):
+        requests = [("GET", "https://react.dev/", None), ("GET", "https://react.dev/_next/app.js", None)]
+        self.record(requests)
+        responses, server = self.replay(requests * (PARALLEL_REQUESTS // 2), connections_per_host=64)
+        self.assertEqual(len(responses), PARALLEL_REQUESTS)
+        self.assertEqual({response.status for response in responses}, {200})
+        self.assertEqual(server.hits, PARALLEL_REQUESTS)
+
+    def test_site_url(self):
+        self.assertEqual(site_url("https://fr.react.dev/learn", "http://localhost:8765"),
+                         "http://fr.react.dev.localhost:8765/learn")
+        self.assertEqual(site_url("https://react.dev/", ""), "https://react.dev/")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import time
+import unittest
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+from Infrastructure.HtmlScan import Selector, scan_html
+from Infrastructure.StaticPrecheck import BROWSER_TIER, HTTP_TIER, StaticPrecheck, StructureCheck
+
+#====== FIXTURE PAGES ======
+HOME_PAGE = """<!DOCTYPE html><html lang="en"><head><title>React</title></head><body>
+<nav class="sticky z-40"><ul><li><a href="/learn">Learn</a><li><a href="/reference">Reference</a></ul></nav>
+<main><p>Intro<p>More<footer class="site"><a href="/blog">Blog</a></footer></main>
+<script>var list = document.createElement('ul'); list.className = 'rendered';
+document.body.appendChild(list);</script></body></html>"""
+PAGE_COUNT = 20
+CHECKS_PER_PAGE = 50
+
+
+class SelectorTest(unittest.TestCase):
+
+    def test_combinators(self):
+        counts = scan_html(HOME_PAGE, ["nav.z-40", "nav li > a", "body > nav", "main > footer", "main footer a",
+                                       "nav a, footer a", "body > a", "p footer", "ul.rendered"]).counts
+        self.assertEqual(counts, {"nav.z-40": 1, "nav li > a": 2, "body > nav": 1, "main > footer": 1,
+                                  "main footer a": 1, "nav a, footer a": 3, "body > a": 0, "p footer": 0,
+                                  "ul.rendered": 0})
+
+    def test_selectors_that_need_a_rendered_dom(self):
+        for text in ("a:hover", "li + li", "h1 ~ p", "> a", "nav >", "a,,b"):
+            with self.subTest(selector=text):
+                with self.assertRaises(ValueError):
+                    Selector(text)
+        self.assertEqual(scan_html('<a title="x > y" href="/">a</a>', ['a[title="x > y"]']).counts,
+                         {'a[title="x > y"]': 1})
+
+
+class StaticPrecheckHttpTest(unittest.TestCase):
+    """
+    Tier one settles everything that is in the server rendered HTML, without a browser.
+    """
+
+    def setUp(self):
+        routes = {f"/page-{index}": FixtureResponse(HOME_PAGE) for index in range(PAGE_COUNT)}
+        self.server = FixtureServer(routes).start()
+        self.precheck = StaticPrecheck()
+        self.browsers = []
+
+    def tearDown(self):
+        self.server.stop()
+
+    def browser(self):
+        self.browsers.append(1)
+        raise AssertionError("The browser was started")
+
+    def test_structure_in_raw_html(self):
+        url = self.server.url("/page-0")
+        for selector in ("nav.z-40", "footer", "main > footer a"):
+            result = self.precheck.check(url, selector, browser=self.browser)
+            self.assertTrue(result.passed, result.describe())
+            self.assertEqual(result.tier, HTTP_TIER)
+        self.assertEqual(self.browsers, [])
+        self.assertEqual(self.server.requests.count(("GET", "/page-0")), 1, "The page is fetched once")
+
+    def test_undecided_checks_without_browser(self):
+        results = self.precheck.run([StructureCheck(self.server.url("/page-0"), "ul.rendered"),
+                                     StructureCheck(self.server.url("/page-0"), "a:hover"),
+                                     StructureCheck(self.server.url("/missing"), "nav.z-40")])
+        self.assertEqual([(result.tier, result.passed) for result in results], [(HTTP_TIER, False)] * 3)
+        self.assertEqual([result.reason for result in results],
+                         ["not in the server rendered HTML, no browser to confirm",
+                          "selector needs a rendered DOM, no browser to confirm", "status 404"])
+        self.assertIn("http: 3 checks, 3 failed", self.precheck.report())
+
+    def test_thousands_of_checks(self):
+        selectors = ["nav.z-40", "footer", "nav li > a", "main footer a", "body > nav"]
+        checks = [StructureCheck(self.server.url(f"/page-{index % PAGE_COUNT}"), selectors[index % len(selectors)])
+                  for index in range(PAGE_COUNT * CHECKS_PER_PAGE)]
+        start = time.perf_counter()
+        results = self.precheck.run(checks, browser=self.browser)
+        elapsed = time.perf_counter() - start
+
+        self.assertTrue(all(result.passed and result.tier == HTTP_TIER for result in results))
+        self.assertEqual(len(self.server.requests), PAGE_COUNT)
+        self.assertLess(elapsed, 5, f"{len(checks)} checks took {elapsed:.2f}s")
+
+
+class StaticPrecheckBrowserTest(unittest.TestCase):
+    """
+    Only the checks that need JS rendering go to the browser, and the browser is leased only for them.
+    """
+
+    def setUp(self):
+        self.server = FixtureServer({"/": FixtureResponse(HOME_PAGE)}).start()
+        self.leases = []
+
+    def tearDown(self):
+        self.server.stop()
+
+    def browser(self):
+        self.leases.append(get_driver_pool().acquire(self.id()))
+        self.addCleanup(get_driver_pool().release, self.leases[-1])
+        return self.leases[-1].driver
+
+    def test_js_rendered_selectors_use_the_browser(self):
+        url = self.server.url("/")
+        precheck = StaticPrecheck(browser_timeout=2)
+        results = precheck.run([StructureCheck(url, "nav.z-40"), StructureCheck(url, "ul.rendered"),
+                                StructureCheck(url, "li + li"), StructureCheck(url, "section.absent")],
+                               browser=self.browser)
+        self.assertEqual([(result.tier, result.count) for result in results],
+                         [(HTTP_TIER, 1), (BROWSER_TIER, 1), (BROWSER_TIER, 1), (BROWSER_TIER, 0)])
+        self.assertEqual(len(self.leases), 1)
+        self.assertIn("browser: 3 checks, 1 failed", precheck.report())
+
+
+if __name__ == "__main__":
+    unittest.main()
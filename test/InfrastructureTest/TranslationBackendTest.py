@@ -0,0 +1,143 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from FunctionalTest.LanguageSwitcherSearch import LANGUAGE_CODES
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+from Infrastructure.ParagraphAlignment import MISSING, OK, UNTRANSLATED, Paragraph
+from Infrastructure.TranslationBackend import LocalBackend, TranslationCache, Translator, compare_locales, \
+    fetch_paragraphs, lexical_embed
+
+#====== FIXTURE CONTENT ======
+ENGLISH = ["React lets you build user interfaces out of individual pieces called components.",
+           "Create your own React components like Thumbnail, LikeButton, and Video.",
+           "Then combine them into entire screens, pages, and apps.",
+           "Whether you work on your own or with thousands of other developers, using React feels the same.",
+           "React components are JavaScript functions.",
+           "Add interactivity wherever you need it."]
+UNRELATED = "The weather in Paris is sunny with a light breeze from the west today."
+BACKEND_LATENCY = 0.1
+
+
+def paragraphs(texts):
+    return [Paragraph(index, f"main > p:nth-of-type({index + 1})", text) for index, text in enumerate(texts)]
+
+
+def page(texts):
+    body = "".join(f"<p>{text}</p>" for text in texts)
+    return f"<!DOCTYPE html><html lang='en'><head><title>React</title></head><body><main>{body}</main></body></html>"
+
+
+class CountingBackend(LocalBackend):
+    """
+    Local stand-in that records the texts it was asked for and the highest number of calls in flight.
+    """
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.texts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def translate_batch(self, texts, source, target):
+        with self._lock:
+            self.texts.extend(texts)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return super().translate_batch(texts, source, target)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class TranslationBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.cache_dir.name, "translations.sqlite")
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_local_backend_round_trip(self):
+        backend = LocalBackend()
+        french = backend.translate_batch(ENGLISH[:2], "en", "fr")
+        self.assertTrue(all(text.startswith("[fr] ") for text in french))
+        self.assertNotEqual(french, backend.translate_batch(ENGLISH[:2], "en", "ja"))
+        self.assertEqual(backend.translate_batch(french, "fr", "en"), ENGLISH[:2])
+        self.assertEqual(backend.translate_batch([UNRELATED], "fr", "en"), [UNRELATED])
+
+    def test_translations_are_cached_across_runs(self):
+        backend = CountingBackend()
+        translator = Translator(backend, TranslationCache(self.cache_file), batch_size=2)
+        french = LocalBackend().translate_batch(ENGLISH, "en", "fr")
+        self.assertEqual(translator.translate(french + french[:1], "fr"), ENGLISH + ENGLISH[:1])
+        self.assertEqual(len(backend.texts), len(ENGLISH), "Duplicates are translated once")
+        self.assertEqual(translator.stats["batches"], 3)
+        translator.close()
+
+        backend = CountingBackend()
+        translator = Translator(backend, TranslationCache(self.cache_file))
+        self.assertEqual(translator.translate(french, "fr"), ENGLISH)
+        self.assertEqual(backend.texts, [])
+        self.assertEqual(translator.stats["cache_hits"], len(ENGLISH))
+        self.assertEqual(translator.translate(ENGLISH, "en"), ENGLISH, "Same language is not translated")
+        translator.close()
+
+    def test_concurrency_is_bounded(self):
+        backend = CountingBackend(BACKEND_LATENCY)
+        translator = Translator(backend, batch_size=1, concurrency=2)
+        threads = [threading.Thread(target=translator.translate, args=([f"text {index}", f"more {index}"], "fr"))
+                   for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(backend.max_in_flight, 2)
+        self.assertEqual(translator.stats["translated"], 8)
+        translator.close()
+
+    def test_lexical_embed(self):
+        vectors = lexical_embed([ENGLISH[0], ENGLISH[0].upper(), UNRELATED, ""])
+        self.assertAlmostEqual(float(vectors[0] @ vectors[1]), 1.0)
+        self.assertLess(float(vectors[0] @ vectors[2]), 0.2)
+        self.assertEqual(float(vectors[3] @ vectors[3]), 0.0)
+
+    def test_compare_every_locale_offline(self):
+        stand_in = LocalBackend()
+        pages = {code: paragraphs(stand_in.translate_batch(ENGLISH, "en", code))
+                 for code in LANGUAGE_CODES if code != "en"}
+        pages["fr"][1].text = ENGLISH[1]
+        pages["fr"][3].text = stand_in.translate_batch([UNRELATED], "en", "fr")[0]
+
+        backend = CountingBackend(BACKEND_LATENCY)
+        translator = Translator(backend, TranslationCache(self.cache_file), batch_size=len(ENGLISH))
+        start = time.perf_counter()
+        reports = compare_locales(paragraphs(ENGLISH), pages, translator)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(sorted(reports), sorted(code for code in LANGUAGE_CODES if code != "en"))
+        self.assertLess(elapsed, BACKEND_LATENCY * len(pages), "The locales are translated in parallel")
+        for code, report in reports.items():
+            if code != "fr":
+                self.assertEqual({match.status for match in report.matches}, {OK}, report.summary())
+                self.assertAlmostEqual(report.mean_score, 1.0)
+        french = [match.status for match in reports["fr"].matches]
+        self.assertEqual((french[1], french[3]), (UNTRANSLATED, MISSING), reports["fr"].summary())
+
+        calls = backend.calls
+        compare_locales(paragraphs(ENGLISH), pages, translator)
+        self.assertEqual(backend.calls, calls, "A second comparison is served from the cache")
+        translator.close()
+
+    def test_fetch_paragraphs(self):
+        with FixtureServer({"/": FixtureResponse(page(ENGLISH)), "/fr": FixtureResponse(page(ENGLISH[:2]))}) as server:
+            pages = fetch_paragraphs({"en": server.url("/"), "fr": server.url("/fr")})
+        self.assertEqual([paragraph.text for paragraph in pages["en"]], ENGLISH)
+        self.assertEqual(len(pages["fr"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,201 @@
+import asyncio
+import gc
+import os
+import socketserver
+import tempfile
+import threading
+import time
+import unittest
+import warnings
+from FunctionalTest.LanguageSwitcherSearch import LANGUAGE_CODES
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+from Infrastructure.HttpClient import AsyncHttpClient
+from Infrastructure.MemoryMonitor import MemoryMonitor
+from Infrastructure.PageWait import PageWait
+from Infrastructure.PerfMetrics import FAIL, TRANSLATION, TRANSLATION_HTTP, MetricsStore, PerfRecorder
+from Infrastructure.TranslationLinkChecker import BROWSER_TIER, HTTP_TIER, TranslationLinkChecker
+
+#====== FIXTURE PAGES ======
+PAGE_DELAY = 0.2
+LOCALE_PAGE = """<!DOCTYPE html><html lang='{code}'><head><title>React ({code})</title></head>
+<body><p>{code}</p></body></html>"""
+WRONG_LANG_PAGE = "<html lang='de'><head><title>React</title></head><body></body></html>"
+JS_LANG_PAGE = """<html><head><title>React</title></head><body>
+<script>document.documentElement.setAttribute('lang', 'ja');</script></body></html>"""
+TRUNCATED_RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Length: 1000\r\n\r\n<html lang='fr'><head>"
+
+
+def locale_routes():
+    """
+    One page per LANGUAGE_CODES locale plus a wrong language page and a page whose lang is set by JS.
+    """
+    routes = {f"/{code}/": FixtureResponse(LOCALE_PAGE.format(code=code), delay=PAGE_DELAY)
+              for code in LANGUAGE_CODES.values()}
+    routes["/wrong-lang/"] = FixtureResponse(WRONG_LANG_PAGE)
+    routes["/js-lang/"] = FixtureResponse(JS_LANG_PAGE)
+    return routes
+
+
+class TruncatingHandler(socketserver.StreamRequestHandler):
+    """
+    Announces a longer body than it sends, then closes the connection.
+    """
+
+    def handle(self):
+        while self.rfile.readline() not in (b"\r\n", b""):
+            pass
+        self.wfile.write(TRUNCATED_RESPONSE)
+
+
+class SilentHandler(socketserver.StreamRequestHandler):
+    """
+    Reads the request and never answers; `closed` is set once the client closed the connection.
+    """
+
+    closed = None
+
+    def handle(self):
+        while self.rfile.readline() not in (b"\r\n", b""):
+            pass
+        self.rfile.read()
+        self.closed.set()
+
+
+class TranslationLinkCheckerHttpTest(unittest.TestCase):
+    """
+    Tier one (HTTP) of the translation link checker, against a local stand-in for the translated sites.
+    """
+
+    def setUp(self):
+        self.server = FixtureServer(locale_routes()).start()
+        self.checker = TranslationLinkChecker(LANGUAGE_CODES)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_all_locales_fetched_concurrently(self):
+        """
+        Every locale page is delayed, so a serial check would take len(locales) * PAGE_DELAY.
+        """
+        links = [(code, self.server.url(f"/{code}/")) for code in LANGUAGE_CODES.values()]
+        start = time.perf_counter()
+        results = self.checker.check(links)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual([result.error for result in results], [None] * len(links))
+        self.assertEqual([result.lang for result in results], list(LANGUAGE_CODES.values()))
+        self.assertTrue(all(result.tier == HTTP_TIER and result.seconds >= PAGE_DELAY for result in results))
+        self.assertLess(elapsed, len(links) * PAGE_DELAY / 2, "Links were not checked concurrently")
+
+    def test_connections_are_reused(self):
+        links = [("German", self.server.url("/wrong-lang/"))] * 20
+        checker = TranslationLinkChecker(LANGUAGE_CODES, connections_per_host=2)
+        results = checker.check(links)
+        self.assertEqual(len(results), len(links))
+        self.assertLessEqual(self.server.connections, 2)
+
+    def test_errors(self):
+        links = [("Missing", self.server.url("/missing/")), ("German", self.server.url("/wrong-lang/"))]
+        errors = [result.error for result in self.checker.check(links)]
+        self.assertEqual(errors, ["Missing (404 page!)", "German (de)"])
+
+    def test_broken_responses_need_browser(self):
+        self.server.add("/bad-deflate/", FixtureResponse(LOCALE_PAGE, headers={"Content-Encoding": "deflate"}))
+        truncating = socketserver.ThreadingTCPServer(("127.0.0.1", 0), TruncatingHandler)
+        threading.Thread(target=truncating.serve_forever, daemon=True).start()
+        self.addCleanup(truncating.server_close)
+        self.addCleanup(truncating.shutdown)
+
+        links = [("French", f"http://127.0.0.1:{truncating.server_address[1]}/fr/"),
+                 ("Japanese", self.server.url("/bad-deflate/"))]
+        results = self.checker.check(links)
+        self.assertEqual([(result.tier, result.needs_browser) for result in results], [(HTTP_TIER, True)] * 2)
+
+    def test_fetch_time_is_recorded(self):
+        links = [(code, self.server.url(f"/{code}/")) for code in ("fr", "ja", "ko")]
+        links.append(("Japanese", self.server.url("/js-lang/")))
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            budgets = {TRANSLATION_HTTP: {"fetch_ms": (PAGE_DELAY * 1000 / 2, None)}}
+            recorder = PerfRecorder(MetricsStore(os.path.join(metrics_dir, "metrics.jsonl")), budgets, FAIL)
+            results = TranslationLinkChecker(LANGUAGE_CODES, perf_recorder=recorder).check(links)
+            stored = recorder.store.history(TRANSLATION_HTTP)
+        self.assertEqual(sorted(sample.url for sample in stored), sorted(href for _, href in links[:3]),
+                         "Only the pages settled over HTTP are recorded")
+        self.assertTrue(all(sample.values["fetch_ms"] >= PAGE_DELAY * 1000 for sample in stored))
+        # The budget is checked from the third sample on, so only the link that finished last is over it.
+        errors = [result.error for result in results[:3] if result.error]
+        self.assertEqual(len(errors), 1, errors)
+        self.assertIn("over performance budget: fetch_ms p50", errors[0])
+
+    def test_timed_out_connection_is_closed(self):
+        silent = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SilentHandler)
+        silent.daemon_threads = True
+        closed = SilentHandler.closed = threading.Event()
+        threading.Thread(target=silent.serve_forever, daemon=True).start()
+        self.addCleanup(silent.server_close)
+        self.addCleanup(silent.shutdown)
+
+        async def fetch():
+            async with AsyncHttpClient(timeout=0.2) as client:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await client.get(f"http://127.0.0.1:{silent.server_address[1]}/fr/")
+                # A leaked transport is only closed (with a ResourceWarning) when it is garbage collected.
+                gc.collect()
+                self.assertTrue(await asyncio.to_thread(closed.wait, 5), "The timed out connection was not closed")
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", ResourceWarning)
+            asyncio.run(fetch())
+        self.assertEqual([str(warning.message) for warning in caught if warning.category is ResourceWarning], [])
+
+    def test_js_rendered_lang_needs_browser(self):
+        result = self.checker.check([("Japanese", self.server.url("/js-lang/"))])[0]
+        self.assertTrue(result.needs_browser)
+        self.assertEqual(result.tier, HTTP_TIER)
+
+
+class TranslationLinkCheckerBrowserTest(unittest.TestCase):
+    """
+    Tier two (browser tabs) is used only for the pages whose lang is rendered by JS.
+    """
+
+    def setUp(self):
+        self.server = FixtureServer(locale_routes()).start()
+        self.lease = get_driver_pool().acquire(self.id())
+        self.addCleanup(get_driver_pool().release, self.lease)
+        self.driver = self.lease.driver
+        self.driver.get(self.server.url("/en/"))
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_only_js_pages_go_to_the_browser(self):
+        links = [("French", self.server.url("/fr/")), ("Japanese", self.server.url("/js-lang/"))]
+        results = TranslationLinkChecker(LANGUAGE_CODES).check(links, self.driver, PageWait(self.driver))
+        self.assertEqual([result.tier for result in results], [HTTP_TIER, BROWSER_TIER])
+        self.assertEqual([result.error for result in results], [None, None])
+        self.assertEqual(len(self.driver.window_handles), 1)
+
+    def test_translation_pages_are_recorded(self):
+        links = [("Japanese", self.server.url("/js-lang/")), ("French", self.server.url("/fr/"))]
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            recorder = PerfRecorder(MetricsStore(os.path.join(metrics_dir, "metrics.jsonl")), mode=FAIL)
+            results = TranslationLinkChecker(LANGUAGE_CODES, perf_recorder=recorder).check(links, self.driver)
+            stored = recorder.store.history(TRANSLATION)
+        self.assertEqual([result.error for result in results], [None, None])
+        self.assertEqual([(sample.page, sample.url) for sample in recorder.samples],
+                         [(TRANSLATION_HTTP, links[1][1]), (TRANSLATION, links[0][1])])
+        self.assertEqual(len(stored), 1)
+        self.assertIsNotNone(recorder.samples[0].values["ttfb"])
+
+    def test_memory_is_sampled_in_every_tab(self):
+        links = [("Japanese", self.server.url("/js-lang/")), ("French", self.server.url("/fr/"))]
+        monitor = MemoryMonitor()
+        TranslationLinkChecker(LANGUAGE_CODES, max_tabs=1, memory_monitor=monitor).check_in_browser(self.driver, links)
+        self.assertEqual([sample.step for sample in monitor.samples], ["translation Japanese", "translation French"])
+        self.assertTrue(all(sample.windows == 2 for sample in monitor.samples), "Sampled while the tab is open")
+
+
+if __name__ == "__main__":
+    unittest.main()
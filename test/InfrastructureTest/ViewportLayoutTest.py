@@ -0,0 +1,91 @@
+import time
+import unittest
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.FixtureServer import FixtureResponse, FixtureServer
+from Infrastructure.ViewportLayout import LayoutEngine, LayoutSnapshot, Viewport, width_sweep
+
+#====== RESPONSIVE FIXTURE ======
+NARROW_BREAKPOINT = 600
+RESPONSIVE_PAGE = """<!DOCTYPE html><html lang="en"><head><title>Responsive</title><style>
+body { margin: 0; }
+nav { height: 60px; background: #23272f; }
+.banner { width: 640px; height: 40px; }
+.clipped { overflow-x: hidden; }
+.clipped div { width: 3000px; height: 10px; }
+@media (min-width: %dpx) { .banner { width: 100%%; } }
+</style></head><body>
+<nav class="z-40">React</nav>
+<main><div class="banner">banner</div><div class="clipped"><div></div></div></main>
+<footer>footer</footer>
+</body></html>""" % NARROW_BREAKPOINT
+ELEMENTS = {"header": "nav.z-40", "footer": "footer", "missing": "#missing"}
+SWEEP_SECONDS = 30
+
+
+def raw_layout(scroll_width, client_width, offenders=()):
+    return {"innerWidth": client_width, "scrollWidth": scroll_width, "clientWidth": client_width, "boxes": {},
+            "offenders": list(offenders), "quiet": True, "settleMs": 150.0}
+
+
+class ViewportLayoutTest(unittest.TestCase):
+
+    def test_width_sweep(self):
+        viewports = width_sweep(320, 1920, 54)
+        self.assertEqual(len(viewports), 54)
+        self.assertEqual((viewports[0].width, viewports[-1].width), (320, 1920))
+        self.assertEqual(viewports[0].name, "320px")
+        self.assertEqual(len(width_sweep(320, 330, 54)), 11, "Duplicate widths are dropped")
+
+    def test_snapshot_describes_offenders(self):
+        offender = {"path": "html > body > main > div", "left": 0, "right": 640}
+        snapshot = LayoutSnapshot(Viewport("mobile", 375, 667), raw_layout(640, 375, [offender]))
+        self.assertEqual(snapshot.overflow, 265)
+        self.assertEqual(snapshot.describe(), "mobile: scrollWidth 640 vs clientWidth 375, "
+                                              "overflowing: html > body > main > div (right 640px)")
+
+    def test_device_metrics(self):
+        viewport = Viewport.from_breakpoint({"name": "laptop", "width": 1200, "height": 800})
+        self.assertEqual(viewport.device_metrics(),
+                         {"width": 1200, "height": 800, "deviceScaleFactor": 1, "mobile": False})
+
+
+class ViewportLayoutBrowserTest(unittest.TestCase):
+    """
+    Sweeps a responsive fixture page that overflows below its breakpoint.
+    """
+
+    def setUp(self):
+        self.server = FixtureServer({"/": FixtureResponse(RESPONSIVE_PAGE)}).start()
+        self.lease = get_driver_pool().acquire(self.id())
+        self.addCleanup(get_driver_pool().release, self.lease)
+        self.driver = self.lease.driver
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_sweep(self):
+        handles = self.driver.window_handles
+        started = time.perf_counter()
+        snapshots = LayoutEngine(self.driver, ELEMENTS, capture=True).measure(self.server.url("/"), width_sweep())
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(self.driver.window_handles, handles, "The tabs are closed afterwards")
+        self.assertEqual([snapshot.viewport.name for snapshot in snapshots], [v.name for v in width_sweep()])
+        self.assertLess(elapsed, SWEEP_SECONDS)
+        for snapshot in snapshots:
+            width = snapshot.viewport.width
+            self.assertEqual(snapshot.inner_width, width)
+            self.assertEqual(snapshot.boxes["header"]["width"], width)
+            self.assertGreater(snapshot.boxes["footer"]["y"], snapshot.boxes["header"]["y"])
+            self.assertIsNone(snapshot.boxes["missing"])
+            self.assertTrue(snapshot.png.startswith(b"\x89PNG"))
+            if width < NARROW_BREAKPOINT:
+                self.assertGreater(snapshot.overflow, 0)
+                self.assertEqual([offender["path"] for offender in snapshot.offenders],
+                                 ["html > body > main > div"], "Only the outermost unclipped offender")
+            else:
+                self.assertEqual((snapshot.overflow, snapshot.offenders), (0, []), snapshot.describe())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import io
+import os
+import tempfile
+import time
+import unittest
+import numpy as np
+from PIL import Image
+from Infrastructure.VisualDiff import CHANGED, IDENTICAL, NEW, SIMILAR, UPDATED, VisualBaselineStore, \
+    hash_distance, perceptual_hash, tile_diff
+
+#====== SYNTHETIC PAGES ======
+WIDTH = 375
+HEIGHT = 667
+IDENTICAL_CHECKS = 1000
+IDENTICAL_CHECKS_SECONDS = 2.0
+
+
+def page(seed=0):
+    """
+    A page-like image: a header bar, text-like stripes and a footer.
+    """
+    pixels = np.full((HEIGHT, WIDTH, 3), 255, dtype=np.uint8)
+    pixels[:60] = (35, 39, 47)
+    random = np.random.default_rng(seed)
+    for top in range(100, 560, 24):
+        pixels[top:top + 10, 20:20 + int(random.integers(150, 330))] = 80
+    pixels[600:] = (246, 247, 249)
+    return pixels
+
+
+def png(pixels):
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def noisy(pixels, amount=3):
+    noise = np.random.default_rng(1).integers(-amount, amount + 1, pixels.shape)
+    return np.clip(pixels.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def with_block(pixels):
+    changed = pixels.copy()
+    changed[200:420, 40:330] = (97, 218, 251)
+    return changed
+
+
+class VisualDiffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store_dir = tempfile.TemporaryDirectory()
+        self.store = VisualBaselineStore(self.store_dir.name)
+
+    def tearDown(self):
+        self.store_dir.cleanup()
+
+    def test_perceptual_hash(self):
+        baseline = perceptual_hash(page())
+        self.assertLessEqual(hash_distance(baseline, perceptual_hash(noisy(page()))), 2)
+        self.assertGreater(hash_distance(baseline, perceptual_hash(with_block(page()))), 6)
+
+    def test_tile_diff(self):
+        self.assertEqual(tile_diff(page(), noisy(page())), [])
+        tiles = tile_diff(page(), with_block(page()))
+        self.assertIn((64, 256), [(x, y) for x, y, _ in tiles])
+        self.assertTrue(all(40 - 64 < x < 330 and 200 - 64 < y < 420 for x, y, _ in tiles))
+
+    def test_funnel(self):
+        self.assertEqual(self.store.check("home/mobile", png(page())).status, NEW)
+        self.assertEqual(self.store.check("home/mobile", png(page())).status, IDENTICAL)
+        self.assertEqual(self.store.check("home/mobile", png(noisy(page()))).status, SIMILAR)
+
+        result = self.store.check("home/mobile", png(with_block(page())))
+        self.assertEqual(result.status, CHANGED)
+        self.assertTrue(result.failed)
+        self.assertTrue(os.path.exists(result.path))
+        self.assertIn("tiles changed", result.message)
+
+        resized = self.store.check("home/mobile", png(page()[:500]))
+        self.assertTrue(resized.size_changed)
+        self.assertEqual(self.store.stats, {NEW: 1, IDENTICAL: 1, SIMILAR: 1, CHANGED: 2, UPDATED: 0})
+
+    def test_update_mode(self):
+        self.store.check("home/mobile", png(page()))
+        self.store.update = True
+        self.assertEqual(self.store.check("home/mobile", png(with_block(page()))).status, UPDATED)
+        self.store.update = False
+        self.assertEqual(self.store.check("home/mobile", png(with_block(page()))).status, IDENTICAL)
+
+    def test_baselines_are_content_addressed(self):
+        image = png(page())
+        results = self.store.check_many([(f"page/{index}", image) for index in range(5)])
+        self.assertEqual({result.status for result in results}, {NEW})
+        objects = [name for _, _, names in os.walk(os.path.join(self.store_dir.name, "objects")) for name in names]
+        self.assertEqual(objects, [results[0].sha + ".png"])
+
+    def test_unchanged_screenshots_skip_decoding(self):
+        images = [png(page(seed)) for seed in range(10)]
+        self.store.check_many([(f"page/{index}", image) for index, image in enumerate(images)])
+        started = time.perf_counter()
+        results = self.store.check_many([(f"page/{index % 10}", images[index % 10])
+                                         for index in range(IDENTICAL_CHECKS)])
+        elapsed = time.perf_counter() - started
+        self.assertEqual({result.status for result in results}, {IDENTICAL})
+        self.assertLess(elapsed, IDENTICAL_CHECKS_SECONDS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,100 +1,142 @@
-import unittest
-import time
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.wait import WebDriverWait
-
-#====== URL AND WEBSITE ======
-SITE_URL = "https://react.dev"
-#====== HEADERS & BREAKPOINTS & TAGS ======
-HEADER_SELECTOR = "nav.z-40"
-FOOTER_TAG = "footer"
-LAYOUT_BREAKPOINTS = [
-    {"name": "mobile", "width": 375, "height": 667},
-    {"name": "laptop", "width": 1200, "height": 800},
-    {"name": "desktop", "width": 1920, "height": 1080}
-]
-
-#====== SCRIPTS ======
-SCRIPT_NAME="return document.body.scrollWidth"
-CLIENT_SCRIPT="return document.body.clientWidth"
-
-
-class LayoutHomePageTest(unittest.TestCase):
-    """
-       Test suite to verify the layout and presence of key sections (header/footer) on the React.dev homepage
-       across common device sizes (mobile, laptop, desktop).
-       """
-
-    def setUp(self):
-        """
-        Opens the Chrome browser and navigates to the homepage.
-        """
-        self.driver = webdriver.Chrome()
-        self.driver.get(SITE_URL)
-        self.wait = WebDriverWait(self.driver, 10)
-
-    def tearDown(self):
-        """
-        Closes the browser after each test.
-        """
-        self.driver.quit()
-
-
-    def test_header(self):
-        """
-        Checks that the header navigation (nav.z-40) is present on the homepage.
-        Fails if not found.
-        """
-        header_element = self.wait.until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, HEADER_SELECTOR)))
-        self.assertIsNotNone(header_element, "Header element was not found!")
-
-    def test_footer(self):
-        """
-        Checks that the footer is present on the homepage and prints its text.
-        Fails if not found.
-        """
-        footer = self.wait.until(
-            EC.presence_of_element_located((By.TAG_NAME, FOOTER_TAG))
-        )
-        self.assertIsNotNone(footer)
-
-
-    def test_layout_in_different_size(self):
-        """
-        Verifies that the homepage layout does not break or cause unwanted horizontal scrolling
-        at common device sizes (mobile, laptop, desktop).
-        For each breakpoint:
-        - Resizes the window
-        - Waits for rendering
-        - Checks scrollWidth vs. clientWidth (no significant horizontal scroll)
-        - Saves a screenshot for visual inspection
-        """
-        for point in LAYOUT_BREAKPOINTS:
-            with self.subTest(LAYOUT_BREAKPOINTS=point["name"]):
-                self.driver.set_window_size(point["width"], point["height"])
-                time.sleep(1)
-
-                scroll_width = self.driver.execute_script(SCRIPT_NAME)
-                client_width = self.driver.execute_script(CLIENT_SCRIPT)
-                self.assertTrue(
-                    scroll_width - client_width < 50,
-                    f"Layout breaks at {point['name']} – horizontal scroll detected!"
-                )
-
-                self.driver.save_screenshot(f"screenshot_{point['name']}.png")
-
-
-
-
-
-
-
-
-
-
-
-
-
+import time
+import unittest
+from Infrastructure.Browsers import browser_config
+from Infrastructure.DriverPool import get_driver_pool
+from Infrastructure.Fingerprints import HTML, get_fingerprint_store, page_fingerprint
+from Infrastructure.Instrumentation import instrument_helpers
+from Infrastructure.PerfMetrics import HOME, get_perf_recorder
+from Infrastructure.ParallelRunner import shard_subtests, subtest_items
+from Infrastructure.SiteConfig import site_url
+from Infrastructure.StaticPrecheck import get_static_precheck
+from Infrastructure.ViewportLayout import LayoutEngine, Viewport, width_sweep
+from Infrastructure.VisualDiff import get_visual_store
+
+#====== URL AND WEBSITE ======
+SITE_URL = site_url("https://react.dev")
+#====== HEADERS & BREAKPOINTS & TAGS ======
+HEADER_SELECTOR = "nav.z-40"
+FOOTER_TAG = "footer"
+LAYOUT_BREAKPOINTS = [
+    {"name": "mobile", "width": 375, "height": 667},
+    {"name": "laptop", "width": 1200, "height": 800},
+    {"name": "desktop", "width": 1920, "height": 1080}
+]
+
+LAYOUT_ELEMENTS = {"header": HEADER_SELECTOR, "footer": FOOTER_TAG}
+#====== FINGERPRINT ======
+LAYOUT_INPUTS = {HEADER_SELECTOR: HTML, FOOTER_TAG: HTML, "main": HTML, "link[rel=stylesheet]": HTML}
+
+MAX_HORIZONTAL_OVERFLOW = 50
+
+
+@instrument_helpers
+class LayoutHomePageTest(unittest.TestCase):
+    """
+       Test suite to verify the layout and presence of key sections (header/footer) on the React.dev homepage
+       across common device sizes (mobile, laptop, desktop).
+       """
+
+    def setUp(self):
+        """
+        The browser is leased on first use of self.driver, so the structural checks that the HTML pre-check
+        settles never start one.
+        """
+        self.lease = None
+        self.home_budget_error = None
+
+    @property
+    def driver(self):
+        """
+        Leases a warm Chrome browser from the shared driver pool and navigates to the homepage (once per test).
+        """
+        if self.lease is None:
+            self.lease = get_driver_pool().acquire(self.id())
+            self.addCleanup(get_driver_pool().release, self.lease)
+            self.lease.driver.get(SITE_URL)
+            self.home_budget_error = get_perf_recorder().check(self.lease.driver, HOME, self.id())
+        return self.lease.driver
+
+    def assert_home_budget(self):
+        """
+        Fails the test if the homepage, when a browser loaded it, was over its performance budget
+        (only with PERF_METRICS=fail).
+        """
+        self.assertIsNone(self.home_budget_error, self.home_budget_error)
+
+    def test_header(self):
+        """
+        Checks that the header navigation (nav.z-40) is present on the homepage.
+        The server rendered HTML is checked first; the browser is only used if the header is not in it.
+        Fails if not found.
+        """
+        result = get_static_precheck().check(SITE_URL, HEADER_SELECTOR, browser=lambda: self.driver)
+        self.assertTrue(result.passed, f"Header element was not found! {result.describe()}")
+        self.assert_home_budget()
+
+    def test_footer(self):
+        """
+        Checks that the footer is present on the homepage.
+        The server rendered HTML is checked first; the browser is only used if the footer is not in it.
+        Fails if not found.
+        """
+        result = get_static_precheck().check(SITE_URL, FOOTER_TAG, browser=lambda: self.driver)
+        self.assertTrue(result.passed, result.describe())
+        self.assert_home_budget()
+
+
+    @shard_subtests(len(LAYOUT_BREAKPOINTS))
+    def test_layout_in_different_size(self):
+        """
+        Verifies that the homepage layout does not break or cause unwanted horizontal scrolling
+        at common device sizes (mobile, laptop, desktop).
+        All the breakpoints are emulated at once (one tab per breakpoint, no window resize). For each breakpoint:
+        - Waits until the page stops re-rendering (no DOM mutations)
+        - Checks scrollWidth vs. clientWidth (no significant horizontal scroll)
+        - Compares a CDP screenshot with the stored baseline of the browser config (perceptual hash, then tile
+          diff); a changed screenshot is saved for visual inspection
+        """
+        breakpoints = [Viewport.from_breakpoint(point) for point in subtest_items(LAYOUT_BREAKPOINTS)]
+        engine = LayoutEngine(self.driver, LAYOUT_ELEMENTS, tabs=len(LAYOUT_BREAKPOINTS), capture=True)
+        self.assert_home_budget()
+        for snapshot in engine.measure(SITE_URL, breakpoints):
+            name = snapshot.viewport.name
+            with self.subTest(LAYOUT_BREAKPOINTS=name):
+                self.assertTrue(
+                    snapshot.overflow < MAX_HORIZONTAL_OVERFLOW,
+                    f"Layout breaks at {name} – horizontal scroll detected! {snapshot.describe()}"
+                )
+
+                visual = get_visual_store().check(f"home/{browser_config().name}/{name}", snapshot.png)
+                if visual.failed:
+                    with open(f"screenshot_{name}.png", "wb") as screenshot:
+                        screenshot.write(snapshot.png)
+                self.assertFalse(visual.failed, visual.message)
+
+    def test_layout_width_sweep(self):
+        """
+        Sweeps the homepage over dense widths from mobile to desktop in emulated tabs.
+        At every width the header and footer must be rendered inside the viewport and nothing may
+        scroll the page horizontally.
+        Skipped when the header, footer, main section and stylesheets did not change since the last passing sweep.
+        """
+        start = time.perf_counter()
+        fingerprints = get_fingerprint_store()
+        fingerprint = page_fingerprint(self.driver, LAYOUT_INPUTS)
+        self.assert_home_budget()
+        if fingerprints.unchanged(self.id(), "width sweep", fingerprint):
+            self.skipTest("Layout inputs unchanged since the last passing sweep")
+
+        # A failed subTest does not stop the loop, so every width stays listed until its assertions passed.
+        failing = []
+        for snapshot in LayoutEngine(self.driver, LAYOUT_ELEMENTS).measure(SITE_URL, width_sweep()):
+            with self.subTest(width=snapshot.viewport.width):
+                failing.append(snapshot.viewport.name)
+                self.assertTrue(snapshot.overflow < MAX_HORIZONTAL_OVERFLOW, snapshot.describe())
+                for name, box in snapshot.boxes.items():
+                    self.assertIsNotNone(box, f"{name} was not found at {snapshot.viewport.name}")
+                    self.assertGreater(box["width"], 0, f"{name} is not rendered at {snapshot.viewport.name}")
+                    self.assertLessEqual(box["x"] + box["width"], snapshot.viewport.width + 1,
+                                         f"{name} sticks out at {snapshot.viewport.name}")
+                failing.remove(snapshot.viewport.name)
+        if not failing:
+            fingerprints.record(self.id(), "width sweep", fingerprint, time.perf_counter() - start)